@@ -60,3 +60,50 @@ class GetAttachmentSerializer(serializers.Serializer):
 class IssueFileSerializer(AuthMixinSerializer, FileSerializer):
     doc_id = serializers.CharField()
     attachment_id = serializers.CharField()
+
+
+class UploadInitSerializer(AuthMixinSerializer):
+    name = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    checksum = serializers.RegexField(r'^[0-9a-fA-F]{64}$', help_text='SHA-256 digest of the file in hexadecimal')
+    db = serializers.ChoiceField(choices=('', 'grm'), required=False, default='')
+    doc_id = serializers.CharField(help_text='Issue (db=grm) or ADL document the file is attached to')
+    attachment_id = serializers.CharField()
+    phase = serializers.IntegerField(min_value=1, required=False, help_text='Phase of the ADL task')
+    task = serializers.IntegerField(min_value=1, required=False, help_text='Task of the ADL document')
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs['db'] != 'grm':
+            missing = {field: [self.fields[field].error_messages['required']] for field in ('phase', 'task')
+                       if field not in attrs}
+            if missing:
+                raise serializers.ValidationError(missing)
+        return attrs
+
+    def validate_size(self, value):
+        max_upload_size = settings.MAX_UPLOAD_SIZE
+        if value > max_upload_size:
+            raise serializers.ValidationError(
+                self.default_error_messages['file_size'] % {
+                    'max_size': filesizeformat(max_upload_size),
+                    'size': filesizeformat(value)})
+        return value
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(**kwargs)
+        self.default_error_messages['file_size'] = _(
+            'Select a file size less than or equal to %(max_size)s. The selected file size is %(size)s.')
+
+
+class UploadChunkSerializer(AuthMixinSerializer):
+    offset = serializers.IntegerField(min_value=0)
+    chunk = serializers.FileField(allow_empty_file=True)
+
+
+class UploadStatusSerializer(serializers.Serializer):
+    upload_id = serializers.CharField(read_only=True)
+    offset = serializers.IntegerField(read_only=True)
+    size = serializers.IntegerField(read_only=True)
+    chunk_size = serializers.IntegerField(read_only=True)
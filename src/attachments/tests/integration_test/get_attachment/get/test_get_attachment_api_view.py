@@ -0,0 +1,94 @@
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from PIL import Image
+from rest_framework.reverse import reverse
+
+import attachments.views
+import client
+from client import get_db, get_document, upload_stream
+from grm.tests import BaseTestCase
+
+CONTENT = bytes(range(256)) * 1024
+
+
+def image_content(size=(1200, 800)):
+    output = BytesIO()
+    Image.new('RGB', size).save(output, 'JPEG')
+    return output.getvalue()
+
+
+class TestGetAttachmentAPIView(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.attachment_db = get_db(settings.COUCHDB_ATTACHMENT_DATABASE)
+        self.upstreams = []
+
+    def upload(self, content=CONTENT, name='photo.jpg'):
+        doc_id = upload_stream(self.attachment_db, name, 'image/jpeg', BytesIO(content), len(content))['id']
+        return doc_id, reverse('attachments:get-attachment', kwargs={'id': doc_id, 'name': name})
+
+    def get_attachment(self, db_client, doc_id, name, headers=None):
+        # The responses of CouchDB proxied by the view
+        upstream = client.get_attachment(db_client, doc_id, name, headers)
+        upstream.close = mock.Mock(wraps=upstream.close)
+        self.upstreams.append((headers, upstream, name))
+        return upstream
+
+    def get(self, uri, data=None, **kwargs):
+        with mock.patch.object(attachments.views, 'get_attachment', self.get_attachment):
+            return super().get(uri, data, **kwargs)
+
+    def test_attachment_is_streamed(self):
+        _, url = self.upload()
+
+        response = self.get(url)
+
+        assert response.streaming and response.status_code == 200
+        assert response['ETag'] and response['Content-Length'] == str(len(CONTENT))
+        assert 'max-age' in response['Cache-Control']
+        upstream = self.upstreams[0][1]
+        # The content is read from CouchDB while it is sent
+        assert not upstream._content_consumed
+        assert b''.join(response.streaming_content) == CONTENT
+        response.close()
+        assert upstream.close.called
+
+    def test_unmodified_attachment(self):
+        _, url = self.upload()
+        response = self.get(url)
+        etag = response['ETag']
+        response.close()
+
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304 and response.content == b''
+        assert self.upstreams[1][0]['If-None-Match'] == etag
+        assert self.upstreams[1][1].close.called
+
+    def test_range(self):
+        _, url = self.upload()
+
+        response = self.get(url, HTTP_RANGE='bytes=100-199')
+
+        assert response.status_code == 206
+        assert response['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+        assert b''.join(response.streaming_content) == CONTENT[100:200]
+        assert self.upstreams[0][0]['Accept-Encoding'] == 'identity'
+        response.close()
+
+    def test_thumbnail(self):
+        doc_id, url = self.upload(image_content())
+
+        for _ in range(2):
+            response = self.get(url, {'size': 100})
+            with Image.open(BytesIO(b''.join(response.streaming_content))) as thumbnail:
+                assert thumbnail.size == (128, 85)
+            assert response['Cache-Control'] == f'private, max-age={attachments.views.THUMBNAIL_CACHE_MAX_AGE}'
+            response.close()
+
+        assert [name for _, _, name in self.upstreams] == ['thumbnail-128-photo.jpg'] * 2
+        # The thumbnail is created by the first request only
+        assert get_document(self.attachment_db, doc_id)['_rev'].startswith('2-')
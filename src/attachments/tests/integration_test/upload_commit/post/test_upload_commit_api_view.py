@@ -0,0 +1,161 @@
+import hashlib
+import os
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.reverse import reverse
+
+import attachments.uploads
+import attachments.views
+from authentication.tests import CouchdbADLFactory, IssueFactory
+from client import COUCHDB_PASSWORD, COUCHDB_USERNAME, get_attachment, get_db, get_document
+from grm.tests import BaseTestCase
+
+CONTENT = os.urandom(100 * 1024)
+CHECKSUM = hashlib.sha256(CONTENT).hexdigest()
+CREDENTIALS = {'username': COUCHDB_USERNAME, 'password': COUCHDB_PASSWORD}
+
+
+class TestUploadCommitAPIView(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        patcher = mock.patch.object(attachments.uploads, 'ATTACHMENT_UPLOAD_DIR', upload_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.grm_db = get_db(settings.COUCHDB_GRM_DATABASE)
+        self.issue = IssueFactory().doc
+
+    def start_upload(self, checksum=CHECKSUM, **target):
+        target = target or {
+            'db': 'grm', 'doc_id': self.issue['_id'], 'attachment_id': self.issue['attachments'][0]['id']
+        }
+        response = self.post(reverse('attachments:upload-init'), {
+            'name': 'photo.jpg', 'content_type': 'image/jpeg', 'size': len(CONTENT), 'checksum': checksum,
+            **target, **CREDENTIALS
+        }, authorized=False)
+        assert response.status_code == 201
+        return response.data['upload_id']
+
+    def send_chunk(self, upload_id, offset, chunk):
+        return self.post(reverse('attachments:upload-chunk', kwargs={'upload_id': upload_id}), {
+            'offset': offset, 'chunk': SimpleUploadedFile('chunk', chunk), **CREDENTIALS
+        }, authorized=False, format='multipart')
+
+    def commit(self, upload_id):
+        return self.post(reverse('attachments:upload-commit', kwargs={'upload_id': upload_id}), CREDENTIALS,
+                         authorized=False)
+
+    def test_resumed_upload(self):
+        upload_id = self.start_upload()
+
+        response = self.send_chunk(upload_id, 0, CONTENT[:60 * 1024])
+        assert response.status_code == 200 and response.data['offset'] == 60 * 1024
+
+        # Resent from the start after the connection dropped, the response gives the offset to resume from
+        response = self.send_chunk(upload_id, 0, CONTENT[:60 * 1024])
+        assert response.status_code == 409 and response.data['offset'] == 60 * 1024
+
+        response = self.send_chunk(upload_id, 60 * 1024, CONTENT[60 * 1024:])
+        assert response.data['offset'] == len(CONTENT)
+
+        response = self.commit(upload_id)
+        assert response.status_code == 201
+        attachment = get_attachment(get_db(settings.COUCHDB_GRM_ATTACHMENT_DATABASE), response.data['id'], 'photo.jpg')
+        assert attachment.content == CONTENT
+        issue_attachment = get_document(self.grm_db, self.issue['_id'])['attachments'][0]
+        assert issue_attachment['url'] == f'/grm_attachments/{response.data["id"]}/photo.jpg'
+        assert issue_attachment['uploaded'] is True and issue_attachment['bd_id'] == response.data['id']
+
+    def test_upload_to_a_task(self):
+        doc = CouchdbADLFactory().doc
+        attachment_id = doc['phases'][1]['tasks'][0]['attachments'][0]['id']
+        upload_id = self.start_upload(doc_id=doc['_id'], phase=2, task=1, attachment_id=attachment_id)
+        self.send_chunk(upload_id, 0, CONTENT)
+
+        response = self.commit(upload_id)
+
+        assert response.status_code == 201
+        attachment_db = get_db(settings.COUCHDB_ATTACHMENT_DATABASE)
+        assert get_attachment(attachment_db, response.data['id'], 'photo.jpg').content == CONTENT
+        task_attachment = get_document(get_db(), doc['_id'])['phases'][1]['tasks'][0]['attachments'][0]
+        assert task_attachment['url'] == f'/attachments/{response.data["id"]}/photo.jpg'
+        assert task_attachment['uploaded'] is True
+
+    def test_commit_sent_twice(self):
+        upload_id = self.start_upload()
+        self.send_chunk(upload_id, 0, CONTENT)
+        attachment_db = get_db(settings.COUCHDB_GRM_ATTACHMENT_DATABASE)
+        doc_count = attachment_db.doc_count()
+
+        first = self.commit(upload_id)
+        # The response to the commit was lost and the client sends it again
+        second = self.commit(upload_id)
+
+        assert first.status_code == second.status_code == 201
+        assert second.data == first.data
+        assert attachment_db.doc_count() == doc_count + 1
+        # The issue is only updated by the first commit
+        assert get_document(self.grm_db, self.issue['_id'])['_rev'].startswith('2-')
+
+    def test_commit_sent_again_after_the_link_failed(self):
+        upload_id = self.start_upload()
+        self.send_chunk(upload_id, 0, CONTENT)
+        attachment_db = get_db(settings.COUCHDB_GRM_ATTACHMENT_DATABASE)
+        doc_count = attachment_db.doc_count()
+        save_issue_attachment = attachments.views.save_issue_attachment
+
+        with mock.patch.object(attachments.views, 'save_issue_attachment', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                self.commit(upload_id)
+        assert not get_document(self.grm_db, self.issue['_id'])['attachments'][0]['uploaded']
+
+        with mock.patch.object(attachments.views, 'save_issue_attachment', wraps=save_issue_attachment) as save:
+            response = self.commit(upload_id)
+            self.commit(upload_id)
+
+        assert response.status_code == 201 and save.call_count == 1
+        assert attachment_db.doc_count() == doc_count + 1
+        issue_attachment = get_document(self.grm_db, self.issue['_id'])['attachments'][0]
+        assert issue_attachment['bd_id'] == response.data['id']
+
+    def test_unknown_target(self):
+        response = self.post(reverse('attachments:upload-init'), {
+            'name': 'photo.jpg', 'content_type': 'image/jpeg', 'size': len(CONTENT), 'checksum': CHECKSUM,
+            'db': 'grm', 'doc_id': self.issue['_id'], 'attachment_id': 'unknown', **CREDENTIALS
+        }, authorized=False)
+
+        assert response.status_code == 404
+
+    def test_task_of_the_upload_is_required(self):
+        doc = CouchdbADLFactory().doc
+        response = self.post(reverse('attachments:upload-init'), {
+            'name': 'photo.jpg', 'content_type': 'image/jpeg', 'size': len(CONTENT), 'checksum': CHECKSUM,
+            'doc_id': doc['_id'], 'attachment_id': doc['phases'][0]['tasks'][0]['attachments'][0]['id'],
+            **CREDENTIALS
+        }, authorized=False)
+
+        assert response.status_code == 400 and set(response.data) == {'phase', 'task'}
+
+    def test_incomplete_or_corrupted_upload(self):
+        upload_id = self.start_upload()
+        self.send_chunk(upload_id, 0, CONTENT[:10])
+
+        response = self.commit(upload_id)
+        assert response.status_code == 400 and 'non_field_errors' in response.data
+
+        upload_id = self.start_upload(checksum=hashlib.sha256(b'other').hexdigest())
+        self.send_chunk(upload_id, 0, CONTENT)
+        response = self.commit(upload_id)
+        assert response.status_code == 400 and 'checksum' in response.data
+        # The corrupted upload must be sent again from the start
+        assert self.commit(upload_id).status_code == 404
+
+    def test_unknown_upload(self):
+        response = self.commit('a' * 32)
+
+        assert response.status_code == 404
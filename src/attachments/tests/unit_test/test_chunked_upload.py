@@ -0,0 +1,137 @@
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+import attachments.uploads
+from attachments.uploads import (
+    ChecksumMismatch, ChunkedUpload, OffsetMismatch, UploadIncomplete, UploadNotFound, delete_expired_uploads
+)
+
+CONTENT = os.urandom(100 * 1024)
+CHECKSUM = hashlib.sha256(CONTENT).hexdigest()
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupted_chunks(data, after):
+    # Chunks of a request whose connection drops after the given number of bytes
+    yield data[:after]
+    raise Interrupted
+
+
+@pytest.fixture
+def uploads(monkeypatch, tmp_path):
+    monkeypatch.setattr(attachments.uploads, 'ATTACHMENT_UPLOAD_DIR', str(tmp_path))
+    uploaded = []
+
+    def upload_stream(db_client, name, content_type, file, size=None):
+        uploaded.append((db_client, name, content_type, file.read(), size))
+        return {'ok': True, 'id': 'doc-1', 'rev': '1-abc'}
+
+    monkeypatch.setattr(attachments.uploads, 'upload_stream', upload_stream)
+    return uploaded
+
+
+TARGET = {'doc_id': 'issue-1', 'attachment_id': 'attachment-1'}
+
+
+def create_upload(content=CONTENT, checksum=CHECKSUM):
+    return ChunkedUpload.create('photo.jpg', 'image/jpeg', len(content), checksum, 'grm', TARGET)
+
+
+class TestChunkedUpload:
+
+    def test_upload_in_chunks(self, uploads):
+        upload = create_upload()
+        for offset in range(0, len(CONTENT), 30 * 1024):
+            assert upload.append(offset, [CONTENT[offset:offset + 30 * 1024]]) == min(offset + 30 * 1024, len(CONTENT))
+
+        assert upload.commit('grm_attachments') == {'ok': True, 'id': 'doc-1', 'rev': '1-abc'}
+        assert uploads == [('grm_attachments', 'photo.jpg', 'image/jpeg', CONTENT, len(CONTENT))]
+        # The spooled data is discarded once the attachment is saved
+        assert ChunkedUpload.get(upload.upload_id).offset == 0
+
+    def test_commit_sent_twice(self, uploads):
+        upload = create_upload()
+        upload.append(0, [CONTENT])
+        results = []
+        links = []
+
+        def commit():
+            upload_ = ChunkedUpload.get(upload.upload_id)
+            results.append(upload_.commit('grm_attachments', lambda *args: links.append(args)))
+
+        threads = [threading.Thread(target=commit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The response to the commit was lost and the client sends it again
+        commit()
+
+        assert results == [{'ok': True, 'id': 'doc-1', 'rev': '1-abc'}] * 5
+        assert len(uploads) == 1
+        assert links == [(TARGET, 'photo.jpg', {'ok': True, 'id': 'doc-1', 'rev': '1-abc'})]
+        # The result is kept until the upload expires
+        assert delete_expired_uploads(now=time.time() + 2 * 24 * 3600) == 1
+        with pytest.raises(UploadNotFound):
+            ChunkedUpload.get(upload.upload_id)
+
+    def test_interrupted_chunk_is_discarded(self, uploads):
+        upload = create_upload()
+        upload.append(0, [CONTENT[:50 * 1024]])
+
+        with pytest.raises(Interrupted):
+            upload.append(50 * 1024, interrupted_chunks(CONTENT[50 * 1024:], 10 * 1024))
+
+        # The upload is resumed by another worker after the last complete chunk
+        upload = ChunkedUpload.get(upload.upload_id)
+        assert upload.offset == 50 * 1024
+        upload.append(50 * 1024, [CONTENT[50 * 1024:]])
+        upload.commit('grm_attachments')
+        assert uploads[0][3] == CONTENT
+
+    def test_chunk_sent_twice(self, uploads):
+        upload = create_upload()
+        upload.append(0, [CONTENT[:10]])
+
+        # The response to the chunk was lost and the client sends it again
+        with pytest.raises(OffsetMismatch) as e:
+            upload.append(0, [CONTENT[:10]])
+        assert e.value.offset == 10 and upload.offset == 10
+
+    def test_chunks_larger_than_the_file(self, uploads):
+        upload = create_upload(content=b'abc')
+
+        with pytest.raises(ValueError):
+            upload.append(0, [b'abcd'])
+        assert upload.offset == 0
+
+    def test_incomplete_or_corrupted_upload_is_not_saved(self, uploads):
+        upload = create_upload(checksum=hashlib.sha256(b'other').hexdigest())
+        upload.append(0, [CONTENT[:10]])
+        with pytest.raises(UploadIncomplete):
+            upload.commit('grm_attachments')
+
+        upload.append(10, [CONTENT[10:]])
+        with pytest.raises(ChecksumMismatch):
+            upload.commit('grm_attachments')
+        assert uploads == []
+
+    def test_expired_uploads_are_deleted(self, uploads):
+        upload = create_upload()
+        upload.append(0, [CONTENT[:10]])
+
+        assert delete_expired_uploads() == 0
+        assert delete_expired_uploads(now=time.time() + 2 * 24 * 3600) == 1
+        with pytest.raises(UploadNotFound):
+            ChunkedUpload.get(upload.upload_id)
+
+    def test_invalid_upload_id(self, uploads):
+        with pytest.raises(UploadNotFound):
+            ChunkedUpload.get('../../etc/passwd')
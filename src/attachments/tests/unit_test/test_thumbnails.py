@@ -0,0 +1,104 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import attachments.thumbnails
+from attachments.thumbnails import get_or_create_thumbnail, get_thumbnail_size, make_thumbnail
+
+
+def image_content(size=(1200, 800), image_format='JPEG', mode='RGB'):
+    output = BytesIO()
+    Image.new(mode, size).save(output, image_format)
+    return output.getvalue()
+
+
+class FakeResponse:
+
+    def __init__(self, content):
+        self.status_code = 200 if content is not None else 404
+        self.content = content
+
+    def close(self):
+        pass
+
+
+class FakeAttachmentDatabase:
+
+    def __init__(self, attachments):
+        self.rev = 1
+        self.attachments = attachments
+        self.reads = 0
+        self.conflicts = 0
+
+    def get_document(self, db_client, doc_id):
+        stubs = {name: {'content_type': content_type} for name, (content_type, _) in self.attachments.items()}
+        return {'_id': doc_id, '_rev': f'{self.rev}-abc', '_attachments': stubs}
+
+    def get_attachment(self, db_client, doc_id, name, headers=None):
+        self.reads += 1
+        return FakeResponse(self.attachments[name][1] if name in self.attachments else None)
+
+    def put_attachment(self, db_client, doc_id, rev, name, content_type, data):
+        if self.conflicts:
+            # Updated by another request in the meantime
+            self.conflicts -= 1
+            self.rev += 1
+            return None
+        self.rev += 1
+        self.attachments[name] = (content_type, data)
+        return f'{self.rev}-abc'
+
+
+@pytest.fixture
+def attachment_db(monkeypatch):
+    db = FakeAttachmentDatabase({
+        'photo.jpg': ('image/jpeg', image_content()),
+        'report.pdf': ('application/pdf', b'%PDF-1.4'),
+    })
+    for name in ('get_document', 'get_attachment', 'put_attachment'):
+        monkeypatch.setattr(attachments.thumbnails, name, getattr(db, name))
+    return db
+
+
+class TestThumbnails:
+
+    def test_sizes_are_bucketed(self):
+        assert get_thumbnail_size('48') == 64
+        assert get_thumbnail_size(100) == 128
+        assert get_thumbnail_size(512) == 512
+        assert get_thumbnail_size(1000) is None
+        assert get_thumbnail_size('0') is None
+        assert get_thumbnail_size('abc') is None
+        assert get_thumbnail_size(None) is None
+
+    def test_thumbnail_keeps_the_aspect_ratio(self):
+        content, content_type = make_thumbnail(image_content(), 128, 'image/jpeg')
+
+        assert content_type == 'image/jpeg'
+        assert Image.open(BytesIO(content)).size == (128, 85)
+
+        content, content_type = make_thumbnail(image_content(image_format='PNG', mode='RGBA'), 64, 'image/png')
+        with Image.open(BytesIO(content)) as thumbnail:
+            assert content_type == 'image/png'
+            assert thumbnail.mode == 'RGBA' and thumbnail.size == (64, 43)
+
+    def test_thumbnail_is_created_once(self, attachment_db):
+        assert get_or_create_thumbnail(None, 'doc-1', 'photo.jpg', 128) == 'thumbnail-128-photo.jpg'
+        assert get_or_create_thumbnail(None, 'doc-1', 'photo.jpg', 128) == 'thumbnail-128-photo.jpg'
+
+        assert attachment_db.reads == 1
+        content_type, content = attachment_db.attachments['thumbnail-128-photo.jpg']
+        assert content_type == 'image/jpeg' and len(content) < len(attachment_db.attachments['photo.jpg'][1])
+
+    def test_conflicts_are_retried(self, attachment_db):
+        attachment_db.conflicts = 1
+
+        assert get_or_create_thumbnail(None, 'doc-1', 'photo.jpg', 64) == 'thumbnail-64-photo.jpg'
+        assert attachment_db.reads == 2
+
+    def test_other_files_have_no_thumbnail(self, attachment_db):
+        assert get_or_create_thumbnail(None, 'doc-1', 'report.pdf', 64) is None
+        assert get_or_create_thumbnail(None, 'doc-1', 'missing.jpg', 64) is None
+        attachment_db.attachments['broken.jpg'] = ('image/jpeg', b'not an image')
+        assert get_or_create_thumbnail(None, 'doc-1', 'broken.jpg', 64) is None
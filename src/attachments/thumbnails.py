@@ -0,0 +1,85 @@
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from client import get_attachment, get_document, put_attachment
+
+# Widths and heights in pixels of the thumbnails, a requested size is rounded up to the next one
+THUMBNAIL_SIZES = getattr(settings, 'THUMBNAIL_SIZES', (64, 128, 256, 512))
+THUMBNAIL_QUALITY = 85
+# Format of the thumbnails of each type of image, PNG keeping the transparency
+THUMBNAIL_FORMATS = {
+    'image/jpeg': ('JPEG', 'image/jpeg'),
+    'image/png': ('PNG', 'image/png'),
+    'image/gif': ('PNG', 'image/png'),
+    'image/webp': ('PNG', 'image/png'),
+    'image/bmp': ('JPEG', 'image/jpeg'),
+}
+MAX_ATTEMPTS = 3
+
+
+def get_thumbnail_size(size):
+    """
+    Returns the size of the thumbnails to use for images displayed at most size pixels wide and high, or None if the
+    size is not valid or larger than the largest thumbnails.
+    """
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return None
+    if size <= 0:
+        return None
+    return next((bucket for bucket in sorted(THUMBNAIL_SIZES) if bucket >= size), None)
+
+
+def get_thumbnail_name(name, size):
+    return f'thumbnail-{size}-{name}'
+
+
+def make_thumbnail(content, size, content_type):
+    """
+    Returns the content and content type of the thumbnail of the image, at most size pixels wide and high.
+    """
+    image_format, thumbnail_content_type = THUMBNAIL_FORMATS[content_type]
+    with Image.open(BytesIO(content)) as image:
+        # Photos taken with phones are often rotated with an EXIF tag
+        thumbnail = ImageOps.exif_transpose(image)
+        thumbnail.thumbnail((size, size))
+        if image_format == 'JPEG' and thumbnail.mode != 'RGB':
+            thumbnail = thumbnail.convert('RGB')
+        output = BytesIO()
+        thumbnail.save(output, image_format, quality=THUMBNAIL_QUALITY, optimize=True)
+    return output.getvalue(), thumbnail_content_type
+
+
+def get_or_create_thumbnail(db_client, doc_id, name, size):
+    """
+    Returns the name of the attachment of the document holding the thumbnail of size pixels of the attachment name,
+    creating it the first time it is requested. Returns None if the attachment is not an image supported by Pillow
+    or does not exist.
+    """
+    thumbnail_name = get_thumbnail_name(name, size)
+    for attempt in range(MAX_ATTEMPTS):
+        doc = get_document(db_client, doc_id)
+        attachments = doc.get('_attachments', {}) if doc else {}
+        if thumbnail_name in attachments:
+            return thumbnail_name
+        if name not in attachments or attachments[name]['content_type'] not in THUMBNAIL_FORMATS:
+            return None
+
+        response = get_attachment(db_client, doc_id, name, {'Accept-Encoding': 'identity'})
+        try:
+            if response.status_code != 200:
+                return None
+            content = response.content
+        finally:
+            response.close()
+        try:
+            thumbnail, content_type = make_thumbnail(content, size, attachments[name]['content_type'])
+        except Exception:
+            return None
+        # The revision changes when the thumbnails of other sizes are added concurrently
+        if put_attachment(db_client, doc_id, doc['_rev'], thumbnail_name, content_type, thumbnail):
+            return thumbnail_name
+    return None
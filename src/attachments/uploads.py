@@ -0,0 +1,223 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+from django.conf import settings
+
+from client import upload_stream
+
+ATTACHMENT_UPLOAD_DIR = getattr(settings, 'ATTACHMENT_UPLOAD_DIR', '/tmp/grm-uploads')
+ATTACHMENT_UPLOAD_EXPIRY = getattr(settings, 'ATTACHMENT_UPLOAD_EXPIRY', 24 * 3600)
+# Size of the chunks suggested to the clients, small enough to be sent on poor connections
+ATTACHMENT_UPLOAD_CHUNK_SIZE = 256 * 1024
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+class OffsetMismatch(Exception):
+    """
+    The chunk does not start where the previous chunks received end, e.g. because the response to the previous
+    chunk was lost. offset is the number of bytes received, where the client must resume.
+    """
+
+    def __init__(self, offset):
+        super().__init__(f'The upload must resume at offset {offset}')
+        self.offset = offset
+
+
+class UploadIncomplete(Exception):
+    pass
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class ChunkedUpload:
+    """
+    Upload of an attachment received in several requests. The chunks are appended to a file of
+    ATTACHMENT_UPLOAD_DIR, next to a JSON file holding the metadata of the upload, so that an interrupted upload
+    can be resumed from any worker of the host until it expires. ATTACHMENT_UPLOAD_DIR is a spool on the local disk:
+    when the application runs on several hosts, it must be a storage shared by the hosts, or the requests of an
+    upload must all be sent to the same host (sticky sessions).
+    target identifies the attachment of the issue or ADL task document the file is saved for.
+    """
+
+    def __init__(self, upload_id, name, content_type, size, checksum, db, target=None):
+        self.upload_id = upload_id
+        self.name = name
+        self.content_type = content_type
+        self.size = size
+        self.checksum = checksum
+        self.db = db
+        self.target = target
+
+    @staticmethod
+    def get_path(upload_id, extension):
+        return os.path.join(ATTACHMENT_UPLOAD_DIR, f'{upload_id}.{extension}')
+
+    @property
+    def data_path(self):
+        return self.get_path(self.upload_id, 'data')
+
+    @property
+    def offset(self):
+        return os.path.getsize(self.data_path)
+
+    @classmethod
+    def create(cls, name, content_type, size, checksum, db, target=None):
+        """
+        Starts an upload of size bytes whose SHA-256 digest is checksum (hexadecimal), to the database db.
+        target is a dictionary that can be serialized to JSON, passed to the link function of commit.
+        """
+        os.makedirs(ATTACHMENT_UPLOAD_DIR, exist_ok=True)
+        delete_expired_uploads()
+        upload = cls(uuid.uuid4().hex, name, content_type, size, checksum.lower(), db, target)
+        open(upload.data_path, 'xb').close()
+        with open(cls.get_path(upload.upload_id, 'json'), 'x') as f:
+            json.dump({
+                'name': name,
+                'content_type': content_type,
+                'size': size,
+                'checksum': upload.checksum,
+                'db': db,
+                'target': target,
+            }, f)
+        return upload
+
+    @classmethod
+    def read_metadata(cls, upload_id):
+        try:
+            with open(cls.get_path(upload_id, 'json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            raise UploadNotFound(upload_id)
+
+    @classmethod
+    def get(cls, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise UploadNotFound(upload_id)
+        metadata = cls.read_metadata(upload_id)
+        metadata.pop('result', None)
+        metadata.pop('linked', None)
+        if not os.path.exists(cls.get_path(upload_id, 'data')):
+            raise UploadNotFound(upload_id)
+        return cls(upload_id, **metadata)
+
+    def append(self, offset, chunks):
+        """
+        Writes the chunks (iterable of bytes, e.g. UploadedFile.chunks()) at offset, which must be the number of
+        bytes already received. A chunk that is not fully written is discarded so that it can be sent again.
+        Returns the new offset.
+        """
+        try:
+            f = open(self.data_path, 'r+b')
+        except FileNotFoundError:
+            raise UploadNotFound(self.upload_id)
+        with f:
+            # Concurrent requests sending the same chunk are serialised, the second one failing with OffsetMismatch
+            fcntl.flock(f, fcntl.LOCK_EX)
+            current = f.seek(0, os.SEEK_END)
+            if offset != current:
+                raise OffsetMismatch(current)
+            try:
+                for chunk in chunks:
+                    if f.tell() + len(chunk) > self.size:
+                        raise ValueError('The chunks are larger than the size of the upload')
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                f.truncate(current)
+                raise
+            return f.tell()
+
+    def get_checksum(self):
+        digest = hashlib.sha256()
+        with open(self.data_path, 'rb') as f:
+            for block in iter(lambda: f.read(ATTACHMENT_UPLOAD_CHUNK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def commit(self, db_client, link=None):
+        """
+        Checks that the upload is complete and matches its checksum, then creates the attachment in CouchDB with a
+        single streamed request, and calls link(target, name, response) to refer to it from the target document.
+        Returns the status, id and revision of the new document, which are kept in the metadata of the upload until
+        it expires, so that a commit sent again, e.g. because its response was lost or the link failed, returns them
+        instead of creating another document, and only calls link if it did not succeed yet. The spooled data is
+        discarded once saved.
+        """
+        try:
+            f = open(self.data_path, 'r+b')
+        except FileNotFoundError:
+            raise UploadNotFound(self.upload_id)
+        with f:
+            # Concurrent commits of the same upload are serialised, the second one returning the result of the first
+            fcntl.flock(f, fcntl.LOCK_EX)
+            metadata = self.read_metadata(self.upload_id)
+            if 'result' not in metadata:
+                offset = f.seek(0, os.SEEK_END)
+                if offset != self.size:
+                    raise UploadIncomplete(f'{offset} of {self.size} bytes received')
+                if self.get_checksum() != self.checksum:
+                    raise ChecksumMismatch(self.upload_id)
+                f.seek(0)
+                metadata['result'] = upload_stream(db_client, self.name, self.content_type, f, self.size)
+                self.save_metadata(metadata)
+                f.truncate(0)
+            if link and not metadata.get('linked'):
+                link(self.target, self.name, metadata['result'])
+                metadata['linked'] = True
+                self.save_metadata(metadata)
+        return metadata['result']
+
+    def save_metadata(self, metadata):
+        # Replaced at once so that the metadata is never read partially written
+        path = self.get_path(self.upload_id, 'json')
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(metadata, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{path}.tmp', path)
+
+    def delete(self):
+        for extension in ('json', 'data'):
+            try:
+                os.remove(self.get_path(self.upload_id, extension))
+            except FileNotFoundError:
+                pass
+
+
+def delete_expired_uploads(now=None):
+    """
+    Deletes the uploads that did not receive a chunk for ATTACHMENT_UPLOAD_EXPIRY seconds. Returns the number of
+    uploads deleted.
+    """
+    now = time.time() if now is None else now
+    try:
+        file_names = os.listdir(ATTACHMENT_UPLOAD_DIR)
+    except FileNotFoundError:
+        return 0
+    updated_at = {}
+    for file_name in file_names:
+        upload_id, _, extension = file_name.partition('.')
+        if extension in ('json', 'data') and UPLOAD_ID_PATTERN.match(upload_id):
+            try:
+                mtime = os.path.getmtime(os.path.join(ATTACHMENT_UPLOAD_DIR, file_name))
+            except FileNotFoundError:
+                continue
+            updated_at[upload_id] = max(mtime, updated_at.get(upload_id, 0))
+    deleted = 0
+    for upload_id, mtime in updated_at.items():
+        if now - mtime > ATTACHMENT_UPLOAD_EXPIRY:
+            ChunkedUpload(upload_id, None, None, None, None, None).delete()
+            deleted += 1
+    return deleted
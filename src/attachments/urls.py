@@ -4,6 +4,9 @@ from attachments import views
 
 app_name = 'attachments'
 urlpatterns = [
+    path('uploads', views.UploadInitAPIView.as_view(), name='upload-init'),
+    path('uploads/<str:upload_id>', views.UploadChunkAPIView.as_view(), name='upload-chunk'),
+    path('uploads/<str:upload_id>/commit', views.UploadCommitAPIView.as_view(), name='upload-commit'),
     path('<str:id>/<str:name>', views.GetAttachmentAPIView.as_view(), name='get-attachment'),
     path('upload-to-task', views.UploadTaskAttachmentAPIView.as_view(), name='upload-task-attachment'),
     path('upload-to-issue', views.UploadIssueAttachmentAPIView.as_view(), name='upload-issue-attachment'),
@@ -1,19 +1,48 @@
-import requests
+from functools import partial
+
 from django.conf import settings
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.translation import gettext as _
 from drf_yasg.openapi import IN_QUERY, Parameter
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import generics, parsers
+from rest_framework import generics, parsers, serializers
 from rest_framework.response import Response
 
 from attachments.serializers import (
-    AttachmentUpdateStatusSerializer, IssueFileSerializer,
-    TaskFileSerializer
+    AttachmentUpdateStatusSerializer, AuthMixinSerializer, IssueFileSerializer, TaskFileSerializer,
+    UploadChunkSerializer, UploadInitSerializer, UploadStatusSerializer
+)
+from attachments.thumbnails import get_or_create_thumbnail, get_thumbnail_size
+from attachments.uploads import (
+    ATTACHMENT_UPLOAD_CHUNK_SIZE, ChecksumMismatch, ChunkedUpload, OffsetMismatch, UploadIncomplete, UploadNotFound
 )
-from client import COUCHDB_ATTACHMENT_DATABASE, COUCHDB_PASSWORD, COUCHDB_URL, COUCHDB_USERNAME, get_db, upload_file
+from client import COUCHDB_ATTACHMENT_DATABASE, get_attachment, get_db, upload_file
 
 COUCHDB_GRM_DATABASE = settings.COUCHDB_GRM_DATABASE
 COUCHDB_GRM_ATTACHMENT_DATABASE = settings.COUCHDB_GRM_ATTACHMENT_DATABASE
+ATTACHMENT_CACHE_MAX_AGE = getattr(settings, 'ATTACHMENT_CACHE_MAX_AGE', 3600)
+THUMBNAIL_CACHE_MAX_AGE = getattr(settings, 'THUMBNAIL_CACHE_MAX_AGE', 30 * 24 * 3600)
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+# Headers of the request forwarded to CouchDB, and of the CouchDB response forwarded to the client
+FORWARDED_REQUEST_HEADERS = ('If-None-Match', 'If-Match', 'If-Modified-Since', 'Range', 'If-Range')
+FORWARDED_RESPONSE_HEADERS = ('ETag', 'Content-Length', 'Content-Range', 'Accept-Ranges', 'Last-Modified')
+
+
+class AttachmentStream:
+    """
+    Iterates over the content of a streamed CouchDB response and closes it when Django closes the response, even if
+    the content was not consumed (e.g. client disconnected), so the connection goes back to the pool.
+    """
+
+    def __init__(self, response, chunk_size=ATTACHMENT_CHUNK_SIZE):
+        self.response = response
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        return self.response.iter_content(self.chunk_size)
+
+    def close(self):
+        self.response.close()
 
 
 class GetAttachmentAPIView(generics.GenericAPIView):
@@ -27,6 +56,13 @@ class GetAttachmentAPIView(generics.GenericAPIView):
                             'is passed empty then it is used by default in the attachment database for Participatory '
                             'Budgeting.',
                 type='string'
+            ),
+            Parameter(
+                'size',
+                IN_QUERY,
+                description='Size in pixels the image is displayed at. If it is passed, a thumbnail of the image is '
+                            'returned instead of the full resolution image.',
+                type='integer'
             )
         ]
     )
@@ -36,28 +72,101 @@ class GetAttachmentAPIView(generics.GenericAPIView):
             db = COUCHDB_GRM_ATTACHMENT_DATABASE
         else:
             db = COUCHDB_ATTACHMENT_DATABASE
-        url = f'{COUCHDB_URL}/{db}/{kwargs["id"]}/{kwargs["name"]}'
-        response = requests.get(url, auth=(COUCHDB_USERNAME, COUCHDB_PASSWORD))
-        return HttpResponse(
-            content=response.content,
-            status=response.status_code,
-            content_type=response.headers['Content-Type']
-        )
+        db = get_db(db)
+        name = kwargs['name']
+        cache_max_age = ATTACHMENT_CACHE_MAX_AGE
+        size = get_thumbnail_size(request.GET.get('size'))
+        if size:
+            thumbnail_name = get_or_create_thumbnail(db, kwargs['id'], name, size)
+            if thumbnail_name:
+                # The thumbnails are never modified, the uploads being saved in new documents
+                name = thumbnail_name
+                cache_max_age = THUMBNAIL_CACHE_MAX_AGE
+
+        headers = {
+            header: request.headers[header] for header in FORWARDED_REQUEST_HEADERS if header in request.headers
+        }
+        # Compressed content would not match the Content-Length and the ranges computed by CouchDB
+        headers['Accept-Encoding'] = 'identity'
+        upstream = get_attachment(db, kwargs['id'], name, headers)
+
+        if upstream.status_code in (200, 206):
+            response = StreamingHttpResponse(
+                AttachmentStream(upstream),
+                status=upstream.status_code,
+                content_type=upstream.headers.get('Content-Type')
+            )
+        else:
+            # 304 Not Modified, 412 Precondition Failed, 416 Range Not Satisfiable and errors have small bodies
+            response = HttpResponse(
+                content=upstream.content if upstream.status_code != 304 else b'',
+                status=upstream.status_code,
+                content_type=upstream.headers.get('Content-Type')
+            )
+            upstream.close()
+        for header in FORWARDED_RESPONSE_HEADERS:
+            if header in upstream.headers:
+                response[header] = upstream.headers[header]
+        if upstream.status_code in (200, 206, 304):
+            response['Cache-Control'] = f'private, max-age={cache_max_age}'
+        return response
+
+
+def get_task_attachments(doc, phase, task):
+    attachments = list()
+    try:
+        attachments = doc['phases'][phase - 1]['tasks'][task - 1]['attachments']
+    except Exception:
+        pass
+    return attachments
+
+
+def get_task_attachment(eadl_db, doc_id, phase, task, attachment_id):
+    """
+    Returns the ADL document and the attachment of its task, raising Http404 if either does not exist.
+    """
+    try:
+        doc = eadl_db[doc_id]
+    except Exception:
+        raise Http404
+    for attachment in get_task_attachments(doc, phase, task):
+        if attachment['id'] == attachment_id:
+            return doc, attachment
+    raise Http404
+
+
+def get_issue_attachment(grm_db, doc_id, attachment_id):
+    """
+    Returns the issue document and its attachment, raising Http404 if either does not exist.
+    """
+    try:
+        doc = grm_db[doc_id]
+    except Exception:
+        raise Http404
+    attachments = doc['attachments'] if 'attachments' in doc else list()
+    for attachment in attachments:
+        if attachment['id'] == attachment_id:
+            return doc, attachment
+    raise Http404
+
+
+def save_task_attachment(doc, attachment, name, response):
+    attachment['url'] = f'/attachments/{response["id"]}/{name}'
+    attachment['uploaded'] = True
+    doc.save()
+
+
+def save_issue_attachment(doc, attachment, name, response):
+    attachment['url'] = f'/grm_attachments/{response["id"]}/{name}'
+    attachment['uploaded'] = True
+    attachment['bd_id'] = response["id"]
+    doc.save()
 
 
 class UploadTaskAttachmentAPIView(generics.GenericAPIView):
     serializer_class = TaskFileSerializer
     parser_classes = (parsers.FormParser, parsers.MultiPartParser)
 
-    @staticmethod
-    def get_task_attachments(doc, phase, task):
-        attachments = list()
-        try:
-            attachments = doc['phases'][phase - 1]['tasks'][task - 1]['attachments']
-        except Exception:
-            pass
-        return attachments
-
     @swagger_auto_schema(
         responses={201: AttachmentUpdateStatusSerializer()},
         operation_description="Allowed file size less than or equal to 2 MB"
@@ -66,20 +175,11 @@ class UploadTaskAttachmentAPIView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        eadl_db = get_db()
-        try:
-            doc = eadl_db[data['doc_id']]
-        except Exception:
-            raise Http404
-        attachments = self.get_task_attachments(doc, data['phase'], data['task'])
-        for attachment in attachments:
-            if attachment['id'] == data['attachment_id']:
-                response = upload_file(data['file'])
-                attachment['url'] = f'/attachments/{response["id"]}/{data["file"].name}'
-                attachment['uploaded'] = True
-                doc.save()
-                return Response(response, status=201)
-        raise Http404
+        doc, attachment = get_task_attachment(
+            get_db(), data['doc_id'], data['phase'], data['task'], data['attachment_id'])
+        response = upload_file(data['file'])
+        save_task_attachment(doc, attachment, data['file'].name, response)
+        return Response(response, status=201)
 
 
 class UploadIssueAttachmentAPIView(generics.GenericAPIView):
@@ -94,18 +194,109 @@ class UploadIssueAttachmentAPIView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        grm_db = get_db(COUCHDB_GRM_DATABASE)
+        doc, attachment = get_issue_attachment(get_db(COUCHDB_GRM_DATABASE), data['doc_id'], data['attachment_id'])
+        response = upload_file(data['file'], COUCHDB_GRM_ATTACHMENT_DATABASE)
+        save_issue_attachment(doc, attachment, data['file'].name, response)
+        return Response(response, status=201)
+
+
+def get_upload_target(db, doc_id, attachment_id, phase=None, task=None):
+    """
+    Returns the document and the attachment an upload to the database db ('grm' or '') is saved for, raising
+    Http404 if either does not exist.
+    """
+    if db == 'grm':
+        return get_issue_attachment(get_db(COUCHDB_GRM_DATABASE), doc_id, attachment_id)
+    return get_task_attachment(get_db(), doc_id, phase, task, attachment_id)
+
+
+def link_upload(db, target, name, response):
+    doc, attachment = get_upload_target(db, **target)
+    if db == 'grm':
+        save_issue_attachment(doc, attachment, name, response)
+    else:
+        save_task_attachment(doc, attachment, name, response)
+
+
+def get_upload_status(upload, offset):
+    return {
+        'upload_id': upload.upload_id,
+        'offset': offset,
+        'size': upload.size,
+        'chunk_size': ATTACHMENT_UPLOAD_CHUNK_SIZE,
+    }
+
+
+class UploadInitAPIView(generics.GenericAPIView):
+    serializer_class = UploadInitSerializer
+
+    @swagger_auto_schema(
+        responses={201: UploadStatusSerializer()},
+        operation_description="Starts a resumable upload of the file of an attachment of an issue (db=grm) or of "
+                              "an ADL task. The file is then sent in chunks of about chunk_size bytes and the upload "
+                              "committed once all the chunks are sent."
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        target = {field: data[field] for field in ('doc_id', 'attachment_id', 'phase', 'task') if field in data}
+        # Checked before the file is sent, and again when the upload is committed
+        get_upload_target(data['db'], **target)
+        upload = ChunkedUpload.create(
+            data['name'], data['content_type'], data['size'], data['checksum'], data['db'], target)
+        return Response(get_upload_status(upload, 0), status=201)
+
+
+class UploadChunkAPIView(generics.GenericAPIView):
+    serializer_class = UploadChunkSerializer
+    parser_classes = (parsers.FormParser, parsers.MultiPartParser)
+
+    @swagger_auto_schema(
+        responses={200: UploadStatusSerializer(), 409: UploadStatusSerializer()},
+        operation_description="Appends a chunk to the upload. offset must be the number of bytes already received, "
+                              "otherwise the chunk is ignored and the response is a 409 with the offset where the "
+                              "upload must resume."
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
         try:
-            doc = grm_db[data['doc_id']]
-        except Exception:
+            upload = ChunkedUpload.get(kwargs['upload_id'])
+            offset = upload.append(data['offset'], data['chunk'].chunks(ATTACHMENT_UPLOAD_CHUNK_SIZE))
+        except UploadNotFound:
             raise Http404
-        attachments = doc['attachments'] if 'attachments' in doc else list()
-        for attachment in attachments:
-            if attachment['id'] == data['attachment_id']:
-                response = upload_file(data['file'], COUCHDB_GRM_ATTACHMENT_DATABASE)
-                attachment['url'] = f'/grm_attachments/{response["id"]}/{data["file"].name}'
-                attachment['uploaded'] = True
-                attachment['bd_id'] = response["id"]
-                doc.save()
-                return Response(response, status=201)
-        raise Http404
+        except OffsetMismatch as e:
+            return Response(get_upload_status(upload, e.offset), status=409)
+        except ValueError:
+            raise serializers.ValidationError({'chunk': [_('The chunks exceed the size of the file.')]})
+        return Response(get_upload_status(upload, offset))
+
+
+class UploadCommitAPIView(generics.GenericAPIView):
+    serializer_class = AuthMixinSerializer
+
+    @swagger_auto_schema(
+        responses={201: AttachmentUpdateStatusSerializer()},
+        operation_description="Saves the uploaded file as the attachment of a new document once all the chunks are "
+                              "received and the checksum verified, and sets the url of the attachment of the issue "
+                              "or ADL task the upload was started for."
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = ChunkedUpload.get(kwargs['upload_id'])
+            db = COUCHDB_GRM_ATTACHMENT_DATABASE if upload.db == 'grm' else COUCHDB_ATTACHMENT_DATABASE
+            response = upload.commit(get_db(db), partial(link_upload, upload.db))
+        except UploadNotFound:
+            raise Http404
+        except UploadIncomplete:
+            msg = _('All the chunks of the file were not received.')
+            raise serializers.ValidationError({'non_field_errors': [msg]})
+        except ChecksumMismatch:
+            # The file is corrupted, it must be sent again from the start
+            upload.delete()
+            raise serializers.ValidationError({'checksum': [_('The checksum of the uploaded file does not match.')]})
+        return Response(response, status=201)
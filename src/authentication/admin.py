@@ -5,7 +5,7 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.forms import UserChangeForm
 from django.forms.fields import EmailField
 
-from authentication.models import GovernmentWorker, User, Pdata, Cdata
+from authentication.models import GovernmentWorker, User, Pdata, Cdata, SmsMessage
 
 
 class UserWithEmptyPasswordCreationForm(forms.ModelForm):
@@ -76,6 +76,26 @@ class GovernmentWorkerAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('user')
 
 
+class SmsMessageAdmin(admin.ModelAdmin):
+    list_filter = [
+        'status',
+    ]
+
+    search_fields = [
+        'dedupe_key',
+        'to',
+    ]
+
+    list_display = [
+        'dedupe_key',
+        'to',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'sent_at',
+    ]
+
+
 class LogEntryAdmin(admin.ModelAdmin):
     list_filter = [
         'content_type',
@@ -104,4 +124,5 @@ admin.site.register(User, UserAdmin)
 admin.site.register(GovernmentWorker, GovernmentWorkerAdmin)
 admin.site.register(Pdata)
 admin.site.register(Cdata)
+admin.site.register(SmsMessage, SmsMessageAdmin)
 admin.site.register(LogEntry, LogEntryAdmin)
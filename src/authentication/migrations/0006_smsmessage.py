@@ -0,0 +1,45 @@
+# Generated by Django 3.2 on 2026-10-18 07:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0005_cdata_pdata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SmsMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dedupe_key', models.CharField(max_length=255, unique=True)),
+                ('to', models.CharField(max_length=45, verbose_name='phone number')),
+                ('body', models.TextField(verbose_name='message')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('sending', 'sending'), ('sent', 'sent'), ('failed', 'failed')], default='pending', max_length=10, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt at')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='sent at')),
+            ],
+            options={
+                'verbose_name': 'SMS message',
+                'verbose_name_plural': 'SMS messages',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='cdata',
+            options={'verbose_name_plural': 'Cdata'},
+        ),
+        migrations.AlterModelOptions(
+            name='pdata',
+            options={'verbose_name_plural': 'Pdata'},
+        ),
+        migrations.AddIndex(
+            model_name='smsmessage',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='authenticat_status_57e4f2_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_smsmessage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='governmentworker',
+            index=models.Index(fields=['department', 'administrative_id'], name='governmentworker_dept_region'),
+        ),
+    ]
@@ -1,15 +1,29 @@
 import os
+import threading
+import time
+import uuid as uuid_lib
 
 import cryptocode
 import shortuuid as uuid
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from requests import HTTPError
 
-from grm.utils import (
-    belongs_to_region, get_parent_administrative_level, get_related_region_with_specific_level,
-    sort_dictionary_list_by_field
-)
+from client import get_db, get_local_document, save_local_document
+from grm.administrative_tree import get_administrative_tree
+from grm.taxonomy import get_taxonomy
+from grm.utils import belongs_to_region, get_related_region_with_specific_level, sort_dictionary_list_by_field
+
+GOVERNMENT_WORKER_DIRECTORY_TIMEOUT = getattr(settings, 'GOVERNMENT_WORKER_DIRECTORY_TIMEOUT', 300)
+GOVERNMENT_WORKER_DIRECTORY_REFRESH_INTERVAL = getattr(settings, 'GOVERNMENT_WORKER_DIRECTORY_REFRESH_INTERVAL', 10)
+GOVERNMENT_WORKER_DIRECTORY_VERSION = '_local/government-worker-directory-version'
+# Fields of the users shown by the directory, the other updates (last_login on each login...) are ignored
+GOVERNMENT_WORKER_DIRECTORY_USER_FIELDS = {'first_name', 'last_name'}
 
 
 def photo_path(instance, filename):
@@ -60,6 +74,44 @@ class Cdata(AbstractKeyData):
         return f'{self.key}: {self.data}'
 
 
+class SmsMessage(models.Model):
+    """
+    SMS of the outbox, sent by sms_client.SmsSender. The dedupe_key identifies the notification the message is
+    for, so that queuing the same notification again does not send a second message.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('pending')),
+        (STATUS_SENDING, _('sending')),
+        (STATUS_SENT, _('sent')),
+        (STATUS_FAILED, _('failed')),
+    )
+
+    dedupe_key = models.CharField(max_length=255, unique=True)
+    to = models.CharField(max_length=45, verbose_name=_('phone number'))
+    body = models.TextField(verbose_name=_('message'))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING,
+                              verbose_name=_('status'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('attempts'))
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name=_('next attempt at'))
+    last_error = models.TextField(blank=True, verbose_name=_('last error'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('created at'))
+    sent_at = models.DateTimeField(blank=True, null=True, verbose_name=_('sent at'))
+
+    class Meta:
+        verbose_name = _('SMS message')
+        verbose_name_plural = _('SMS messages')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.dedupe_key}: {self.status}'
+
+
 class GovernmentWorker(models.Model):
     user = models.OneToOneField('User', models.PROTECT)
     department = models.PositiveSmallIntegerField(db_index=True, verbose_name=_('department'))
@@ -69,6 +121,9 @@ class GovernmentWorker(models.Model):
     class Meta:
         verbose_name = _('Government Worker')
         verbose_name_plural = _('Government Workers')
+        indexes = [
+            models.Index(fields=['department', 'administrative_id'], name='governmentworker_dept_region'),
+        ]
 
     @property
     def name(self):
@@ -87,20 +142,127 @@ class GovernmentWorker(models.Model):
             return False
 
 
+class GovernmentWorkerDirectory:
+    """
+    Process-local index of the government workers by user id and by (department, administrative_id), loaded with a
+    single query. The workers of a region are in the order of their primary key, like GovernmentWorker.objects.first().
+    The index is reloaded after GOVERNMENT_WORKER_DIRECTORY_TIMEOUT seconds, or when the version stored in a local
+    document of the GRM database has changed. The version is replaced by invalidate(), called once the transaction
+    saving or deleting a worker, or the name of a user, is committed, and the other processes read it every
+    GOVERNMENT_WORKER_DIRECTORY_REFRESH_INTERVAL seconds.
+    """
+
+    def __init__(self, timeout=GOVERNMENT_WORKER_DIRECTORY_TIMEOUT,
+                 refresh_interval=GOVERNMENT_WORKER_DIRECTORY_REFRESH_INTERVAL):
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+        self.by_user = {}
+        self.by_region = {}
+        self.version = None
+        self.loaded_at = None
+        self.refreshed_at = None
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_db():
+        return get_db(settings.COUCHDB_GRM_DATABASE)
+
+    def _ensure_loaded(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.refreshed_at is None or now - self.refreshed_at >= self.refresh_interval:
+                doc = get_local_document(self._get_db(), GOVERNMENT_WORKER_DIRECTORY_VERSION)
+                version = doc['version'] if doc else None
+                if version != self.version:
+                    self.version = version
+                    self.loaded_at = None
+                self.refreshed_at = now
+            if self.loaded_at is not None and now - self.loaded_at < self.timeout:
+                return
+            by_user, by_region = {}, {}
+            for worker in GovernmentWorker.objects.select_related('user').order_by('pk'):
+                entry = {
+                    "id": worker.user.id,
+                    "name": worker.name,
+                    "department": worker.department,
+                    "administrative_id": worker.administrative_id,
+                }
+                by_user[entry['id']] = entry
+                by_region.setdefault((worker.department, worker.administrative_id), []).append(entry)
+            self.by_user, self.by_region = by_user, by_region
+            self.loaded_at = now
+            self.loads += 1
+
+    def invalidate(self):
+        """
+        Replaces the shared version, so that the index is reloaded by the next lookup of this process, and of the
+        other processes once they read the version.
+        """
+        db = self._get_db()
+        doc_id = GOVERNMENT_WORKER_DIRECTORY_VERSION
+        doc = get_local_document(db, doc_id) or {"_id": doc_id}
+        doc['version'] = uuid_lib.uuid4().hex
+        try:
+            save_local_document(db, doc)
+        except HTTPError as e:
+            # The version was replaced by another process in the meantime
+            if e.response is None or e.response.status_code != 409:
+                raise
+        with self._lock:
+            self.loaded_at = None
+            self.refreshed_at = None
+
+    def get_worker(self, user_id):
+        """
+        Returns {"id", "name", "department", "administrative_id"} of the worker of the user, or None.
+        """
+        self._ensure_loaded()
+        return self.by_user.get(user_id)
+
+    def get_workers(self, department, administrative_id):
+        """
+        Returns the workers of the department in the region, department being converted to an int like in a query.
+        """
+        self._ensure_loaded()
+        try:
+            department = int(department)
+        except (TypeError, ValueError):
+            return []
+        return self.by_region.get((department, administrative_id), [])
+
+    def get_all(self):
+        self._ensure_loaded()
+        return list(self.by_user.values())
+
+
+government_worker_directory = GovernmentWorkerDirectory()
+
+
+@receiver(post_save, sender=GovernmentWorker)
+@receiver(post_delete, sender=GovernmentWorker)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_government_worker_directory(sender, update_fields=None, **kwargs):
+    if sender is User and update_fields is not None and not GOVERNMENT_WORKER_DIRECTORY_USER_FIELDS & update_fields:
+        return
+    transaction.on_commit(government_worker_directory.invalidate)
+
+
 def get_government_worker_choices(empty_choice=True):
-    query = GovernmentWorker.objects.select_related('user')
-    choices = [(i.user.id, f'{i.user.first_name} {i.user.last_name}') for i in query]
+    choices = [(worker['id'], worker['name']) for worker in government_worker_directory.get_all()]
     if empty_choice:
         choices = [('', '')] + choices
     return choices
 
 
-def get_assignee(grm_db, eadl_db, issue_doc, errors=None):
+def get_assignee(grm_db, eadl_db, issue_doc, errors=None, pending_assignments=None):
+    """
+    pending_assignments maps the ids of the workers to the number of issues assigned to them that are not saved
+    yet, so that they are taken into account when the issues are saved in batches.
+    """
     try:
-        doc_category = grm_db.get_query_result({
-            "id": issue_doc['category']['id'],
-            "type": 'issue_category'
-        })[0][0]
+        doc_category = get_taxonomy(grm_db, 'issue_category')[issue_doc['category']['id']]
     except Exception:
         if errors:
             error = 'Error trying to get issue_category document in get_assignee function'
@@ -118,8 +280,8 @@ def get_assignee(grm_db, eadl_db, issue_doc, errors=None):
 
         if not assigned_department_level:
             try:
-                reporter = GovernmentWorker.objects.get(user=issue_doc['reporter']['id'])
-                administrative_id = reporter.administrative_id
+                reporter = government_worker_directory.get_worker(issue_doc['reporter']['id'])
+                administrative_id = reporter['administrative_id']
             except Exception:
                 pass
 
@@ -138,9 +300,8 @@ def get_assignee(grm_db, eadl_db, issue_doc, errors=None):
             related_region = get_related_region_with_specific_level(eadl_db, doc_administrative_level, level)
             administrative_id = related_region['administrative_id']
 
-        related_workers = set(
-            GovernmentWorker.objects.filter(
-                department=department_id, administrative_id=administrative_id).values_list('user', flat=True))
+        region_workers = government_worker_directory.get_workers(department_id, administrative_id)
+        related_workers = {worker['id'] for worker in region_workers}
 
         startkey = [department_id, None, None]
         endkey = [department_id, {}, {}]
@@ -149,14 +310,17 @@ def get_assignee(grm_db, eadl_db, issue_doc, errors=None):
         assignments_result = [doc for doc in assignments_result]
 
         department_workers_with_assignment = {worker['key'][1] for worker in assignments_result}
+        if pending_assignments:
+            department_workers_with_assignment.update(pending_assignments)
+            for assignment in assignments_result:
+                assignment['value'] += pending_assignments.get(assignment['key'][1], 0)
         department_workers_without_assignment = related_workers - department_workers_with_assignment
 
         if department_workers_without_assignment:
             worker_id = list(department_workers_without_assignment)[0]
-            worker_without_assignment = GovernmentWorker.objects.get(user=worker_id)
             assignee = {
                 "id": worker_id,
-                "name": worker_without_assignment.name
+                "name": government_worker_directory.get_worker(worker_id)['name']
             }
         else:
             assignee = ""
@@ -171,18 +335,14 @@ def get_assignee(grm_db, eadl_db, issue_doc, errors=None):
                         }
                         break
             elif related_workers:
-                worker = GovernmentWorker.objects.filter(
-                    department=department_id, administrative_id=administrative_id).first()
+                worker = region_workers[0]
                 assignee = {
-                    "id": worker.user.id,
-                    "name": worker.name
+                    "id": worker['id'],
+                    "name": worker['name']
                 }
     else:
         try:
-            doc_department = grm_db.get_query_result({
-                "id": department_id,
-                "type": 'issue_department'
-            })[0][0]
+            doc_department = get_taxonomy(grm_db, 'issue_department')[department_id]
         except Exception:
             if errors:
                 error = 'Error trying to get issue_department document in get_assignee function'
@@ -207,21 +367,28 @@ def get_assignee(grm_db, eadl_db, issue_doc, errors=None):
 
 
 def get_assignee_to_escalate(eadl_db, department_id, administrative_id):
-    try:
-        parent = get_parent_administrative_level(eadl_db, administrative_id)
-    except Exception:
-        raise
+    """
+    Returns the first worker of the department found in the ancestors of the region, from its parent to the root,
+    or None.
+    """
+    for parent in get_administrative_tree(eadl_db).get_ancestors(administrative_id):
+        workers = government_worker_directory.get_workers(department_id, parent['administrative_id'])
+        if workers:
+            return {
+                "id": workers[0]['id'],
+                "name": workers[0]['name']
+            }
 
-    administrative_id = parent['administrative_id']
-    worker = GovernmentWorker.objects.filter(department=department_id, administrative_id=administrative_id).first()
-    if worker:
-        assignee = {
-            "id": worker.user.id,
-            "name": worker.name
-        }
-        return assignee
-    elif parent:
-        return get_assignee_to_escalate(eadl_db, department_id, administrative_id)
+
+def get_issue_contact(issue_doc):
+    """
+    Returns the contact of the issue, decrypting it if the issue data was anonymized.
+    """
+    contact = (issue_doc.get('contact_information') or {}).get('contact')
+    if contact == '*':
+        cdata = Cdata.objects.filter(key=issue_doc['_id']).first()
+        contact = cryptocode.decrypt(cdata.data, issue_doc['_id']) if cdata else None
+    return contact
 
 
 def anonymize_issue_data(issue_doc):
@@ -7,6 +7,7 @@ from rest_framework import serializers
 from authentication import ADL, MAJOR
 from authentication.utils import get_validation_code
 from client import get_db
+from grm.couchdb_indexes import EADL, get_query_options
 
 
 class CredentialSerializer(serializers.Serializer):
@@ -49,7 +50,7 @@ class UserAuthSerializer(serializers.Serializer):
             ]
         }
         eadl_db = get_db()
-        docs = eadl_db.get_query_result(selector)
+        docs = eadl_db.get_query_result(selector, **get_query_options(EADL, selector))
         try:
             doc = eadl_db[docs[0][0]['_id']]
         except Exception:
@@ -103,7 +104,7 @@ class RegisterSerializer(serializers.Serializer):
             ]
         }
         eadl_db = get_db()
-        docs = eadl_db.get_query_result(selector)
+        docs = eadl_db.get_query_result(selector, **get_query_options(EADL, selector))
         try:
             doc = eadl_db[docs[0][0]['_id']]
         except Exception:
@@ -0,0 +1,116 @@
+import pytest
+from django.contrib.auth.models import update_last_login
+
+import authentication.models
+from authentication.models import (
+    GovernmentWorker, GovernmentWorkerDirectory, User, get_assignee_to_escalate, get_government_worker_choices
+)
+from grm.administrative_tree import AdministrativeTree
+
+
+def region(administrative_id, parent_id):
+    return {
+        "_id": f'doc-{administrative_id}',
+        "type": 'administrative_level',
+        "administrative_id": administrative_id,
+        "name": f'Region {administrative_id}',
+        "parent_id": parent_id,
+    }
+
+
+def create_worker(username, department, administrative_id):
+    user = User.objects.create(
+        username=username, email=f'{username}@example.com', first_name=username.title(), last_name='Worker')
+    return GovernmentWorker.objects.create(user=user, department=department, administrative_id=administrative_id)
+
+
+@pytest.mark.django_db
+class TestGovernmentWorkerDirectory:
+
+    @pytest.fixture(autouse=True)
+    def directory(self, monkeypatch):
+        directory = GovernmentWorkerDirectory()
+        monkeypatch.setattr(authentication.models, 'government_worker_directory', directory)
+        return directory
+
+    def test_workers_are_loaded_with_one_query(self, directory, django_assert_num_queries):
+        first = create_worker('alice', 1, '1')
+        bob = create_worker('bob', 1, '2')
+        second = create_worker('carol', 1, '1')
+
+        with django_assert_num_queries(1):
+            assert [worker['id'] for worker in directory.get_workers(1, '1')] == [first.user.id, second.user.id]
+            assert directory.get_workers('1', '2')[0]['name'] == 'Bob Worker'
+            assert directory.get_workers(2, '1') == []
+            assert directory.get_worker(second.user.id)['administrative_id'] == '1'
+            assert get_government_worker_choices()[1:] == [
+                (first.user.id, 'Alice Worker'), (bob.user.id, 'Bob Worker'), (second.user.id, 'Carol Worker')]
+        assert directory.loads == 1
+
+    def test_directory_is_reloaded_when_a_worker_or_a_user_changes(self, directory,
+                                                                   django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            worker = create_worker('alice', 1, '1')
+        assert directory.get_workers(1, '2') == []
+
+        with django_capture_on_commit_callbacks(execute=True):
+            worker.administrative_id = '2'
+            worker.save()
+        assert directory.get_workers(1, '2')[0]['id'] == worker.user.id
+
+        with django_capture_on_commit_callbacks(execute=True):
+            worker.user.first_name = 'Alicia'
+            worker.user.save()
+        assert directory.get_worker(worker.user.id)['name'] == 'Alicia Worker'
+
+        with django_capture_on_commit_callbacks(execute=True):
+            worker.delete()
+        assert directory.get_workers(1, '2') == []
+        assert directory.loads == 4
+
+    def test_logins_do_not_reload_the_directory(self, directory, django_capture_on_commit_callbacks):
+        worker = create_worker('alice', 1, '1')
+        assert directory.get_worker(worker.user.id)['name'] == 'Alice Worker'
+
+        with django_capture_on_commit_callbacks(execute=True):
+            update_last_login(None, worker.user)
+            worker.user.save(update_fields=['email'])
+        assert directory.get_worker(worker.user.id)['name'] == 'Alice Worker'
+        assert directory.loads == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            worker.user.last_name = 'Smith'
+            worker.user.save(update_fields=['last_name'])
+        assert directory.get_worker(worker.user.id)['name'] == 'Alice Smith'
+        assert directory.loads == 2
+
+    def test_other_processes_reload_once_they_read_the_version(self, directory, django_capture_on_commit_callbacks):
+        worker = create_worker('alice', 1, '1')
+        # Directories of other processes, with the index loaded before the change
+        reading = GovernmentWorkerDirectory(refresh_interval=0)
+        waiting = GovernmentWorkerDirectory(refresh_interval=3600)
+        for other in (reading, waiting):
+            assert other.get_worker(worker.user.id)['administrative_id'] == '1'
+
+        with django_capture_on_commit_callbacks(execute=True):
+            worker.administrative_id = '2'
+            worker.save()
+
+        assert reading.get_worker(worker.user.id)['administrative_id'] == '2'
+        assert reading.loads == 2
+        assert waiting.get_worker(worker.user.id)['administrative_id'] == '1'
+        waiting.refreshed_at -= 3600
+        assert waiting.get_worker(worker.user.id)['administrative_id'] == '2'
+        # Without changes the version is read again but the index is not reloaded
+        assert reading.get_worker(worker.user.id)['administrative_id'] == '2'
+        assert reading.loads == 2
+
+    def test_escalation_walks_up_the_ancestors(self, monkeypatch):
+        tree = AdministrativeTree([region('1', None), region('2', '1'), region('3', '2'), region('4', '3')])
+        monkeypatch.setattr(authentication.models, 'get_administrative_tree', lambda eadl_db: tree)
+        worker = create_worker('alice', 1, '2')
+        create_worker('bob', 1, '4')
+
+        assert get_assignee_to_escalate(None, 1, '4') == {"id": worker.user.id, "name": 'Alice Worker'}
+        assert get_assignee_to_escalate(None, 1, '2') is None
+        assert get_assignee_to_escalate(None, 2, '4') is None
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+from django.utils import timezone
+
+from authentication.models import SmsMessage
+from sms_client import FakeTransport, SmsSender, TokenBucket, queue_sms
+
+
+class BarrierTransport(FakeTransport):
+    """
+    Transport whose sends wait for each other by parties, so that the messages fail if they are sent one at a time.
+    """
+
+    def __init__(self, parties):
+        super().__init__()
+        self.barrier = threading.Barrier(parties, timeout=10)
+
+    def wait(self):
+        self.barrier.wait()
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.mark.django_db
+class TestSmsOutbox:
+
+    def test_messages_are_queued_once(self):
+        assert queue_sms('issue-1:accepted_alert_message', '+1000', 'Accepted')
+        assert not queue_sms('issue-1:accepted_alert_message', '+1000', 'Accepted')
+
+        assert SmsMessage.objects.count() == 1
+
+    def test_messages_are_sent_in_order_by_recipient(self):
+        for i in range(20):
+            queue_sms(f'issue-{i}:accepted_alert_message', f'+{i % 4}', f'message {i}')
+        transport = BarrierTransport(4)
+
+        stats = SmsSender(transport, max_concurrency=4, rate=1000).drain()
+
+        assert stats == {'sent': 20, 'failed': 0, 'retried': 0}
+        for recipient in range(4):
+            bodies = [body for to, body in transport.sent if to == f'+{recipient}']
+            assert bodies == [f'message {i}' for i in range(recipient, 20, 4)]
+        # The messages of the 4 recipients are sent concurrently
+        assert transport.max_in_flight == 4
+        assert not SmsMessage.objects.exclude(status=SmsMessage.STATUS_SENT).exists()
+
+    def test_failed_messages_are_retried_with_backoff(self):
+        queue_sms('issue-1:accepted_alert_message', '+1000', 'Accepted')
+        queue_sms('issue-1:closed_alert_message', '+1000', 'Closed')
+        queue_sms('issue-2:accepted_alert_message', '+2000', 'Accepted')
+        sender = SmsSender(FakeTransport(fail_numbers={'+1000'}), rate=1000, max_attempts=2, retry_backoff=60)
+
+        assert sender.drain() == {'sent': 1, 'failed': 0, 'retried': 1}
+        first, second = SmsMessage.objects.filter(to='+1000').order_by('id')
+        assert first.attempts == 1 and first.status == SmsMessage.STATUS_PENDING
+        assert first.next_attempt_at > timezone.now()
+        # The next message of the recipient waits for the retry of the failed one
+        assert second.attempts == 0 and second.next_attempt_at == first.next_attempt_at
+        assert sender.drain() == {'sent': 0, 'failed': 0, 'retried': 0}
+
+        SmsMessage.objects.filter(to='+1000').update(next_attempt_at=timezone.now())
+        assert sender.drain() == {'sent': 0, 'failed': 1, 'retried': 0}
+        assert SmsMessage.objects.get(pk=first.pk).status == SmsMessage.STATUS_FAILED
+
+
+class TestTokenBucket:
+
+    def test_rate_is_limited(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100, capacity=2, clock=clock, sleep=clock.sleep)
+
+        for _ in range(12):
+            bucket.acquire()
+
+        # A burst of capacity acquisitions, then one every 1 / rate seconds
+        assert clock.sleeps == pytest.approx([0.01] * 10)
+        clock.now += 1
+        bucket.acquire()
+        bucket.acquire()
+        assert len(clock.sleeps) == 10
@@ -12,6 +12,7 @@ from authentication.serializers import (
     UserAuthSerializer
 )
 from client import get_db
+from grm.couchdb_indexes import EADL, get_query_options
 
 
 class RegisterAPIView(APIView):
@@ -89,7 +90,7 @@ class ADLActiveAPIView(generics.GenericAPIView):
             "type": {"$in": [ADL, MAJOR]}
         }
         eadl_db = get_db()
-        docs = eadl_db.get_query_result(selector)
+        docs = eadl_db.get_query_result(selector, **get_query_options(EADL, selector))
         try:
             doc = eadl_db[docs[0][0]['_id']]
         except Exception:
@@ -1,22 +1,158 @@
+import json
+import os
+import threading
+import uuid
+from urllib.parse import quote
+
 from cloudant.client import CouchDB
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from grm.couchdb_memory import MemoryAdapter
+from grm.couchdb_trace import trace_response
 
 COUCHDB_DATABASE = settings.COUCHDB_DATABASE
 COUCHDB_ATTACHMENT_DATABASE = settings.COUCHDB_ATTACHMENT_DATABASE
 COUCHDB_USERNAME = settings.COUCHDB_USERNAME
 COUCHDB_PASSWORD = settings.COUCHDB_PASSWORD
 COUCHDB_URL = settings.COUCHDB_URL
+COUCHDB_POOL_MAXSIZE = getattr(settings, 'COUCHDB_POOL_MAXSIZE', 50)
+COUCHDB_BACKEND = getattr(settings, 'COUCHDB_BACKEND', 'http')
+# Limits of the _bulk_docs requests of bulk_write, well below the max_http_request_size of CouchDB
+BULK_WRITE_BATCH_SIZE = 500
+BULK_WRITE_MAX_BYTES = 4 * 1024 * 1024
+BULK_WRITE_MAX_ATTEMPTS = 3
+
+_clients = {}
+_verified_databases = set()
+_clients_lock = threading.Lock()
+connection_stats = {
+    'opened': 0,
+    'reused': 0,
+    'databases_checked': 0,
+}
+
+
+def _client_key(url, username):
+    # Sessions must not be shared between forked worker processes.
+    return os.getpid(), url, username
+
+
+def get_client(url=COUCHDB_URL, username=COUCHDB_USERNAME, password=COUCHDB_PASSWORD):
+    """
+    Returns the process-wide CouchDB client for the given server, logging in only the first time it is requested.
+    The cookie session is renewed transparently (auto_renew) when CouchDB answers 401 or credentials_expired.
+    """
+    key = _client_key(url, username)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            connection_stats['reused'] += 1
+            return client
+        if COUCHDB_BACKEND == 'memory':
+            adapter = MemoryAdapter()
+        else:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=COUCHDB_POOL_MAXSIZE)
+        client = CouchDB(username, password, url=url, connect=True, auto_renew=True, adapter=adapter)
+        # Records the requests in the CouchDBTrace of the request being processed, if any
+        client.r_session.hooks['response'].append(trace_response)
+        _clients[key] = client
+        connection_stats['opened'] += 1
+        return client
 
 
 def get_db(db=COUCHDB_DATABASE):
-    client = CouchDB(COUCHDB_USERNAME, COUCHDB_PASSWORD, url=COUCHDB_URL, connect=True, auto_renew=True)
-    return client[db]
+    """
+    Returns a handle to the database db using the shared client.
+    The existence of the database is only checked the first time it is requested. A new handle is returned on each
+    call because cloudant caches the fetched documents inside the handle, and sharing them would leak stale documents
+    between requests.
+    """
+    client = get_client()
+    database = client._DATABASE_CLASS(client, db)
+    key = _client_key(COUCHDB_URL, COUCHDB_USERNAME) + (db,)
+    if key not in _verified_databases:
+        with _clients_lock:
+            connection_stats['databases_checked'] += 1
+        if not database.exists():
+            raise KeyError(db)
+        with _clients_lock:
+            _verified_databases.add(key)
+    return database
+
+
+def get_connection_stats():
+    """
+    Returns the number of clients opened (and logins) and reused, and of database existence checks, of the process
+    since it started or since reset_clients.
+    """
+    with _clients_lock:
+        return dict(connection_stats)
+
+
+def reset_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+        _clients.clear()
+        _verified_databases.clear()
+        for key in connection_stats:
+            connection_stats[key] = 0
 
 
 def upload_file(file, db=COUCHDB_ATTACHMENT_DATABASE):
-    attachment_db = get_db(db)
-    attachment = attachment_db.create_document({})
-    return attachment.put_attachment(file.name, file.content_type, file)
+    return upload_stream(get_db(db), file.name, file.content_type, file)
+
+
+def upload_stream(db_client, name, content_type, file, size=None):
+    """
+    Creates a document with the file as its only attachment with a single request, reading the file by blocks
+    instead of loading it in memory. Returns the status, id and revision of the new document.
+    """
+    url = f'{db_client.database_url}/{uuid.uuid4().hex}/{quote(name, safe="")}'
+    headers = {'Content-Type': content_type}
+    if size is not None:
+        headers['Content-Length'] = str(size)
+    response = db_client.r_session.put(url, data=file, headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_attachment(db_client, doc_id, name, headers=None):
+    """
+    Requests the attachment of the document with the shared session without reading its content, which must be
+    consumed with iter_content() and the response closed to release the connection.
+    """
+    url = f'{db_client.database_url}/{quote(doc_id, safe="")}/{quote(name, safe="")}'
+    return db_client.r_session.get(url, headers=headers, stream=True)
+
+
+def get_document(db_client, doc_id):
+    """
+    Returns the latest revision of the document, with stubs for its attachments, or None if it does not exist.
+    Unlike db_client[doc_id], the document is not cached in the database handle.
+    """
+    response = db_client.r_session.get(f'{db_client.database_url}/{quote(doc_id, safe="")}')
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+def put_attachment(db_client, doc_id, rev, name, content_type, data):
+    """
+    Adds the attachment to the revision rev of the document. Returns the new revision, or None if rev is not the
+    latest revision of the document anymore.
+    """
+    url = f'{db_client.database_url}/{quote(doc_id, safe="")}/{quote(name, safe="")}'
+    response = db_client.r_session.put(url, params={'rev': rev}, data=data, headers={'Content-Type': content_type})
+    if response.status_code == 409:
+        return None
+    response.raise_for_status()
+    return response.json()['rev']
 
 
 def bulk_delete(db_client, documents):
@@ -24,8 +160,189 @@ def bulk_delete(db_client, documents):
     for d in documents:
         d['_deleted'] = True
         docs_to_delete.append(d)
-    return db_client.bulk_docs(docs_to_delete)
+    return bulk_write(db_client, docs_to_delete)
 
 
 def bulk_update(db_client, edited_documents):
-    return db_client.bulk_docs(edited_documents)
+    return bulk_write(db_client, edited_documents)
+
+
+def _post_bulk_docs(db_client, encoded_docs):
+    body = '{"docs":[' + ','.join(encoded_docs) + ']}'
+    response = db_client.r_session.post(
+        f'{db_client.database_url}/_bulk_docs', data=body.encode(), headers={'Content-Type': 'application/json'}
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def _split_batches(encoded_docs, batch_size, max_bytes):
+    batch, batch_bytes = [], 0
+    for index, encoded_doc in encoded_docs:
+        if batch and (len(batch) == batch_size or batch_bytes + len(encoded_doc) > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append((index, encoded_doc))
+        batch_bytes += len(encoded_doc) + 1
+    if batch:
+        yield batch
+
+
+def bulk_write(db_client, docs, merge=None, batch_size=BULK_WRITE_BATCH_SIZE, max_bytes=BULK_WRITE_MAX_BYTES,
+               max_attempts=BULK_WRITE_MAX_ATTEMPTS):
+    """
+    Saves the documents with _bulk_docs requests of at most batch_size documents and max_bytes bytes (a larger
+    document is sent alone). The _id and _rev of the saved documents are updated.
+
+    The documents rejected with a conflict are retried up to max_attempts times in total if merge is given:
+    merge(latest_doc, doc) is called with the latest revision of the document, read with _bulk_get, and returns the
+    document to save instead, or None if the latest revision must be kept as is.
+
+    Returns the outcome of each document in the order of docs, as returned by _bulk_docs ({'ok', 'id', 'rev'} or
+    {'id', 'error', 'reason'}, 'conflict' being the error of the conflicts left), or {'id', 'rev', 'skipped': True}
+    for the documents whose latest revision merge decided to keep.
+    """
+    docs = list(docs)
+    outcomes = [None] * len(docs)
+    pending = list(range(len(docs)))
+    for attempt in range(max_attempts):
+        conflicts = []
+        encoded_docs = [(index, json.dumps(docs[index])) for index in pending]
+        for batch in _split_batches(encoded_docs, batch_size, max_bytes):
+            results = _post_bulk_docs(db_client, [encoded_doc for _, encoded_doc in batch])
+            for (index, _), outcome in zip(batch, results):
+                outcomes[index] = outcome
+                if 'error' not in outcome:
+                    docs[index]['_id'] = outcome['id']
+                    docs[index]['_rev'] = outcome['rev']
+                elif outcome['error'] == 'conflict':
+                    conflicts.append(index)
+
+        if not conflicts or merge is None or attempt == max_attempts - 1:
+            break
+        latest_docs = {doc['_id']: doc for doc in bulk_get(db_client, [docs[index]['_id'] for index in conflicts])}
+        pending = []
+        for index in conflicts:
+            latest_doc = latest_docs.get(docs[index]['_id'])
+            if latest_doc is None:
+                # Deleted in the meantime
+                continue
+            merged_doc = merge(latest_doc, docs[index])
+            if merged_doc is None:
+                outcomes[index] = {'id': latest_doc['_id'], 'rev': latest_doc['_rev'], 'skipped': True}
+                continue
+            merged_doc['_rev'] = latest_doc['_rev']
+            docs[index] = merged_doc
+            pending.append(index)
+        if not pending:
+            break
+    return outcomes
+
+
+def bulk_get(db_client, doc_ids):
+    """
+    Returns the latest revision of the existing documents with the given ids with a single _bulk_get request.
+    """
+    if not doc_ids:
+        return []
+    body = {'docs': [{'id': doc_id} for doc_id in doc_ids]}
+    response = db_client.r_session.post(f'{db_client.database_url}/_bulk_get', json=body)
+    response.raise_for_status()
+    docs = []
+    for result in response.json()['results']:
+        for doc in result['docs']:
+            if 'ok' in doc and not doc['ok'].get('_deleted'):
+                docs.append(doc['ok'])
+    return docs
+
+
+def get_changes(db_client, since='0', selector=None, include_docs=True, limit=None):
+    """
+    Returns the changes of the database after the sequence since and the last sequence processed by CouchDB.
+    If a selector is given, only the changes of the documents matching it are returned (_selector filter).
+    """
+    params = {
+        'since': since,
+        'include_docs': json.dumps(include_docs),
+    }
+    body = {}
+    if selector is not None:
+        params['filter'] = '_selector'
+        body['selector'] = selector
+    if limit:
+        params['limit'] = limit
+    response = db_client.r_session.post(f'{db_client.database_url}/_changes', params=params, json=body)
+    response.raise_for_status()
+    data = response.json()
+    return data['results'], data['last_seq']
+
+
+def get_local_document(db_client, doc_id):
+    """
+    Returns the local (non-replicated) document "_local/..." of the database, or None if it does not exist.
+    """
+    response = db_client.r_session.get(f'{db_client.database_url}/{doc_id}')
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+def save_local_document(db_client, doc):
+    response = db_client.r_session.put(f'{db_client.database_url}/{doc["_id"]}', json=doc)
+    response.raise_for_status()
+    doc['_rev'] = response.json()['rev']
+    return doc
+
+
+def get_local_documents(db_client, prefix):
+    """
+    Returns the local documents of the database whose id starts with "_local/" followed by the prefix.
+    """
+    params = {
+        'include_docs': 'true',
+        'startkey': json.dumps(f'_local/{prefix}'),
+        'endkey': json.dumps(f'_local/{prefix}\ufff0'),
+    }
+    response = db_client.r_session.get(f'{db_client.database_url}/_local_docs', params=params)
+    response.raise_for_status()
+    return [row['doc'] for row in response.json()['rows'] if row.get('doc')]
+
+
+def delete_local_document(db_client, doc):
+    response = db_client.r_session.delete(f'{db_client.database_url}/{doc["_id"]}', params={'rev': doc['_rev']})
+    if response.status_code != 404:
+        response.raise_for_status()
+
+
+def get_query_indexes(db_client):
+    response = db_client.r_session.get(f'{db_client.database_url}/_index')
+    response.raise_for_status()
+    return response.json()['indexes']
+
+
+def create_query_index(db_client, design_document, name, fields):
+    index = {
+        'ddoc': design_document,
+        'name': name,
+        'type': 'json',
+        'index': {'fields': fields},
+    }
+    response = db_client.r_session.post(f'{db_client.database_url}/_index', json=index)
+    response.raise_for_status()
+    return response.json()
+
+
+def delete_query_index(db_client, design_document, name):
+    response = db_client.r_session.delete(f'{db_client.database_url}/_index/{design_document}/json/{name}')
+    response.raise_for_status()
+    return response.json()
+
+
+def explain_query(db_client, selector, **options):
+    """
+    Returns the plan of the Mango query, including the index CouchDB would use to answer it.
+    """
+    response = db_client.r_session.post(f'{db_client.database_url}/_explain', json={'selector': selector, **options})
+    response.raise_for_status()
+    return response.json()
@@ -4,6 +4,7 @@ from django.utils.translation import gettext_lazy as _
 from authentication import ADL, MAJOR
 from client import get_db
 from dashboard.forms.forms import FileForm
+from grm.couchdb_indexes import EADL, get_query_options
 
 
 class PasswordConfirmForm(forms.Form):
@@ -44,7 +45,7 @@ class AdlProfileForm(FileForm):
         }
         eadl_db = get_db()
 
-        docs = eadl_db.get_query_result(selector)
+        docs = eadl_db.get_query_result(selector, **get_query_options(EADL, selector))
         doc = docs[0][0] if docs[0] else None
         if doc and doc['_id'] != self.doc_id:
             self.add_error('email', _("This email is already registered."))
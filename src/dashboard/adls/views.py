@@ -123,7 +123,7 @@ class EditAdlProfileFormView(ADLMixin, AJAXRequestMixin, ModalFormMixin, LoginRe
     def get_context_data(self, **kwargs):
         picture = self.doc["representative"]["photo"] if "photo" in self.doc["representative"] else ""
         if picture:
-            self.picture = picture
+            self.picture = f'{picture}?size=256'
         context = super().get_context_data(**kwargs)
         return context
 
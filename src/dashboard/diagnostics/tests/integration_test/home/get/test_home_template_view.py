@@ -8,6 +8,14 @@ class TestHomeTemplateView(DashboardTestCase):
     def setUp(self):
         super().setUp()
         self.url = reverse('dashboard:diagnostics:home')
+        for administrative_id, level, parent_id in (('1', 'region', None), ('2', 'prefecture', '1')):
+            self.eadl_db.create_document({
+                "type": 'administrative_level',
+                "administrative_id": administrative_id,
+                "administrative_level": level,
+                "name": level.title(),
+                "parent_id": parent_id,
+            })
 
     def test_auth_permission(self):
         response = self.get(self.url, authorized=False)
@@ -15,8 +23,13 @@ class TestHomeTemplateView(DashboardTestCase):
         assert response.status_code == 302
 
     def test_context_data(self):
-        with self.assertNumQueries(18):
-            response = self.get(self.url)
+        self.authenticate(None)
+        # The session, the user and the government workers of the assignee choices
+        with self.assertNumQueries(3):
+            response = self.get(self.url, authorized=False)
+        # The government workers are then served by the directory of the process
+        with self.assertNumQueries(2):
+            self.get(self.url, authorized=False)
         context_data = response.context_data
 
         assert response.status_code == 200
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -8,7 +8,9 @@ from django.views import generic
 from client import get_db
 from dashboard.grm.forms import SearchIssueForm
 from dashboard.mixins import AJAXRequestMixin, JSONResponseMixin, PageMixin
-from grm.utils import get_administrative_level_descendants, get_base_administrative_id
+from grm.administrative_tree import get_administrative_tree
+from grm.issue_statistics import aggregate_issue_statistics, get_issue_statistics_rows
+from grm.utils import get_issue_category_choices, get_issue_status_choices, get_issue_type_choices
 
 COUCHDB_GRM_DATABASE = settings.COUCHDB_GRM_DATABASE
 
@@ -42,96 +44,25 @@ class IssuesStatisticsView(AJAXRequestMixin, LoginRequiredMixin, JSONResponseMix
         issue_type = self.request.GET.get('type')
         region = self.request.GET.get('region')
 
-        selector = {
-            "type": "issue",
-            "confirmed": True,
-            "auto_increment_id": {"$ne": ""},
-        }
-
-        date_range = {}
         if start_date:
-            start_date = datetime.strptime(start_date, '%d/%m/%Y').strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-            date_range["$gte"] = start_date
-            selector["intake_date"] = date_range
+            start_date = datetime.strptime(start_date, '%d/%m/%Y').strftime('%Y-%m-%d')
         if end_date:
-            end_date = (datetime.strptime(end_date, '%d/%m/%Y') + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-            date_range["$lte"] = end_date
-            selector["intake_date"] = date_range
-        if category:
-            selector["category.id"] = int(category)
-        if issue_type:
-            selector["issue_type.id"] = int(issue_type)
-
-        if region:
-            filter_regions = get_administrative_level_descendants(eadl_db, region, []) + [region]
-            selector["administrative_region.administrative_id"] = {
-                "$in": filter_regions
-            }
-
-        issues = grm_db.get_query_result(selector)
-        issues = [doc for doc in issues]
-
-        total_issues = len(issues)
-        region_stats = {}
-        status_stats = {}
-        type_stats = {}
-        category_stats = {}
-
-        def fill_count(key, stats: dict, name=None):
-            if key in stats:
-                stats[key]['count'] = stats[key]['count'] + 1
-            else:
-                stats[key] = {
-                    'count': 1
-                }
-            if name:
-                stats[key]['name'] = name
-
-        def process_stats(stats: dict):
-            for k in stats:
-                stats[k]['percentage'] = round(stats[k]['count'] * 100 / total_issues)
-                stats[k]['issues'] = stats[k]['count']
-
-        for doc in issues:
-            region_key = get_base_administrative_id(eadl_db, doc['administrative_region']['administrative_id'], region)
-            fill_count(region_key, region_stats)
-
-            status_key = doc['status']['id']
-            fill_count(status_key, status_stats, doc['status']['name'])
-
-            type_key = doc['issue_type']['id']
-            fill_count(type_key, type_stats, doc['issue_type']['name'])
-
-            category_key = doc['category']['id']
-            fill_count(category_key, category_stats, doc['category']['name'])
-
-        process_stats(region_stats)
-        process_stats(status_stats)
-        process_stats(type_stats)
-        process_stats(category_stats)
-
-        regions = [k for k in region_stats]
-        selector = {
-            "type": "administrative_level",
-            "administrative_id": {
-                "$in": regions
-            }
-        }
-        administrative_level_docs = eadl_db.get_query_result(selector)
-        without_administrative_level_docs = True
-        for doc in administrative_level_docs:
-            without_administrative_level_docs = False
-            data = region_stats[doc['administrative_id']]
-            data['name'] = doc['name']
-            data['latitude'] = doc['latitude']
-            data['longitude'] = doc['longitude']
-            data['level'] = doc['administrative_level'].capitalize()
-        if without_administrative_level_docs:
-            region_stats = {}
-        statistics = {
-            'region_stats': region_stats,
-            'status_stats': status_stats,
-            'type_stats': type_stats,
-            'category_stats': category_stats,
+            end_date = datetime.strptime(end_date, '%d/%m/%Y').strftime('%Y-%m-%d')
+        tree = get_administrative_tree(eadl_db)
+        # The issues of the whole country are counted in the children of the root
+        regions = [region] if region else tree.get_roots()
+        rows = get_issue_statistics_rows(grm_db, regions, start_date, end_date)
+
+        names = {
+            'status': dict(get_issue_status_choices(grm_db, empty_choice=False)),
+            'type': dict(get_issue_type_choices(grm_db, empty_choice=False)),
+            'category': dict(get_issue_category_choices(grm_db, empty_choice=False)),
         }
+        statistics = aggregate_issue_statistics(
+            rows,
+            tree,
+            category=int(category) if category else None,
+            issue_type=int(issue_type) if issue_type else None,
+            names=names,
+        )
         return self.render_to_json_response(statistics)
@@ -0,0 +1,100 @@
+from django.urls import reverse
+
+from authentication.models import GovernmentWorker
+from grm.tests import DashboardTestCase
+from grm.utils import encode_cursor
+
+
+def issue(number, day, **kwargs):
+    date = f'2024-01-{day:02d}T10:00:00.000000Z'
+    return {
+        "_id": f'issue-{number}',
+        "type": 'issue',
+        "confirmed": True,
+        "auto_increment_id": number,
+        "internal_code": f'CODE-{number}',
+        "tracking_code": f'T{number}',
+        "created_date": date,
+        "intake_date": date,
+        **kwargs,
+    }
+
+
+class TestIssueListView(DashboardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('dashboard:grm:issue_list')
+        self.user = self.create_user()
+
+    def create_issues(self, *issues):
+        for doc in issues:
+            self.eadl_db.create_document(doc)
+
+    def get_page(self, cursor=None, page_size=2, **data):
+        if cursor:
+            data['cursor'] = cursor
+        response = self.get(self.url, {'page_size': page_size, **data}, ajax=True)
+        assert response.status_code == 200
+        return [doc['auto_increment_id'] for doc in response.context['issues']], response.context['next_cursor']
+
+    def get_all_pages(self, page_size=2, **data):
+        pages = []
+        issues, cursor = self.get_page(page_size=page_size, **data)
+        pages.append(issues)
+        while cursor:
+            issues, cursor = self.get_page(cursor, page_size, **data)
+            pages.append(issues)
+        return pages
+
+    def test_pages_are_walked_with_the_cursor(self):
+        # Issues 2, 3 and 4 have the same intake date, ordered by auto_increment_id
+        self.create_issues(issue(1, 1), issue(2, 5), issue(3, 5), issue(4, 5), issue(5, 9), issue(6, 2))
+
+        assert self.get_all_pages() == [[5, 4], [3, 2], [6, 1]]
+        assert self.get_all_pages(page_size=4) == [[5, 4, 3, 2], [6, 1]]
+        assert self.get_all_pages(page_size=6) == [[5, 4, 3, 2, 6, 1]]
+
+    def test_issues_created_between_pages(self):
+        self.create_issues(issue(1, 1), issue(2, 5), issue(3, 5), issue(4, 7))
+        first_page, cursor = self.get_page()
+        assert first_page == [4, 3]
+
+        # Newer than the cursor, with the intake date of the cursor and a greater id, and older than the cursor
+        self.create_issues(issue(5, 9), issue(6, 5), issue(7, 3))
+        second_page, cursor = self.get_page(cursor)
+        third_page, cursor = self.get_page(cursor)
+
+        assert second_page == [2, 7] and third_page == [1] and cursor is None
+
+    def test_invalid_cursor(self):
+        self.create_issues(issue(1, 1))
+
+        for cursor in ('not a cursor', encode_cursor(['2024-01-01T10:00:00.000000Z'])):
+            response = self.get(self.url, {'cursor': cursor}, ajax=True)
+            assert response.status_code == 400
+
+    def test_cursor_with_the_regions_of_the_worker(self):
+        for administrative_id, parent_id in (('1', None), ('2', '1'), ('3', None)):
+            self.eadl_db.create_document({
+                "type": 'administrative_level',
+                "administrative_id": administrative_id,
+                "administrative_level": 'region',
+                "name": f'Region {administrative_id}',
+                "parent_id": parent_id,
+            })
+        GovernmentWorker.objects.create(user=self.user, department=1, administrative_id='1')
+
+        def in_region(number, day, administrative_id, **kwargs):
+            return issue(number, day, category={"assigned_department": 1},
+                         administrative_region={"administrative_id": administrative_id}, **kwargs)
+
+        self.create_issues(
+            in_region(1, 1, '2'), in_region(2, 4, '3'), in_region(3, 4, '1'), in_region(4, 4, '2'),
+            in_region(5, 6, '3', assignee={"id": self.user.id}), in_region(6, 8, '3'),
+            in_region(7, 2, '3', internal_code='AB-7'), in_region(8, 4, '2', internal_code='AB-8'),
+            in_region(9, 3, '1', internal_code='AB-9'),
+        )
+
+        assert self.get_all_pages() == [[5, 8], [4, 3], [9, 1]]
+        # The code does not give access to the issues of the other regions
+        assert self.get_all_pages(page_size=1, code='AB') == [[8], [9]]
@@ -5,7 +5,7 @@ import cryptocode
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import BadRequest, PermissionDenied
 from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import reverse, reverse_lazy
@@ -22,9 +22,11 @@ from dashboard.grm.forms import (
     NewIssueContactForm, NewIssueDetailsForm, NewIssueLocationForm, NewIssuePersonForm, SearchIssueForm
 )
 from dashboard.mixins import AJAXRequestMixin, JSONResponseMixin, ModalFormMixin, PageMixin
+from grm.couchdb_indexes import GRM, get_query_options
+from grm.taxonomy import get_taxonomy
 from grm.utils import (
-    get_administrative_level_descendants, get_auto_increment_id, get_child_administrative_regions,
-    get_parent_administrative_level
+    decode_cursor, encode_cursor, get_administrative_level_descendants, get_auto_increment_id,
+    get_child_administrative_regions, get_parent_administrative_level
 )
 
 COUCHDB_GRM_DATABASE = settings.COUCHDB_GRM_DATABASE
@@ -77,10 +79,11 @@ class IssueMixin:
     has_permission = True
 
     def get_query_result(self, **kwargs):
-        return self.grm_db.get_query_result({
+        selector = {
             "auto_increment_id": kwargs['issue'],
             "type": 'issue'
-        })
+        }
+        return self.grm_db.get_query_result(selector, **get_query_options(GRM, selector))
 
     def check_permissions(self):
         user = self.request.user
@@ -227,12 +230,13 @@ class NewIssueMixin(LoginRequiredMixin, IssueFormMixin):
         return dispatch
 
     def get_query_result(self, **kwargs):
-        return self.grm_db.get_query_result({
+        selector = {
             "auto_increment_id": kwargs['issue'],
             "reporter.id": self.request.user.id,
             "confirmed": False,
             "type": 'issue'
-        })
+        }
+        return self.grm_db.get_query_result(selector, **get_query_options(GRM, selector))
 
     def get_form_kwargs(self):
         self.initial = {'doc_id': self.doc['_id']}
@@ -255,14 +259,8 @@ class NewIssueMixin(LoginRequiredMixin, IssueFormMixin):
         self.doc['description'] = data['description']
 
         try:
-            doc_type = self.grm_db.get_query_result({
-                "id": int(data['issue_type']),
-                "type": 'issue_type'
-            })[0][0]
-            doc_category = self.grm_db.get_query_result({
-                "id": int(data['category']),
-                "type": 'issue_category'
-            })[0][0]
+            doc_type = get_taxonomy(self.grm_db, 'issue_type')[int(data['issue_type'])]
+            doc_category = get_taxonomy(self.grm_db, 'issue_category')[int(data['category'])]
             department_id = doc_category['assigned_department']['id']
         except Exception:
             raise Http404
@@ -295,10 +293,8 @@ class NewIssueMixin(LoginRequiredMixin, IssueFormMixin):
 
         if data['citizen_age_group']:
             try:
-                doc_issue_age_group = self.grm_db.get_query_result({
-                    "id": int(data['citizen_age_group']),
-                    "type": 'issue_age_group'
-                })[0][0]
+                doc_issue_age_group = get_taxonomy(self.grm_db, 'issue_age_group')[
+                    int(data['citizen_age_group'])]
                 self.doc['citizen_age_group'] = {
                     "name": doc_issue_age_group['name'],
                     "id": doc_issue_age_group['id']
@@ -312,10 +308,8 @@ class NewIssueMixin(LoginRequiredMixin, IssueFormMixin):
 
         if data['citizen_group_1']:
             try:
-                doc_issue_citizen_group_1 = self.grm_db.get_query_result({
-                    "id": int(data['citizen_group_1']),
-                    "type": 'issue_citizen_group_1'
-                })[0][0]
+                doc_issue_citizen_group_1 = get_taxonomy(self.grm_db, 'issue_citizen_group_1')[
+                    int(data['citizen_group_1'])]
                 self.doc['citizen_group_1'] = {
                     "name": doc_issue_citizen_group_1['name'],
                     "id": doc_issue_citizen_group_1['id']
@@ -327,10 +321,8 @@ class NewIssueMixin(LoginRequiredMixin, IssueFormMixin):
 
         if data['citizen_group_2']:
             try:
-                doc_issue_citizen_group_2 = self.grm_db.get_query_result({
-                    "id": int(data['citizen_group_2']),
-                    "type": 'issue_citizen_group_2'
-                })[0][0]
+                doc_issue_citizen_group_2 = get_taxonomy(self.grm_db, 'issue_citizen_group_2')[
+                    int(data['citizen_group_2'])]
                 self.doc['citizen_group_2'] = {
                     "name": doc_issue_citizen_group_2['name'],
                     "id": doc_issue_citizen_group_2['id']
@@ -470,10 +462,7 @@ class NewIssueConfirmFormView(PageMixin, NewIssueMixin):
 
         self.set_contact_fields(data)
         try:
-            doc_category = self.grm_db.get_query_result({
-                "id": self.doc['category']['id'],
-                "type": 'issue_category'
-            })[0][0]
+            doc_category = get_taxonomy(self.grm_db, 'issue_category')[self.doc['category']['id']]
         except Exception:
             raise Http404
         administrative_id = self.doc["administrative_region"]["administrative_id"]
@@ -481,10 +470,7 @@ class NewIssueConfirmFormView(PageMixin, NewIssueMixin):
             'internal_code'] = f'{doc_category["abbreviation"]}-{administrative_id}-{self.doc["auto_increment_id"]}'
 
         try:
-            doc_status = self.grm_db.get_query_result({
-                "open_status": True,
-                "type": 'issue_status'
-            })[0][0]
+            doc_status = get_taxonomy(self.grm_db, 'issue_status').filter(open_status=True)[0]
         except Exception:
             raise Http404
         self.doc['status'] = {
@@ -507,11 +493,12 @@ class NewIssueConfirmationFormView(PageMixin, NewIssueMixin):
     permissions = ('read_only_by_reporter',)
 
     def get_query_result(self, **kwargs):
-        return self.grm_db.get_query_result({
+        selector = {
             "auto_increment_id": kwargs['issue'],
             "confirmed": True,
             "type": 'issue'
-        })
+        }
+        return self.grm_db.get_query_result(selector, **get_query_options(GRM, selector))
 
 
 class ReviewIssuesFormView(PageMixin, LoginRequiredMixin, generic.FormView):
@@ -532,14 +519,30 @@ class ReviewIssuesFormView(PageMixin, LoginRequiredMixin, generic.FormView):
 
 
 class IssueListView(AJAXRequestMixin, LoginRequiredMixin, generic.ListView):
+    """
+    Lists the issues by descending intake date, a page at a time. The page following the last issue of a page is
+    requested with the cursor returned in the next_cursor context variable, so that CouchDB reads the index from
+    the position of that issue instead of skipping all the issues of the previous pages.
+    """
     template_name = 'grm/issue_list.html'
     context_object_name = 'issues'
+    default_page_size = 10
+    max_page_size = 100
+    sort = [{"type": "desc"}, {"confirmed": "desc"}, {"intake_date": "desc"}, {"auto_increment_id": "desc"}]
+    next_cursor = None
+
+    def get_page_size(self):
+        try:
+            page_size = int(self.request.GET.get('page_size', self.default_page_size))
+        except ValueError:
+            raise BadRequest('Invalid page size')
+        return max(1, min(page_size, self.max_page_size))
 
     def get_queryset(self):
         grm_db = get_db(COUCHDB_GRM_DATABASE)
         eadl_db = get_db()
-        index = int(self.request.GET.get('index'))
-        offset = int(self.request.GET.get('offset'))
+        page_size = self.get_page_size()
+        cursor = self.request.GET.get('cursor')
         start_date = self.request.GET.get('start_date')
         end_date = self.request.GET.get('end_date')
         code = self.request.GET.get('code')
@@ -566,18 +569,18 @@ class IssueListView(AJAXRequestMixin, LoginRequiredMixin, generic.ListView):
                 ]}
             ]
 
-        date_range = {}
+        # intake_date is always part of the selector so that the sort can be served by the issue-intake-date index
+        date_range = {"$gt": None}
+        selector["intake_date"] = date_range
         if start_date:
             start_date = datetime.strptime(start_date, '%d/%m/%Y').strftime('%Y-%m-%dT%H:%M:%S.%fZ')
             date_range["$gte"] = start_date
-            selector["intake_date"] = date_range
         if end_date:
             end_date = (datetime.strptime(end_date, '%d/%m/%Y') + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
             date_range["$lte"] = end_date
-            selector["intake_date"] = date_range
         if code:
             code_filter = {"$regex": f"^{code}"}
-            selector['$or'] = [{"internal_code": code_filter}, {"tracking_code": code_filter}]
+            self.add_or_conditions(selector, [{"internal_code": code_filter}, {"tracking_code": code_filter}])
         if assigned_to:
             selector["assignee.id"] = int(assigned_to)
         if category:
@@ -586,7 +589,48 @@ class IssueListView(AJAXRequestMixin, LoginRequiredMixin, generic.ListView):
             selector["issue_type.id"] = int(issue_type)
         if status:
             selector["status.id"] = int(status)
-        return grm_db.get_query_result(selector)[index:index + offset]
+        if cursor:
+            self.add_cursor_conditions(selector, cursor)
+
+        docs = grm_db.get_query_result(
+            selector, raw_result=True, limit=page_size + 1, sort=self.sort, **get_query_options(GRM, selector)
+        )['docs']
+        issues = docs[:page_size]
+        if len(docs) > page_size:
+            self.next_cursor = encode_cursor([issues[-1]['intake_date'], issues[-1]['auto_increment_id']])
+        return issues
+
+    @staticmethod
+    def add_cursor_conditions(selector, cursor):
+        try:
+            intake_date, auto_increment_id = decode_cursor(cursor, 2)
+        except ValueError:
+            raise BadRequest('Invalid cursor')
+
+        date_range = selector["intake_date"]
+        if "$lte" not in date_range or intake_date < date_range["$lte"]:
+            date_range["$lte"] = intake_date
+        IssueListView.add_or_conditions(selector, [
+            {"intake_date": {"$lt": intake_date}},
+            {"intake_date": intake_date, "auto_increment_id": {"$lt": auto_increment_id}},
+        ])
+
+    @staticmethod
+    def add_or_conditions(selector, conditions):
+        """
+        Adds the conditions to the selector, which must then match one of them in addition to its other "$or".
+        """
+        if "$or" in selector:
+            selector["$and"] = selector.get("$and", []) + [{"$or": selector.pop("$or")}, {"$or": conditions}]
+        elif "$and" in selector:
+            selector["$and"].append({"$or": conditions})
+        else:
+            selector["$or"] = conditions
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
 
 
 class IssueCommentsContextMixin:
@@ -595,10 +639,8 @@ class IssueCommentsContextMixin:
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         try:
-            self.doc_department = self.grm_db.get_query_result({
-                "id": self.doc['category']['assigned_department'],
-                "type": 'issue_department'
-            })[0][0]
+            self.doc_department = get_taxonomy(self.grm_db, 'issue_department')[
+                self.doc['category']['assigned_department']]
         except Exception:
             raise Http404
         context['colors'] = ['warning', 'mediumslateblue', 'gray', 'mediumpurple', 'plum', 'primary', 'danger']
@@ -637,11 +679,12 @@ class IssueDetailsFormView(PageMixin, IssueMixin, IssueCommentsContextMixin, Log
         return super().get_form_kwargs()
 
     def get_query_result(self, **kwargs):
-        return self.grm_db.get_query_result({
+        selector = {
             "auto_increment_id": kwargs['issue'],
             "confirmed": True,
             "type": 'issue'
-        })
+        }
+        return self.grm_db.get_query_result(selector, **get_query_options(GRM, selector))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -650,10 +693,7 @@ class IssueDetailsFormView(PageMixin, IssueMixin, IssueCommentsContextMixin, Log
             'head']['id']
         context['comment_form'] = IssueCommentForm()
         try:
-            doc_status = self.grm_db.get_query_result({
-                "id": self.doc['status']['id'],
-                "type": 'issue_status'
-            })[0][0]
+            doc_status = get_taxonomy(self.grm_db, 'issue_status')[self.doc['status']['id']]
         except Exception:
             raise Http404
         context['doc_status'] = doc_status
@@ -683,10 +723,8 @@ class AddCommentToIssueView(IssueMixin, AJAXRequestMixin, LoginRequiredMixin, JS
 
     def post(self, request, *args, **kwargs):
         try:
-            doc_department = self.grm_db.get_query_result({
-                "id": self.doc['category']['assigned_department'],
-                "type": 'issue_department'
-            })[0][0]
+            doc_department = get_taxonomy(self.grm_db, 'issue_department')[
+                self.doc['category']['assigned_department']]
         except Exception:
             raise Http404
         user_id = request.user.id
@@ -730,10 +768,7 @@ class IssueStatusButtonsTemplateView(IssueMixin, AJAXRequestMixin, LoginRequired
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         try:
-            doc_status = self.grm_db.get_query_result({
-                "id": self.doc['status']['id'],
-                "type": 'issue_status'
-            })[0][0]
+            doc_status = get_taxonomy(self.grm_db, 'issue_status')[self.doc['status']['id']]
         except Exception:
             raise Http404
         context['doc_status'] = doc_status
@@ -747,10 +782,7 @@ class SubmitIssueOpenStatusView(IssueMixin, AJAXRequestMixin, LoginRequiredMixin
     def check_permissions(self):
         super().check_permissions()
         try:
-            doc_status = self.grm_db.get_query_result({
-                "id": self.doc["status"]["id"],
-                "type": 'issue_status'
-            })[0][0]
+            doc_status = get_taxonomy(self.grm_db, 'issue_status')[self.doc["status"]["id"]]
         except Exception:
             self.has_permission = False
             return
@@ -765,10 +797,7 @@ class SubmitIssueOpenStatusView(IssueMixin, AJAXRequestMixin, LoginRequiredMixin
         self.doc['research_result'] = ""
         self.doc['reject_reason'] = ""
         try:
-            doc_status = self.grm_db.get_query_result({
-                "open_status": True,
-                "type": 'issue_status'
-            })[0][0]
+            doc_status = get_taxonomy(self.grm_db, 'issue_status').filter(open_status=True)[0]
         except Exception:
             raise Http404
         self.doc['status'] = {
@@ -793,10 +822,7 @@ class SubmitIssueResearchResultFormView(AJAXRequestMixin, ModalFormMixin, LoginR
     def check_permissions(self):
         super().check_permissions()
         try:
-            doc_status = self.grm_db.get_query_result({
-                "id": self.doc["status"]["id"],
-                "type": 'issue_status'
-            })[0][0]
+            doc_status = get_taxonomy(self.grm_db, 'issue_status')[self.doc["status"]["id"]]
         except Exception:
             self.has_permission = False
             return
@@ -811,10 +837,7 @@ class SubmitIssueResearchResultFormView(AJAXRequestMixin, ModalFormMixin, LoginR
         self.doc['research_result'] = data["research_result"]
         self.doc['reject_reason'] = ""
         try:
-            doc_status = self.grm_db.get_query_result({
-                "final_status": True,
-                "type": 'issue_status'
-            })[0][0]
+            doc_status = get_taxonomy(self.grm_db, 'issue_status').filter(final_status=True)[0]
         except Exception:
             raise Http404
         self.doc['status'] = {
@@ -840,10 +863,7 @@ class SubmitIssueRejectReasonFormView(AJAXRequestMixin, ModalFormMixin, LoginReq
     def check_permissions(self):
         super().check_permissions()
         try:
-            doc_status = self.grm_db.get_query_result({
-                "id": self.doc["status"]["id"],
-                "type": 'issue_status'
-            })[0][0]
+            doc_status = get_taxonomy(self.grm_db, 'issue_status')[self.doc["status"]["id"]]
         except Exception:
             self.has_permission = False
             return
@@ -858,10 +878,7 @@ class SubmitIssueRejectReasonFormView(AJAXRequestMixin, ModalFormMixin, LoginReq
         self.doc['reject_reason'] = data["reject_reason"]
         self.doc['research_result'] = ""
         try:
-            doc_status = self.grm_db.get_query_result({
-                "rejected_status": True,
-                "type": 'issue_status'
-            })[0][0]
+            doc_status = get_taxonomy(self.grm_db, 'issue_status').filter(rejected_status=True)[0]
         except Exception:
             raise Http404
         self.doc['status'] = {
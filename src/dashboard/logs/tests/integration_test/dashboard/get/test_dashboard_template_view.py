@@ -0,0 +1,34 @@
+from django.urls import reverse
+
+from dashboard.logs.views import DashboardTemplateView
+from dashboard.tasks import check_issues
+from grm.metrics import reset_metrics_stores
+from grm.tests import DashboardTestCase
+
+
+class TestDashboardTemplateView(DashboardTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_metrics_stores()
+        self.url = reverse('dashboard:logs:dashboard')
+
+    def test_auth_permission(self):
+        response = self.get(self.url, authorized=False)
+
+        assert response.status_code == 302
+
+    def test_context_data(self):
+        check_issues()
+        self.get(self.url)
+        response = self.get(self.url)
+        context_data = response.context_data
+        metrics = context_data['metrics']
+
+        assert response.status_code == 200
+        assert context_data['title'] == DashboardTemplateView.title == 'Logs'
+        assert context_data['active_level1'] == DashboardTemplateView.active_level1 == 'logs'
+        assert isinstance(context_data['view'], DashboardTemplateView)
+        assert [endpoint['name'] for endpoint in metrics['endpoints']] == ['GET dashboard:logs:dashboard']
+        assert metrics['couchdb'] and [task['name'] for task in metrics['tasks']] == ['check_issues']
+        assert metrics['tasks'][0]['item_counts']['updated_issues'] == 0
+        assert [feed['pending_changes'] for feed in context_data['change_feeds']] == [None, None]
@@ -1,11 +1,34 @@
+import time
+
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.translation import gettext_lazy as _
 from django.views import generic
 
+from client import get_db
 from dashboard.mixins import PageMixin
+from dashboard.tasks import ADMINISTRATIVE_PATHS_CHECKPOINT, ISSUE_CHANGES_CHECKPOINT
+from grm.metrics import METRICS_WINDOW, get_change_feed_lag, get_metrics_snapshots, get_performance_report
+
+# Consumers of the _changes feeds, as (name, database, checkpoint)
+CHANGE_FEEDS = (
+    (_('Issue changes'), settings.COUCHDB_GRM_DATABASE, ISSUE_CHANGES_CHECKPOINT),
+    (_('Administrative paths'), settings.COUCHDB_DATABASE, ADMINISTRATIVE_PATHS_CHECKPOINT),
+)
 
 
 class DashboardTemplateView(PageMixin, LoginRequiredMixin, generic.TemplateView):
-    template_name = 'common/under_construction.html'
+    template_name = 'logs/dashboard.html'
     title = _('Logs')
     active_level1 = 'logs'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        now = time.time()
+        context['metrics'] = get_performance_report(get_metrics_snapshots(get_db(settings.COUCHDB_GRM_DATABASE), now))
+        context['change_feeds'] = [
+            {"name": name, **get_change_feed_lag(get_db(database), checkpoint, now)}
+            for name, database, checkpoint in CHANGE_FEEDS
+        ]
+        context['window_minutes'] = METRICS_WINDOW // 60
+        return context
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from client import get_db
+from grm.administrative_paths import get_outdated_regions, update_region_paths
+from grm.administrative_tree import get_administrative_tree, reset_administrative_trees
+
+
+class Command(BaseCommand):
+    help = 'Sets the path_ids and path_names of the administrative levels where they are missing or outdated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the administrative levels that would be updated')
+
+    def handle(self, *args, **kwargs):
+        eadl_db = get_db()
+        reset_administrative_trees()
+
+        start = time.perf_counter()
+        try:
+            tree = get_administrative_tree(eadl_db)
+        except Exception as e:
+            raise CommandError(f'Failed to load the administrative levels {e}')
+
+        if kwargs['dry_run']:
+            docs = get_outdated_regions(tree)
+            for doc in docs:
+                self.stdout.write(f'  ~ {doc["administrative_id"]} {", ".join(reversed(doc["path_names"]))}')
+            self.stdout.write(self.style.SUCCESS(f'Would have updated {len(docs)} administrative levels'))
+            return
+
+        updated = 0
+        for outcome in update_region_paths(eadl_db, tree):
+            if 'error' in outcome:
+                self.stdout.write(self.style.ERROR(
+                    f'Failed to save the administrative level {outcome["id"]}: {outcome["error"]}'))
+            elif not outcome.get('skipped'):
+                updated += 1
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Successfully updated {updated} administrative levels in {elapsed:.3f}s'))
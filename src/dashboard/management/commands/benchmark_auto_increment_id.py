@@ -0,0 +1,62 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from client import get_db
+from grm.sequences import SequenceAllocator
+
+
+class Command(BaseCommand):
+    help = 'Allocates ids of a temporary sequence from concurrent allocators and checks that they are unique'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--allocators', type=int, default=4, help='Number of allocators, one per worker process')
+        parser.add_argument('--threads', type=int, default=4, help='Number of threads using each allocator')
+        parser.add_argument('--allocations', type=int, default=50, help='Number of ids allocated by each thread')
+        parser.add_argument('--block-size', type=int, default=settings.AUTO_INCREMENT_ID_BLOCK_SIZE)
+
+    def handle(self, *args, **kwargs):
+        grm_db = get_db(settings.COUCHDB_GRM_DATABASE)
+        name = f'benchmark-{uuid.uuid4().hex}'
+        allocators = [
+            SequenceAllocator(grm_db, name, kwargs['block_size']) for _ in range(kwargs['allocators'])
+        ]
+        ids = []
+        errors = []
+        lock = threading.Lock()
+
+        def allocate(allocator):
+            try:
+                allocated = [allocator.next() for _ in range(kwargs['allocations'])]
+            except Exception as e:
+                errors.append(e)
+                return
+            with lock:
+                ids.extend(allocated)
+
+        threads = [
+            threading.Thread(target=allocate, args=(allocator,))
+            for allocator in allocators for _ in range(kwargs['threads'])
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        counter = grm_db[allocators[0].doc_id]
+        counter.delete()
+        if errors:
+            raise CommandError(f'{len(errors)} threads failed to allocate ids {errors[0]}')
+
+        self.stdout.write(f'Allocated {len(ids)} ids in {elapsed:.2f}s ({len(ids) / elapsed:.0f} allocations/s)')
+        self.stdout.write(f'Leases: {sum(a.leases for a in allocators)}, '
+                          f'conflicts: {sum(a.conflicts for a in allocators)}')
+        duplicates = len(ids) - len(set(ids))
+        if duplicates:
+            raise CommandError(f'{duplicates} ids were allocated more than once')
+        self.stdout.write(self.style.SUCCESS('All the ids are unique'))
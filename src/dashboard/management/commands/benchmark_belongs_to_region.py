@@ -0,0 +1,131 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grm.administrative_tree import AdministrativeTree
+
+LEVELS = ['country', 'region', 'prefecture', 'commune', 'canton', 'village']
+
+
+class SyntheticEadlDb:
+    """
+    Dictionary backed stand-in of the eadl database answering the parent_id Mango queries of the recursive
+    implementation, counting the queries that would have been sent to CouchDB.
+    """
+
+    def __init__(self, docs):
+        self.queries = 0
+        self.by_parent = {}
+        for doc in docs:
+            self.by_parent.setdefault(doc['parent_id'], []).append(doc)
+
+    def get_query_result(self, selector):
+        self.queries += 1
+        return self.by_parent.get(selector['parent_id'], [])
+
+
+def recursive_get_administrative_level_descendants(eadl_db, parent_id, ids):
+    # grm.utils implementation before the introduction of AdministrativeTree
+    data = eadl_db.get_query_result(
+        {
+            "type": 'administrative_level',
+            "parent_id": parent_id,
+        }
+    )
+    data = [doc for doc in data]
+    descendants_ids = [region["administrative_id"] for region in data]
+    for descendant_id in descendants_ids:
+        recursive_get_administrative_level_descendants(eadl_db, descendant_id, ids)
+        ids.append(descendant_id)
+
+    return ids
+
+
+def recursive_belongs_to_region(eadl_db, child_administrative_id, parent_administrative_id):
+    if parent_administrative_id == child_administrative_id:
+        return True
+    descendants = recursive_get_administrative_level_descendants(eadl_db, parent_administrative_id, [])
+    return child_administrative_id in descendants
+
+
+def create_synthetic_hierarchy(nodes):
+    branching = 2
+    while sum(branching ** depth for depth in range(len(LEVELS) - 2)) < nodes:
+        branching += 1
+    docs = [{
+        "_id": 'synthetic-0',
+        "type": 'administrative_level',
+        "administrative_id": '0',
+        "administrative_level": LEVELS[0],
+        "name": 'Country',
+        "parent_id": None,
+    }]
+    parents = [docs[0]]
+    while len(docs) < nodes:
+        next_parents = []
+        for parent in parents:
+            depth = LEVELS.index(parent['administrative_level']) + 1
+            for _ in range(branching):
+                if len(docs) == nodes:
+                    break
+                administrative_id = str(len(docs))
+                doc = {
+                    "_id": f'synthetic-{administrative_id}',
+                    "type": 'administrative_level',
+                    "administrative_id": administrative_id,
+                    "administrative_level": LEVELS[min(depth, len(LEVELS) - 1)],
+                    "name": f'Region {administrative_id}',
+                    "parent_id": parent['administrative_id'],
+                }
+                docs.append(doc)
+                next_parents.append(doc)
+        parents = next_parents
+    return docs
+
+
+class Command(BaseCommand):
+    help = 'Compares belongs_to_region with interval labelling against the recursive implementation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=50000, help='Number of administrative levels')
+        parser.add_argument('--checks', type=int, default=200, help='Number of permission checks')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **kwargs):
+        if kwargs['checks'] < 1:
+            raise CommandError('--checks must be at least 1')
+        if kwargs['nodes'] < 2:
+            raise CommandError('--nodes must be at least 2')
+        rng = random.Random(kwargs['seed'])
+        docs = create_synthetic_hierarchy(kwargs['nodes'])
+        ids = [doc['administrative_id'] for doc in docs]
+        upper_levels = [doc['administrative_id'] for doc in docs if doc['administrative_level'] in LEVELS[1:3]]
+        checks = [(rng.choice(ids), rng.choice(upper_levels)) for _ in range(kwargs['checks'])]
+
+        start = time.perf_counter()
+        tree = AdministrativeTree(docs)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        interval_results = [
+            child == parent or tree.is_descendant(child, parent) for child, parent in checks
+        ]
+        interval_time = time.perf_counter() - start
+
+        eadl_db = SyntheticEadlDb(docs)
+        start = time.perf_counter()
+        recursive_results = [recursive_belongs_to_region(eadl_db, child, parent) for child, parent in checks]
+        recursive_time = time.perf_counter() - start
+
+        if interval_results != recursive_results:
+            self.stdout.write(self.style.ERROR('The implementations returned different results'))
+
+        checks_count = len(checks)
+        self.stdout.write(f'Administrative levels: {len(docs)}, checks: {checks_count}')
+        self.stdout.write(f'Interval labelling: build {build_time * 1000:.1f} ms, '
+                          f'{interval_time / checks_count * 1e6:.2f} us/check, 0 queries/check')
+        self.stdout.write(f'Recursive queries: {recursive_time / checks_count * 1e6:.2f} us/check, '
+                          f'{eadl_db.queries / checks_count:.1f} queries/check')
+        speedup = recursive_time / interval_time
+        self.stdout.write(self.style.SUCCESS(f'Speedup (without network latency): {speedup:.0f}x'))
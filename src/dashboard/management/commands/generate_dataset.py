@@ -0,0 +1,152 @@
+import itertools
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from authentication.models import GovernmentWorker, User, government_worker_directory
+from client import bulk_write, get_db
+from grm.administrative_tree import ADMINISTRATIVE_LEVEL_SELECTOR
+from grm.sequences import SequenceAllocator
+from grm.synthetic_dataset import DEFAULT_LEVELS, SyntheticDataset, parse_levels
+from grm.taxonomy import TAXONOMY_FLAGS
+from grm.utils import ISSUE_AUTO_INCREMENT_ID_SEQUENCE, get_max_auto_increment_id
+
+
+class Command(BaseCommand):
+    help = 'Generates a reproducible synthetic dataset in the eadl and GRM databases for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--levels', type=parse_levels, default=DEFAULT_LEVELS,
+                            help='Levels below the country and number of children of each region of the level '
+                                 'above, e.g. region:5,prefecture:8,commune:10,village:25')
+        parser.add_argument('--adls-per-village', type=int, default=2)
+        parser.add_argument('--departments', type=int, default=6)
+        parser.add_argument('--categories', type=int, default=24)
+        parser.add_argument('--workers-per-region', type=int, default=1,
+                            help='Number of workers of each department in each region of its level')
+        parser.add_argument('--issues', type=int, default=200000)
+        parser.add_argument('--max-comments', type=int, default=3, help='Maximum number of comments of an issue')
+        parser.add_argument('--max-attachments', type=int, default=2,
+                            help='Maximum number of attachments of an issue')
+        parser.add_argument('--unconfirmed-ratio', type=float, default=0.02,
+                            help='Ratio of the issues left unconfirmed, like the issues being created')
+        parser.add_argument('--unchecked-ratio', type=float, default=0.02,
+                            help='Ratio of the confirmed issues left for check_issues')
+        parser.add_argument('--escalated-ratio', type=float, default=0.01,
+                            help='Ratio of the assigned issues to escalate')
+        parser.add_argument('--end-date', type=datetime.fromisoformat, default=datetime(2024, 12, 31),
+                            help='Date of the latest issues, the issues being spread over the previous --days days')
+        parser.add_argument('--days', type=int, default=730)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of documents saved by each _bulk_docs request')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['departments'] < 1:
+            raise CommandError('At least one department is required')
+        dataset = SyntheticDataset(
+            seed=kwargs['seed'], levels=kwargs['levels'], adls_per_village=kwargs['adls_per_village'],
+            departments=kwargs['departments'], categories=kwargs['categories'],
+            workers_per_region=kwargs['workers_per_region'], issues=kwargs['issues'],
+            max_comments=kwargs['max_comments'], max_attachments=kwargs['max_attachments'],
+            unconfirmed_ratio=kwargs['unconfirmed_ratio'], unchecked_ratio=kwargs['unchecked_ratio'],
+            escalated_ratio=kwargs['escalated_ratio'], end_date=kwargs['end_date'], days=kwargs['days'],
+        )
+        self.batch_size = kwargs['batch_size']
+        self.verbosity = kwargs['verbosity']
+        eadl_db = get_db()
+        grm_db = get_db(settings.COUCHDB_GRM_DATABASE)
+
+        # The ids of the generated documents are always the same, so the dataset must not be added to another one
+        if eadl_db.get_query_result(ADMINISTRATIVE_LEVEL_SELECTOR, raw_result=True, limit=1)['docs']:
+            raise CommandError('The eadl database already has administrative levels')
+        taxonomy_selector = {"type": {"$in": list(TAXONOMY_FLAGS)}}
+        if grm_db.get_query_result(taxonomy_selector, raw_result=True, limit=1)['docs']:
+            raise CommandError('The GRM database already has taxonomy documents')
+        if User.objects.filter(username__startswith=dataset.username_prefix).exists():
+            raise CommandError(f'The users of the dataset with the seed {dataset.seed} already exist')
+
+        start = time.perf_counter()
+        regions = self.write(eadl_db, 'administrative levels', dataset.administrative_levels())
+        adls = self.write(eadl_db, 'ADL documents', dataset.adls())
+        eadl_at = time.perf_counter()
+
+        workers = self.create_workers(dataset)
+        workers_at = time.perf_counter()
+
+        taxonomy = self.write(grm_db, 'taxonomy documents', dataset.taxonomy(workers))
+        first_auto_increment_id = 1
+        if dataset.issue_count:
+            # Reserves the auto_increment_id of all the issues at once, after the ids of the existing issues
+            allocator = SequenceAllocator(grm_db, ISSUE_AUTO_INCREMENT_ID_SEQUENCE, dataset.issue_count,
+                                          lambda: get_max_auto_increment_id(grm_db))
+            first_auto_increment_id = allocator.next()
+        issues = self.write(grm_db, 'issues', dataset.issues(workers, first_auto_increment_id))
+        grm_at = time.perf_counter()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully created {regions} administrative levels, {adls} ADL documents, {len(workers)} government '
+            f'workers, {taxonomy} taxonomy documents and {issues} issues with the seed {dataset.seed}'))
+        self.stdout.write(
+            f'Saved the eadl documents in {eadl_at - start:.3f}s, '
+            f'the government workers in {workers_at - eadl_at:.3f}s, '
+            f'the GRM documents in {grm_at - workers_at:.3f}s'
+        )
+
+    def write(self, db, label, docs):
+        """
+        Saves the documents by batches, so that the generated documents are not all in memory at once. Returns the
+        number of documents saved.
+        """
+        docs = iter(docs)
+        saved = 0
+        while True:
+            batch = list(itertools.islice(docs, self.batch_size))
+            if not batch:
+                return saved
+            for outcome in bulk_write(db, batch, batch_size=self.batch_size):
+                if 'error' in outcome:
+                    self.stdout.write(self.style.ERROR(
+                        f'Failed to save the {label} {outcome["id"]}: {outcome["error"]} {outcome.get("reason", "")}'))
+                else:
+                    saved += 1
+            if self.verbosity > 1:
+                self.stdout.write(f'  {saved} {label} saved')
+
+    def create_workers(self, dataset):
+        """
+        Creates the users and the government workers of the dataset with bulk inserts. Returns the saved workers as
+        {"id", "name", "department", "administrative_id"}, in the order of the dataset.
+        """
+        generated_workers = dataset.government_workers()
+        # The users cannot log in with a password, the benchmarks log them in directly
+        password = make_password(None)
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(
+                    username=worker['username'], email=worker['email'], first_name=worker['first_name'],
+                    last_name=worker['last_name'], phone_number=worker['phone_number'], password=password,
+                ) for worker in generated_workers
+            ], batch_size=self.batch_size)
+            # bulk_create does not set the primary keys of the users with every database
+            user_ids = dict(User.objects.filter(username__startswith=dataset.username_prefix).values_list(
+                'username', 'id'))
+            GovernmentWorker.objects.bulk_create([
+                GovernmentWorker(user_id=user_ids[worker['username']], department=worker['department'],
+                                 administrative_id=worker['administrative_id'])
+                for worker in generated_workers
+            ], batch_size=self.batch_size)
+        # bulk_create does not send the signals that invalidate the directory
+        government_worker_directory.invalidate()
+        return [
+            {
+                "id": user_ids[worker['username']],
+                "name": f'{worker["first_name"]} {worker["last_name"]}',
+                "department": worker['department'],
+                "administrative_id": worker['administrative_id'],
+            } for worker in generated_workers
+        ]
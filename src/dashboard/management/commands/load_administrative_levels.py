@@ -1,9 +1,12 @@
 import csv
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.core.management.base import BaseCommand, CommandError
 
-from client import bulk_update, get_db
+from client import bulk_write, get_db
+from grm.administrative_import import AdministrativeLevelImport, fill_coordinates
+from grm.administrative_tree import ADMINISTRATIVE_LEVEL_SELECTOR
 
 
 class Command(BaseCommand):
@@ -11,81 +14,84 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('file_path', type=str, help='Absolute path to csv file')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the administrative levels that would be created or updated')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of documents saved by each _bulk_docs request')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of _bulk_docs requests sent in parallel')
 
     def handle(self, *args, **kwargs):
         eadl_db = get_db()
+        dry_run = kwargs['dry_run']
 
+        start = time.perf_counter()
+        docs = list(eadl_db.get_query_result(ADMINISTRATIVE_LEVEL_SELECTOR, page_size=1000))
         try:
-            country_administrative_id = eadl_db.get_query_result(
-                {
-                    "type": 'administrative_level',
-                    "parent_id": None,
-                }
-            )[:][0]['administrative_id']
+            country_administrative_id = [doc for doc in docs if doc.get('parent_id') is None][0]['administrative_id']
         except Exception as e:
             raise CommandError(f'Failed to get country administrative level {e}')
-
-        file_path = kwargs['file_path']
+        administrative_import = AdministrativeLevelImport(docs, country_administrative_id)
+        loaded_at = time.perf_counter()
 
         try:
-            with open(file_path, newline='') as csvfile:
+            with open(kwargs['file_path'], newline='') as csvfile:
                 reader = csv.reader(csvfile, delimiter=';', quotechar='"')
-                headers = []
-                for row in reader:
-                    headers = row
-                    break
-                created = 0
-                docs_to_update = []
+                headers = next(reader, [])
                 for row in reader:
-                    current_parent_id = country_administrative_id
                     doc_data = dict(zip(headers, row))
                     try:
                         latitude = float(doc_data['Latitude'].replace(',', '.'))
                         longitude = float(doc_data['Longitude'].replace(',', '.'))
-                    except TypeError as e:
+                    except (KeyError, TypeError, ValueError) as e:
                         self.stdout.write(
                             self.style.ERROR(f'Invalid value in line {reader.line_num} for latitude/longitude. {e}'))
                         continue
-
-                    for administrative_level, name in list(doc_data.items())[2:]:
-                        administrative_level_doc = eadl_db.get_query_result(
-                            {
-                                "type": 'administrative_level',
-                                "name": name,
-                                "administrative_level": administrative_level,
-                                "parent_id": current_parent_id,
-                            }
-                        )[:]
-
-                        if administrative_level_doc:
-                            doc = administrative_level_doc[0]
-                            to_update = not doc['latitude'] or not doc['longitude']
-                            if not doc['latitude']:
-                                doc['latitude'] = latitude
-                            if not doc['longitude']:
-                                doc['longitude'] = latitude
-                            if to_update:
-                                docs_to_update.append(doc)
-                        else:
-                            doc = {
-                                "type": 'administrative_level',
-                                "administrative_id": str(time.time()).replace('.', ''),
-                                "administrative_level": administrative_level,
-                                "name": name,
-                                "latitude": latitude,
-                                "longitude": longitude,
-                                "parent_id": current_parent_id,
-                            }
-
-                            eadl_db.create_document(doc)
-                            created += 1
-
-                        current_parent_id = doc['administrative_id']
-
-                updated = len(bulk_update(eadl_db, docs_to_update))
-
-            self.stdout.write(self.style.SUCCESS(f'Successfully created {created} administrative levels'))
-            self.stdout.write(self.style.SUCCESS(f'Successfully updated {updated} administrative levels'))
-
+                    administrative_import.add_row(list(doc_data.items())[2:], latitude, longitude)
         except IOError as e:
             raise CommandError(f'Failed to open file {e}')
+        planned_at = time.perf_counter()
+
+        created = administrative_import.created
+        updated = list(administrative_import.updated.values())
+        if dry_run or kwargs['verbosity'] > 1:
+            for doc in created:
+                self.stdout.write(self.style.SUCCESS(f'  + {" > ".join(administrative_import.get_path(doc))}'))
+            for doc in updated:
+                self.stdout.write(self.style.WARNING(
+                    f'  ~ {" > ".join(administrative_import.get_path(doc))} (latitude, longitude)'))
+
+        created_count, updated_count = len(created), len(updated)
+        if not dry_run:
+            # The ids of the new regions do not depend on the order of the documents, so the batches are independent
+            docs_to_save = created + updated
+            batch_size = kwargs['batch_size']
+            batches = [docs_to_save[i:i + batch_size] for i in range(0, len(docs_to_save), batch_size)]
+            with ThreadPoolExecutor(max_workers=kwargs['workers']) as executor:
+                results = executor.map(lambda batch: bulk_write(eadl_db, batch, self.merge, batch_size), batches)
+                outcomes = [outcome for batch_outcomes in results for outcome in batch_outcomes]
+            for outcome in outcomes:
+                if 'error' in outcome:
+                    self.stdout.write(self.style.ERROR(f'Failed to save the administrative level {outcome["id"]}: '
+                                                       f'{outcome["error"]} {outcome.get("reason", "")}'))
+            saved = ['error' not in outcome and not outcome.get('skipped') for outcome in outcomes]
+            created_count, updated_count = sum(saved[:len(created)]), sum(saved[len(created):])
+        written_at = time.perf_counter()
+
+        action = 'Would have' if dry_run else 'Successfully'
+        self.stdout.write(self.style.SUCCESS(f'{action} created {created_count} administrative levels'))
+        self.stdout.write(self.style.SUCCESS(f'{action} updated {updated_count} administrative levels'))
+        self.stdout.write(
+            f'Loaded {len(docs)} existing administrative levels in {loaded_at - start:.3f}s, '
+            f'read the file in {planned_at - loaded_at:.3f}s, '
+            f'saved the documents in {written_at - planned_at:.3f}s'
+        )
+
+    @staticmethod
+    def merge(latest_doc, doc):
+        if '_rev' not in doc:
+            # Created by another import since the administrative levels were loaded, with the same administrative_id
+            return None
+        if latest_doc.get('latitude') and latest_doc.get('longitude'):
+            return None
+        return fill_coordinates(latest_doc, doc['latitude'], doc['longitude'])
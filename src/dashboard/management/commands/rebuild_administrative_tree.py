@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from client import get_db
+from grm.administrative_tree import get_administrative_tree, reset_administrative_trees
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the in-memory index of the administrative levels and checks its interval labelling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Check the interval of every region against its chain of parents')
+
+    def handle(self, *args, **kwargs):
+        eadl_db = get_db()
+        reset_administrative_trees()
+
+        start = time.perf_counter()
+        try:
+            tree = get_administrative_tree(eadl_db)
+        except Exception as e:
+            raise CommandError(f'Failed to load the administrative levels {e}')
+        elapsed = time.perf_counter() - start
+
+        roots = tree.get_roots()
+        depths = [tree.get_depth(i) for i in tree.nodes]
+        unlabelled = [i for i, depth in zip(tree.nodes, depths) if depth is None]
+        self.stdout.write(self.style.SUCCESS(f'Indexed {len(tree)} administrative levels in {elapsed:.3f}s'))
+        self.stdout.write(f'Roots: {len(roots)}')
+        self.stdout.write(f'Maximum depth: {max([d for d in depths if d is not None], default=0)}')
+        for administrative_id in unlabelled:
+            self.stdout.write(self.style.WARNING(
+                f'Administrative level {administrative_id} is part of a parent cycle and was not indexed'))
+
+        if kwargs['verify']:
+            errors = 0
+            for administrative_id in tree.nodes:
+                if administrative_id in unlabelled:
+                    continue
+                ancestors = tree.get_ancestors(administrative_id)
+                valid = tree.get_depth(administrative_id) == len(ancestors) and all(
+                    tree.is_descendant(administrative_id, a['administrative_id']) for a in ancestors)
+                if not valid:
+                    errors += 1
+                    self.stdout.write(
+                        self.style.ERROR(f'Invalid interval for administrative level {administrative_id}'))
+            if errors:
+                raise CommandError(f'{errors} administrative levels have an invalid interval')
+            self.stdout.write(self.style.SUCCESS('All intervals are consistent with the parents of the regions'))
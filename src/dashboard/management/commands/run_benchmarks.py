@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from client import COUCHDB_BACKEND
+from grm.benchmarks import SCENARIOS, SIZES, compare_results, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Measures the hot paths of the GRM on synthetic datasets and compares the results with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'])
+        parser.add_argument('--scenarios', nargs='+', choices=[scenario.name for scenario in SCENARIOS],
+                            help='Scenarios to run, all of them by default')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of measured runs of each scenario')
+        parser.add_argument('--output', help='Path of the JSON file the results are saved to')
+        parser.add_argument('--baseline', help='Path of the JSON file of the results to compare with')
+        parser.add_argument('--time-tolerance', type=float, default=0.25,
+                            help='Relative increase of the median wall time reported as a regression')
+        parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                            help='Relative increase of the peak memory reported as a regression')
+
+    def handle(self, *args, **kwargs):
+        if COUCHDB_BACKEND != 'memory':
+            raise CommandError('The benchmarks run on the in-memory CouchDB backend, use --settings=grm.test_settings')
+        baseline = None
+        if kwargs['baseline']:
+            try:
+                with open(kwargs['baseline']) as f:
+                    baseline = json.load(f)
+            except (IOError, ValueError) as e:
+                raise CommandError(f'Failed to read the baseline {e}')
+        scenarios = [
+            scenario for scenario in SCENARIOS if not kwargs['scenarios'] or scenario.name in kwargs['scenarios']
+        ]
+
+        # The users of the datasets are created in a test database, like the users of the tests
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = run_benchmarks(kwargs['sizes'], scenarios, kwargs['repeat'], log=self.stdout.write)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if kwargs['output']:
+            with open(kwargs['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Saved the results to {kwargs["output"]}'))
+
+        if baseline is not None:
+            regressions = compare_results(
+                baseline, results, kwargs['time_tolerance'], kwargs['memory_tolerance'])
+            for size, scenario, metric, baseline_value, value in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f'{size} {scenario}: {metric} went from {baseline_value:.6g} to {value:.6g}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions from the baseline {kwargs["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regression from the baseline {kwargs["baseline"]}'))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from client import create_query_index, delete_query_index, explain_query, get_db, get_query_indexes
+from grm.couchdb_indexes import DATABASES, INDEX_DESIGN_DOCUMENT, INDEXES, QUERIES, get_query_options
+
+
+class Command(BaseCommand):
+    help = 'Creates the Mango indexes declared in grm.couchdb_indexes that are missing or outdated in CouchDB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the differences')
+        parser.add_argument('--delete-unknown', action='store_true',
+                            help=f'Delete the indexes of _design/{INDEX_DESIGN_DOCUMENT} that are not declared')
+        parser.add_argument('--explain', action='store_true',
+                            help='Report the index used by every query of the application')
+
+    def handle(self, *args, **kwargs):
+        for database, db_name in DATABASES.items():
+            try:
+                db = get_db(db_name)
+                existing_indexes = get_query_indexes(db)
+            except Exception as e:
+                raise CommandError(f'Failed to get the indexes of the database {db_name} {e}')
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'Database {db_name}'))
+            self.sync_indexes(db, database, existing_indexes, kwargs['dry_run'], kwargs['delete_unknown'])
+            if kwargs['explain']:
+                self.explain_queries(db, database)
+
+    def sync_indexes(self, db, database, existing_indexes, dry_run, delete_unknown):
+        design_document = f'_design/{INDEX_DESIGN_DOCUMENT}'
+        current = {
+            index['name']: [list(field)[0] for field in index['def']['fields']]
+            for index in existing_indexes if index['ddoc'] == design_document
+        }
+        declared = INDEXES[database]
+
+        for name, fields in declared.items():
+            if current.get(name) == fields:
+                self.stdout.write(f'  = {name} {fields}')
+                continue
+            if name in current:
+                self.stdout.write(self.style.WARNING(f'  ~ {name} {current[name]} -> {fields}'))
+                if not dry_run:
+                    delete_query_index(db, INDEX_DESIGN_DOCUMENT, name)
+            else:
+                self.stdout.write(self.style.SUCCESS(f'  + {name} {fields}'))
+            if not dry_run:
+                create_query_index(db, INDEX_DESIGN_DOCUMENT, name, fields)
+
+        for name in set(current) - set(declared):
+            self.stdout.write(self.style.WARNING(f'  - {name} {current[name]} (not declared)'))
+            if delete_unknown and not dry_run:
+                delete_query_index(db, INDEX_DESIGN_DOCUMENT, name)
+
+    def explain_queries(self, db, database):
+        full_scans = 0
+        for name, selector in QUERIES[database].items():
+            plan = explain_query(db, selector, **get_query_options(database, selector))
+            index = plan['index']
+            if index['type'] == 'special':
+                full_scans += 1
+                self.stdout.write(self.style.ERROR(f'  {name}: {index["name"]} scan'))
+            else:
+                self.stdout.write(f'  {name}: {index["ddoc"]}/{index["name"]}')
+        if full_scans:
+            self.stdout.write(self.style.ERROR(f'  {full_scans} queries fall back to a full scan'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from client import get_db
+from grm.couchdb_indexes import DATABASES
+from grm.couchdb_views import DESIGN_DOCUMENTS, load_design_document
+
+
+class Command(BaseCommand):
+    help = 'Creates or updates the design documents of couchdb/design that differ from the ones in CouchDB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the differences')
+
+    def handle(self, *args, **kwargs):
+        for database, names in DESIGN_DOCUMENTS.items():
+            db_name = DATABASES[database]
+            try:
+                db = get_db(db_name)
+            except Exception as e:
+                raise CommandError(f'Failed to open the database {db_name} {e}')
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'Database {db_name}'))
+            for name in names:
+                self.sync_design_document(db, load_design_document(name), kwargs['dry_run'])
+
+    def sync_design_document(self, db, declared, dry_run):
+        doc_id = declared['_id']
+        try:
+            current = db[doc_id]
+        except KeyError:
+            current = None
+        if current is not None:
+            changed = [key for key in declared if key != '_id' and current.get(key) != declared[key]]
+            if not changed:
+                self.stdout.write(f'  = {doc_id}')
+                return
+            self.stdout.write(self.style.WARNING(f'  ~ {doc_id} {", ".join(changed)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'  + {doc_id}'))
+        if dry_run:
+            return
+
+        if current is not None:
+            current.update(declared)
+            current.save()
+        else:
+            db.create_document(declared, throw_on_exists=True)
@@ -1,232 +1,442 @@
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext as _
-from twilio.base.exceptions import TwilioRestException
 
-from authentication.models import anonymize_issue_data, get_assignee, get_assignee_to_escalate
-from client import get_db
+from authentication.models import anonymize_issue_data, get_assignee, get_assignee_to_escalate, get_issue_contact
+from client import bulk_get, bulk_write, get_changes, get_db, get_local_document, save_local_document
 from dashboard.grm import CHOICE_CONTACT, CHOICE_PHONE
+from grm.administrative_paths import get_moved_regions, set_issue_path, update_issue_paths, update_region_paths
+from grm.administrative_tree import ADMINISTRATIVE_LEVEL_CHANGES_SELECTOR, get_administrative_tree
 from grm.celery import app
+from grm.couchdb_indexes import GRM, get_query_options
+from grm.metrics import record_task_metrics
+from grm.taxonomy import get_taxonomy
 from grm.utils import get_auto_increment_id
-from sms_client import send_sms
+from sms_client import SmsSender, queue_sms
 
 COUCHDB_GRM_DATABASE = settings.COUCHDB_GRM_DATABASE
+ISSUES_BATCH_SIZE = 100
+ISSUES_UPDATE_MAX_ATTEMPTS = 3
+ISSUE_CHANGES_CHECKPOINT = '_local/issue-changes-checkpoint'
+ISSUE_CHANGES_SELECTOR = {"type": "issue"}
+ADMINISTRATIVE_PATHS_CHECKPOINT = '_local/administrative-paths-checkpoint'
+ADMINISTRATIVE_CHANGES_BATCH_SIZE = 500
+
+CHECK_ISSUES_SELECTOR = {
+    "type": "issue",
+    "confirmed": True,
+    "$or": [
+        {
+            "auto_increment_id": {
+                "$in": [
+                    None,
+                    ""
+                ]
+            }
+        },
+        {
+            "auto_increment_id": {
+                "$exists": False
+            }
+        },
+        {
+            "internal_code": {
+                "$in": [
+                    None,
+                    ""
+                ]
+            }
+        },
+        {
+            "internal_code": {
+                "$exists": False
+            }
+        },
+        {
+            "citizen": {
+                "$nin": [
+                    None,
+                    "",
+                    "*"
+                ]
+            }
+        },
+        {
+            "contact_information.contact": {
+                "$nin": [
+                    None,
+                    "",
+                    "*"
+                ]
+            }
+        },
+        {
+            "assignee": {
+                "$in": [
+                    None,
+                    ""
+                ]
+            }
+        },
+        {
+            "assignee": {
+                "$exists": False
+            }
+        },
+        {
+            "administrative_region.administrative_id": {
+                "$exists": True
+            },
+            "administrative_region.path_ids": {
+                "$exists": False
+            }
+        }
+    ]
+}
+
+ESCALATE_ISSUES_SELECTOR = {
+    "type": "issue",
+    "confirmed": True,
+    "escalate_flag": True,
+    "assignee": {"$ne": ""}
+}
+
+SEND_SMS_MESSAGE_SELECTOR = {
+    "type": "issue",
+    "confirmed": True,
+    "assignee": {"$ne": ""},
+    "tracking_code": {"$ne": ""},
+    "contact_medium": CHOICE_CONTACT,
+    "contact_information.type": CHOICE_PHONE,
+    "contact_information.contact": {"$ne": ""},
+    "$or": [
+        {
+            "accepted_alert_message": False,
+        },
+        {
+            "accepted_alert_message": {
+                "$exists": False
+            }
+        },
+        {
+            "rejected_alert_message": False,
+        },
+        {
+            "rejected_alert_message": {
+                "$exists": False
+            }
+        },
+        {
+            "closed_alert_message": False,
+        },
+        {
+            "closed_alert_message": {
+                "$exists": False
+            }
+        },
+    ]
+}
+
+
+# The following functions match the issue documents selected by the selectors above, so that the documents received
+# from the _changes feed are only dispatched to the tasks that have something to do with them.
+
+def issue_needs_check(doc):
+    if doc.get('type') != 'issue' or doc.get('confirmed') is not True:
+        return False
+    contact_information = doc.get('contact_information') or {}
+    region = doc.get('administrative_region')
+    return (
+        not doc.get('auto_increment_id')
+        or not doc.get('internal_code')
+        or doc.get('citizen') not in (None, '', '*')
+        or contact_information.get('contact') not in (None, '', '*')
+        or not doc.get('assignee')
+        or (isinstance(region, dict) and 'administrative_id' in region and 'path_ids' not in region)
+    )
+
+
+def issue_needs_escalation(doc):
+    return (
+        doc.get('type') == 'issue' and doc.get('confirmed') is True and doc.get('escalate_flag') is True
+        and doc.get('assignee', '') != ''
+    )
+
+
+def issue_needs_sms_message(doc):
+    contact_information = doc.get('contact_information') or {}
+    return (
+        doc.get('type') == 'issue' and doc.get('confirmed') is True and doc.get('assignee', '') != ''
+        and doc.get('tracking_code', '') != '' and doc.get('contact_medium') == CHOICE_CONTACT
+        and contact_information.get('type') == CHOICE_PHONE and contact_information.get('contact', '') != ''
+        and not all(doc.get(f) for f in ('accepted_alert_message', 'rejected_alert_message', 'closed_alert_message'))
+    )
+
+
+def get_issue_ids(grm_db, selector, page_size=ISSUES_BATCH_SIZE):
+    """
+    Returns the ids of all the documents matching the selector, reading them page by page with the bookmark of the
+    previous page. The ids are read before any document is updated so that the pages are not shifted by the
+    updated documents that stop matching the selector.
+    """
+    options = get_query_options(GRM, selector)
+    ids = []
+    bookmark = None
+    while True:
+        if bookmark:
+            options['bookmark'] = bookmark
+        response = grm_db.get_query_result(selector, fields=['_id'], raw_result=True, limit=page_size, **options)
+        ids.extend(doc['_id'] for doc in response['docs'])
+        if len(response['docs']) < page_size:
+            return ids
+        bookmark = response['bookmark']
+
+
+def update_issues(grm_db, issue_ids, update_issue, result, batch_size=ISSUES_BATCH_SIZE, merge_issue=None):
+    """
+    Applies update_issue to the issues by batches of batch_size documents, read with one _bulk_get request and
+    written with bulk_write. update_issue modifies the document it receives and returns the keys of result listing
+    the updates made, where the id of the issue is added once the document is saved. The issues whose update is
+    rejected because they were modified in the meantime are updated again from their latest revision, with
+    merge_issue(latest_doc, issue_doc, updates) if given, which applies the updates of issue_doc to latest_doc and
+    returns the keys of the updates made, or else with update_issue.
+    Returns the number of updated issues.
+    """
+    updated_issues = 0
+    for i in range(0, len(issue_ids), batch_size):
+        updates = {}
+        issue_docs = []
+        for issue_doc in bulk_get(grm_db, issue_ids[i:i + batch_size]):
+            issue_updates = update_issue(issue_doc)
+            if issue_updates:
+                updates[issue_doc['_id']] = issue_updates
+                issue_docs.append(issue_doc)
+
+        def merge(latest_doc, issue_doc):
+            if merge_issue:
+                issue_updates = merge_issue(latest_doc, issue_doc, updates[issue_doc['_id']])
+            else:
+                issue_updates = update_issue(latest_doc)
+            if not issue_updates:
+                return None
+            updates[latest_doc['_id']] = issue_updates
+            return latest_doc
+
+        outcomes = bulk_write(grm_db, issue_docs, merge, max_attempts=ISSUES_UPDATE_MAX_ATTEMPTS)
+        for outcome in outcomes:
+            issue_id = outcome['id']
+            if outcome.get('error') == 'conflict':
+                result['errors'].append(f'Error trying to save issue document with id {issue_id} (conflict)')
+            elif 'error' in outcome:
+                result['errors'].append(f'Error trying to save issue document with id {issue_id}')
+            elif not outcome.get('skipped'):
+                updated_issues += 1
+                for update in updates[issue_id]:
+                    result[update].append(issue_id)
+    return updated_issues
 
 
 @app.task
-def check_issues():
+@record_task_metrics
+def check_issues(issue_ids=None):
     """
-    Check the issues without 'auto_increment_id', 'internal_code' or 'assignee', and try to set a value for these fields
+    Check the issues without 'auto_increment_id', 'internal_code', 'assignee' or path of their region, and try to set a
+    value for these fields
     """
     grm_db = get_db(COUCHDB_GRM_DATABASE)
-    selector = {
-        "type": "issue",
-        "confirmed": True,
-        "$or": [
-            {
-                "auto_increment_id": {
-                    "$in": [
-                        None,
-                        ""
-                    ]
-                }
-            },
-            {
-                "auto_increment_id": {
-                    "$exists": False
-                }
-            },
-            {
-                "internal_code": {
-                    "$in": [
-                        None,
-                        ""
-                    ]
-                }
-            },
-            {
-                "internal_code": {
-                    "$exists": False
-                }
-            },
-            {
-                "citizen": {
-                    "$nin": [
-                        None,
-                        "",
-                        "*"
-                    ]
-                }
-            },
-            {
-                "contact_information.contact": {
-                    "$nin": [
-                        None,
-                        "",
-                        "*"
-                    ]
-                }
-            },
-            {
-                "assignee": {
-                    "$in": [
-                        None,
-                        ""
-                    ]
-                }
-            },
-            {
-                "assignee": {
-                    "$exists": False
-                }
-            }
-        ]
-    }
-
-    issues = grm_db.get_query_result(selector)
+    eadl_db = get_db()
+    if issue_ids is None:
+        issue_ids = get_issue_ids(grm_db, CHECK_ISSUES_SELECTOR)
     result = {
         'errors': [],
         'auto_increment_id_updated': [],
         'internal_code_updated': [],
         'anonymized_data': [],
         'assignee_updated': [],
+        'region_path_updated': [],
     }
-    updated_issues = 0
-    for issue in issues:
-        auto_increment_id_updated = False
-        internal_code_updated = False
-        anonymized_data = False
-        assignee_updated = False
+    categories = get_taxonomy(grm_db, 'issue_category')
+    pending_assignments = {}
+
+    def update_issue(issue_doc):
+        return check_issue(grm_db, eadl_db, issue_doc, categories, result, pending_assignments)
 
-        issue_id = issue['_id']
+    def merge_issue(latest_doc, issue_doc, updates):
+        return merge_checked_issue(eadl_db, latest_doc, issue_doc, updates, result, pending_assignments)
+
+    result['updated_issues'] = update_issues(grm_db, issue_ids, update_issue, result, merge_issue=merge_issue)
+    return result
+
+
+def check_issue(grm_db, eadl_db, issue_doc, categories, result, pending_assignments):
+    """
+    Sets the missing 'auto_increment_id', 'internal_code', 'assignee' and administrative_region.path_ids of the issue
+    document and anonymizes its data. Returns the keys of result listing the updates made to the document.
+    """
+    updates = []
+    if not issue_needs_check(issue_doc):
+        return updates
+    issue_id = issue_doc['_id']
+
+    if 'auto_increment_id' not in issue_doc or not issue_doc['auto_increment_id']:
         try:
-            issue_doc = grm_db[issue_id]
+            auto_increment_id = get_auto_increment_id(grm_db)
+            issue_doc['auto_increment_id'] = auto_increment_id
+            updates.append('auto_increment_id_updated')
         except Exception:
-            error = f'Error trying to get issue document with id {issue_id}'
+            error = f'Error trying to set auto_increment_id of issue document with id {issue_id}'
+            result['errors'].append(error)
+    else:
+        auto_increment_id = issue_doc['auto_increment_id']
+
+    if set_issue_path(get_administrative_tree(eadl_db), issue_doc):
+        updates.append('region_path_updated')
+
+    try:
+        doc_category = categories[issue_doc['category']['id']]
+    except Exception:
+        error = f'Error trying to get the category of issue document with id {issue_id}'
+        result['errors'].append(error)
+        return updates
+
+    if 'internal_code' not in issue_doc or not issue_doc['internal_code']:
+        try:
+            administrative_id = issue_doc["administrative_region"]["administrative_id"]
+            issue_doc['internal_code'] = f'{doc_category["abbreviation"]}-{administrative_id}-{auto_increment_id}'
+            updates.append('internal_code_updated')
+        except Exception:
+            error = f'Error trying to set internal_code for issue document with id {issue_id}'
+            result['errors'].append(error)
+
+    contact_information = issue_doc['contact_information']
+    if issue_doc['citizen'] != '*' or (contact_information and contact_information['contact'] != '*'):
+        try:
+            anonymize_issue_data(issue_doc)
+            updates.append('anonymized_data')
+        except Exception:
+            error = f'Error trying to anonymize issue document with id {issue_id}'
             result['errors'].append(error)
-            return result
 
-        if 'auto_increment_id' not in issue_doc or not issue_doc['auto_increment_id']:
-            try:
-                auto_increment_id = get_auto_increment_id(grm_db)
-                issue_doc['auto_increment_id'] = auto_increment_id
-                auto_increment_id_updated = True
-                result['auto_increment_id_updated'].append(issue_id)
-            except Exception:
-                error = f'Error trying to set auto_increment_id of issue document with id {issue_id}'
-                result['errors'].append(error)
+    if 'assignee' not in issue_doc or not issue_doc['assignee']:
+        try:
+            assignee = get_assignee(grm_db, eadl_db, issue_doc, result['errors'], pending_assignments)
+            issue_doc['assignee'] = assignee
+            if assignee:
+                pending_assignments[assignee['id']] = pending_assignments.get(assignee['id'], 0) + 1
+                updates.append('assignee_updated')
+        except Exception:
+            error = f'Error trying to set assignee for issue document with id {issue_id}'
+            result['errors'].append(error)
+
+    return updates
+
+
+def merge_checked_issue(eadl_db, latest_doc, issue_doc, updates, result, pending_assignments):
+    """
+    Applies the updates made by check_issue to issue_doc to latest_doc, the revision of the issue saved in the
+    meantime, reusing the 'auto_increment_id', 'internal_code' and 'assignee' already set instead of setting them
+    again. The values set in latest_doc in the meantime are kept. Returns the keys of result listing the updates made
+    to latest_doc.
+    """
+    merged_updates = []
+    if 'auto_increment_id_updated' in updates and not latest_doc.get('auto_increment_id'):
+        latest_doc['auto_increment_id'] = issue_doc['auto_increment_id']
+        merged_updates.append('auto_increment_id_updated')
+    # The internal code contains the auto_increment_id it was made with
+    if 'internal_code_updated' in updates and not latest_doc.get('internal_code') \
+            and latest_doc.get('auto_increment_id') == issue_doc.get('auto_increment_id'):
+        latest_doc['internal_code'] = issue_doc['internal_code']
+        merged_updates.append('internal_code_updated')
+    if 'assignee_updated' in updates:
+        if not latest_doc.get('assignee'):
+            latest_doc['assignee'] = issue_doc['assignee']
+            merged_updates.append('assignee_updated')
         else:
-            auto_increment_id = issue_doc['auto_increment_id']
+            # The issue was assigned in the meantime
+            pending_assignments[issue_doc['assignee']['id']] -= 1
 
+    contact_information = latest_doc.get('contact_information') or {}
+    if latest_doc.get('citizen') not in (None, '', '*') or contact_information.get('contact') not in (None, '', '*'):
         try:
-            category_id = issue_doc['category']['id']
-            doc_category = grm_db.get_query_result({
-                "id": category_id,
-                "type": 'issue_category'
-            })[0][0]
+            anonymize_issue_data(latest_doc)
+            merged_updates.append('anonymized_data')
         except Exception:
-            error = f'Error trying to get the category of issue document with id {issue_id}'
+            error = f'Error trying to anonymize issue document with id {latest_doc["_id"]}'
             result['errors'].append(error)
-            continue
-
-        if 'internal_code' not in issue_doc or not issue_doc['internal_code']:
-            try:
-                administrative_id = issue_doc["administrative_region"]["administrative_id"]
-                issue_doc['internal_code'] = f'{doc_category["abbreviation"]}-{administrative_id}-{auto_increment_id}'
-                internal_code_updated = True
-                result['internal_code_updated'].append(issue_id)
-            except Exception:
-                error = f'Error trying to set internal_code for issue document with id {issue_id}'
-                result['errors'].append(error)
-
-        contact_information = issue_doc['contact_information']
-        if issue_doc['citizen'] != '*' or (contact_information and contact_information['contact'] != '*'):
-            try:
-                anonymize_issue_data(issue_doc)
-                anonymized_data = True
-                result['anonymized_data'].append(issue_id)
-            except Exception:
-                error = f'Error trying to anonymize issue document with id {issue_id}'
-                result['errors'].append(error)
-
-        if 'assignee' not in issue_doc or not issue_doc['assignee']:
-            try:
-                eadl_db = get_db()
-                assignee = get_assignee(grm_db, eadl_db, issue_doc, result['errors'])
-                issue_doc['assignee'] = assignee
-                if assignee:
-                    assignee_updated = True
-                    result['assignee_updated'].append(issue_id)
-            except Exception:
-                error = f'Error trying to set assignee for issue document with id {issue_id}'
-                result['errors'].append(error)
-
-        if auto_increment_id_updated or internal_code_updated or anonymized_data or assignee_updated:
-            issue_doc.save()
-            updated_issues += 1
-            grm_db = get_db(COUCHDB_GRM_DATABASE)  # refresh db
-
-    result['updated_issues'] = updated_issues
-    return result
+
+    if set_issue_path(get_administrative_tree(eadl_db), latest_doc):
+        merged_updates.append('region_path_updated')
+    return merged_updates
 
 
 @app.task
-def escalate_issues():
+@record_task_metrics
+def escalate_issues(issue_ids=None):
     grm_db = get_db(COUCHDB_GRM_DATABASE)
-    selector = {
-        "type": "issue",
-        "confirmed": True,
-        "escalate_flag": True,
-        "assignee": {"$ne": ""}
-    }
-
-    issues = grm_db.get_query_result(selector)
+    eadl_db = get_db()
+    if issue_ids is None:
+        issue_ids = get_issue_ids(grm_db, ESCALATE_ISSUES_SELECTOR)
     result = {
         'errors': [],
         'issues_updated': [],
         'scale_is_not_available': [],
     }
-    updated_issues = 0
-    for issue in issues:
-        issues_updated = False
-        issue_id = issue['_id']
-        try:
-            issue_doc = grm_db[issue_id]
-        except Exception:
-            error = f'Error trying to get issue document with id {issue_id}'
-            result['errors'].append(error)
-            continue
-        try:
-            category_id = issue_doc['category']['id']
-            doc_category = grm_db.get_query_result({
-                "id": category_id,
-                "type": 'issue_category'
-            })[0][0]
-            department_id = doc_category['assigned_department']['id']
-            administrative_id = issue_doc['administrative_region']['administrative_id']
-            eadl_db = get_db()
-            assignee = get_assignee_to_escalate(eadl_db, department_id, administrative_id)
-            if assignee:
-                issue_doc['assignee'] = assignee
-                issue_doc['escalate_flag'] = False
-                result['issues_updated'].append(issue_id)
-                issues_updated = True
-            else:
-                result['scale_is_not_available'].append(issue_id)
+    categories = get_taxonomy(grm_db, 'issue_category')
 
-        except Exception:
-            error = f'Error trying to escalate for issue document with id {issue_id}'
-            result['errors'].append(error)
-        if issues_updated:
-            issue_doc.save()
-            updated_issues += 1
-            grm_db = get_db(COUCHDB_GRM_DATABASE)  # refresh db
+    def update_issue(issue_doc):
+        return escalate_issue(eadl_db, issue_doc, categories, result)
 
-    result['updated_issues'] = updated_issues
+    result['updated_issues'] = update_issues(grm_db, issue_ids, update_issue, result)
     return result
 
 
+def escalate_issue(eadl_db, issue_doc, categories, result):
+    if not issue_needs_escalation(issue_doc):
+        return []
+    issue_id = issue_doc['_id']
+    try:
+        doc_category = categories[issue_doc['category']['id']]
+        department_id = doc_category['assigned_department']['id']
+        administrative_id = issue_doc['administrative_region']['administrative_id']
+        assignee = get_assignee_to_escalate(eadl_db, department_id, administrative_id)
+        if assignee:
+            issue_doc['assignee'] = assignee
+            issue_doc['escalate_flag'] = False
+            return ['issues_updated']
+        result['scale_is_not_available'].append(issue_id)
+    except Exception:
+        error = f'Error trying to escalate for issue document with id {issue_id}'
+        result['errors'].append(error)
+    return []
+
+
 @app.task
-def send_sms_message():
+@record_task_metrics
+def send_sms_message(issue_ids=None):
+    grm_db = get_db(COUCHDB_GRM_DATABASE)
+    if issue_ids is None:
+        issue_ids = get_issue_ids(grm_db, SEND_SMS_MESSAGE_SELECTOR)
+    result = {
+        'errors': [],
+        'notified_issues': [],
+    }
+    statuses = get_taxonomy(grm_db, 'issue_status')
+
+    def update_issue(issue_doc):
+        return notify_issue(issue_doc, statuses, result)
+
+    result['updated_issues'] = update_issues(grm_db, issue_ids, update_issue, result)
+    if result['notified_issues']:
+        send_sms_outbox.delay()
+    return result
+
+
+def notify_issue(issue_doc, statuses, result):
+    """
+    Queues the SMS messages of the status of the issue that were not sent yet in the outbox, and flags them as sent
+    in the issue document. The outbox ignores a message queued twice for the same issue and alert, so the issue
+    can be processed again safely if its update is rejected.
+    """
     messages = {
         'accepted_alert_message': _(
             "Your issue submitted has been accepted into the system with the code %s(tracking_code)s"),
@@ -235,124 +445,186 @@ def send_sms_message():
         'closed_alert_message': _(
             "Your issue %s(tracking_code)s has been resolved with the following response: %s(resolution)s"),
     }
+    if not issue_needs_sms_message(issue_doc):
+        return []
+    issue_id = issue_doc['_id']
+    try:
+        status_id = issue_doc['status']['id']
+        doc_status = statuses[status_id]
+    except Exception:
+        error = f'Error trying to get issue_status document of issue document with id {issue_id}'
+        result['errors'].append(error)
+        return []
+
+    tracking_code = issue_doc['tracking_code']
+    phone = get_issue_contact(issue_doc)
+    if not phone:
+        result['errors'].append(f'Error trying to get the phone number of issue document with id {issue_id}')
+        return []
+
+    alerts = []
+    no_alert = 'accepted_alert_message' not in issue_doc or not issue_doc['accepted_alert_message']
+    if no_alert and doc_status['open_status']:
+        msg = messages['accepted_alert_message'] % {'tracking_code': tracking_code}
+        alerts.append(('accepted_alert_message', msg))
+
+    no_alert = 'rejected_alert_message' not in issue_doc or not issue_doc['rejected_alert_message']
+    if no_alert and doc_status['rejected_status']:
+        msg = messages['rejected_alert_message'] % {
+            'tracking_code': tracking_code,
+            'reason': issue_doc['rejected_alert_message'] if 'rejected_alert_message' in issue_doc else ''
+        }
+        alerts.append(('rejected_alert_message', msg))
+
+    no_alert = 'closed_alert_message' not in issue_doc or not issue_doc['closed_alert_message']
+    if no_alert and doc_status['final_status']:
+        msg = messages['closed_alert_message'] % {
+            'tracking_code': tracking_code,
+            'resolution': issue_doc['research_result'] if 'research_result' in issue_doc else ''
+        }
+        alerts.append(('closed_alert_message', msg))
+
+    for alert, msg in alerts:
+        try:
+            queue_sms(f'{issue_id}:{alert}', phone, msg)
+            issue_doc[alert] = True
+        except Exception:
+            result['errors'].append(f'Error trying to queue the {alert} of issue document with id {issue_id}')
+
+    return ['notified_issues'] if any(issue_doc.get(alert) for alert, _msg in alerts) else []
+
+
+@app.task
+def send_sms_outbox():
+    """
+    Sends the due messages of the SMS outbox.
+    """
+    return SmsSender().drain()
+
+
+@app.task
+@record_task_metrics
+def process_issue_changes():
+    """
+    Follows the _changes feed of the GRM database from the last processed sequence, saved in a local document, and
+    runs check_issues, escalate_issues and send_sms_message for the changed issues that need them.
+    The feed is read from the current sequence the first time; the issues changed before are handled by the
+    periodic full runs of the tasks.
+    """
     grm_db = get_db(COUCHDB_GRM_DATABASE)
-    selector = {
-        "type": "issue",
-        "confirmed": True,
-        "assignee": {"$ne": ""},
-        "tracking_code": {"$ne": ""},
-        "contact_medium": CHOICE_CONTACT,
-        "contact_information.type": CHOICE_PHONE,
-        "contact_information.contact": {"$ne": ""},
-        "$or": [
-            {
-                "accepted_alert_message": False,
-            },
-            {
-                "accepted_alert_message": {
-                    "$exists": False
-                }
-            },
-            {
-                "rejected_alert_message": False,
-            },
-            {
-                "rejected_alert_message": {
-                    "$exists": False
-                }
-            },
-            {
-                "closed_alert_message": False,
-            },
-            {
-                "closed_alert_message": {
-                    "$exists": False
-                }
-            },
-        ]
+    checkpoint = get_local_document(grm_db, ISSUE_CHANGES_CHECKPOINT) or {"_id": ISSUE_CHANGES_CHECKPOINT}
+    since = checkpoint.get('last_seq', 'now')
+    result = {
+        'changes': 0,
+        'checked_issues': [],
+        'escalated_issues': [],
+        'notified_issues': [],
+        'errors': [],
     }
+    while True:
+        changes, last_seq = get_changes(grm_db, since, ISSUE_CHANGES_SELECTOR, limit=ISSUES_BATCH_SIZE)
+        docs = [change['doc'] for change in changes if not change.get('deleted') and change.get('doc')]
+        result['changes'] += len(changes)
+
+        for key, task, needs_task in (
+                ('checked_issues', check_issues, issue_needs_check),
+                ('escalated_issues', escalate_issues, issue_needs_escalation),
+                ('notified_issues', send_sms_message, issue_needs_sms_message)):
+            issue_ids = [doc['_id'] for doc in docs if needs_task(doc)]
+            if issue_ids:
+                task_result = task(issue_ids)
+                result[key].extend(issue_ids)
+                result['errors'].extend(task_result['errors'])
+
+        # Save the checkpoint after every batch so that a failure does not process the batches again
+        checkpoint['last_seq'] = last_seq
+        checkpoint['updated_at'] = timezone.now().isoformat()
+        save_local_document(grm_db, checkpoint)
+        since = last_seq
+        if len(changes) < ISSUES_BATCH_SIZE:
+            return result
 
-    issues = grm_db.get_query_result(selector)
+
+@app.task
+@record_task_metrics
+def update_administrative_paths():
+    """
+    Follows the _changes feed of the EADL database from the last processed sequence, saved in a local document, and
+    updates the path_ids and path_names of the changed administrative levels and of their descendants, and the
+    path_ids of the issues of the moved ones.
+    The feed is read from the current sequence the first time; the paths of the regions changed before are set by
+    the backfill_administrative_paths command.
+    """
+    eadl_db = get_db()
+    checkpoint = get_local_document(eadl_db, ADMINISTRATIVE_PATHS_CHECKPOINT)
+    if checkpoint is None:
+        checkpoint = {"_id": ADMINISTRATIVE_PATHS_CHECKPOINT}
+    since = checkpoint.get('last_seq', 'now')
+    tree = get_administrative_tree(eadl_db)
     result = {
+        'changes': 0,
+        'updated_regions': [],
+        'updated_issues': [],
         'errors': [],
-        'notified_issues': [],
     }
-    updated_issues = 0
-    for issue in issues:
-        notified_issues = False
-        issue_id = issue['_id']
-        try:
-            issue_doc = grm_db[issue_id]
-        except Exception:
-            error = f'Error trying to get issue document with id {issue_id}'
-            result['errors'].append(error)
-            continue
-        try:
-            status_id = issue_doc['status']['id']
-            doc_status = grm_db.get_query_result({
-                "id": status_id,
-                "type": 'issue_status'
-            })[0][0]
-        except Exception:
-            error = f'Error trying to get issue_status document with id {status_id}'
-            result['errors'].append(error)
-            continue
-
-        tracking_code = issue_doc['tracking_code']
-        phone = issue_doc['contact_information']['contact']
-
-        no_alert = 'accepted_alert_message' not in issue_doc or not issue_doc['accepted_alert_message']
-        if no_alert and doc_status['open_status']:
-            msg = messages['accepted_alert_message'] % {'tracking_code': tracking_code}
-            try:
-                send_sms(phone, msg)
-                notified_issues = True
-                issue_doc['accepted_alert_message'] = True
-            except TwilioRestException as e:
-                result['errors'].append(e.msg)
-
-        no_alert = 'rejected_alert_message' not in issue_doc or not issue_doc['rejected_alert_message']
-        if no_alert and doc_status['rejected_status']:
-            msg = messages['rejected_alert_message'] % {
-                'tracking_code': tracking_code,
-                'reason': issue_doc['rejected_alert_message'] if 'rejected_alert_message' in issue_doc else ''
-            }
-            try:
-                send_sms(phone, msg)
-                notified_issues = True
-                issue_doc['rejected_alert_message'] = True
-            except TwilioRestException as e:
-                result['errors'].append(e.msg)
-
-        no_alert = 'closed_alert_message' not in issue_doc or not issue_doc['closed_alert_message']
-        if no_alert and doc_status['final_status']:
-            msg = messages['closed_alert_message'] % {
-                'tracking_code': tracking_code,
-                'resolution': issue_doc['research_result'] if 'research_result' in issue_doc else ''
-            }
-            try:
-                send_sms(phone, msg)
-                notified_issues = True
-                issue_doc['closed_alert_message'] = True
-            except TwilioRestException as e:
-                result['errors'].append(e.msg)
-
-        if notified_issues:
-            issue_doc.save()
-            updated_issues += 1
-            grm_db = get_db(COUCHDB_GRM_DATABASE)  # refresh db
-
-    result['updated_issues'] = updated_issues
-    return result
+    grm_db = get_db(COUCHDB_GRM_DATABASE)
+    while True:
+        changes, last_seq = get_changes(
+            eadl_db, since, ADMINISTRATIVE_LEVEL_CHANGES_SELECTOR, limit=ADMINISTRATIVE_CHANGES_BATCH_SIZE)
+        result['changes'] += len(changes)
+        tree.apply_changes(changes)
+        docs = [change.get('doc') or {} for change in changes]
+        if any(change.get('deleted') for change in changes):
+            # The descendants of a deleted region are not known anymore
+            administrative_ids = None
+        else:
+            administrative_ids = [doc['administrative_id'] for doc in docs if 'administrative_id' in doc]
+        if administrative_ids is None or administrative_ids:
+            for outcome in update_region_paths(eadl_db, tree, administrative_ids):
+                if 'error' in outcome:
+                    result['errors'].append(f'Error trying to save administrative level document with id '
+                                            f'{outcome["id"]} ({outcome["error"]})')
+                elif not outcome.get('skipped'):
+                    result['updated_regions'].append(outcome['id'])
+        # The issues of the moved regions are counted in other regions by the issues/statistics view
+        for outcome in update_issue_paths(grm_db, tree, get_moved_regions(tree, docs)):
+            if 'error' in outcome:
+                result['errors'].append(f'Error trying to save issue document with id {outcome["id"]} '
+                                        f'({outcome["error"]})')
+            elif not outcome.get('skipped'):
+                result['updated_issues'].append(outcome['id'])
+
+        checkpoint['last_seq'] = last_seq
+        checkpoint['updated_at'] = timezone.now().isoformat()
+        save_local_document(eadl_db, checkpoint)
+        since = last_seq
+        if len(changes) < ADMINISTRATIVE_CHANGES_BATCH_SIZE:
+            return result
 
 
 @app.on_after_finalize.connect
 def setup_periodic_tasks(sender, **kwargs):
-    # Calls check_issues() every 5 minutes.
-    sender.add_periodic_task(300, check_issues.s(), name='check issues every 5 minutes')
+    # Calls process_issue_changes() every ISSUE_CHANGES_INTERVAL seconds.
+    interval = settings.ISSUE_CHANGES_INTERVAL
+    sender.add_periodic_task(interval, process_issue_changes.s(), name='process issue changes', expires=interval)
+
+    # The full runs only catch up on the changes missed by process_issue_changes (e.g. while the workers were down)
+    interval = settings.ISSUE_FULL_CHECK_INTERVAL
+
+    # Calls check_issues() every ISSUE_FULL_CHECK_INTERVAL seconds.
+    sender.add_periodic_task(interval, check_issues.s(), name='check issues', expires=interval)
+
+    # Calls escalate_issues() every ISSUE_FULL_CHECK_INTERVAL seconds.
+    sender.add_periodic_task(interval, escalate_issues.s(), name='escalate issues', expires=interval)
+
+    # Calls send_sms_message() every ISSUE_FULL_CHECK_INTERVAL seconds.
+    sender.add_periodic_task(interval, send_sms_message.s(), name='send sms', expires=interval)
 
-    # Calls escalate_issues() every 5 minutes.
-    sender.add_periodic_task(300, escalate_issues.s(), name='escalate issues every 5 minutes')
+    # Calls update_administrative_paths() every ADMINISTRATIVE_PATHS_INTERVAL seconds.
+    interval = settings.ADMINISTRATIVE_PATHS_INTERVAL
+    sender.add_periodic_task(
+        interval, update_administrative_paths.s(), name='update administrative paths', expires=interval)
 
-    # Calls send_sms_message() every 5 minutes.
-    sender.add_periodic_task(300, send_sms_message.s(), name='send sms every 5 minutes')
+    # Calls send_sms_outbox() every SMS_OUTBOX_INTERVAL seconds, to send the messages waiting for a retry.
+    interval = settings.SMS_OUTBOX_INTERVAL
+    sender.add_periodic_task(interval, send_sms_outbox.s(), name='send sms outbox', expires=interval)
@@ -5,6 +5,7 @@ from django import template
 from authentication.utils import get_validation_code
 from client import get_db
 from dashboard.grm import CITIZEN_TYPE_CHOICES, CITIZEN_TYPE_CHOICES_ALT, CONTACT_CHOICES, MEDIUM_CHOICES
+from grm.request_lookups import get_request_lookups
 from grm.utils import get_administrative_region_name as get_region_name
 
 register = template.Library()
@@ -139,5 +140,8 @@ def get_hour(date_time):
 
 @register.simple_tag
 def get_administrative_region_name(administrative_id):
+    lookups = get_request_lookups()
+    if lookups is not None:
+        return lookups.get_region_name(administrative_id)
     eadl_db = get_db()
     return get_region_name(eadl_db, administrative_id)
@@ -0,0 +1,129 @@
+import hashlib
+import json
+
+ADMINISTRATIVE_LEVEL_DOC_TYPE = 'administrative_level'
+
+
+class AdministrativeIdGenerator:
+    """
+    Generates the administrative_id of a new region from its parent, its level and its name, so that the same region
+    always gets the same id whichever the process, the order of the rows or the run of the import. The ids are
+    numeric strings of the given number of digits, like the ids created from the clock. An id already used by
+    another region (existing_docs, or generated before) is hashed again with a salt, so the ids never collide.
+    """
+
+    def __init__(self, existing_docs=(), digits=16):
+        self.digits = digits
+        self.keys = {}
+        for doc in existing_docs:
+            self.keys[doc['administrative_id']] = (doc.get('parent_id'), doc['administrative_level'], doc['name'])
+
+    def __call__(self, parent_id, administrative_level, name):
+        key = (parent_id, administrative_level, name)
+        if len(self.keys) >= 10 ** self.digits and key not in self.keys.values():
+            raise ValueError(f'All the administrative ids of {self.digits} digits are used')
+        salt = 0
+        while True:
+            data = json.dumps([parent_id, administrative_level, name, salt], ensure_ascii=False)
+            value = int.from_bytes(hashlib.sha256(data.encode()).digest()[:8], 'big') % 10 ** self.digits
+            # Left padded so that all the ids have the same length
+            administrative_id = str(value).rjust(self.digits, '0')
+            if self.keys.setdefault(administrative_id, key) == key:
+                return administrative_id
+            salt += 1
+
+
+def get_administrative_level_doc_id(parent_id, administrative_level, name):
+    """
+    Returns the _id of the document of the region, derived from its parent and its name so that a region created
+    twice (e.g. by an import run again after a failure) is rejected with a conflict instead of being duplicated.
+    """
+    key = json.dumps([parent_id, administrative_level, name], ensure_ascii=False)
+    return f'administrative_level-{hashlib.sha1(key.encode()).hexdigest()}'
+
+
+class AdministrativeLevelImport:
+    """
+    Computes in memory the documents to create and update to load rows of administrative levels, each row being the
+    names of a region and of its ancestors, from the highest level below the country, e.g.
+    {'Region': 'Savanes', 'Prefecture': 'Kpendjal', 'Commune': 'Kpendjal 1'}.
+    The existing regions are found by (parent_id, administrative_level, name) in the index of the documents given.
+    """
+
+    def __init__(self, docs, country_id, generate_administrative_id=None):
+        self.docs = list(docs)
+        self.country_id = country_id
+        self.generate_administrative_id = generate_administrative_id or AdministrativeIdGenerator(self.docs)
+        self.index = {}
+        self.nodes = {}
+        for doc in self.docs:
+            self.index[(doc.get('parent_id'), doc['administrative_level'], doc['name'])] = doc
+            self.nodes[doc['administrative_id']] = doc
+        self.created = []
+        self.updated = {}
+
+    def add_row(self, levels, latitude, longitude):
+        """
+        levels is the list of (administrative_level, name) of the row. Returns the document of the region of the
+        row.
+        """
+        parent_id = self.country_id
+        doc = None
+        for administrative_level, name in levels:
+            key = (parent_id, administrative_level, name)
+            doc = self.index.get(key)
+            if doc is None:
+                doc = {
+                    "_id": get_administrative_level_doc_id(parent_id, administrative_level, name),
+                    "type": ADMINISTRATIVE_LEVEL_DOC_TYPE,
+                    "administrative_id": self.generate_administrative_id(parent_id, administrative_level, name),
+                    "administrative_level": administrative_level,
+                    "name": name,
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "parent_id": parent_id,
+                }
+                path_ids, path_names = self.get_parent_path(parent_id)
+                doc['path_ids'] = path_ids + [doc['administrative_id']]
+                doc['path_names'] = path_names + [name]
+                self.index[key] = doc
+                self.nodes[doc['administrative_id']] = doc
+                self.created.append(doc)
+            elif not doc.get('latitude') or not doc.get('longitude'):
+                fill_coordinates(doc, latitude, longitude)
+                if '_rev' in doc:
+                    self.updated[doc['_id']] = doc
+            parent_id = doc['administrative_id']
+        return doc
+
+    def get_parent_path(self, parent_id):
+        """
+        Returns the path_ids and path_names of the region parent_id, from the root to the region.
+        """
+        parent = self.nodes.get(parent_id)
+        if parent and parent.get('path_ids'):
+            return list(parent['path_ids']), list(parent['path_names'])
+        path = []
+        while parent is not None and len(path) < len(self.nodes):
+            path.append(parent)
+            parent = self.nodes.get(parent.get('parent_id'))
+        path.reverse()
+        return [doc['administrative_id'] for doc in path], [doc['name'] for doc in path]
+
+    def get_path(self, doc):
+        """
+        Returns the names of the region and of its ancestors below the country, from the highest level.
+        """
+        names = []
+        while doc is not None and doc['administrative_id'] != self.country_id and len(names) < len(self.nodes):
+            names.append(doc['name'])
+            doc = self.nodes.get(doc.get('parent_id'))
+        return list(reversed(names))
+
+
+def fill_coordinates(doc, latitude, longitude):
+    if not doc.get('latitude'):
+        doc['latitude'] = latitude
+    if not doc.get('longitude'):
+        doc['longitude'] = longitude
+    return doc
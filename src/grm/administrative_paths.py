@@ -0,0 +1,105 @@
+from client import bulk_write
+from grm.couchdb_indexes import GRM, get_query_options
+
+
+def get_region_path(tree, administrative_id):
+    """
+    Returns the path_ids and path_names of the region: the administrative_id and the name of the root, of the
+    ancestors and of the region, from the root to the region.
+    """
+    path = tree.get_path(administrative_id)
+    return [doc['administrative_id'] for doc in path], [doc['name'] for doc in path]
+
+
+def set_region_path(tree, doc):
+    """
+    Sets the path_ids and path_names of the document of the region. Returns True if they changed.
+    """
+    path_ids, path_names = get_region_path(tree, doc['administrative_id'])
+    if not path_ids or (doc.get('path_ids'), doc.get('path_names')) == (path_ids, path_names):
+        return False
+    doc['path_ids'] = path_ids
+    doc['path_names'] = path_names
+    return True
+
+
+def get_outdated_regions(tree, administrative_ids=None):
+    """
+    Returns copies of the documents of the regions whose path_ids or path_names are missing or outdated, with the
+    new values, among the regions of administrative_ids and their descendants (a rename or a move changes the paths
+    below the region), or among all the regions if administrative_ids is None.
+    """
+    if administrative_ids is None:
+        candidates = tree.get_descendant_ids(None)
+    else:
+        candidates = []
+        for administrative_id in administrative_ids:
+            if administrative_id in tree:
+                candidates.append(administrative_id)
+                candidates.extend(tree.get_descendant_ids(administrative_id))
+    docs = []
+    for administrative_id in dict.fromkeys(candidates):
+        doc = dict(tree.get(administrative_id))
+        if set_region_path(tree, doc):
+            docs.append(doc)
+    return docs
+
+
+def update_region_paths(eadl_db, tree, administrative_ids=None):
+    """
+    Saves the path_ids and path_names of the outdated regions (see get_outdated_regions). Returns the outcomes of
+    bulk_write.
+    """
+    def merge(latest_doc, doc):
+        return latest_doc if set_region_path(tree, latest_doc) else None
+
+    return bulk_write(eadl_db, get_outdated_regions(tree, administrative_ids), merge)
+
+
+def set_issue_path(tree, doc):
+    """
+    Sets the path_ids of the administrative_region of the issue document, used by the issues/statistics view to count
+    the issue in every region above it, or only its administrative_id if the region is unknown. Returns True if it
+    changed.
+    """
+    region = doc.get('administrative_region')
+    if not isinstance(region, dict) or not region.get('administrative_id'):
+        return False
+    path_ids = get_region_path(tree, region['administrative_id'])[0] or [region['administrative_id']]
+    if region.get('path_ids') == path_ids:
+        return False
+    region['path_ids'] = path_ids
+    return True
+
+
+def get_moved_regions(tree, docs):
+    """
+    Returns the administrative_id of the documents of regions whose stored path_ids differ from their path in the
+    tree (a new region, or a region moved by itself or with an ancestor) and of their descendants.
+    """
+    administrative_ids = []
+    for doc in docs:
+        administrative_id = doc.get('administrative_id')
+        if administrative_id in tree and doc.get('path_ids') != get_region_path(tree, administrative_id)[0]:
+            administrative_ids.append(administrative_id)
+            administrative_ids.extend(tree.get_descendant_ids(administrative_id))
+    return list(dict.fromkeys(administrative_ids))
+
+
+def update_issue_paths(grm_db, tree, administrative_ids):
+    """
+    Saves the path_ids of the issues of the regions of administrative_ids whose path changed. Returns the outcomes of
+    bulk_write.
+    """
+    if not administrative_ids:
+        return []
+    selector = {"type": 'issue', "administrative_region.administrative_id": {"$in": administrative_ids}}
+    docs = [
+        doc for doc in grm_db.get_query_result(selector, page_size=1000, **get_query_options(GRM, selector))
+        if set_issue_path(tree, doc)
+    ]
+
+    def merge(latest_doc, doc):
+        return latest_doc if set_issue_path(tree, latest_doc) else None
+
+    return bulk_write(grm_db, docs, merge)
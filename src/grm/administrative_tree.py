@@ -0,0 +1,287 @@
+import threading
+import time
+
+from django.conf import settings
+
+from client import get_changes
+
+ADMINISTRATIVE_TREE_REFRESH_INTERVAL = getattr(settings, 'ADMINISTRATIVE_TREE_REFRESH_INTERVAL', 10)
+ADMINISTRATIVE_LEVEL_SELECTOR = {"type": 'administrative_level'}
+ADMINISTRATIVE_LEVEL_CHANGES_SELECTOR = {
+    "$or": [
+        ADMINISTRATIVE_LEVEL_SELECTOR,
+        {"_deleted": True},
+    ]
+}
+
+_trees = {}
+_trees_lock = threading.Lock()
+
+
+class AdministrativeTree:
+    """
+    In-memory index of the documents of type=administrative_level.
+
+    Every region is labelled with a nested-set interval (left, right) that contains the intervals of all its
+    descendants, so checking whether a region is inside another one is two integer comparisons. The labels are spaced
+    by LABEL_GAP so new leaves can be labelled in place, without relabelling the whole tree, until the gap under their
+    parent is exhausted. The documents kept in the tree must be treated as read-only.
+    """
+    LABEL_GAP = 2 ** 32
+    NEW_LEAF_GAP = 2 ** 16
+
+    def __init__(self, docs=(), last_seq='0'):
+        self.nodes = {}
+        self.children = {}
+        self.doc_ids = {}
+        self.last_seq = last_seq
+        self.refreshed_at = time.monotonic()
+        self.relabel_count = 0
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._labels = {}
+        self._next_label = 0
+        for doc in docs:
+            self._set_doc(doc)
+        self.reindex()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, administrative_id):
+        return administrative_id in self.nodes
+
+    @classmethod
+    def load(cls, eadl_db):
+        # The update sequence is read first so no change is lost between the query and the first refresh.
+        last_seq = eadl_db.metadata()['update_seq']
+        docs = eadl_db.get_query_result(ADMINISTRATIVE_LEVEL_SELECTOR, page_size=1000)
+        return cls(docs, last_seq)
+
+    def _set_doc(self, doc):
+        doc = dict(doc)
+        administrative_id = doc['administrative_id']
+        previous = self.nodes.get(administrative_id)
+        if previous:
+            self._unlink(administrative_id, previous.get('parent_id'))
+        self.nodes[administrative_id] = doc
+        self.doc_ids[doc['_id']] = administrative_id
+        self.children.setdefault(administrative_id, [])
+        self.children.setdefault(doc.get('parent_id'), []).append(administrative_id)
+
+    def _unlink(self, administrative_id, parent_id):
+        siblings = self.children.get(parent_id, [])
+        if administrative_id in siblings:
+            siblings.remove(administrative_id)
+
+    def _remove_doc(self, doc_id):
+        administrative_id = self.doc_ids.pop(doc_id, None)
+        doc = self.nodes.pop(administrative_id, None)
+        if doc:
+            self._unlink(administrative_id, doc.get('parent_id'))
+            self._labels.pop(administrative_id, None)
+            if self.children.get(administrative_id):
+                # The children of the region become roots
+                self.reindex()
+
+    def get_roots(self):
+        """
+        Returns the administrative_id of the regions without parent.
+        Regions whose parent is missing are treated as roots, as the query based helpers did.
+        """
+        return [i for i, doc in self.nodes.items() if doc.get('parent_id') not in self.nodes]
+
+    def _walk(self, root):
+        seen = set()
+        stack = [root]
+        while stack:
+            administrative_id = stack.pop()
+            if administrative_id in seen:
+                continue
+            seen.add(administrative_id)
+            yield administrative_id
+            stack.extend(reversed(self.children.get(administrative_id, [])))
+
+    def reindex(self):
+        """
+        Relabels every region with spaced nested-set intervals and depths.
+        """
+        with self._lock:
+            labels = {}
+            counter = 0
+            for root in self.get_roots():
+                stack = [(root, 0, False)]
+                while stack:
+                    administrative_id, depth, visited = stack.pop()
+                    if visited:
+                        labels[administrative_id] = (labels[administrative_id][0], counter, depth)
+                        counter += self.LABEL_GAP
+                        continue
+                    if administrative_id in labels:
+                        continue
+                    labels[administrative_id] = (counter, None, depth)
+                    counter += self.LABEL_GAP
+                    stack.append((administrative_id, depth, True))
+                    for child_id in reversed(self.children.get(administrative_id, [])):
+                        stack.append((child_id, depth + 1, False))
+            self._next_label = counter
+            self._labels = labels
+            self.relabel_count += 1
+
+    def add_node(self, doc):
+        """
+        Adds or updates the document of a region. A new leaf is labelled in the free space left under its parent;
+        any other change relabels the whole tree.
+        """
+        with self._lock:
+            administrative_id = doc['administrative_id']
+            previous = self.nodes.get(administrative_id)
+            self._set_doc(doc)
+            if previous:
+                if previous.get('parent_id') != doc.get('parent_id'):
+                    self.reindex()
+                return
+            if self.children.get(administrative_id) or not self._label_leaf(administrative_id):
+                self.reindex()
+
+    def _label_leaf(self, administrative_id):
+        parent_id = self.nodes[administrative_id].get('parent_id')
+        parent_label = self._labels.get(parent_id)
+        if parent_id not in self.nodes:
+            self._labels[administrative_id] = (self._next_label, self._next_label + self.LABEL_GAP, 0)
+            self._next_label += 2 * self.LABEL_GAP
+            return True
+        if not parent_label:
+            return False
+        parent_left, parent_right, parent_depth = parent_label
+        siblings = [i for i in self.children[parent_id] if i != administrative_id and i in self._labels]
+        lower = max([self._labels[i][1] for i in siblings] + [parent_left])
+        if parent_right - lower < 3:
+            return False
+        step = min(self.NEW_LEAF_GAP, (parent_right - lower) // 3)
+        self._labels[administrative_id] = (lower + step, lower + 2 * step, parent_depth + 1)
+        return True
+
+    def apply_changes(self, changes):
+        with self._lock:
+            for change in changes:
+                doc = change.get('doc')
+                if change.get('deleted') or not doc:
+                    self._remove_doc(change['id'])
+                elif doc.get('type') == 'administrative_level' and 'administrative_id' in doc:
+                    self.add_node(doc)
+                else:
+                    self._remove_doc(change['id'])
+
+    def refresh(self, eadl_db):
+        with self._lock:
+            changes, last_seq = get_changes(
+                eadl_db, since=self.last_seq, selector=ADMINISTRATIVE_LEVEL_CHANGES_SELECTOR)
+            self.apply_changes(changes)
+            self.last_seq = last_seq
+            self.refreshed_at = time.monotonic()
+
+    def is_stale(self, interval=ADMINISTRATIVE_TREE_REFRESH_INTERVAL):
+        return time.monotonic() - self.refreshed_at > interval
+
+    def refresh_if_stale(self, eadl_db):
+        """
+        Refreshes the tree if it is stale, unless another caller is already refreshing it: the tree is still read
+        during the refresh, so the other callers use it as it is instead of waiting for the _changes request.
+        """
+        if not self.is_stale() or not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if self.is_stale():
+                self.refresh(eadl_db)
+        finally:
+            self._refresh_lock.release()
+
+    def get(self, administrative_id):
+        return self.nodes.get(administrative_id)
+
+    def get_parent(self, administrative_id):
+        doc = self.nodes.get(administrative_id)
+        if doc and doc.get('parent_id'):
+            return self.nodes.get(doc['parent_id'])
+
+    def get_ancestors(self, administrative_id):
+        """
+        Returns the documents of the ancestors of the region, from its parent to the root.
+        """
+        ancestors = []
+        parent = self.get_parent(administrative_id)
+        while parent and len(ancestors) < len(self.nodes):
+            ancestors.append(parent)
+            parent = self.get_parent(parent['administrative_id'])
+        return ancestors
+
+    def get_path(self, administrative_id):
+        """
+        Returns the documents of the root, of the ancestors and of the region, from the root to the region, or an
+        empty list if the region is unknown.
+        """
+        doc = self.nodes.get(administrative_id)
+        if not doc:
+            return []
+        return list(reversed(self.get_ancestors(administrative_id))) + [doc]
+
+    def get_base_id(self, administrative_id, base_parent_id=None):
+        """
+        Returns the administrative_id of the ancestor of the region (or of the region itself) that is a child of
+        base_parent_id, or a child of the root if base_parent_id is not an ancestor of the region.
+        """
+        base_id = administrative_id
+        for parent in self.get_ancestors(administrative_id):
+            if parent['administrative_id'] == base_parent_id or not self.get_parent(parent['administrative_id']):
+                break
+            base_id = parent['administrative_id']
+        return base_id
+
+    def get_children(self, parent_id):
+        return [self.nodes[i] for i in self.children.get(parent_id, [])]
+
+    def get_depth(self, administrative_id):
+        label = self._labels.get(administrative_id)
+        return label[2] if label else None
+
+    def get_descendant_ids(self, parent_id):
+        """
+        Returns the administrative_id of every region below parent_id, or of every region if parent_id is None.
+        """
+        if parent_id is None:
+            return [i for root in self.get_roots() for i in self._walk(root)]
+        if parent_id not in self.nodes:
+            return []
+        return list(self._walk(parent_id))[1:]
+
+    def is_descendant(self, administrative_id, ancestor_id):
+        label = self._labels.get(administrative_id)
+        ancestor_label = self._labels.get(ancestor_id)
+        if not label or not ancestor_label:
+            return False
+        return ancestor_label[0] < label[0] and label[1] < ancestor_label[1]
+
+
+def get_administrative_tree(eadl_db):
+    """
+    Returns the process-wide AdministrativeTree of the database, loading it on the first call and following the
+    _changes feed of the database when the tree is older than ADMINISTRATIVE_TREE_REFRESH_INTERVAL seconds.
+    """
+    key = eadl_db.database_name
+    with _trees_lock:
+        tree = _trees.get(key)
+    if tree is None:
+        # Loaded without the lock, so the callers of the other databases do not wait; if concurrent callers load the
+        # tree, the first one inserted is kept
+        tree = AdministrativeTree.load(eadl_db)
+        with _trees_lock:
+            tree = _trees.setdefault(key, tree)
+    else:
+        tree.refresh_if_stale(eadl_db)
+    return tree
+
+
+def reset_administrative_trees():
+    with _trees_lock:
+        _trees.clear()
@@ -0,0 +1,341 @@
+"""
+Benchmarks of the hot paths of the GRM on the synthetic datasets of generate_dataset, run on the in-memory CouchDB
+backend. Each scenario is measured on each size of dataset: its wall time, the number of CouchDB requests it sends
+and the peak of the memory it allocates (the allocations of the in-memory server included).
+"""
+import contextvars
+import copy
+import io
+import platform
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from authentication.models import GovernmentWorker, User, get_assignee, government_worker_directory
+from client import bulk_get, bulk_write, get_db
+from dashboard.tasks import CHECK_ISSUES_SELECTOR, ESCALATE_ISSUES_SELECTOR, check_issues, escalate_issues
+from grm.administrative_tree import ADMINISTRATIVE_LEVEL_SELECTOR, reset_administrative_trees
+from grm.couchdb_memory import reset_memory_server
+from grm.couchdb_trace import end_couchdb_trace, get_couchdb_trace, start_couchdb_trace
+from grm.sequences import SequenceAllocator, reset_sequence_allocators
+from grm.taxonomy import reset_taxonomy_caches
+from grm.utils import (
+    belongs_to_region, get_administrative_level_descendants, get_administrative_region_name,
+    get_base_administrative_id, get_related_region_with_specific_level
+)
+
+SEED = 0
+
+# Options of generate_dataset of the datasets
+SIZES = {
+    'small': {'levels': 'region:2,prefecture:3,commune:4,village:5', 'issues': 2000},
+    'medium': {'levels': 'region:4,prefecture:5,commune:6,village:10', 'issues': 20000},
+    'large': {'levels': 'region:5,prefecture:8,commune:10,village:25', 'issues': 100000},
+}
+SAMPLE_SIZE = 100
+AJAX_HEADERS = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+def reset_databases():
+    """
+    Discards the CouchDB databases, the government workers and the process caches of the previous dataset.
+    """
+    reset_memory_server()
+    reset_administrative_trees()
+    reset_taxonomy_caches()
+    reset_sequence_allocators()
+    cache.clear()
+    GovernmentWorker.objects.all().delete()
+    User.objects.all().delete()
+    government_worker_directory.invalidate()
+
+
+def load_dataset(options):
+    reset_databases()
+    arguments = [f'--{name}={value}' for name, value in options.items()]
+    call_command('generate_dataset', f'--seed={SEED}', *arguments, stdout=io.StringIO())
+
+
+def restore_documents(db, originals):
+    """
+    Saves the documents back as they were when they were read, to run a scenario that modifies them again.
+    """
+    latest_docs = {doc['_id']: doc for doc in bulk_get(db, [doc['_id'] for doc in originals])}
+    docs = [{**copy.deepcopy(doc), '_rev': latest_docs[doc['_id']]['_rev']} for doc in originals]
+    bulk_write(db, docs)
+
+
+class Scenario(ABC):
+    """
+    An operation measured on a dataset. prepare() is called once per dataset and setup() before each run, neither
+    of them being measured.
+    """
+    name = None
+
+    def prepare(self):
+        pass
+
+    def setup(self):
+        pass
+
+    @abstractmethod
+    def run(self):
+        pass
+
+
+class HierarchyWalks(Scenario):
+    """
+    The walks of the hierarchy of grm.utils on a sample of villages.
+    """
+    name = 'hierarchy_walks'
+
+    def prepare(self):
+        regions = list(get_db().get_query_result(ADMINISTRATIVE_LEVEL_SELECTOR, page_size=1000))
+        depth = max(len(doc['path_ids']) for doc in regions)
+        villages = [doc for doc in regions if len(doc['path_ids']) == depth]
+        self.villages = random.Random(SEED).sample(villages, min(SAMPLE_SIZE, len(villages)))
+        self.upper_regions = [doc['administrative_id'] for doc in regions if len(doc['path_ids']) == 2]
+        self.level = next(doc['administrative_level'] for doc in regions if len(doc['path_ids']) == depth - 1)
+
+    def run(self):
+        eadl_db = get_db()
+        for village in self.villages:
+            administrative_id = village['administrative_id']
+            get_administrative_region_name(eadl_db, administrative_id)
+            get_related_region_with_specific_level(eadl_db, village, self.level)
+            get_base_administrative_id(eadl_db, administrative_id)
+            for region in self.upper_regions:
+                belongs_to_region(eadl_db, administrative_id, region)
+        for region in self.upper_regions:
+            get_administrative_level_descendants(eadl_db, region, [])
+
+
+class GetAssignee(Scenario):
+    """
+    get_assignee of a sample of the confirmed issues.
+    """
+    name = 'get_assignee'
+
+    def prepare(self):
+        selector = {"type": 'issue', "confirmed": True}
+        issues = list(get_db(settings.COUCHDB_GRM_DATABASE).get_query_result(selector, page_size=1000))
+        self.issues = random.Random(SEED).sample(issues, min(SAMPLE_SIZE, len(issues)))
+
+    def run(self):
+        grm_db, eadl_db = get_db(settings.COUCHDB_GRM_DATABASE), get_db()
+        for issue in self.issues:
+            get_assignee(grm_db, eadl_db, issue)
+
+
+class SequenceAllocations(Scenario):
+    """
+    Ids of a sequence allocated concurrently by the threads of several allocators, one per worker process, with the
+    block size of the auto_increment_id sequence. The threads run in copies of the context of the benchmark, so that
+    their CouchDB requests are recorded by its trace.
+    """
+    name = 'sequence_allocations'
+    processes = 4
+    threads_per_process = 4
+    allocations = 50
+
+    def setup(self):
+        grm_db = get_db(settings.COUCHDB_GRM_DATABASE)
+        self.allocators = [
+            SequenceAllocator(grm_db, self.name, settings.AUTO_INCREMENT_ID_BLOCK_SIZE)
+            for _ in range(self.processes)
+        ]
+
+    def run(self):
+        ids = []
+        lock = threading.Lock()
+
+        def allocate(allocator):
+            allocated = [allocator.next() for _ in range(self.allocations)]
+            with lock:
+                ids.extend(allocated)
+
+        threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(allocate, allocator))
+            for allocator in self.allocators for _ in range(self.threads_per_process)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if len(ids) != len(set(ids)) or len(ids) != len(threads) * self.allocations:
+            raise RuntimeError(f'{self.name} failed: {len(ids)} ids allocated, {len(set(ids))} unique')
+
+
+class IssuesTask(Scenario):
+    """
+    A Celery task processing the issues of its selector, which are restored before each run.
+    """
+    selector = None
+    task = None
+
+    def prepare(self):
+        grm_db = get_db(settings.COUCHDB_GRM_DATABASE)
+        self.originals = [copy.deepcopy(dict(doc)) for doc in grm_db.get_query_result(self.selector, page_size=1000)]
+
+    def setup(self):
+        restore_documents(get_db(settings.COUCHDB_GRM_DATABASE), self.originals)
+
+    def run(self):
+        result = self.task()
+        if result['errors']:
+            raise RuntimeError(f'{self.name} failed: {result["errors"][0]}')
+
+
+class CheckIssues(IssuesTask):
+    name = 'check_issues'
+    selector = CHECK_ISSUES_SELECTOR
+    task = staticmethod(check_issues)
+
+
+class EscalateIssues(IssuesTask):
+    name = 'escalate_issues'
+    selector = ESCALATE_ISSUES_SELECTOR
+    task = staticmethod(escalate_issues)
+
+
+class ViewScenario(Scenario):
+    """
+    Requests of a view by the first government worker, the head of the first department, who works in the whole
+    country.
+    """
+
+    def prepare(self):
+        self.client = Client()
+        worker = GovernmentWorker.objects.select_related('user').order_by('pk').first()
+        self.client.force_login(worker.user)
+
+    def get(self, url, data=None):
+        response = self.client.get(url, data, **AJAX_HEADERS)
+        if response.status_code != 200:
+            raise RuntimeError(f'{self.name} failed: {url} returned {response.status_code}')
+        return response
+
+
+class IssueList(ViewScenario):
+    """
+    The first two pages of the issue list, without and with a filter on the status.
+    """
+    name = 'issue_list_view'
+
+    def run(self):
+        url = reverse('dashboard:grm:issue_list')
+        response = self.get(url)
+        if response.context['next_cursor']:
+            self.get(url, {'cursor': response.context['next_cursor']})
+        self.get(url, {'status': 1})
+
+
+class IssuesStatistics(ViewScenario):
+    """
+    The statistics of all the issues, and of the issues of a year.
+    """
+    name = 'issues_statistics_view'
+
+    def run(self):
+        url = reverse('dashboard:diagnostics:issues_statistics')
+        self.get(url)
+        self.get(url, {'start_date': '01/01/2024', 'end_date': '31/12/2024'})
+
+
+SCENARIOS = [HierarchyWalks, GetAssignee, SequenceAllocations, CheckIssues, EscalateIssues, IssueList, IssuesStatistics]
+
+
+def measure(scenario, repeat):
+    """
+    Runs the scenario once to fill the caches, repeat times to measure its wall time and its CouchDB requests, and
+    once more with tracemalloc, which slows it down, to measure the peak of the memory it allocates.
+    """
+    scenario.setup()
+    scenario.run()
+    wall_times, requests = [], []
+    for _ in range(repeat):
+        scenario.setup()
+        token = start_couchdb_trace()
+        try:
+            start = time.perf_counter()
+            scenario.run()
+            wall_times.append(time.perf_counter() - start)
+            requests.append(len(get_couchdb_trace()))
+        finally:
+            end_couchdb_trace(token)
+
+    scenario.setup()
+    tracemalloc.start()
+    try:
+        current, _ = tracemalloc.get_traced_memory()
+        scenario.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'wall_time': {'min': min(wall_times), 'median': statistics.median(wall_times)},
+        'couchdb_requests': max(requests),
+        'peak_memory': peak - current,
+    }
+
+
+def run_benchmarks(sizes=('small',), scenarios=SCENARIOS, repeat=5, available_sizes=SIZES, log=None):
+    """
+    Returns the results of the scenarios on the datasets of the sizes, as saved in JSON.
+    """
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'seed': SEED,
+        'repeat': repeat,
+        'sizes': {},
+    }
+    for size in sizes:
+        start = time.perf_counter()
+        load_dataset(available_sizes[size])
+        if log:
+            log(f'Generated the {size} dataset in {time.perf_counter() - start:.1f}s')
+        size_results = results['sizes'][size] = {'dataset': available_sizes[size], 'scenarios': {}}
+        for scenario_class in scenarios:
+            scenario = scenario_class()
+            scenario.prepare()
+            size_results['scenarios'][scenario.name] = measurement = measure(scenario, repeat)
+            if log:
+                log(f'  {scenario.name}: {measurement["wall_time"]["median"] * 1000:.1f} ms, '
+                    f'{measurement["couchdb_requests"]} requests, {measurement["peak_memory"] / 1024:.0f} KiB')
+    reset_databases()
+    return results
+
+
+def compare_results(baseline, results, time_tolerance=0.25, memory_tolerance=0.25):
+    """
+    Returns the regressions of the results from the baseline, as (size, scenario, metric, baseline value, value):
+    a median wall time or a peak memory greater than the baseline by more than the tolerance, or more CouchDB
+    requests. The scenarios missing from the baseline are not compared.
+    """
+    metrics = [
+        ('wall_time', lambda measurement: measurement['wall_time']['median'], time_tolerance),
+        ('couchdb_requests', lambda measurement: measurement['couchdb_requests'], 0),
+        ('peak_memory', lambda measurement: measurement['peak_memory'], memory_tolerance),
+    ]
+    regressions = []
+    for size, size_results in results['sizes'].items():
+        baseline_scenarios = baseline.get('sizes', {}).get(size, {}).get('scenarios', {})
+        for name, measurement in size_results['scenarios'].items():
+            if name not in baseline_scenarios:
+                continue
+            for metric, get_value, tolerance in metrics:
+                baseline_value, value = get_value(baseline_scenarios[name]), get_value(measurement)
+                if value > baseline_value * (1 + tolerance):
+                    regressions.append((size, name, metric, baseline_value, value))
+    return regressions
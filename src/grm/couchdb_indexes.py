@@ -0,0 +1,106 @@
+from django.conf import settings
+
+INDEX_DESIGN_DOCUMENT = 'grm-indexes'
+
+EADL = 'eadl'
+GRM = 'grm'
+
+DATABASES = {
+    EADL: settings.COUCHDB_DATABASE,
+    GRM: settings.COUCHDB_GRM_DATABASE,
+}
+
+# JSON indexes required by the Mango selectors of the application, by database.
+# An index is usable by a selector when all the fields of the index are in the selector.
+INDEXES = {
+    EADL: {
+        'type': ['type'],
+        'administrative-level-id': ['type', 'administrative_id'],
+        'administrative-level-parent': ['type', 'parent_id'],
+        'adl-region': ['type', 'administrative_region'],
+        'representative-email': ['representative.email', 'type'],
+    },
+    GRM: {
+        'type': ['type'],
+        'type-id': ['type', 'id'],
+        'issue-auto-increment-id': ['type', 'auto_increment_id'],
+        'issue-confirmed': ['type', 'confirmed'],
+        'issue-intake-date': ['type', 'confirmed', 'intake_date'],
+        # Sort and keyset pagination of dashboard.grm.views.IssueListView
+        'issue-list': ['type', 'confirmed', 'intake_date', 'auto_increment_id'],
+        'issue-assignee': ['type', 'confirmed', 'assignee.id'],
+        'issue-category': ['type', 'confirmed', 'category.id'],
+        'issue-status': ['type', 'confirmed', 'status.id'],
+        'issue-escalate-flag': ['type', 'confirmed', 'escalate_flag'],
+        'issue-contact-medium': ['type', 'confirmed', 'contact_medium'],
+        # Issues whose administrative_region.path_ids must be updated after a region moved
+        'issue-region': ['type', 'administrative_region.administrative_id'],
+    },
+}
+
+# Representative selectors of every query of the application, used to explain which index CouchDB chooses.
+QUERIES = {
+    EADL: {
+        'administrative levels': {"type": 'administrative_level'},
+        'administrative level by id': {"type": 'administrative_level', "administrative_id": '1'},
+        'administrative level children': {"type": 'administrative_level', "parent_id": '1'},
+        'adl village secretary': {
+            "administrative_level": 'village', "administrative_region": '1', "village_secretary": 1, "type": 'adl'
+        },
+        'user by email': {"representative.email": 'user@example.com', "type": {"$in": ['adl', 'major']}},
+        'adl list': {"type": {"$eq": 'adl'}},
+    },
+    GRM: {
+        'taxonomy': {"type": 'issue_category'},
+        'taxonomy by id': {"id": 1, "type": 'issue_category'},
+        'taxonomy by flag': {"open_status": True, "type": 'issue_status'},
+        'issue by auto_increment_id': {"auto_increment_id": 1, "type": 'issue'},
+        'new issue by auto_increment_id': {
+            "auto_increment_id": 1, "reporter.id": 1, "confirmed": False, "type": 'issue'
+        },
+        'issue list': {
+            "type": "issue", "confirmed": True, "auto_increment_id": {"$ne": ""}, "intake_date": {"$gt": None}
+        },
+        'issue list next page': {
+            "type": "issue", "confirmed": True, "auto_increment_id": {"$ne": ""},
+            "intake_date": {"$gt": None, "$lte": '2022-01-01T00:00:00.000000Z'},
+            "$or": [
+                {"intake_date": {"$lt": '2022-01-01T00:00:00.000000Z'}},
+                {"intake_date": '2022-01-01T00:00:00.000000Z', "auto_increment_id": {"$lt": 10}},
+            ]
+        },
+        'issues by intake_date': {
+            "type": "issue", "confirmed": True, "intake_date": {"$gte": '2022-01-01T00:00:00.000000Z'}
+        },
+        'issue list by assignee': {"type": "issue", "confirmed": True, "assignee.id": 1},
+        'issue list by category': {"type": "issue", "confirmed": True, "category.id": 1},
+        'issue list by status': {"type": "issue", "confirmed": True, "status.id": 1},
+        'issues to escalate': {"type": "issue", "confirmed": True, "escalate_flag": True, "assignee": {"$ne": ""}},
+        'issues of regions': {"type": 'issue', "administrative_region.administrative_id": {"$in": ['1', '2']}},
+        'issues to notify': {
+            "type": "issue", "confirmed": True, "contact_medium": 'contact', "contact_information.type": 'phone_number'
+        },
+    },
+}
+
+
+def get_index_name(database, selector):
+    """
+    Returns the use_index hint ("design_document/index_name") of the declared index of the database with the most
+    fields that is usable by the selector, or None if no declared index is usable.
+    """
+    indexes = INDEXES[database]
+    fields = set(selector)
+    for condition in selector.get('$and', []):
+        fields.update(condition)
+    candidates = [name for name, index_fields in indexes.items() if fields.issuperset(index_fields)]
+    if not candidates:
+        return None
+    # On a tie the index declared first wins
+    name = max(candidates, key=lambda i: len(indexes[i]))
+    return f'{INDEX_DESIGN_DOCUMENT}/{name}'
+
+
+def get_query_options(database, selector):
+    index_name = get_index_name(database, selector)
+    return {'use_index': index_name} if index_name else {}
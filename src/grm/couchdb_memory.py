@@ -0,0 +1,1053 @@
+"""
+In-process stand-in for the CouchDB server, selected with COUCHDB_BACKEND = 'memory'. MemoryAdapter is mounted on
+the session of the cloudant client instead of the HTTP adapter and answers the requests of the application from
+memory, so the cloudant documents, queries and views and the raw requests of the client module work unchanged.
+
+It implements the endpoints used by the application: databases, documents and their revisions, attachments,
+_local documents, _all_docs, _local_docs, _bulk_docs, _bulk_get, _changes, the Mango _find, _index and _explain
+endpoints, and the views of couchdb/design through their Python ports (grm.couchdb_views). Strings are collated by
+code point instead of the ICU collation of CouchDB, only the latest revision of the documents is kept and conflicts
+are rejected, never stored.
+"""
+import base64
+import hashlib
+import io
+import json
+import re
+import threading
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from django.conf import settings
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from grm.couchdb_indexes import DATABASES, INDEX_DESIGN_DOCUMENT, INDEXES
+from grm.couchdb_views import DESIGN_DOCUMENTS, MAP_FUNCTIONS, load_design_document
+
+# Default limit of the Mango queries, like CouchDB
+FIND_DEFAULT_LIMIT = 25
+REASONS = {
+    200: 'OK', 201: 'Created', 202: 'Accepted', 206: 'Partial Content', 304: 'Not Modified', 400: 'Bad Request',
+    404: 'Object Not Found', 405: 'Method Not Allowed', 409: 'Conflict', 412: 'Precondition Failed',
+    416: 'Requested Range Not Satisfiable', 500: 'Internal Server Error',
+}
+ALL_DOCS_INDEX = {'ddoc': None, 'name': '_all_docs', 'type': 'special', 'def': {'fields': [{'_id': 'asc'}]}}
+
+_server = None
+_server_lock = threading.Lock()
+
+
+class CouchDBError(Exception):
+
+    def __init__(self, status, error, reason):
+        super().__init__(reason)
+        self.status = status
+        self.error = error
+        self.reason = reason
+
+
+def not_found(reason='missing'):
+    return CouchDBError(404, 'not_found', reason)
+
+
+def conflict():
+    return CouchDBError(409, 'conflict', 'Document update conflict.')
+
+
+def bad_request(reason):
+    return CouchDBError(400, 'bad_request', reason)
+
+
+class _Max:
+    # Sorts after any value, used as the upper bound of the document ids of a view key
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+MAX = _Max()
+
+
+def collation_key(value):
+    """
+    Returns a key sorting the JSON values like the views of CouchDB: null, false, true, numbers, strings, arrays
+    and objects.
+    """
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, list):
+        return (4, tuple(collation_key(item) for item in value))
+    if isinstance(value, dict):
+        return (5, tuple((key, collation_key(item)) for key, item in value.items()))
+    raise TypeError(f'{type(value).__name__} is not a JSON value')
+
+
+# Mango selectors
+
+_MISSING = object()
+
+
+def get_field(doc, path):
+    value = doc
+    for name in path.split('.'):
+        if not isinstance(value, dict) or name not in value:
+            return _MISSING
+        value = value[name]
+    return value
+
+
+def _get_type(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, list):
+        return 'array'
+    return 'object'
+
+
+def _match_operator(value, operator, argument):
+    if operator == '$exists':
+        return (value is not _MISSING) == argument
+    if value is _MISSING:
+        return False
+    if operator == '$eq':
+        return collation_key(value) == collation_key(argument)
+    if operator == '$ne':
+        return collation_key(value) != collation_key(argument)
+    if operator == '$gt':
+        return collation_key(value) > collation_key(argument)
+    if operator == '$gte':
+        return collation_key(value) >= collation_key(argument)
+    if operator == '$lt':
+        return collation_key(value) < collation_key(argument)
+    if operator == '$lte':
+        return collation_key(value) <= collation_key(argument)
+    if operator in ('$in', '$nin'):
+        keys = {collation_key(item) for item in argument}
+        values = value if isinstance(value, list) else [value]
+        found = any(collation_key(item) in keys for item in values)
+        return found if operator == '$in' else not found
+    if operator == '$type':
+        return _get_type(value) == argument
+    if operator == '$regex':
+        return isinstance(value, str) and re.search(argument, value) is not None
+    if operator == '$size':
+        return isinstance(value, list) and len(value) == argument
+    if operator == '$mod':
+        return isinstance(value, int) and not isinstance(value, bool) and value % argument[0] == argument[1]
+    if operator == '$all':
+        return isinstance(value, list) and all(
+            any(collation_key(item) == collation_key(expected) for item in value) for expected in argument)
+    if operator == '$elemMatch':
+        return isinstance(value, list) and any(_match_value(item, argument) for item in value)
+    if operator == '$allMatch':
+        return isinstance(value, list) and bool(value) and all(_match_value(item, argument) for item in value)
+    if operator == '$not':
+        return not _match_value(value, argument)
+    raise bad_request(f'Invalid operator: {operator}')
+
+
+def _match_value(value, condition):
+    if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+        for operator, argument in condition.items():
+            if operator in ('$and', '$or', '$nor'):
+                if not match_selector(value, {operator: argument}):
+                    return False
+            elif not _match_operator(value, operator, argument):
+                return False
+        return True
+    if isinstance(condition, dict) and condition:
+        # Selector of the fields of an object
+        return isinstance(value, dict) and match_selector(value, condition)
+    return _match_operator(value, '$eq', condition)
+
+
+def match_selector(doc, selector):
+    """
+    Returns whether the document matches the Mango selector.
+    """
+    for field, condition in selector.items():
+        if field == '$and':
+            if not all(match_selector(doc, item) for item in condition):
+                return False
+        elif field == '$or':
+            if not any(match_selector(doc, item) for item in condition):
+                return False
+        elif field == '$nor':
+            if any(match_selector(doc, item) for item in condition):
+                return False
+        elif field == '$not':
+            if match_selector(doc, condition):
+                return False
+        elif not _match_value(get_field(doc, field), condition):
+            return False
+    return True
+
+
+def project_fields(doc, fields):
+    projection = {}
+    for field in fields:
+        value = get_field(doc, field)
+        if value is _MISSING:
+            continue
+        target = projection
+        names = field.split('.')
+        for name in names[:-1]:
+            target = target.setdefault(name, {})
+        target[names[-1]] = value
+    return projection
+
+
+# Views
+
+def _add(total, value):
+    if isinstance(total, (int, float)) and isinstance(value, (int, float)):
+        return total + value
+    if isinstance(total, (int, float)) and isinstance(value, list):
+        total = [total]
+    elif isinstance(total, list) and isinstance(value, (int, float)):
+        value = [value]
+    if isinstance(total, list) and isinstance(value, list):
+        # Arrays are summed item by item, the longer array giving the last items
+        longer, shorter = (total, value) if len(total) >= len(value) else (value, total)
+        return [_add(a, b) for a, b in zip(longer, shorter)] + longer[len(shorter):]
+    if isinstance(total, dict) and isinstance(value, dict):
+        return {**total, **value, **{key: _add(total[key], value[key]) for key in total.keys() & value.keys()}}
+    raise CouchDBError(500, 'builtin_reduce_error', 'The _sum function requires that map values be numbers')
+
+
+def _sum(values):
+    total = None
+    for value in values:
+        total = value if total is None else _add(total, value)
+    return 0 if total is None else total
+
+
+def _stats(values):
+    numbers = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise CouchDBError(500, 'builtin_reduce_error', 'The _stats function requires that map values be numbers')
+        numbers.append(value)
+    return {
+        'sum': sum(numbers),
+        'count': len(numbers),
+        'min': min(numbers),
+        'max': max(numbers),
+        'sumsqr': sum(number * number for number in numbers),
+    }
+
+
+REDUCE_FUNCTIONS = {
+    '_count': lambda rows: len(rows),
+    '_sum': lambda rows: _sum([row['value'] for row in rows]),
+    '_stats': lambda rows: _stats([row['value'] for row in rows]),
+    # Exact instead of the HyperLogLog estimate of CouchDB
+    '_approx_count_distinct': lambda rows: len({collation_key(row['key']) for row in rows}),
+}
+
+
+class ViewIndex:
+    """
+    Rows emitted by a map function for the documents of a database, sorted by key and document id, and updated
+    with the documents changed since the last query.
+    """
+
+    def __init__(self, map_function, design_rev):
+        self.map_function = map_function
+        self.design_rev = design_rev
+        self.seq = 0
+        self.sort_keys = []
+        self.rows = {}
+        self.by_doc = {}
+
+    def update(self, database):
+        for doc_id in database.get_changed_ids(self.seq):
+            for sort_key in self.by_doc.pop(doc_id, ()):
+                del self.sort_keys[bisect_left(self.sort_keys, sort_key)]
+                del self.rows[sort_key]
+            record = database.docs[doc_id]
+            if record.deleted or doc_id.startswith('_design/'):
+                continue
+            try:
+                emitted = list(self.map_function(record.get_doc()))
+            except Exception:
+                continue
+            sort_keys = []
+            for i, (key, value) in enumerate(emitted):
+                sort_key = (collation_key(key), doc_id, i)
+                insort(self.sort_keys, sort_key)
+                self.rows[sort_key] = {'id': doc_id, 'key': key, 'value': value}
+                sort_keys.append(sort_key)
+            self.by_doc[doc_id] = sort_keys
+        self.seq = database.update_seq
+
+    def get_rows(self, params):
+        if 'key' in params:
+            params = {**params, 'startkey': params['key'], 'endkey': params['key'], 'inclusive_end': True}
+
+        def lower(key, doc_id):
+            return collation_key(key), '' if doc_id is None else doc_id
+
+        def upper(key, doc_id):
+            return collation_key(key), MAX if doc_id is None else doc_id, MAX
+
+        descending = params.get('descending', False)
+        inclusive_end = params.get('inclusive_end', True)
+        start, end = 0, len(self.sort_keys)
+        if 'startkey' in params:
+            if descending:
+                end = bisect_right(self.sort_keys, upper(params['startkey'], params.get('startkey_docid')))
+            else:
+                start = bisect_left(self.sort_keys, lower(params['startkey'], params.get('startkey_docid')))
+        if 'endkey' in params:
+            endkey, endkey_docid = params['endkey'], params.get('endkey_docid')
+            if descending and inclusive_end:
+                start = bisect_left(self.sort_keys, lower(endkey, endkey_docid))
+            elif descending:
+                start = bisect_right(self.sort_keys, upper(endkey, endkey_docid))
+            elif inclusive_end:
+                end = bisect_right(self.sort_keys, upper(endkey, endkey_docid))
+            else:
+                end = bisect_left(self.sort_keys, lower(endkey, endkey_docid))
+        sort_keys = self.sort_keys[start:max(start, end)]
+        if descending:
+            sort_keys.reverse()
+        return [self.rows[sort_key] for sort_key in sort_keys]
+
+
+def group_rows(rows, group_level):
+    groups = []
+    for row in rows:
+        key = row['key']
+        if group_level is not None and isinstance(key, list):
+            key = key[:group_level]
+        if groups and collation_key(groups[-1][0]) == collation_key(key):
+            groups[-1][1].append(row)
+        else:
+            groups.append((key, [row]))
+    return groups
+
+
+# Databases
+
+class _Attachment:
+    __slots__ = ('content_type', 'data', 'digest', 'revpos')
+
+    def __init__(self, content_type, data, revpos):
+        self.content_type = content_type
+        self.data = data
+        self.digest = 'md5-' + base64.b64encode(hashlib.md5(data).digest()).decode()
+        self.revpos = revpos
+
+    def get_stub(self, include_data=False):
+        stub = {
+            'content_type': self.content_type,
+            'revpos': self.revpos,
+            'digest': self.digest,
+            'length': len(self.data),
+        }
+        if include_data:
+            stub['data'] = base64.b64encode(self.data).decode()
+        else:
+            stub['stub'] = True
+        return stub
+
+
+class _Record:
+    # Latest revision of a document. The dictionaries of a record are replaced, never modified.
+    __slots__ = ('doc', 'attachments', 'deleted', 'seq')
+
+    def __init__(self, doc, attachments, deleted, seq):
+        self.doc = doc
+        self.attachments = attachments
+        self.deleted = deleted
+        self.seq = seq
+
+    @property
+    def rev(self):
+        return self.doc['_rev']
+
+    def get_doc(self, attachments=False):
+        if not self.attachments:
+            return self.doc
+        return {
+            **self.doc,
+            '_attachments': {name: attachment.get_stub(attachments) for name, attachment in self.attachments.items()},
+        }
+
+
+def _get_rev_number(rev):
+    try:
+        return int(rev.split('-', 1)[0])
+    except (AttributeError, ValueError):
+        raise bad_request('Invalid rev format')
+
+
+class MemoryDatabase:
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        self.local_docs = {}
+        # Ids of the documents by the sequence of their latest update, in the order of the updates
+        self.by_seq = {}
+        self.update_seq = 0
+        self.indexes = {}
+        self.views = {}
+
+    def get_changed_ids(self, since):
+        """
+        Returns the ids of the documents updated after the sequence since, in the order of their latest update.
+        """
+        changed = []
+        for seq in reversed(self.by_seq):
+            if seq <= since:
+                break
+            changed.append(self.by_seq[seq])
+        changed.reverse()
+        return changed
+
+    def get_record(self, doc_id):
+        record = self.docs.get(doc_id)
+        if record is None:
+            raise not_found('missing')
+        if record.deleted:
+            raise not_found('deleted')
+        return record
+
+    def save(self, doc, rev=None, new_edits=True):
+        """
+        Saves a revision of the document, doc['_rev'] or rev being the revision it updates. Inline attachments
+        (base64 data) are added, stubs keep the existing attachments and the attachments missing from
+        doc['_attachments'] are deleted.
+        """
+        doc = dict(doc)
+        doc_id = doc.get('_id') or uuid.uuid4().hex
+        if not isinstance(doc_id, str) or (doc_id.startswith('_') and not doc_id.startswith('_design/')):
+            raise bad_request('Only reserved document ids may start with underscore.')
+        rev = doc.pop('_rev', None) or rev
+        current = self.docs.get(doc_id)
+
+        if new_edits:
+            if current is not None and not current.deleted:
+                if rev != current.rev:
+                    raise conflict()
+            elif rev is not None and (current is None or rev != current.rev):
+                raise conflict()
+            rev_number = _get_rev_number(current.rev) + 1 if current is not None else 1
+        elif rev is None:
+            raise bad_request('Document revision is required when new_edits is false')
+        else:
+            rev_number = _get_rev_number(rev)
+
+        attachments = {}
+        for name, attachment in (doc.pop('_attachments', None) or {}).items():
+            if attachment.get('stub'):
+                if current is None or name not in current.attachments:
+                    raise CouchDBError(412, 'missing_stub', f'Missing stub on {name}')
+                attachments[name] = current.attachments[name]
+            else:
+                attachments[name] = _Attachment(
+                    attachment.get('content_type', 'application/octet-stream'),
+                    base64.b64decode(attachment.get('data', '')), rev_number
+                )
+
+        deleted = bool(doc.get('_deleted'))
+        doc.pop('_id', None)
+        if new_edits:
+            body = json.dumps(doc, sort_keys=True).encode()
+            rev = f'{rev_number}-{hashlib.md5((current.rev if current else "").encode() + body).hexdigest()}'
+        doc = {'_id': doc_id, '_rev': rev, **doc}
+        self.update_seq += 1
+        if current is not None:
+            del self.by_seq[current.seq]
+        self.by_seq[self.update_seq] = doc_id
+        self.docs[doc_id] = _Record(doc, {} if deleted else attachments, deleted, self.update_seq)
+        return {'ok': True, 'id': doc_id, 'rev': rev}
+
+    def delete(self, doc_id, rev):
+        record = self.get_record(doc_id)
+        if rev != record.rev:
+            raise conflict()
+        return self.save({'_id': doc_id, '_rev': rev, '_deleted': True})
+
+    def put_attachment(self, doc_id, name, rev, content_type, data):
+        record = self.docs.get(doc_id)
+        if record is not None and not record.deleted:
+            doc = record.get_doc()
+        else:
+            doc = {'_id': doc_id}
+        attachments = dict(doc.get('_attachments', {}))
+        attachments[name] = {'content_type': content_type, 'data': base64.b64encode(data).decode()}
+        return self.save({**doc, '_rev': rev, '_attachments': attachments})
+
+    def delete_attachment(self, doc_id, name, rev):
+        doc = self.get_record(doc_id).get_doc()
+        attachments = dict(doc.get('_attachments', {}))
+        if name not in attachments:
+            raise not_found('Document is missing attachment')
+        del attachments[name]
+        return self.save({**doc, '_rev': rev, '_attachments': attachments})
+
+    def find(self, query):
+        """
+        Returns the result of a Mango query, sorting the documents by _id unless a sort is given. The bookmark of the
+        result is the number of documents skipped by the next page.
+        """
+        selector = query.get('selector')
+        if not isinstance(selector, dict):
+            raise bad_request('selector must be a JSON object')
+        sort = [{field: 'asc'} if isinstance(field, str) else field for field in query.get('sort') or []]
+        limit = query.get('limit', FIND_DEFAULT_LIMIT)
+        skip = query.get('skip', 0)
+        if query.get('bookmark'):
+            try:
+                skip = int(base64.urlsafe_b64decode(query['bookmark'].encode()))
+            except ValueError:
+                raise bad_request('Invalid bookmark value')
+
+        docs = []
+        for doc_id in sorted(self.docs):
+            record = self.docs[doc_id]
+            if record.deleted or doc_id.startswith('_design/'):
+                continue
+            doc = record.get_doc()
+            if match_selector(doc, selector):
+                docs.append(doc)
+        for field, direction in reversed([list(item.items())[0] for item in sort]):
+            # The documents without the sort fields are not in the index used to sort
+            docs = [doc for doc in docs if get_field(doc, field) is not _MISSING]
+            docs.sort(key=lambda doc: collation_key(get_field(doc, field)), reverse=direction == 'desc')
+
+        docs = docs[skip:skip + limit]
+        if query.get('fields'):
+            docs = [project_fields(doc, query['fields']) for doc in docs]
+        bookmark = base64.urlsafe_b64encode(str(skip + len(docs)).encode()).decode()
+        return {'docs': docs, 'bookmark': bookmark}
+
+    def get_index(self, use_index):
+        if isinstance(use_index, list):
+            use_index = '/'.join(use_index)
+        if use_index:
+            ddoc, _, name = use_index.partition('/')
+            for index in self.indexes.values():
+                if index['ddoc'] in (ddoc, f'_design/{ddoc}') and (not name or index['name'] == name):
+                    return index
+        return ALL_DOCS_INDEX
+
+    def create_index(self, ddoc, name, fields):
+        ddoc = ddoc if ddoc.startswith('_design/') else f'_design/{ddoc}'
+        index = {
+            'ddoc': ddoc,
+            'name': name,
+            'type': 'json',
+            'def': {'fields': [field if isinstance(field, dict) else {field: 'asc'} for field in fields]},
+        }
+        result = 'exists' if self.indexes.get((ddoc, name)) == index else 'created'
+        self.indexes[(ddoc, name)] = index
+        return {'result': result, 'id': ddoc, 'name': name}
+
+    def query_view(self, ddoc_id, view_name, params):
+        design = self.get_record(ddoc_id).doc
+        view = design.get('views', {}).get(view_name)
+        if view is None:
+            raise not_found('missing_named_view')
+        map_function = MAP_FUNCTIONS.get((ddoc_id, view_name))
+        if map_function is None:
+            raise CouchDBError(500, 'unknown_view', f'{ddoc_id}/{view_name} has no Python map function')
+        index = self.views.get((ddoc_id, view_name))
+        if index is None or index.design_rev != design['_rev']:
+            index = ViewIndex(map_function, design['_rev'])
+            self.views[(ddoc_id, view_name)] = index
+        index.update(self)
+
+        if 'keys' in params:
+            rows = [row for key in params['keys'] for row in index.get_rows({**params, 'key': key})]
+        else:
+            rows = index.get_rows(params)
+        reduce = view.get('reduce')
+        if reduce and params.get('reduce', True):
+            if reduce not in REDUCE_FUNCTIONS:
+                raise CouchDBError(500, 'unknown_reduce', f'{reduce} is not supported')
+            group_level = params.get('group_level')
+            if params.get('group') or group_level is not None or 'keys' in params:
+                groups = group_rows(rows, group_level)
+            else:
+                groups = [(None, rows)] if rows else []
+            rows = [{'key': key, 'value': REDUCE_FUNCTIONS[reduce](group)} for key, group in groups]
+            return {'rows': self._limit(rows, params)}
+
+        total_rows = len(index.sort_keys)
+        rows = self._limit(rows, params)
+        if params.get('include_docs'):
+            rows = [{**row, 'doc': self._get_doc_or_none(row['id'])} for row in rows]
+        return {'total_rows': total_rows, 'offset': params.get('skip', 0), 'rows': rows}
+
+    def all_docs(self, params):
+        ids = sorted(doc_id for doc_id, record in self.docs.items() if not record.deleted)
+        total_rows = len(ids)
+        if 'keys' in params:
+            rows = []
+            for key in params['keys']:
+                record = self.docs.get(key)
+                if record is None:
+                    rows.append({'key': key, 'error': 'not_found'})
+                elif record.deleted:
+                    rows.append({'id': key, 'key': key, 'value': {'rev': record.rev, 'deleted': True}, 'doc': None})
+                else:
+                    rows.append(self._get_all_docs_row(key, params))
+            return {'total_rows': total_rows, 'offset': 0, 'rows': rows}
+
+        if 'key' in params:
+            params = {**params, 'startkey': params['key'], 'endkey': params['key']}
+        descending = params.get('descending', False)
+        start, end = 0, len(ids)
+        if 'startkey' in params:
+            if descending:
+                end = bisect_right(ids, params['startkey'])
+            else:
+                start = bisect_left(ids, params['startkey'])
+        if 'endkey' in params:
+            inclusive_end = params.get('inclusive_end', True)
+            if descending:
+                start = bisect_left(ids, params['endkey']) if inclusive_end else bisect_right(ids, params['endkey'])
+            else:
+                end = bisect_right(ids, params['endkey']) if inclusive_end else bisect_left(ids, params['endkey'])
+        ids = ids[start:max(start, end)]
+        if descending:
+            ids.reverse()
+        skip = params.get('skip', 0)
+        ids = self._limit(ids, params)
+        return {
+            'total_rows': total_rows,
+            'offset': start + skip,
+            'rows': [self._get_all_docs_row(doc_id, params) for doc_id in ids],
+        }
+
+    def get_local_docs(self, params):
+        ids = sorted(self.local_docs)
+        start = bisect_left(ids, params['startkey']) if 'startkey' in params else 0
+        end = bisect_right(ids, params['endkey']) if 'endkey' in params else len(ids)
+        rows = []
+        for doc_id in self._limit(ids[start:max(start, end)], params):
+            doc = self.local_docs[doc_id]
+            row = {'id': doc_id, 'key': doc_id, 'value': {'rev': doc['_rev']}}
+            if params.get('include_docs'):
+                row['doc'] = doc
+            rows.append(row)
+        # CouchDB does not count the local documents
+        return {'total_rows': None, 'offset': None, 'rows': rows}
+
+    def _get_all_docs_row(self, doc_id, params):
+        record = self.docs[doc_id]
+        row = {'id': doc_id, 'key': doc_id, 'value': {'rev': record.rev}}
+        if params.get('include_docs'):
+            row['doc'] = record.get_doc()
+        return row
+
+    def _get_doc_or_none(self, doc_id):
+        record = self.docs.get(doc_id)
+        return None if record is None or record.deleted else record.get_doc()
+
+    @staticmethod
+    def _limit(rows, params):
+        skip = params.get('skip', 0)
+        limit = params.get('limit')
+        return rows[skip:] if limit is None else rows[skip:skip + limit]
+
+    def get_changes(self, params, body):
+        since = params.get('since', 0)
+        if since == 'now':
+            since = self.update_seq
+        else:
+            since = int(str(since).split('-', 1)[0])
+        selector = body.get('selector') if params.get('filter') == '_selector' else None
+        doc_ids = set(body.get('doc_ids', [])) if params.get('filter') == '_doc_ids' else None
+        limit = params.get('limit')
+
+        results = []
+        last_seq = self.update_seq
+        for doc_id in self.get_changed_ids(since):
+            record = self.docs[doc_id]
+            if doc_ids is not None and doc_id not in doc_ids:
+                continue
+            if selector is not None and not match_selector(record.get_doc(), selector):
+                continue
+            change = {'seq': str(record.seq), 'id': doc_id, 'changes': [{'rev': record.rev}]}
+            if record.deleted:
+                change['deleted'] = True
+            if params.get('include_docs'):
+                change['doc'] = record.get_doc()
+            results.append(change)
+            if limit and len(results) == limit:
+                last_seq = record.seq
+                break
+        return {'results': results, 'last_seq': str(last_seq), 'pending': self.update_seq - int(last_seq)}
+
+    def get_info(self):
+        return {
+            'db_name': self.name,
+            'doc_count': len([record for record in self.docs.values() if not record.deleted]),
+            'doc_del_count': len([record for record in self.docs.values() if record.deleted]),
+            'update_seq': str(self.update_seq),
+        }
+
+
+class MemoryServer:
+    """
+    Databases of the in-memory CouchDB server. The requests are served one at a time.
+    """
+
+    def __init__(self):
+        self.databases = {}
+        self.requests = 0
+        self.lock = threading.RLock()
+
+    def create_database(self, name):
+        with self.lock:
+            if name not in self.databases:
+                self.databases[name] = MemoryDatabase(name)
+            return self.databases[name]
+
+    def get_database(self, name):
+        database = self.databases.get(name)
+        if database is None:
+            raise not_found('Database does not exist.')
+        return database
+
+    def handle(self, method, path, params, headers, body):
+        """
+        Returns the status, headers and body (bytes or JSON value) of the response to a request, path being the
+        encoded path of the URL and body the bytes of the request body.
+        """
+        with self.lock:
+            self.requests += 1
+            try:
+                return self._route(method, path, params, headers, body)
+            except CouchDBError as e:
+                return e.status, {}, {'error': e.error, 'reason': e.reason}
+
+    def _route(self, method, path, params, headers, body):
+        segments = [unquote(segment) for segment in path.split('/') if segment]
+        if not segments:
+            return 200, {}, {'couchdb': 'Welcome', 'version': '3.3.0', 'vendor': {'name': 'grm memory'}}
+        if segments[0] == '_session':
+            return 200, {}, {'ok': True, 'userCtx': {'name': None, 'roles': ['_admin']}}
+        if segments[0] == '_all_dbs':
+            return 200, {}, sorted(self.databases)
+        if segments[0] == '_uuids':
+            return 200, {}, {'uuids': [uuid.uuid4().hex for _ in range(params.get('count', 1))]}
+
+        name = segments[0]
+        if len(segments) == 1:
+            return self._handle_database(method, name, _parse_json(body))
+        database = self.get_database(name)
+        rest = segments[1:]
+        if rest[0] in ('_design', '_local') and len(rest) > 1:
+            # Unencoded slash of the id of design and local documents
+            rest = [f'{rest[0]}/{rest[1]}'] + rest[2:]
+        resource = rest[0]
+
+        if len(rest) > 1 and not resource.startswith('_'):
+            return self._handle_attachment(database, method, resource, '/'.join(rest[1:]), params, headers, body)
+        body = _parse_json(body)
+        if resource.startswith('_local/'):
+            return self._handle_local_document(database, method, resource, body)
+        if resource.startswith('_design/') and len(rest) == 3 and rest[1] == '_view':
+            if method not in ('GET', 'POST'):
+                raise CouchDBError(405, 'method_not_allowed', 'Only GET,POST allowed')
+            return 200, {}, database.query_view(resource, rest[2], {**params, **self._get_keys(method, body)})
+        if resource == '_all_docs':
+            return 200, {}, database.all_docs({**params, **self._get_keys(method, body)})
+        if resource == '_local_docs':
+            return 200, {}, database.get_local_docs(params)
+        if resource == '_bulk_docs':
+            return self._bulk_docs(database, body)
+        if resource == '_bulk_get':
+            return 200, {}, self._bulk_get(database, body)
+        if resource == '_changes':
+            return 200, {}, database.get_changes(params, body or {})
+        if resource == '_find':
+            return 200, {}, database.find(body or {})
+        if resource == '_explain':
+            return 200, {}, self._explain(database, body or {})
+        if resource == '_index':
+            return self._handle_index(database, method, rest, body)
+        if len(rest) > 1 or (resource.startswith('_') and not resource.startswith('_design/')):
+            raise bad_request(f'Unsupported endpoint {"/".join(rest)}')
+        return self._handle_document(database, method, resource, params, headers, body)
+
+    @staticmethod
+    def _get_keys(method, body):
+        if method == 'POST' and body and 'keys' in body:
+            return {'keys': body['keys']}
+        return {}
+
+    def _handle_database(self, method, name, body):
+        if method == 'PUT':
+            if name in self.databases:
+                raise CouchDBError(412, 'file_exists', 'The database could not be created, the file already exists.')
+            self.create_database(name)
+            return 201, {}, {'ok': True}
+        if method == 'DELETE':
+            self.get_database(name)
+            del self.databases[name]
+            return 200, {}, {'ok': True}
+        if method in ('GET', 'HEAD'):
+            return 200, {}, self.get_database(name).get_info()
+        if method == 'POST':
+            if not isinstance(body, dict):
+                raise bad_request('Document must be a JSON object')
+            return 201, {}, self.get_database(name).save(body)
+        raise bad_request(f'Unsupported method {method}')
+
+    @staticmethod
+    def _handle_document(database, method, doc_id, params, headers, body):
+        if method in ('GET', 'HEAD'):
+            record = database.get_record(doc_id)
+            if 'rev' in params and params['rev'] != record.rev:
+                raise not_found('missing')
+            return 200, {'ETag': f'"{record.rev}"'}, record.get_doc(attachments=params.get('attachments', False))
+        if method == 'PUT':
+            if not isinstance(body, dict):
+                raise bad_request('Document must be a JSON object')
+            return 201, {}, database.save({**body, '_id': doc_id}, _get_rev(params, headers))
+        if method == 'DELETE':
+            return 200, {}, database.delete(doc_id, _get_rev(params, headers))
+        raise bad_request(f'Unsupported method {method}')
+
+    @staticmethod
+    def _handle_attachment(database, method, doc_id, name, params, headers, body):
+        rev = _get_rev(params, headers)
+        if method == 'PUT':
+            content_type = headers.get('Content-Type', 'application/octet-stream')
+            return 201, {}, database.put_attachment(doc_id, name, rev, content_type, body or b'')
+        if method == 'DELETE':
+            return 200, {}, database.delete_attachment(doc_id, name, rev)
+        if method not in ('GET', 'HEAD'):
+            raise bad_request(f'Unsupported method {method}')
+
+        attachment = database.get_record(doc_id).attachments.get(name)
+        if attachment is None:
+            raise not_found('Document is missing attachment')
+        etag = f'"{attachment.digest}"'
+        response_headers = {'ETag': etag, 'Accept-Ranges': 'bytes', 'Content-Type': attachment.content_type}
+        if headers.get('If-None-Match') == etag:
+            return 304, response_headers, b''
+        data = attachment.data
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), len(data) - 1) if match.group(2) else len(data) - 1
+            else:
+                start, end = max(0, len(data) - int(match.group(2))), len(data) - 1
+            if start > end:
+                return 416, {'Content-Range': f'bytes */{len(data)}'}, {'error': 'requested_range_not_satisfiable'}
+            response_headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+            return 206, response_headers, data[start:end + 1]
+        return 200, response_headers, data
+
+    @staticmethod
+    def _handle_local_document(database, method, doc_id, body):
+        if method in ('GET', 'HEAD'):
+            if doc_id not in database.local_docs:
+                raise not_found('missing')
+            return 200, {}, database.local_docs[doc_id]
+        if method == 'PUT':
+            current = database.local_docs.get(doc_id)
+            number = _get_rev_number(current['_rev']) + 1 if current else 1
+            rev = f'0-{number}'
+            database.local_docs[doc_id] = {**body, '_id': doc_id, '_rev': rev}
+            return 201, {}, {'ok': True, 'id': doc_id, 'rev': rev}
+        if method == 'DELETE':
+            if database.local_docs.pop(doc_id, None) is None:
+                raise not_found('missing')
+            return 200, {}, {'ok': True, 'id': doc_id, 'rev': '0-0'}
+        raise bad_request(f'Unsupported method {method}')
+
+    @staticmethod
+    def _bulk_docs(database, body):
+        new_edits = body.get('new_edits', True)
+        results = []
+        for doc in body.get('docs', []):
+            try:
+                results.append(database.save(doc, new_edits=new_edits))
+            except CouchDBError as e:
+                results.append({'id': doc.get('_id'), 'error': e.error, 'reason': e.reason})
+        return 201, {}, results
+
+    @staticmethod
+    def _bulk_get(database, body):
+        results = []
+        for item in body.get('docs', []):
+            doc_id = item.get('id')
+            record = database.docs.get(doc_id)
+            if record is None or (item.get('rev') and item['rev'] != record.rev):
+                error = {'id': doc_id, 'rev': item.get('rev', 'undefined'), 'error': 'not_found', 'reason': 'missing'}
+                results.append({'id': doc_id, 'docs': [{'error': error}]})
+            else:
+                results.append({'id': doc_id, 'docs': [{'ok': record.get_doc()}]})
+        return {'results': results}
+
+    @staticmethod
+    def _explain(database, body):
+        return {
+            'dbname': database.name,
+            'index': database.get_index(body.get('use_index')),
+            'selector': body.get('selector'),
+            'opts': {key: value for key, value in body.items() if key != 'selector'},
+            'limit': body.get('limit', FIND_DEFAULT_LIMIT),
+            'skip': body.get('skip', 0),
+            'fields': body.get('fields', 'all_fields'),
+        }
+
+    @staticmethod
+    def _handle_index(database, method, rest, body):
+        if method == 'GET':
+            indexes = [ALL_DOCS_INDEX] + list(database.indexes.values())
+            return 200, {}, {'total_rows': len(indexes), 'indexes': indexes}
+        if method == 'POST':
+            return 200, {}, database.create_index(body['ddoc'], body['name'], body['index']['fields'])
+        if method == 'DELETE' and len(rest) == 4:
+            ddoc = rest[1] if rest[1].startswith('_design/') else f'_design/{rest[1]}'
+            if database.indexes.pop((ddoc, rest[3]), None) is None:
+                raise not_found('Index not found')
+            return 200, {}, {'ok': True}
+        raise bad_request(f'Unsupported method {method}')
+
+
+def _get_rev(params, headers):
+    return params.get('rev') or headers.get('If-Match', '').strip('"') or None
+
+
+def _parse_json(body):
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise bad_request('invalid UTF-8 JSON')
+
+
+def _parse_params(query):
+    params = {}
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key in ('key', 'keys', 'startkey', 'start_key', 'endkey', 'end_key'):
+            params[key.replace('_key', 'key')] = json.loads(value)
+        elif key in ('limit', 'skip', 'group_level', 'count'):
+            params[key] = int(value)
+        elif value in ('true', 'false'):
+            params[key] = value == 'true'
+        else:
+            params[key] = value
+    return params
+
+
+def _read_body(body):
+    if body is None:
+        return b''
+    if isinstance(body, str):
+        return body.encode()
+    if isinstance(body, bytes):
+        return body
+    if hasattr(body, 'read'):
+        data = body.read()
+        return data.encode() if isinstance(data, str) else data
+    return b''.join(chunk.encode() if isinstance(chunk, str) else chunk for chunk in body)
+
+
+class MemoryAdapter(BaseAdapter):
+    """
+    Transport adapter answering the requests of the cloudant client with a MemoryServer, the process-wide one
+    by default.
+    """
+
+    def __init__(self, server=None):
+        super().__init__()
+        self.server = server
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        server = self.server or get_memory_server()
+        url = urlsplit(request.url)
+        status, headers, content = server.handle(
+            request.method, url.path, _parse_params(url.query), request.headers, _read_body(request.body)
+        )
+        return self.build_response(request, status, headers, content)
+
+    @staticmethod
+    def build_response(request, status, headers, content):
+        response = Response()
+        response.status_code = status
+        response.reason = REASONS.get(status, '')
+        response.headers = CaseInsensitiveDict(headers)
+        if not isinstance(content, bytes):
+            content = json.dumps(content).encode()
+            response.headers['Content-Type'] = 'application/json'
+            response.encoding = 'utf-8'
+        if request.method == 'HEAD':
+            response.headers['Content-Length'] = str(len(content))
+            content = b''
+        else:
+            response.headers['Content-Length'] = str(len(content))
+        response.raw = io.BytesIO(content)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def create_memory_server():
+    """
+    Returns a MemoryServer with the databases of the settings, their design documents and their Mango indexes,
+    as after sync_design_documents and sync_couchdb_indexes.
+    """
+    server = MemoryServer()
+    for name in (settings.COUCHDB_DATABASE, settings.COUCHDB_ATTACHMENT_DATABASE, settings.COUCHDB_GRM_DATABASE,
+                 settings.COUCHDB_GRM_ATTACHMENT_DATABASE):
+        server.create_database(name)
+    for database, names in DESIGN_DOCUMENTS.items():
+        db = server.databases[DATABASES[database]]
+        for name in names:
+            design_document = load_design_document(name)
+            current = db.docs.get(design_document['_id'])
+            db.save({**design_document, '_rev': current.rev if current else None})
+        for name, fields in INDEXES[database].items():
+            db.create_index(INDEX_DESIGN_DOCUMENT, name, fields)
+    return server
+
+
+def get_memory_server():
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = create_memory_server()
+        return _server
+
+
+def reset_memory_server():
+    """
+    Discards the databases of the process-wide server, recreated empty on the next request.
+    """
+    global _server
+    with _server_lock:
+        _server = None
@@ -0,0 +1,167 @@
+import json
+import logging
+import threading
+from contextvars import ContextVar
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+COUCHDB_QUERY_BUDGET = getattr(settings, 'COUCHDB_QUERY_BUDGET', 50)
+COUCHDB_REPEATED_QUERY_THRESHOLD = getattr(settings, 'COUCHDB_REPEATED_QUERY_THRESHOLD', 5)
+
+_trace = ContextVar('couchdb_trace', default=None)
+
+
+def get_selector_shape(value):
+    """
+    Returns the selector with its values replaced by "?", keeping the fields and the operators, so that the queries
+    that only differ by their values have the same shape.
+    """
+    if isinstance(value, dict):
+        return {key: get_selector_shape(item) for key, item in value.items()}
+    if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+        # The conditions of $and, $or, $nor and $elemMatch
+        return [get_selector_shape(item) for item in value]
+    return '?'
+
+
+def get_path_shape(segments):
+    """
+    Returns the path below the database with the ids of the documents and the names of the attachments replaced by
+    placeholders, e.g. /{doc}/{attachment}, /_design/issues/_view/statistics or /_local/{doc}.
+    """
+    if not segments:
+        return ''
+    if segments[0] == '_local':
+        return '/_local/{doc}'
+    if segments[0].startswith('_'):
+        return '/' + '/'.join(segments)
+    return '/{doc}' + ('/{attachment}' if len(segments) > 1 else '')
+
+
+def _get_body_size(body):
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return 0
+
+
+def get_call(method, path, request_body, status, duration, response_bytes):
+    """
+    Returns the call recorded in the traces for a request, path being the path of the URL below the server.
+    """
+    segments = [unquote(segment) for segment in path.strip('/').split('/') if segment]
+    if not segments or segments[0].startswith('_'):
+        # Requests to the server, like /_session
+        database, shape = None, f'{method} /{"/".join(segments)}'
+    else:
+        database = segments[0]
+        shape = f'{method} /{{db}}{get_path_shape(segments[1:])}'
+        if segments[1:] in (['_find'], ['_explain']) and request_body:
+            try:
+                selector = json.loads(request_body)['selector']
+                shape = f'{shape} {json.dumps(get_selector_shape(selector), sort_keys=True)}'
+            except (KeyError, TypeError, ValueError):
+                pass
+    return {
+        "method": method,
+        "database": database,
+        "shape": shape,
+        "status": status,
+        "duration": duration,
+        "request_bytes": _get_body_size(request_body),
+        "response_bytes": response_bytes,
+    }
+
+
+class CouchDBTrace:
+    """
+    CouchDB requests sent while processing a request or a task, as {"method", "database", "shape", "status",
+    "duration", "request_bytes", "response_bytes"}: the shape is the method and the path of the request, with the
+    shape of the selector of the _find requests, so that the requests repeated with other values are counted
+    together. The duration is the time until the headers of the response are received.
+    The requests recorded by a trace started while another one is active are also recorded by the other one.
+    The threads started in a copy of the context of the trace, e.g. with contextvars.copy_context().run, record
+    their requests in it too.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.calls = []
+        self.shape_counts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.calls)
+
+    @property
+    def duration(self):
+        return sum(call['duration'] for call in self.calls)
+
+    def add(self, call):
+        with self._lock:
+            self.calls.append(call)
+            self.shape_counts[call['shape']] = self.shape_counts.get(call['shape'], 0) + 1
+
+    def get_repeated_shapes(self, threshold=COUCHDB_REPEATED_QUERY_THRESHOLD):
+        """
+        Returns the shapes of the requests sent at least threshold times, with their number, the most sent first.
+        """
+        repeated = [(shape, count) for shape, count in self.shape_counts.items() if count >= threshold]
+        return sorted(repeated, key=lambda item: -item[1])
+
+    def get_server_timing(self):
+        """
+        Returns the Server-Timing metric of the CouchDB requests, e.g. couchdb;dur=12.5;desc="3 requests".
+        """
+        return f'couchdb;dur={self.duration * 1000:.1f};desc="{len(self.calls)} requests"'
+
+    def log_warnings(self, name, budget=COUCHDB_QUERY_BUDGET, threshold=COUCHDB_REPEATED_QUERY_THRESHOLD):
+        """
+        Logs a warning if more requests than the budget were sent, and for each request sent threshold times or
+        more, name identifying what sent them (e.g. the method and the path of the request).
+        """
+        if budget and len(self.calls) > budget:
+            logger.warning('%s sent %d CouchDB requests in %.1f ms, more than the budget of %d',
+                           name, len(self.calls), self.duration * 1000, budget)
+        for shape, count in self.get_repeated_shapes(threshold) if threshold else []:
+            logger.warning('%s sent the same CouchDB request %d times: %s', name, count, shape)
+
+
+def get_couchdb_trace():
+    """
+    Returns the CouchDBTrace of the request being processed, or None if the requests are not traced.
+    """
+    return _trace.get()
+
+
+def start_couchdb_trace():
+    return _trace.set(CouchDBTrace(_trace.get()))
+
+
+def end_couchdb_trace(token):
+    _trace.reset(token)
+
+
+def trace_response(response, *args, **kwargs):
+    """
+    Response hook of the session of the CouchDB client, recording the requests sent while a trace is started.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return
+    request = response.request
+    path = urlsplit(request.url).path
+    base_path = urlsplit(settings.COUCHDB_URL).path.rstrip('/')
+    if base_path and path.startswith(base_path):
+        path = path[len(base_path):]
+    try:
+        response_bytes = int(response.headers.get('Content-Length', 0))
+    except ValueError:
+        response_bytes = 0
+    call = get_call(request.method, path, request.body, response.status_code, response.elapsed.total_seconds(),
+                    response_bytes)
+    while trace is not None:
+        trace.add(call)
+        trace = trace.parent
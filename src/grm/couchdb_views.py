@@ -0,0 +1,202 @@
+"""
+Python ports of the map functions of the design documents of couchdb/design, used by the in-memory CouchDB backend
+(grm.couchdb_memory) instead of a JavaScript engine. A map function receives the document as returned by CouchDB
+and yields the (key, value) pairs emitted by its JavaScript counterpart. An exception skips the document, like an
+exception raised by a JavaScript map function.
+"""
+import json
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from grm.couchdb_indexes import EADL, GRM
+
+DESIGN_DIR = settings.BASE_DIR.parent / 'couchdb' / 'design'
+
+# Design documents of couchdb/design, by database
+DESIGN_DOCUMENTS = {
+    EADL: ['communes', 'eadl', 'phases', 'tasks'],
+    GRM: ['issues'],
+}
+
+# Value of the missing properties, undefined in JavaScript
+UNDEFINED = object()
+
+
+def load_design_document(name):
+    with open(DESIGN_DIR / f'{name}.json') as f:
+        return json.load(f)
+
+
+def truthy(value):
+    """
+    Truthiness of a JavaScript value: empty arrays and objects are true.
+    """
+    if value is UNDEFINED:
+        return False
+    if isinstance(value, (list, dict)):
+        return True
+    return bool(value)
+
+
+def get_time(value):
+    """
+    Returns new Date(value).getTime(), the milliseconds since the epoch of an ISO 8601 date or a timestamp, or None
+    (NaN, serialized as null) if the date is invalid. Dates without a timezone are read in UTC, the timezone CouchDB
+    runs its JavaScript in.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, bool) or value is UNDEFINED:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        date = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp() * 1000)
+
+
+def get_date(value):
+    time = get_time(value)
+    if time is None:
+        return None
+    return datetime.fromtimestamp(time / 1000, timezone.utc)
+
+
+def adl_tasks(doc):
+    for phase in doc['phases']:
+        for task in phase['tasks']:
+            yield phase, task
+
+
+# communes
+
+def communes_total_count(doc):
+    if doc.get('type') == 'administrative_level' and doc.get('parent_id', UNDEFINED) is None:
+        yield doc['_id'], 1
+
+
+def communes_served(doc):
+    if doc.get('type') == 'adl':
+        for phase, task in adl_tasks(doc):
+            if task.get('status') != 'not-started':
+                yield doc.get('administrative_region'), 1
+
+
+def communes_updated_tasks(doc):
+    if doc.get('type') == 'adl':
+        for phase, task in adl_tasks(doc):
+            if truthy(task.get('updated_at')):
+                yield [doc.get('administrative_region'), doc.get('name')], 1
+
+
+# eadl
+
+def eadl_all_communes(doc):
+    if doc.get('type') == 'administrative_level' and doc.get('administrative_level') == 'commune':
+        yield doc['_id'], doc
+
+
+# issues
+
+def issues_auto_increment_id_stats(doc):
+    if doc.get('type') == 'issue' and truthy(doc.get('auto_increment_id')):
+        yield doc['_id'], doc['auto_increment_id']
+
+
+def issues_by_assignee_stats(doc):
+    if doc.get('type') == 'issue' and truthy(doc.get('confirmed')):
+        assignee = 0
+        if truthy(doc.get('assignee')):
+            assignee = doc['assignee'].get('id')
+        yield assignee, 1
+
+
+def issues_group_by_assignee(doc):
+    if doc.get('type') == 'issue' and truthy(doc.get('confirmed')) and doc['status'].get('name') != 'Closed' \
+            and truthy(doc.get('assignee')) and truthy(doc.get('category')):
+        yield [doc['category'].get('assigned_department'), doc['assignee'].get('id'), doc['assignee'].get('name')], None
+
+
+def issues_statistics(doc):
+    if doc.get('type') == 'issue' and truthy(doc.get('confirmed')) and truthy(doc.get('auto_increment_id')) \
+            and truthy(doc.get('intake_date')):
+        region = doc.get('administrative_region')
+        status = doc.get('status')
+        issue_type = doc.get('issue_type')
+        category = doc.get('category')
+        if truthy(region) and truthy(region.get('path_ids')) and region['path_ids']:
+            path = region['path_ids']
+        else:
+            path = [region.get('administrative_id') if truthy(region) else None]
+        day = doc['intake_date'][:10]
+        values = [
+            status.get('id') if truthy(status) else None,
+            issue_type.get('id') if truthy(issue_type) else None,
+            category.get('id') if truthy(category) else None,
+        ]
+        for i, administrative_id in enumerate(path):
+            child = path[i + 1] if i + 1 < len(path) else administrative_id
+            yield [administrative_id, 'month', day[:7], child] + values, 1
+            yield [administrative_id, 'day', day, child] + values, 1
+
+
+# phases
+
+def phases_tasks_by_month(doc):
+    if doc.get('type') == 'adl':
+        for phase in doc['phases']:
+            tasks = phase['tasks']
+            completed_tasks = len([task for task in tasks if task.get('status') == 'completed'])
+            date = phase.get('closed_at', UNDEFINED)
+            if not truthy(date):
+                date = phase.get('opened_at', UNDEFINED)
+            d = get_date(date)
+            yield [d.year if d else None, d.month if d else None, phase.get('title')], [completed_tasks, len(tasks)]
+
+
+# tasks
+
+def adl_updated_tasks(doc):
+    if doc.get('type') == 'adl':
+        for phase, task in adl_tasks(doc):
+            if truthy(task.get('updated_at')) and task.get('status') != 'not-started':
+                yield phase, task, get_time(task['updated_at'])
+
+
+def tasks_updated(doc):
+    for phase, task, time in adl_updated_tasks(doc):
+        value = {'task': task, 'phase': phase, 'administrative_region': doc.get('name')}
+        yield [time, doc.get('administrative_region')], value
+
+
+def tasks_updated_by_administrative_region_stats(doc):
+    for phase, task, time in adl_updated_tasks(doc):
+        yield doc.get('administrative_region'), time
+
+
+def tasks_updated_by_administrative_region(doc):
+    for phase, task, time in adl_updated_tasks(doc):
+        value = {'task': task, 'phase': phase, 'administrative_region': doc.get('name')}
+        yield [doc.get('administrative_region'), time], value
+
+
+# Map functions by design document id and view name
+MAP_FUNCTIONS = {
+    ('_design/communes', 'total_count'): communes_total_count,
+    ('_design/communes', 'served'): communes_served,
+    ('_design/communes', 'updated_tasks'): communes_updated_tasks,
+    ('_design/eadl', 'all_communes'): eadl_all_communes,
+    ('_design/issues', 'auto_increment_id_stats'): issues_auto_increment_id_stats,
+    ('_design/issues', 'by_assignee_stats'): issues_by_assignee_stats,
+    ('_design/issues', 'group_by_assignee'): issues_group_by_assignee,
+    ('_design/issues', 'statistics'): issues_statistics,
+    ('_design/phases', 'tasks_by_month'): phases_tasks_by_month,
+    ('_design/tasks', 'updated'): tasks_updated,
+    ('_design/tasks', 'updated_by_administrative_region_stats'): tasks_updated_by_administrative_region_stats,
+    ('_design/tasks', 'updated_by_administrative_region'): tasks_updated_by_administrative_region,
+}
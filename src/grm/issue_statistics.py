@@ -0,0 +1,119 @@
+from datetime import date, timedelta
+
+STATISTICS_DESIGN_DOCUMENT = 'issues'
+STATISTICS_VIEW = 'statistics'
+# Number of fields of the keys of the rows of the view: region, period, child region, status, type and category
+STATISTICS_GROUP_LEVEL = 7
+
+
+def _get_month(day):
+    return date.fromisoformat(f'{day[:7]}-01')
+
+
+def get_period_ranges(start_day=None, end_day=None):
+    """
+    Returns the ranges of periods of the issues/statistics view counting the issues from start_day to end_day
+    (YYYY-MM-DD, both included, None for no bound), as ('month' or 'day', first, last) with first or last None for no
+    bound: the complete months, and the days of the incomplete months at both ends, so at most 3 ranges.
+    """
+    if start_day and end_day and start_day > end_day:
+        return []
+    first_month = last_month = None
+    if start_day:
+        first_month = _get_month(start_day)
+        if start_day[8:] != '01':
+            first_month = (first_month + timedelta(days=31)).replace(day=1)
+    if end_day:
+        last_month = _get_month(end_day)
+        if (date.fromisoformat(end_day) + timedelta(days=1)).day != 1:
+            last_month = (last_month - timedelta(days=1)).replace(day=1)
+    if first_month and last_month and first_month > last_month:
+        return [('day', start_day, end_day)]
+
+    ranges = []
+    if first_month and start_day != first_month.isoformat():
+        ranges.append(('day', start_day, (first_month - timedelta(days=1)).isoformat()))
+    ranges.append(('month', first_month and first_month.isoformat()[:7], last_month and last_month.isoformat()[:7]))
+    if last_month and end_day[:7] != last_month.isoformat()[:7]:
+        ranges.append(('day', _get_month(end_day).isoformat(), end_day))
+    return ranges
+
+
+def get_issue_statistics_rows(grm_db, regions, start_day=None, end_day=None):
+    """
+    Returns the rows of the issues/statistics view of the issues of the regions between two days (YYYY-MM-DD, both
+    included), grouped by [region, period, child region, status id, type id, category id] where the child region is
+    the child of the region the issue belongs to (or the region itself for its own issues). The view counts each
+    issue in every region of its path, so the rows of a region are read with at most 3 range requests
+    (see get_period_ranges) and their number depends on the children of the region, the taxonomies and the number of
+    months, not on the number of issues or of regions below the children.
+    """
+    rows = []
+    for region in regions:
+        for period, first, last in get_period_ranges(start_day, end_day):
+            startkey = [region, period] + ([first] if first else [])
+            endkey = [region, period] + ([last] if last else []) + [{}]
+            rows.extend(grm_db.get_view_result(
+                STATISTICS_DESIGN_DOCUMENT, STATISTICS_VIEW, raw_result=True, group_level=STATISTICS_GROUP_LEVEL,
+                startkey=startkey, endkey=endkey)['rows'])
+    return rows
+
+
+def aggregate_issue_statistics(rows, tree, category=None, issue_type=None, names=None):
+    """
+    Sums the rows of get_issue_statistics_rows by child region, status, type and category. names maps 'status',
+    'type' and 'category' to dictionaries of the names by id.
+    """
+    names = names or {}
+    stats = {
+        'region_stats': {},
+        'status_stats': {},
+        'type_stats': {},
+        'category_stats': {},
+    }
+
+    def fill_count(key, stats: dict, count, name=None):
+        if key in stats:
+            stats[key]['count'] = stats[key]['count'] + count
+        else:
+            stats[key] = {
+                'count': count
+            }
+        if name:
+            stats[key]['name'] = name
+
+    total_issues = 0
+    for row in rows:
+        _, _, _, administrative_id, status_id, type_id, category_id = row['key']
+        if category is not None and category_id != category:
+            continue
+        if issue_type is not None and type_id != issue_type:
+            continue
+
+        count = row['value']
+        total_issues += count
+        fill_count(administrative_id, stats['region_stats'], count)
+        fill_count(status_id, stats['status_stats'], count, names.get('status', {}).get(status_id))
+        fill_count(type_id, stats['type_stats'], count, names.get('type', {}).get(type_id))
+        fill_count(category_id, stats['category_stats'], count, names.get('category', {}).get(category_id))
+
+    for key_stats in stats.values():
+        for k in key_stats:
+            key_stats[k]['percentage'] = round(key_stats[k]['count'] * 100 / total_issues)
+            key_stats[k]['issues'] = key_stats[k]['count']
+
+    region_stats = stats['region_stats']
+    without_administrative_level_docs = True
+    for administrative_id in region_stats:
+        doc = tree.get(administrative_id)
+        if not doc:
+            continue
+        without_administrative_level_docs = False
+        data = region_stats[administrative_id]
+        data['name'] = doc['name']
+        data['latitude'] = doc.get('latitude')
+        data['longitude'] = doc.get('longitude')
+        data['level'] = doc['administrative_level'].capitalize()
+    if without_administrative_level_docs:
+        stats['region_stats'] = {}
+    return stats
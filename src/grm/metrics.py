@@ -0,0 +1,432 @@
+"""
+Rolling performance metrics of the requests, of their CouchDB requests and of the Celery tasks, shown on the logs
+page. Each process measures them in memory with a bounded size: the durations are counted in logarithmic buckets
+(like HDR histograms) grouped by slots of METRICS_SLOT_SECONDS, the slots out of METRICS_WINDOW being dropped, and
+only the last METRICS_TASK_RUNS task runs are kept. Every METRICS_PUBLISH_INTERVAL seconds, each process saves its
+metrics in a local document of the GRM database, where the page reads the metrics of the web and Celery processes.
+"""
+import functools
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from django.conf import settings
+from requests import HTTPError
+
+from client import (
+    delete_local_document, get_connection_stats, get_db, get_local_document, get_local_documents, save_local_document
+)
+from grm.couchdb_trace import end_couchdb_trace, get_couchdb_trace, start_couchdb_trace
+
+logger = logging.getLogger(__name__)
+
+METRICS_WINDOW = getattr(settings, 'METRICS_WINDOW', 3600)
+METRICS_SLOT_SECONDS = getattr(settings, 'METRICS_SLOT_SECONDS', 60)
+METRICS_MAX_KEYS = getattr(settings, 'METRICS_MAX_KEYS', 200)
+METRICS_TASK_RUNS = getattr(settings, 'METRICS_TASK_RUNS', 100)
+METRICS_PUBLISH_INTERVAL = getattr(settings, 'METRICS_PUBLISH_INTERVAL', 30)
+
+METRICS_DOCUMENT_PREFIX = 'metrics-'
+# Key of the durations of the endpoints, shapes or tasks measured once METRICS_MAX_KEYS of them are in a slot
+OTHER_KEY = '(other)'
+
+# Each bucket is 10% wider than the previous one, so the percentiles are within 5% of the measured durations
+BUCKET_GROWTH = 1.1
+# Upper bound in seconds of the first bucket, and duration from which everything is counted in the last one
+MIN_DURATION = 0.0001
+MAX_DURATION = 3600
+
+
+def get_bucket(duration):
+    if duration <= MIN_DURATION:
+        return 0
+    return math.ceil(math.log(min(duration, MAX_DURATION) / MIN_DURATION, BUCKET_GROWTH))
+
+
+def get_bucket_duration(bucket):
+    """
+    Returns the duration the durations of the bucket are reported as, the geometric middle of its bounds.
+    """
+    if bucket == 0:
+        return MIN_DURATION
+    return MIN_DURATION * BUCKET_GROWTH ** (bucket - 0.5)
+
+
+class LatencyHistogram:
+    """
+    Number of durations (in seconds) in each logarithmic bucket, with their number, their total and their maximum.
+    Its size depends on the range of the durations, not on their number, and histograms are merged by adding them.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration):
+        bucket = get_bucket(duration)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def get_percentile(self, percent):
+        if not self.count:
+            return 0.0
+        if percent >= 100:
+            return self.max
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(get_bucket_duration(bucket), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "counts": {str(bucket): count for bucket, count in self.counts.items()},
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(bucket): count for bucket, count in data['counts'].items()}
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.max = data['max']
+        return histogram
+
+
+class RollingHistograms:
+    """
+    LatencyHistograms by key (endpoint, shape of CouchDB request, task...) of the last window seconds, kept by slots
+    of slot_seconds. At most max_keys keys are measured in a slot, the durations of the others go to OTHER_KEY.
+    """
+
+    def __init__(self, window=METRICS_WINDOW, slot_seconds=METRICS_SLOT_SECONDS, max_keys=METRICS_MAX_KEYS):
+        self.window = window
+        self.slot_seconds = slot_seconds
+        self.max_keys = max_keys
+        self.slots = deque(maxlen=max(1, math.ceil(window / slot_seconds)))
+
+    def record(self, key, duration, now):
+        start = now - now % self.slot_seconds
+        if not self.slots or self.slots[-1][0] != start:
+            self.slots.append((start, {}))
+        histograms = self.slots[-1][1]
+        if key not in histograms and len(histograms) >= self.max_keys:
+            key = OTHER_KEY
+        histograms.setdefault(key, LatencyHistogram()).record(duration)
+
+    def get_histograms(self, now):
+        """
+        Returns the histograms by key of the slots in the window, merged.
+        """
+        merged = {}
+        for start, histograms in self.slots:
+            if start + self.slot_seconds <= now - self.window:
+                continue
+            for key, histogram in histograms.items():
+                merged.setdefault(key, LatencyHistogram()).merge(histogram)
+        return merged
+
+
+class MetricsStore:
+    """
+    Metrics of the current process: the durations of the requests by endpoint, of the CouchDB requests by shape (see
+    grm.couchdb_trace) and of the task runs by task, and the last task runs with the number of items they processed.
+    """
+
+    def __init__(self, window=METRICS_WINDOW, slot_seconds=METRICS_SLOT_SECONDS, max_keys=METRICS_MAX_KEYS,
+                 task_runs=METRICS_TASK_RUNS):
+        self.window = window
+        self.endpoints = RollingHistograms(window, slot_seconds, max_keys)
+        self.couchdb = RollingHistograms(window, slot_seconds, max_keys)
+        self.tasks = RollingHistograms(window, slot_seconds, max_keys)
+        self.task_runs = deque(maxlen=task_runs)
+        self.process = f'{socket.gethostname()}-{os.getpid()}'
+        self.published_at = None
+        self._revision = None
+        self._lock = threading.Lock()
+
+    @property
+    def document_id(self):
+        return f'_local/{METRICS_DOCUMENT_PREFIX}{self.process}'
+
+    def _record_trace(self, trace, now):
+        if trace is None or trace.parent is not None:
+            # The requests of a nested trace are recorded with the trace including it
+            return
+        for call in trace.calls:
+            self.couchdb.record(call['shape'], call['duration'], now)
+
+    def record_request(self, endpoint, duration, trace=None, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self.endpoints.record(endpoint, duration, now)
+            self._record_trace(trace, now)
+
+    def record_task(self, name, duration, item_counts=None, trace=None, failed=False, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self.tasks.record(name, duration, now)
+            self.task_runs.append({
+                "name": name,
+                "finished_at": now,
+                "duration": duration,
+                "item_counts": item_counts or {},
+                "couchdb_requests": len(trace) if trace is not None else 0,
+                "failed": failed,
+            })
+            self._record_trace(trace, now)
+
+    def get_snapshot(self, now=None):
+        """
+        Returns the metrics of the window as saved in the local document of the process.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            return {
+                "process": self.process,
+                "published_at": now,
+                "endpoints": {key: h.to_dict() for key, h in self.endpoints.get_histograms(now).items()},
+                "couchdb": {key: h.to_dict() for key, h in self.couchdb.get_histograms(now).items()},
+                "tasks": {key: h.to_dict() for key, h in self.tasks.get_histograms(now).items()},
+                "task_runs": [run for run in self.task_runs if run['finished_at'] > now - self.window],
+                # Counters of the process since it started, not of the window
+                "connections": get_connection_stats(),
+            }
+
+    def publish(self, db, now=None):
+        doc = {"_id": self.document_id, **self.get_snapshot(now)}
+        if self._revision:
+            doc['_rev'] = self._revision
+        try:
+            save_local_document(db, doc)
+        except HTTPError as e:
+            if e.response is None or e.response.status_code != 409:
+                raise
+            # The document was saved by a previous process with the same id, or deleted as stale
+            current = get_local_document(db, self.document_id)
+            doc.pop('_rev', None)
+            if current:
+                doc['_rev'] = current['_rev']
+            save_local_document(db, doc)
+        self._revision = doc['_rev']
+        self.published_at = doc['published_at']
+
+    def publish_if_due(self, interval=METRICS_PUBLISH_INTERVAL, now=None):
+        """
+        Publishes the metrics in the GRM database if they were not for interval seconds, logging the failures.
+        """
+        now = time.time() if now is None else now
+        if not interval or (self.published_at is not None and now - self.published_at < interval):
+            return
+        try:
+            self.publish(get_db(settings.COUCHDB_GRM_DATABASE), now)
+        except Exception:
+            # Tried again at the next request or task run
+            self.published_at = now
+            logger.warning('Failed to publish the metrics of %s', self.process, exc_info=True)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_metrics_store():
+    """
+    Returns the MetricsStore of the current process, a new one in a forked process.
+    """
+    pid = os.getpid()
+    store = _stores.get(pid)
+    if store is None:
+        with _stores_lock:
+            if pid not in _stores:
+                _stores.clear()
+                _stores[pid] = MetricsStore()
+            store = _stores[pid]
+    return store
+
+
+def reset_metrics_stores():
+    with _stores_lock:
+        _stores.clear()
+
+
+def get_item_counts(result):
+    """
+    Returns the number of items of each list and the counts of the result of a task, e.g. {"errors": 0,
+    "updated_issues": 12}.
+    """
+    if not isinstance(result, dict):
+        return {}
+    counts = {}
+    for key, value in result.items():
+        if isinstance(value, (list, tuple)):
+            counts[key] = len(value)
+        elif isinstance(value, int) and not isinstance(value, bool):
+            counts[key] = value
+    return counts
+
+
+def record_task_metrics(task):
+    """
+    Decorator of the Celery tasks recording the duration of each run, its CouchDB requests and the item counts of its
+    result in the MetricsStore of the process.
+    """
+    @functools.wraps(task)
+    def wrapper(*args, **kwargs):
+        result, failed = None, True
+        token = start_couchdb_trace()
+        start = time.perf_counter()
+        try:
+            result = task(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            duration = time.perf_counter() - start
+            trace = get_couchdb_trace()
+            end_couchdb_trace(token)
+            store = get_metrics_store()
+            store.record_task(task.__name__, duration, get_item_counts(result), trace, failed)
+            if get_couchdb_trace() is None:
+                # Not run by another task, whose CouchDB requests would include the publication
+                store.publish_if_due()
+    return wrapper
+
+
+def get_metrics_snapshots(db, now=None):
+    """
+    Returns the snapshot of the metrics of the current process and the ones published by the other processes during
+    the window. The documents of the processes that did not publish during the window are deleted.
+    """
+    now = time.time() if now is None else now
+    store = get_metrics_store()
+    snapshots = [store.get_snapshot(now)]
+    for doc in get_local_documents(db, METRICS_DOCUMENT_PREFIX):
+        if doc['_id'] == store.document_id:
+            continue
+        if doc.get('published_at', 0) <= now - store.window:
+            delete_local_document(db, doc)
+        else:
+            snapshots.append(doc)
+    return snapshots
+
+
+def _merge_histograms(snapshots, kind):
+    merged = {}
+    for snapshot in snapshots:
+        for key, data in snapshot.get(kind, {}).items():
+            merged.setdefault(key, LatencyHistogram()).merge(LatencyHistogram.from_dict(data))
+    return merged
+
+
+def _get_rows(histograms):
+    """
+    Returns the statistics of the histograms by key, the durations in milliseconds.
+    """
+    return [{
+        "name": key,
+        "count": histogram.count,
+        "mean": histogram.mean * 1000,
+        "p50": histogram.get_percentile(50) * 1000,
+        "p95": histogram.get_percentile(95) * 1000,
+        "p99": histogram.get_percentile(99) * 1000,
+        "max": histogram.max * 1000,
+        "total": histogram.total * 1000,
+    } for key, histogram in histograms.items()]
+
+
+def get_performance_report(snapshots, limit=20):
+    """
+    Returns the metrics of the snapshots merged: the limit slowest endpoints (by 95th percentile), the limit shapes
+    of CouchDB requests taking the most time in total, the tasks with the item counts of their recent runs, the
+    limit last task runs, and the CouchDB connection counters of each process. The durations are in milliseconds.
+    """
+    endpoints = sorted(_get_rows(_merge_histograms(snapshots, 'endpoints')), key=lambda row: -row['p95'])
+    couchdb = sorted(_get_rows(_merge_histograms(snapshots, 'couchdb')), key=lambda row: -row['total'])
+    task_runs = sorted(
+        (run for snapshot in snapshots for run in snapshot.get('task_runs', [])), key=lambda run: -run['finished_at'])
+
+    tasks = sorted(_get_rows(_merge_histograms(snapshots, 'tasks')), key=lambda row: row['name'])
+    for task in tasks:
+        runs = [run for run in task_runs if run['name'] == task['name']]
+        task['item_counts'] = {}
+        for run in runs:
+            for key, count in run['item_counts'].items():
+                task['item_counts'][key] = task['item_counts'].get(key, 0) + count
+        task['recent_runs'] = len(runs)
+        task['failed_runs'] = len([run for run in runs if run['failed']])
+        task['last_run'] = datetime.fromtimestamp(runs[0]['finished_at'], timezone.utc) if runs else None
+
+    connections = sorted(
+        ({"process": snapshot['process'], **snapshot['connections']} for snapshot in snapshots
+         if 'connections' in snapshot), key=lambda row: row['process'])
+
+    return {
+        "processes": sorted(snapshot['process'] for snapshot in snapshots),
+        "connections": connections,
+        "endpoints": endpoints[:limit],
+        "couchdb": couchdb[:limit],
+        "tasks": tasks,
+        "task_runs": [{
+            **run,
+            "finished_at": datetime.fromtimestamp(run['finished_at'], timezone.utc),
+            "duration": run['duration'] * 1000,
+        } for run in task_runs[:limit]],
+    }
+
+
+def get_sequence_number(seq):
+    """
+    Returns the number of a sequence of CouchDB ("123-g1AAAA..." or 123). The sequences of a clustered database are
+    numbered across its shards, so the differences between them are approximate.
+    """
+    try:
+        return int(str(seq).split('-', 1)[0])
+    except ValueError:
+        return None
+
+
+def get_change_feed_lag(db, checkpoint_id, now=None):
+    """
+    Returns the lag of a consumer of the _changes feed of the database saving its last processed sequence in the
+    local document checkpoint_id, as {"pending_changes", "checkpoint_age"}: the number of changes made after the
+    sequence (of all the documents, not only the ones the consumer processes) and the seconds since the checkpoint
+    was saved. Both are None if the consumer never ran, the age if the checkpoint does not have its date.
+    """
+    now = time.time() if now is None else now
+    checkpoint = get_local_document(db, checkpoint_id)
+    if checkpoint is None or 'last_seq' not in checkpoint:
+        return {"pending_changes": None, "checkpoint_age": None}
+    update_seq = get_sequence_number(db.metadata()['update_seq'])
+    last_seq = get_sequence_number(checkpoint['last_seq'])
+    pending_changes = None
+    if update_seq is not None and last_seq is not None:
+        pending_changes = max(0, update_seq - last_seq)
+    checkpoint_age = None
+    if checkpoint.get('updated_at'):
+        checkpoint_age = max(0.0, now - datetime.fromisoformat(checkpoint['updated_at']).timestamp())
+    return {"pending_changes": pending_changes, "checkpoint_age": checkpoint_age}
@@ -0,0 +1,54 @@
+import time
+
+from grm.couchdb_trace import end_couchdb_trace, get_couchdb_trace, start_couchdb_trace
+from grm.metrics import get_metrics_store
+from grm.request_lookups import end_request_lookups, start_request_lookups
+
+
+class RequestLookupsMiddleware:
+    """
+    Memoises the CouchDB lookups of the template tags for the duration of each request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_request_lookups()
+        try:
+            return self.get_response(request)
+        finally:
+            end_request_lookups(token)
+
+
+class CouchDBTraceMiddleware:
+    """
+    Traces the CouchDB requests sent while processing each request: their total duration is sent in the
+    Server-Timing header of the response, and warnings are logged if there are too many of them or if the same
+    request is repeated (see CouchDBTrace.log_warnings). The durations of the request and of its CouchDB requests are
+    recorded in the metrics of the process, by the name of the view of the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_couchdb_trace()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            trace = get_couchdb_trace()
+        finally:
+            end_couchdb_trace(token)
+        duration = time.perf_counter() - start
+        trace.log_warnings(f'{request.method} {request.path}')
+        view_name = request.resolver_match.view_name if request.resolver_match else '(unresolved)'
+        store = get_metrics_store()
+        store.record_request(f'{request.method} {view_name}', duration, trace)
+        if get_couchdb_trace() is None:
+            store.publish_if_due()
+        server_timing = trace.get_server_timing()
+        if response.has_header('Server-Timing'):
+            server_timing = f'{response["Server-Timing"]}, {server_timing}'
+        response['Server-Timing'] = server_timing
+        return response
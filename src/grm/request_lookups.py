@@ -0,0 +1,50 @@
+from contextvars import ContextVar
+
+from client import get_db
+from grm.administrative_tree import ADMINISTRATIVE_LEVEL_SELECTOR, get_administrative_tree
+from grm.couchdb_indexes import EADL, get_query_options
+from grm.utils import get_administrative_region_name
+
+_request_lookups = ContextVar('request_lookups', default=None)
+
+
+class RequestLookups:
+    """
+    Values looked up in CouchDB while rendering the response to a request, memoised for the duration of the request.
+    """
+
+    def __init__(self):
+        self._eadl_db = None
+        self.region_names = {}
+
+    @property
+    def eadl_db(self):
+        if self._eadl_db is None:
+            self._eadl_db = get_db()
+        return self._eadl_db
+
+    def get_region_name(self, administrative_id):
+        if administrative_id not in self.region_names:
+            tree = get_administrative_tree(self.eadl_db)
+            if administrative_id and administrative_id not in tree:
+                # A region created since the last refresh of the tree
+                selector = dict(ADMINISTRATIVE_LEVEL_SELECTOR, administrative_id=administrative_id)
+                for doc in self.eadl_db.get_query_result(selector, **get_query_options(EADL, selector)):
+                    tree.add_node(doc)
+            self.region_names[administrative_id] = get_administrative_region_name(self.eadl_db, administrative_id)
+        return self.region_names[administrative_id]
+
+
+def get_request_lookups():
+    """
+    Returns the RequestLookups of the request being processed, or None outside of a request.
+    """
+    return _request_lookups.get()
+
+
+def start_request_lookups():
+    return _request_lookups.set(RequestLookups())
+
+
+def end_request_lookups(token):
+    _request_lookups.reset(token)
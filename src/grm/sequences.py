@@ -0,0 +1,82 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import quote
+
+SEQUENCE_DOCUMENT_TYPE = 'sequence'
+MAX_LEASE_ATTEMPTS = 50
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+class SequenceAllocator:
+    """
+    Hands out the unique ids of a sequence stored in a counter document. The value of the counter is the last id
+    reserved by any allocator; an allocator reserves block_size ids at a time by incrementing it, relying on the
+    _rev of the document to detect concurrent updates, and then hands them out from memory.
+    """
+
+    def __init__(self, db, name, block_size=1, get_initial_value=None):
+        self.db = db
+        self.name = name
+        self.block_size = block_size
+        self.get_initial_value = get_initial_value
+        self.doc_id = f'{SEQUENCE_DOCUMENT_TYPE}:{name}'
+        self.doc_url = f'{db.database_url}/{quote(self.doc_id, safe="")}'
+        self.leases = 0
+        self.conflicts = 0
+        self._next = 1
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def _lease(self):
+        session = self.db.r_session
+        for attempt in range(MAX_LEASE_ATTEMPTS):
+            response = session.get(self.doc_url)
+            if response.status_code == 404:
+                start = self.get_initial_value() if self.get_initial_value else 0
+                doc = {"_id": self.doc_id, "type": SEQUENCE_DOCUMENT_TYPE, "name": self.name}
+            else:
+                response.raise_for_status()
+                doc = response.json()
+                start = doc['value']
+            doc['value'] = start + self.block_size
+
+            response = session.put(self.doc_url, json=doc)
+            if response.status_code == 409:
+                # Another allocator reserved a block since the counter was read
+                self.conflicts += 1
+                time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+                continue
+            response.raise_for_status()
+            self.leases += 1
+            return start + 1, start + self.block_size
+        raise RuntimeError(f'Failed to reserve ids of the sequence {self.name} after {MAX_LEASE_ATTEMPTS} attempts')
+
+    def next(self):
+        with self._lock:
+            if self._next > self._last:
+                self._next, self._last = self._lease()
+            value = self._next
+            self._next += 1
+            return value
+
+
+def get_sequence_allocator(db, name, block_size=1, get_initial_value=None):
+    """
+    Returns the allocator of the sequence shared by the threads of the current process.
+    """
+    key = (os.getpid(), db.database_url, name)
+    with _allocators_lock:
+        allocator = _allocators.get(key)
+        if allocator is None:
+            allocator = SequenceAllocator(db, name, block_size, get_initial_value)
+            _allocators[key] = allocator
+    return allocator
+
+
+def reset_sequence_allocators():
+    with _allocators_lock:
+        _allocators.clear()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 import django.conf.locale
@@ -63,6 +64,7 @@ INSTALLED_APPS += CREATED_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'grm.middleware.CouchDBTraceMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,6 +72,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'grm.middleware.RequestLookupsMiddleware',
 ]
 
 ROOT_URLCONF = 'grm.urls'
@@ -181,6 +184,21 @@ MEDIA_URL = '/media/'
 
 MAX_UPLOAD_SIZE = 5 * 1024 * 1024  # 5MB
 
+# Seconds the browsers may reuse a downloaded attachment before revalidating it with its ETag
+ATTACHMENT_CACHE_MAX_AGE = env.int('ATTACHMENT_CACHE_MAX_AGE', default=3600)
+
+# Directory where the chunks of the resumable uploads are written until they are committed, and seconds after which
+# the uploads not committed are deleted. The directory is a spool on the local disk of the host: with several
+# application hosts, it must be on a storage shared by the hosts, or the requests of an upload must be sent to the
+# same host (sticky sessions)
+ATTACHMENT_UPLOAD_DIR = env('ATTACHMENT_UPLOAD_DIR', default=str(Path(tempfile.gettempdir()) / 'grm-uploads'))
+ATTACHMENT_UPLOAD_EXPIRY = env.int('ATTACHMENT_UPLOAD_EXPIRY', default=24 * 3600)
+
+# Sizes in pixels of the thumbnails generated for the images requested with ?size=, and seconds the browsers may
+# reuse them
+THUMBNAIL_SIZES = (64, 128, 256, 512)
+THUMBNAIL_CACHE_MAX_AGE = env.int('THUMBNAIL_CACHE_MAX_AGE', default=30 * 24 * 3600)
+
 AUTH_USER_MODEL = 'authentication.User'
 
 # Default primary key field type
@@ -210,6 +228,57 @@ COUCHDB_USERNAME = env('COUCHDB_USERNAME')
 
 COUCHDB_PASSWORD = env('COUCHDB_PASSWORD')
 
+# 'http' to use the CouchDB server of COUCHDB_URL, or 'memory' to use the in-process stand-in of
+# grm.couchdb_memory, whose databases are empty when the process starts (tests and benchmarks)
+COUCHDB_BACKEND = env('COUCHDB_BACKEND', default='http')
+
+# Maximum number of pooled HTTP connections kept open to CouchDB by each worker process
+COUCHDB_POOL_MAXSIZE = env.int('COUCHDB_POOL_MAXSIZE', default=50)
+
+# Number of CouchDB requests sent while processing a request above which a warning is logged (0 to disable)
+COUCHDB_QUERY_BUDGET = env.int('COUCHDB_QUERY_BUDGET', default=50)
+
+# Number of times the same CouchDB request (same path, same shape of selector) can be sent while processing a request
+# before a warning is logged (0 to disable)
+COUCHDB_REPEATED_QUERY_THRESHOLD = env.int('COUCHDB_REPEATED_QUERY_THRESHOLD', default=5)
+
+# Seconds of requests, CouchDB requests and task runs shown on the performance page of the logs, measured by slots
+# of METRICS_SLOT_SECONDS seconds
+METRICS_WINDOW = env.int('METRICS_WINDOW', default=3600)
+METRICS_SLOT_SECONDS = env.int('METRICS_SLOT_SECONDS', default=60)
+
+# Maximum number of endpoints, shapes of CouchDB requests and tasks measured by each process in a slot, the others
+# being measured together as "(other)"
+METRICS_MAX_KEYS = env.int('METRICS_MAX_KEYS', default=200)
+
+# Number of last task runs kept by each process with the number of items they processed
+METRICS_TASK_RUNS = env.int('METRICS_TASK_RUNS', default=100)
+
+# Seconds between two saves of the metrics of each web and Celery process in the GRM database, where the performance
+# page reads them (0 to only show the metrics of the process serving the page)
+METRICS_PUBLISH_INTERVAL = env.int('METRICS_PUBLISH_INTERVAL', default=30)
+
+# Seconds between two reads of the _changes feed used to keep the administrative levels tree up to date
+ADMINISTRATIVE_TREE_REFRESH_INTERVAL = env.int('ADMINISTRATIVE_TREE_REFRESH_INTERVAL', default=10)
+
+# Seconds between two updates of the path_ids and path_names of the changed administrative levels
+ADMINISTRATIVE_PATHS_INTERVAL = env.int('ADMINISTRATIVE_PATHS_INTERVAL', default=60)
+
+# Seconds between two reads of the _changes feed used to invalidate the cached issue taxonomies (categories,
+# statuses, types...), and lifetime in seconds of the taxonomies in the Django cache
+TAXONOMY_CACHE_REFRESH_INTERVAL = env.int('TAXONOMY_CACHE_REFRESH_INTERVAL', default=10)
+TAXONOMY_CACHE_TIMEOUT = env.int('TAXONOMY_CACHE_TIMEOUT', default=3600)
+
+# Lifetime in seconds of the in-process directory of the government workers by department and region, and seconds
+# between two reads of the version, replaced when a worker or the name of a user is saved, that makes the processes
+# reload it
+GOVERNMENT_WORKER_DIRECTORY_TIMEOUT = env.int('GOVERNMENT_WORKER_DIRECTORY_TIMEOUT', default=300)
+GOVERNMENT_WORKER_DIRECTORY_REFRESH_INTERVAL = env.int('GOVERNMENT_WORKER_DIRECTORY_REFRESH_INTERVAL', default=10)
+
+# Number of issue auto_increment_id reserved at once by each worker process. Ids of a reserved block that are not
+# used before the process stops are lost, so values above 1 trade consecutive ids for fewer counter updates
+AUTO_INCREMENT_ID_BLOCK_SIZE = env.int('AUTO_INCREMENT_ID_BLOCK_SIZE', default=1)
+
 # Celery settings
 CELERY_BROKER_URL = env('CELERY_BROKER_URL')
 
@@ -222,6 +291,12 @@ CELERY_RESULT_BACKEND = 'django-db'
 
 CELERY_TASK_SERIALIZER = 'json'
 
+# Seconds between two reads of the _changes feed of the GRM database by the process_issue_changes task
+ISSUE_CHANGES_INTERVAL = env.int('ISSUE_CHANGES_INTERVAL', default=10)
+
+# Seconds between two full runs of check_issues, escalate_issues and send_sms_message over all the issues
+ISSUE_FULL_CHECK_INTERVAL = env.int('ISSUE_FULL_CHECK_INTERVAL', default=3600)
+
 # Mapbox
 MAPBOX_ACCESS_TOKEN = env('MAPBOX_ACCESS_TOKEN')
 
@@ -244,3 +319,20 @@ TWILIO_ACCOUNT_SID = env('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = env('TWILIO_AUTH_TOKEN')
 
 TWILIO_FROM_NUMBER = env('TWILIO_FROM_NUMBER')
+
+# SMS outbox (sms_client.SmsSender)
+# Dotted path of the class sending the messages, sms_client.FakeTransport keeps them in memory
+SMS_TRANSPORT = env('SMS_TRANSPORT', default='sms_client.TwilioTransport')
+
+# Maximum number of messages sent at the same time, and per second
+SMS_MAX_CONCURRENCY = env.int('SMS_MAX_CONCURRENCY', default=4)
+
+SMS_RATE_LIMIT = env.float('SMS_RATE_LIMIT', default=1.0)
+
+# Number of attempts to send a message, the delay before the first retry in seconds doubling at every attempt
+SMS_MAX_ATTEMPTS = env.int('SMS_MAX_ATTEMPTS', default=5)
+
+SMS_RETRY_BACKOFF = env.int('SMS_RETRY_BACKOFF', default=30)
+
+# Seconds between two runs of the send_sms_outbox task
+SMS_OUTBOX_INTERVAL = env.int('SMS_OUTBOX_INTERVAL', default=30)
@@ -0,0 +1,431 @@
+"""
+Synthetic data of the eadl and GRM databases for benchmarks: a hierarchy of administrative levels, ADL documents
+with their phases and tasks, the taxonomies of the GRM database, government workers and issues with comments and
+attachments. The data only depends on the seed and the sizes, so that two runs generate the same documents, except
+for the ids of the users of the workers, given by the Django database.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from dashboard.grm import CHOICE_ANONYMOUS, CHOICE_CONTACT, CHOICE_FACILITATOR, CHOICE_PHONE, GENDER_CHOICES
+from grm.administrative_import import (
+    ADMINISTRATIVE_LEVEL_DOC_TYPE, AdministrativeIdGenerator, get_administrative_level_doc_id
+)
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+COUNTRY_LEVEL = 'country'
+
+# Levels below the country and number of children of each region of the level above
+DEFAULT_LEVELS = [('region', 5), ('prefecture', 8), ('commune', 10), ('village', 25)]
+
+# (name, open_status, rejected_status, final_status, weight of the issues in the status)
+ISSUE_STATUSES = [
+    ('Open', True, False, False, 35),
+    ('Under review', False, False, False, 20),
+    ('Rejected', False, True, False, 10),
+    ('Closed', False, False, True, 35),
+]
+ISSUE_TYPES = ['Grievance', 'Suggestion', 'Question', 'Compliment']
+ISSUE_AGE_GROUPS = ['Under 18', '18-35', '36-60', 'Over 60']
+ISSUE_CITIZEN_GROUPS_1 = ['Farmers', 'Traders', 'Students', 'Civil servants']
+ISSUE_CITIZEN_GROUPS_2 = ['Women', 'Youth', 'Elderly', 'Persons with disabilities']
+TASK_STATUSES = ['not-started', 'in-progress', 'completed']
+
+FIRST_NAMES = ['Ama', 'Kofi', 'Akou', 'Yao', 'Afi', 'Kossi', 'Abla', 'Komla', 'Essi', 'Kodjo']
+LAST_NAMES = ['Agbeko', 'Mensah', 'Kodjo', 'Lawson', 'Amouzou', 'Tchalla', 'Adjovi', 'Gnassingbe', 'Koffi', 'Dossou']
+WORDS = ['water', 'road', 'school', 'market', 'payment', 'delay', 'well', 'bridge', 'health', 'centre', 'land',
+         'meeting', 'committee', 'subproject', 'works', 'contractor', 'complaint', 'village', 'damage', 'access']
+
+
+def parse_levels(value):
+    """
+    Parses levels given as 'region:5,prefecture:8,commune:10,village:25'.
+    """
+    levels = []
+    for item in value.split(','):
+        name, _, children = item.partition(':')
+        levels.append((name.strip(), int(children)))
+    if not levels or any(not name or children < 1 for name, children in levels):
+        raise ValueError(f'Invalid levels {value}')
+    return levels
+
+
+class SyntheticDataset:
+    """
+    Generates the documents of a synthetic dataset. Each kind of document is drawn from its own random generator,
+    so that e.g. the number of issues does not change the administrative levels or the workers.
+
+    The issues need the ids of the users of the workers, which are known once they are saved: issues() takes the
+    saved workers, as {"id", "name", "department", "administrative_id"}, and the first auto_increment_id.
+    """
+
+    def __init__(self, seed=0, levels=DEFAULT_LEVELS, country='Country', adls_per_village=2, departments=6,
+                 categories=24, workers_per_region=1, issues=200000, max_comments=3, max_attachments=2,
+                 unconfirmed_ratio=0.02, unchecked_ratio=0.02, escalated_ratio=0.01, end_date=datetime(2024, 12, 31),
+                 days=730):
+        self.seed = seed
+        self.levels = list(levels)
+        self.country = country
+        self.adls_per_village = adls_per_village
+        self.department_count = departments
+        self.category_count = categories
+        self.workers_per_region = workers_per_region
+        self.issue_count = issues
+        self.max_comments = max_comments
+        self.max_attachments = max_attachments
+        self.unconfirmed_ratio = unconfirmed_ratio
+        self.unchecked_ratio = unchecked_ratio
+        self.escalated_ratio = escalated_ratio
+        self.end_date = end_date
+        self.days = days
+        self.username_prefix = f'synthetic-{seed}-'
+        self._regions = None
+
+    def _random(self, name):
+        return random.Random(f'{self.seed}:{name}')
+
+    @staticmethod
+    def _uuid(rng):
+        return uuid.UUID(int=rng.getrandbits(128), version=4).hex
+
+    def _date(self, rng, days=None):
+        seconds = rng.randrange((self.days if days is None else days) * 86400)
+        return self.end_date - timedelta(seconds=seconds)
+
+    def _text(self, rng, words):
+        return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+    @property
+    def village_level(self):
+        return self.levels[-1][0]
+
+    def administrative_levels(self):
+        """
+        Returns the documents of the country and of the regions, parents first, with their path_ids and path_names.
+        """
+        if self._regions is None:
+            rng = self._random('administrative_levels')
+            generate_administrative_id = AdministrativeIdGenerator()
+            country = self._administrative_level(rng, generate_administrative_id, None, COUNTRY_LEVEL,
+                                                 self.country)
+            docs = [country]
+            parents = [(country, [])]
+            for level, children in self.levels:
+                next_parents = []
+                for parent, numbers in parents:
+                    for number in range(1, children + 1):
+                        name = f'{level.capitalize()} {"-".join(str(n) for n in numbers + [number])}'
+                        doc = self._administrative_level(rng, generate_administrative_id, parent, level, name)
+                        docs.append(doc)
+                        next_parents.append((doc, numbers + [number]))
+                parents = next_parents
+            self._regions = docs
+        return self._regions
+
+    @staticmethod
+    def _administrative_level(rng, generate_administrative_id, parent, level, name):
+        parent_id = parent['administrative_id'] if parent else None
+        administrative_id = generate_administrative_id(parent_id, level, name)
+        return {
+            "_id": get_administrative_level_doc_id(parent_id, level, name),
+            "type": ADMINISTRATIVE_LEVEL_DOC_TYPE,
+            "administrative_id": administrative_id,
+            "administrative_level": level,
+            "name": name,
+            "latitude": round(rng.uniform(6.1, 11.1), 6),
+            "longitude": round(rng.uniform(-0.1, 1.8), 6),
+            "parent_id": parent_id,
+            "path_ids": (parent['path_ids'] if parent else []) + [administrative_id],
+            "path_names": (parent['path_names'] if parent else []) + [name],
+        }
+
+    def regions_by_level(self):
+        regions = {}
+        for doc in self.administrative_levels():
+            regions.setdefault(doc['administrative_level'], []).append(doc)
+        return regions
+
+    def adls(self):
+        """
+        Yields the ADL documents of the villages, the first ADL of each village being its village secretary.
+        """
+        rng = self._random('adls')
+        for village in self.regions_by_level()[self.village_level]:
+            for index in range(self.adls_per_village):
+                first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                yield {
+                    "_id": self._uuid(rng),
+                    "type": 'adl',
+                    "name": village['name'],
+                    "administrative_level": self.village_level,
+                    "administrative_region": village['administrative_id'],
+                    "village_secretary": 1 if index == 0 else 0,
+                    "representative": {
+                        "email": f'{self.username_prefix}adl-{village["administrative_id"]}-{index}@example.com',
+                        "password": '',
+                        "name": f'{first_name} {last_name}',
+                        "is_active": True,
+                        "photo": '',
+                        "phone": f'+228{rng.randrange(10 ** 8):08}',
+                        "birthday": self._date(rng, 365 * 40).strftime('%Y-%m-%d'),
+                    },
+                    "phases": [self._phase(rng, ordinal) for ordinal in range(1, 4)],
+                }
+
+    def _phase(self, rng, ordinal):
+        opened_at = self._date(rng)
+        closed = rng.random() < 0.5
+        tasks = []
+        for task_ordinal in range(1, 5):
+            status = rng.choice(TASK_STATUSES)
+            tasks.append({
+                "ordinal": task_ordinal,
+                "type": 'list_activity',
+                "title": f'Task {ordinal}.{task_ordinal}',
+                "status": status,
+                "notes": '',
+                "due_at": (opened_at + timedelta(days=30 * task_ordinal)).strftime(DATE_FORMAT),
+                "updated_at": self._date(rng).strftime(DATE_FORMAT) if status != 'not-started' else '',
+                "attachments": [],
+            })
+        return {
+            "ordinal": ordinal,
+            "title": f'Phase {ordinal}',
+            "opened_at": opened_at.strftime(DATE_FORMAT),
+            "closed_at": (opened_at + timedelta(days=90)).strftime(DATE_FORMAT) if closed else '',
+            "due_at": (opened_at + timedelta(days=120)).strftime(DATE_FORMAT),
+            "tasks": tasks,
+        }
+
+    def departments(self):
+        """
+        Returns the issue_department documents without their head, each department working at one of the levels
+        above the villages, in turn.
+        """
+        upper_levels = [level for level, _ in self.levels[:-1]] or [COUNTRY_LEVEL]
+        return [
+            {
+                "_id": f'issue_department-{department_id}',
+                "type": 'issue_department',
+                "id": department_id,
+                "name": f'Department {department_id}',
+                "administrative_level": upper_levels[(department_id - 1) % len(upper_levels)],
+            } for department_id in range(1, self.department_count + 1)
+        ]
+
+    def government_workers(self):
+        """
+        Returns the workers to create, as {"username", "email", "first_name", "last_name", "phone_number",
+        "department", "administrative_id"}: the head of each department, in the country, followed by
+        workers_per_region workers of each department in each region of its level.
+        """
+        rng = self._random('government_workers')
+        regions = self.regions_by_level()
+        country_id = regions[COUNTRY_LEVEL][0]['administrative_id']
+        placements = [(department['id'], country_id) for department in self.departments()]
+        for department in self.departments():
+            for region in regions.get(department['administrative_level'], []):
+                placements.extend([(department['id'], region['administrative_id'])] * self.workers_per_region)
+        workers = []
+        for number, (department_id, administrative_id) in enumerate(placements, 1):
+            workers.append({
+                "username": f'{self.username_prefix}{number}',
+                "email": f'{self.username_prefix}{number}@example.com',
+                "first_name": rng.choice(FIRST_NAMES),
+                "last_name": rng.choice(LAST_NAMES),
+                "phone_number": f'+228{rng.randrange(10 ** 8):08}',
+                "department": department_id,
+                "administrative_id": administrative_id,
+            })
+        return workers
+
+    def taxonomy(self, workers):
+        """
+        Returns the documents of the taxonomies of the GRM database, the heads of the departments being the first
+        saved workers of each department in the country.
+        """
+        rng = self._random('taxonomy')
+        country_id = self.administrative_levels()[0]['administrative_id']
+        heads = {}
+        for worker in workers:
+            if worker['administrative_id'] == country_id:
+                heads.setdefault(worker['department'], {"id": worker['id'], "name": worker['name']})
+
+        departments = self.departments()
+        docs = []
+        for department in departments:
+            docs.append({
+                "_id": department['_id'],
+                "type": department['type'],
+                "id": department['id'],
+                "name": department['name'],
+                "head": heads.get(department['id'], ''),
+            })
+        for category_id in range(1, self.category_count + 1):
+            department = rng.choice(departments)
+            docs.append({
+                "_id": f'issue_category-{category_id}',
+                "type": 'issue_category',
+                "id": category_id,
+                "name": f'Category {category_id}',
+                "abbreviation": f'C{category_id:02}',
+                "confidentiality_level": rng.choice(['Public', 'Confidential']),
+                # Most issues are assigned to the workers of the region, the others to the head of the department
+                "redirection_protocol": rng.random() < 0.8,
+                "assigned_department": {
+                    "id": department['id'],
+                    "name": department['name'],
+                    "administrative_level": department['administrative_level'],
+                },
+            })
+        for status_id, (name, open_status, rejected_status, final_status, _) in enumerate(ISSUE_STATUSES, 1):
+            docs.append({
+                "_id": f'issue_status-{status_id}',
+                "type": 'issue_status',
+                "id": status_id,
+                "name": name,
+                "open_status": open_status,
+                "rejected_status": rejected_status,
+                "final_status": final_status,
+            })
+        for doc_type, names in (('issue_type', ISSUE_TYPES), ('issue_age_group', ISSUE_AGE_GROUPS),
+                                ('issue_citizen_group_1', ISSUE_CITIZEN_GROUPS_1),
+                                ('issue_citizen_group_2', ISSUE_CITIZEN_GROUPS_2)):
+            for doc_id, name in enumerate(names, 1):
+                docs.append({"_id": f'{doc_type}-{doc_id}', "type": doc_type, "id": doc_id, "name": name})
+        return docs
+
+    def issues(self, workers, first_auto_increment_id=1):
+        """
+        Yields the issue documents, the confirmed ones being assigned to the workers the way the tasks assign them,
+        except unchecked_ratio of them that are left for check_issues, with the personal data in clear.
+        """
+        rng = self._random('issues')
+        taxonomy = self.taxonomy(workers)
+        by_type = {}
+        for doc in taxonomy:
+            by_type.setdefault(doc['type'], []).append(doc)
+        departments = {doc['id']: doc for doc in by_type['issue_department']}
+        levels = {doc['id']: doc['assigned_department']['administrative_level'] for doc in by_type['issue_category']}
+        status_weights = [status[-1] for status in ISSUE_STATUSES]
+        workers_by_region = {}
+        for worker in workers:
+            workers_by_region.setdefault((worker['department'], worker['administrative_id']), []).append(worker)
+        regions = self.administrative_levels()
+        level_index = {doc['administrative_id']: index for index, doc in enumerate(regions)}
+        villages = self.regions_by_level()[self.village_level]
+
+        for number in range(self.issue_count):
+            auto_increment_id = first_auto_increment_id + number
+            reporter = rng.choice(workers)
+            created_date = self._date(rng)
+            issue = {
+                "_id": self._uuid(rng),
+                "type": 'issue',
+                "auto_increment_id": auto_increment_id,
+                "tracking_code": f'{rng.choice(WORDS).capitalize()}{rng.randrange(1, 1000)}',
+                "reporter": {"id": reporter['id'], "name": reporter['name']},
+                "created_date": created_date.strftime(DATE_FORMAT),
+                "confirmed": False,
+                "escalate_flag": False,
+                "created_by": False,
+            }
+            if rng.random() < self.unconfirmed_ratio:
+                yield issue
+                continue
+
+            village = rng.choice(villages)
+            category = rng.choice(by_type['issue_category'])
+            department_id = category['assigned_department']['id']
+            issue_type = rng.choice(by_type['issue_type'])
+            status = rng.choices(by_type['issue_status'], status_weights)[0]
+            intake_date = created_date - timedelta(seconds=rng.randrange(86400))
+            issue.update({
+                "intake_date": intake_date.strftime(DATE_FORMAT),
+                "issue_date": (intake_date - timedelta(days=rng.randrange(30))).strftime(DATE_FORMAT),
+                "description": self._text(rng, rng.randint(8, 40)),
+                "issue_type": {"id": issue_type['id'], "name": issue_type['name']},
+                "category": {
+                    "id": category['id'],
+                    "name": category['name'],
+                    "confidentiality_level": category['confidentiality_level'],
+                    "assigned_department": department_id,
+                    "administrative_level": levels[category['id']],
+                },
+                "ongoing_issue": rng.random() < 0.3,
+                "citizen_type": rng.choice([0, 1, 2, 3]),
+                "citizen_age_group": self._reference(rng, by_type['issue_age_group']),
+                "gender": rng.choice(GENDER_CHOICES[1:])[0],
+                "citizen_group_1": self._reference(rng, by_type['issue_citizen_group_1']),
+                "citizen_group_2": self._reference(rng, by_type['issue_citizen_group_2']),
+                "administrative_region": {
+                    "administrative_id": village['administrative_id'],
+                    "name": village['name'],
+                },
+                "status": {"id": status['id'], "name": status['name']},
+                "confirmed": True,
+                "comments": [self._comment(rng, workers, created_date) for _ in range(
+                    rng.randint(0, self.max_comments))],
+                "attachments": [self._attachment(rng, created_date, index) for index in range(
+                    rng.randint(0, self.max_attachments))],
+            })
+            if status['rejected_status']:
+                issue['reject_reason'] = self._text(rng, 8)
+            if status['final_status']:
+                issue['research_result'] = self._text(rng, 12)
+
+            if rng.random() < self.unchecked_ratio:
+                issue.update({
+                    "citizen": f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    "contact_medium": CHOICE_CONTACT,
+                    "contact_information": {"type": CHOICE_PHONE, "contact": f'+228{rng.randrange(10 ** 8):08}'},
+                })
+                yield issue
+                continue
+
+            if category['redirection_protocol']:
+                # The ancestor of the village at the level of the department
+                region = village
+                while region['administrative_level'] != levels[category['id']] and region['parent_id']:
+                    region = regions[level_index[region['parent_id']]]
+                candidates = workers_by_region.get((department_id, region['administrative_id']))
+                assignee = rng.choice(candidates) if candidates else None
+            else:
+                assignee = departments[department_id]['head'] or None
+            issue.update({
+                "internal_code": f'{category["abbreviation"]}-{village["administrative_id"]}-{auto_increment_id}',
+                "citizen": '',
+                "contact_medium": rng.choice([CHOICE_ANONYMOUS, CHOICE_FACILITATOR]),
+                "contact_information": '',
+                "assignee": {"id": assignee['id'], "name": assignee['name']} if assignee else '',
+                "escalate_flag": bool(assignee) and rng.random() < self.escalated_ratio,
+            })
+            issue['administrative_region']['path_ids'] = list(village['path_ids'])
+            yield issue
+
+    @staticmethod
+    def _reference(rng, docs):
+        doc = rng.choice(docs)
+        return {"name": doc['name'], "id": doc['id']}
+
+    def _comment(self, rng, workers, created_date):
+        worker = rng.choice(workers)
+        return {
+            "name": worker['name'],
+            "id": worker['id'],
+            "comment": self._text(rng, rng.randint(4, 20)),
+            "due_at": (created_date + timedelta(seconds=rng.randrange(30 * 86400))).strftime(DATE_FORMAT),
+        }
+
+    def _attachment(self, rng, created_date, index):
+        bd_id = self._uuid(rng)
+        name = f'attachment-{index + 1}.jpg'
+        return {
+            "name": name,
+            "url": f'/grm_attachments/{bd_id}/{name}',
+            "local_url": '',
+            "id": (created_date + timedelta(seconds=index)).strftime(DATE_FORMAT),
+            "uploaded": True,
+            "bd_id": bd_id,
+        }
@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from client import get_changes
+from grm.couchdb_indexes import GRM, get_query_options
+
+logger = logging.getLogger(__name__)
+
+TAXONOMY_CACHE_REFRESH_INTERVAL = getattr(settings, 'TAXONOMY_CACHE_REFRESH_INTERVAL', 10)
+TAXONOMY_CACHE_TIMEOUT = getattr(settings, 'TAXONOMY_CACHE_TIMEOUT', 3600)
+TAXONOMY_CACHE_MAXSIZE = 32
+
+# Reference data of the GRM database, and the flags the documents of each type are indexed by
+TAXONOMY_FLAGS = {
+    'issue_age_group': (),
+    'issue_category': (),
+    'issue_citizen_group_1': (),
+    'issue_citizen_group_2': (),
+    'issue_department': (),
+    'issue_status': ('open_status', 'rejected_status', 'final_status'),
+    'issue_type': (),
+}
+TAXONOMY_CHANGES_SELECTOR = {
+    "$or": [
+        {"type": {"$in": list(TAXONOMY_FLAGS)}},
+        {"_deleted": True},
+    ]
+}
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class Taxonomy:
+    """
+    Documents of a taxonomy of the GRM database indexed by id, taxonomy[id] raising KeyError like a dictionary, and
+    by the values of its flags. The documents are shared by all the users of the cache and must not be modified.
+    The documents without id are left out, so that one invalid document does not break every lookup of its type.
+    """
+
+    def __init__(self, doc_type, docs, version=None):
+        self.doc_type = doc_type
+        self.docs = []
+        for doc in docs:
+            if 'id' in doc:
+                self.docs.append(doc)
+            else:
+                logger.warning('Skipped the %s document %s without id', doc_type, doc.get('_id'))
+        self.version = version
+        self.by_id = {doc['id']: doc for doc in self.docs}
+        self.by_flag = {}
+        for flag in TAXONOMY_FLAGS.get(doc_type, ()):
+            for doc in self.docs:
+                self.by_flag.setdefault((flag, doc.get(flag)), []).append(doc)
+
+    def __getitem__(self, doc_id):
+        return self.by_id[doc_id]
+
+    def __contains__(self, doc_id):
+        return doc_id in self.by_id
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def get(self, doc_id, default=None):
+        return self.by_id.get(doc_id, default)
+
+    def filter(self, **flags):
+        """
+        Returns the documents with the given values of flags, in the order of the query.
+        """
+        docs = self.docs
+        for flag, value in flags.items():
+            if flag in TAXONOMY_FLAGS.get(self.doc_type, ()):
+                matching = self.by_flag.get((flag, value), [])
+                docs = [doc for doc in docs if doc in matching] if docs is not self.docs else matching
+            else:
+                docs = [doc for doc in docs if doc.get(flag) == value]
+        return list(docs)
+
+    def choices(self, empty_choice=True):
+        choices = [(doc['id'], doc['name']) for doc in self.docs]
+        if empty_choice:
+            choices = [('', '')] + choices
+        return choices
+
+
+class TaxonomyCache:
+    """
+    Process-local LRU of the taxonomies of a database, over the Django cache shared by the processes.
+    The taxonomies cached by Django are stored under a version that is replaced when a document of the taxonomy
+    changes, so the processes that read the _changes feed of the database every TAXONOMY_CACHE_REFRESH_INTERVAL
+    seconds stop using them, and load the taxonomy again.
+    """
+
+    def __init__(self, database_name, maxsize=TAXONOMY_CACHE_MAXSIZE):
+        self.database_name = database_name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.last_seq = None
+        self.refreshed_at = 0
+        self.loads = 0
+        self._lock = threading.RLock()
+
+    def _version_key(self, doc_type):
+        return f'taxonomy-version:{self.database_name}:{doc_type}'
+
+    def _data_key(self, doc_type, version):
+        return f'taxonomy:{self.database_name}:{doc_type}:{version}'
+
+    def _get_version(self, doc_type):
+        key = self._version_key(doc_type)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, TAXONOMY_CACHE_TIMEOUT)
+            version = cache.get(key)
+        return version
+
+    def invalidate(self, doc_types=None):
+        with self._lock:
+            for doc_type in TAXONOMY_FLAGS if doc_types is None else doc_types:
+                self.entries.pop(doc_type, None)
+                cache.set(self._version_key(doc_type), uuid.uuid4().hex, TAXONOMY_CACHE_TIMEOUT)
+
+    def refresh(self, grm_db):
+        """
+        Invalidates the taxonomies changed since the previous refresh, according to the _changes feed.
+        """
+        with self._lock:
+            if self.last_seq is None:
+                _, self.last_seq = get_changes(grm_db, 'now', TAXONOMY_CHANGES_SELECTOR, include_docs=False)
+            else:
+                changes, self.last_seq = get_changes(grm_db, self.last_seq, TAXONOMY_CHANGES_SELECTOR)
+                doc_types = {change['doc'].get('type') for change in changes if change.get('doc')}
+                if any(change.get('deleted') for change in changes):
+                    # The type of a deleted document is unknown
+                    doc_types.update(TAXONOMY_FLAGS)
+                self.invalidate(doc_types & set(TAXONOMY_FLAGS))
+            self.refreshed_at = time.monotonic()
+
+    def get(self, grm_db, doc_type):
+        with self._lock:
+            if time.monotonic() - self.refreshed_at > TAXONOMY_CACHE_REFRESH_INTERVAL:
+                self.refresh(grm_db)
+            taxonomy = self.entries.get(doc_type)
+            if taxonomy is not None:
+                self.entries.move_to_end(doc_type)
+                return taxonomy
+
+            version = self._get_version(doc_type)
+            docs = cache.get(self._data_key(doc_type, version))
+            if docs is None:
+                selector = {"type": doc_type}
+                docs = [doc for doc in grm_db.get_query_result(selector, **get_query_options(GRM, selector))]
+                self.loads += 1
+                cache.set(self._data_key(doc_type, version), docs, TAXONOMY_CACHE_TIMEOUT)
+            taxonomy = Taxonomy(doc_type, docs, version)
+            self.entries[doc_type] = taxonomy
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            return taxonomy
+
+
+def get_taxonomy(grm_db, doc_type):
+    """
+    Returns the cached Taxonomy of the documents of doc_type ('issue_category', 'issue_status', ...) of the database.
+    """
+    key = grm_db.database_name
+    with _caches_lock:
+        taxonomy_cache = _caches.get(key)
+        if taxonomy_cache is None:
+            taxonomy_cache = TaxonomyCache(key)
+            _caches[key] = taxonomy_cache
+    return taxonomy_cache.get(grm_db, doc_type)
+
+
+def reset_taxonomy_caches():
+    with _caches_lock:
+        _caches.clear()
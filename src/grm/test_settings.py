@@ -30,3 +30,5 @@ MEDIA_URL = '/media/'
 logging.disable(logging.CRITICAL)
 
 COUCHDB_DATABASE = COUCHDB_GRM_DATABASE = COUCHDB_ATTACHMENT_DATABASE = COUCHDB_GRM_ATTACHMENT_DATABASE = 'test'
+COUCHDB_BACKEND = 'memory'
+METRICS_PUBLISH_INTERVAL = 0
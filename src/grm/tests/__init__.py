@@ -2,10 +2,17 @@ import json
 import tempfile
 
 import pytest
+from django.core.cache import cache
 from rest_framework.test import APITestCase
 
+from authentication.models import government_worker_directory
 from authentication.tests import UserFactory
-from client import get_db, bulk_delete
+from client import COUCHDB_BACKEND, bulk_delete, get_db
+from grm.administrative_tree import reset_administrative_trees
+from grm.couchdb_memory import reset_memory_server
+from grm.metrics import reset_metrics_stores
+from grm.sequences import reset_sequence_allocators
+from grm.taxonomy import reset_taxonomy_caches
 
 JSON_TYPE = 'application/json'
 URLENCODED_TYPE = 'application/x-www-form-urlencoded'
@@ -13,6 +20,23 @@ AJAX_HEADER = 'HTTP_X_REQUESTED_WITH'
 AJAX_HEADER_VALUE = 'XMLHttpRequest'
 
 
+def reset_couchdb():
+    """
+    Discards the databases of the in-memory CouchDB backend and the state the process keeps about them: the caches
+    of their documents, the sequence blocks and the metrics not published yet.
+    """
+    if COUCHDB_BACKEND == 'memory':
+        reset_memory_server()
+    reset_administrative_trees()
+    reset_taxonomy_caches()
+    reset_sequence_allocators()
+    reset_metrics_stores()
+    # The taxonomies are also kept in the Django cache
+    cache.clear()
+    # The rollback of the test transaction does not send the signals of the deleted workers
+    government_worker_directory.invalidate()
+
+
 @pytest.mark.django_db
 class BaseTestCase(APITestCase):
     rest = True
@@ -22,8 +46,13 @@ class BaseTestCase(APITestCase):
 
     def tearDown(self):
         super().tearDown()
-        docs_to_delete = [d for d in self.eadl_db if 'type' in d and d['type'] != 'administrative_level']
-        bulk_delete(self.eadl_db, docs_to_delete)
+        if COUCHDB_BACKEND == 'memory':
+            # Documents cached by the handle
+            self.eadl_db.clear()
+        else:
+            docs_to_delete = [d for d in self.eadl_db if 'type' in d and d['type'] != 'administrative_level']
+            bulk_delete(self.eadl_db, docs_to_delete)
+        reset_couchdb()
 
     @staticmethod
     def create_user(is_active=True, **kwargs):
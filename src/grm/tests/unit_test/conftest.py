@@ -0,0 +1,13 @@
+import pytest
+
+from grm.tests import reset_couchdb
+
+
+@pytest.fixture(autouse=True)
+def couchdb():
+    """
+    Runs each test on empty in-memory CouchDB databases, without the documents cached by the previous tests.
+    """
+    reset_couchdb()
+    yield
+    reset_couchdb()
@@ -0,0 +1,122 @@
+import random
+
+from grm.administrative_import import (
+    AdministrativeIdGenerator, AdministrativeLevelImport, get_administrative_level_doc_id
+)
+
+
+def region(administrative_id, name, level, parent_id, latitude=1.0, longitude=1.0):
+    return {
+        "_id": f'doc-{administrative_id}',
+        "_rev": '1-abc',
+        "type": 'administrative_level',
+        "administrative_id": administrative_id,
+        "administrative_level": level,
+        "name": name,
+        "latitude": latitude,
+        "longitude": longitude,
+        "parent_id": parent_id,
+    }
+
+
+def existing_docs():
+    return [
+        region('1', 'Togo', 'Country', None),
+        region('2', 'Savanes', 'Region', '1'),
+        region('3', 'Kpendjal', 'Prefecture', '2', latitude=None, longitude=None),
+    ]
+
+
+class TestAdministrativeLevelImport:
+
+    def test_existing_regions_are_reused(self):
+        administrative_import = AdministrativeLevelImport(existing_docs(), '1')
+
+        doc = administrative_import.add_row([('Region', 'Savanes'), ('Prefecture', 'Kpendjal')], 10.5, 0.7)
+
+        assert doc['administrative_id'] == '3'
+        assert administrative_import.created == []
+        assert list(administrative_import.updated.values()) == [dict(existing_docs()[2], latitude=10.5, longitude=0.7)]
+
+    def test_new_regions_are_created_once(self):
+        administrative_import = AdministrativeLevelImport(existing_docs(), '1')
+
+        first = administrative_import.add_row(
+            [('Region', 'Savanes'), ('Prefecture', 'Tone'), ('Commune', 'Tone 1')], 10.8, 0.2)
+        second = administrative_import.add_row(
+            [('Region', 'Savanes'), ('Prefecture', 'Tone'), ('Commune', 'Tone 2')], 10.9, 0.3)
+
+        created = administrative_import.created
+        assert [doc['name'] for doc in created] == ['Tone', 'Tone 1', 'Tone 2']
+        assert created[0]['parent_id'] == '2'
+        assert first['parent_id'] == second['parent_id'] == created[0]['administrative_id']
+        assert len({doc['administrative_id'] for doc in created}) == 3
+        assert created[1]['_id'] == get_administrative_level_doc_id(created[0]['administrative_id'], 'Commune',
+                                                                    'Tone 1')
+        assert administrative_import.get_path(second) == ['Savanes', 'Tone', 'Tone 2']
+        assert second['path_names'] == ['Togo', 'Savanes', 'Tone', 'Tone 2']
+        assert second['path_ids'] == ['1', '2', created[0]['administrative_id'], second['administrative_id']]
+        assert administrative_import.updated == {}
+
+    def test_document_ids_are_deterministic(self):
+        assert get_administrative_level_doc_id('2', 'Prefecture', 'Tone') == \
+            get_administrative_level_doc_id('2', 'Prefecture', 'Tone')
+        assert get_administrative_level_doc_id('2', 'Prefecture', 'Tone') != \
+            get_administrative_level_doc_id('3', 'Prefecture', 'Tone')
+
+
+def synthetic_rows(regions=10, prefectures=100, communes=100):
+    for r in range(regions):
+        for p in range(prefectures):
+            for c in range(communes):
+                yield [('Region', f'Region {r}'), ('Prefecture', f'Prefecture {p}'), ('Commune', f'Commune {c}')]
+
+
+class TestAdministrativeIdGenerator:
+
+    def test_ids_of_100k_rows_do_not_collide(self):
+        administrative_import = AdministrativeLevelImport(existing_docs(), '1')
+        for levels in synthetic_rows():
+            administrative_import.add_row(levels, 10.0, 1.0)
+
+        created = administrative_import.created
+        assert len(created) == 10 + 10 * 100 + 10 * 100 * 100
+        administrative_ids = {doc['administrative_id'] for doc in created}
+        assert len(administrative_ids) == len(created)
+        assert not administrative_ids & {doc['administrative_id'] for doc in existing_docs()}
+        assert len({doc['_id'] for doc in created}) == len(created)
+
+    def test_ids_do_not_depend_on_the_order_of_the_rows(self):
+        rows = list(synthetic_rows(regions=2, prefectures=10, communes=10))
+        first_import = AdministrativeLevelImport(existing_docs(), '1')
+        for levels in rows:
+            first_import.add_row(levels, 10.0, 1.0)
+        random.Random(0).shuffle(rows)
+        second_import = AdministrativeLevelImport(existing_docs(), '1')
+        for levels in rows:
+            second_import.add_row(levels, 10.0, 1.0)
+
+        def ids(administrative_import):
+            return {doc['_id']: doc['administrative_id'] for doc in administrative_import.created}
+
+        assert ids(first_import) == ids(second_import)
+
+    def test_import_run_again_creates_nothing(self):
+        rows = list(synthetic_rows(regions=2, prefectures=10, communes=10))
+        first_import = AdministrativeLevelImport(existing_docs(), '1')
+        for levels in rows:
+            first_import.add_row(levels, 10.0, 1.0)
+
+        second_import = AdministrativeLevelImport(existing_docs() + first_import.created, '1')
+        for levels in rows:
+            second_import.add_row(levels, 10.0, 1.0)
+
+        assert second_import.created == []
+
+    def test_colliding_ids_are_hashed_again(self):
+        generate_administrative_id = AdministrativeIdGenerator(digits=2)
+
+        administrative_ids = [generate_administrative_id('1', 'Commune', f'Commune {i}') for i in range(100)]
+
+        assert len(set(administrative_ids)) == 100
+        assert generate_administrative_id('1', 'Commune', 'Commune 5') == administrative_ids[5]
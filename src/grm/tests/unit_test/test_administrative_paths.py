@@ -0,0 +1,90 @@
+import grm.utils
+from grm.administrative_paths import get_moved_regions, get_outdated_regions, set_issue_path, set_region_path
+from grm.administrative_tree import AdministrativeTree
+from grm.utils import get_administrative_region_name
+
+
+def region(administrative_id, name, parent_id, **fields):
+    return dict({
+        "_id": f'doc-{administrative_id}',
+        "_rev": '1-abc',
+        "type": 'administrative_level',
+        "administrative_id": administrative_id,
+        "administrative_level": 'Level',
+        "name": name,
+        "parent_id": parent_id,
+    }, **fields)
+
+
+def create_tree():
+    return AdministrativeTree([
+        region('1', 'Togo', None),
+        region('2', 'Savanes', '1'),
+        region('3', 'Kpendjal', '2'),
+        region('4', 'Kpendjal 1', '3', path_ids=['1', '2', '3', '4'],
+               path_names=['Togo', 'Savanes', 'Kpendjal', 'Kpendjal 1']),
+    ])
+
+
+class TestAdministrativePaths:
+
+    def test_missing_paths_are_set(self):
+        tree = create_tree()
+
+        docs = get_outdated_regions(tree)
+
+        assert [doc['administrative_id'] for doc in docs] == ['1', '2', '3']
+        assert docs[2]['path_ids'] == ['1', '2', '3']
+        assert docs[2]['path_names'] == ['Togo', 'Savanes', 'Kpendjal']
+        # The documents of the tree are not modified
+        assert 'path_ids' not in tree.get('3')
+
+    def test_rename_updates_the_descendants(self):
+        tree = create_tree()
+        for doc in get_outdated_regions(tree):
+            tree.add_node(doc)
+
+        tree.add_node(dict(tree.get('2'), name='Savanes Region'))
+        docs = get_outdated_regions(tree, ['2'])
+
+        assert [doc['administrative_id'] for doc in docs] == ['2', '3', '4']
+        assert docs[2]['path_names'] == ['Togo', 'Savanes Region', 'Kpendjal', 'Kpendjal 1']
+
+    def test_unchanged_path(self):
+        tree = create_tree()
+
+        assert not set_region_path(tree, dict(tree.get('4')))
+        assert get_outdated_regions(tree, ['4']) == []
+
+    def test_issue_path(self):
+        tree = create_tree()
+        doc = {"type": 'issue', "administrative_region": {"administrative_id": '3'}}
+
+        assert set_issue_path(tree, doc)
+        assert doc['administrative_region']['path_ids'] == ['1', '2', '3']
+        assert not set_issue_path(tree, doc)
+        # An unknown region only counts its own issues
+        doc = {"type": 'issue', "administrative_region": {"administrative_id": '9'}}
+        assert set_issue_path(tree, doc)
+        assert doc['administrative_region']['path_ids'] == ['9']
+        assert not set_issue_path(tree, {"type": 'issue'})
+
+    def test_moved_regions(self):
+        tree = create_tree()
+        tree.add_node(dict(tree.get('3'), parent_id='1'))
+
+        assert get_moved_regions(tree, [tree.get('3')]) == ['3', '4']
+        assert get_moved_regions(tree, [tree.get('4')]) == ['4']
+        assert get_moved_regions(tree, [dict(tree.get('4'), path_ids=['1', '3', '4'])]) == []
+
+    def test_region_name_is_read_from_the_tree(self, monkeypatch):
+        tree = create_tree()
+        monkeypatch.setattr(grm.utils, 'get_administrative_tree', lambda eadl_db: tree)
+
+        assert get_administrative_region_name(None, '4') == 'Kpendjal 1, Kpendjal, Savanes, Togo'
+        assert get_administrative_region_name(None, '3') == 'Kpendjal, Savanes, Togo'
+        # The path of the documents is not updated yet
+        tree.add_node(dict(tree.get('2'), name='Savanes Region'))
+        tree.add_node(dict(tree.get('3'), parent_id='1'))
+        assert get_administrative_region_name(None, '4') == 'Kpendjal 1, Kpendjal, Togo'
+        assert get_administrative_region_name(None, '9') == '[Missing region with administrative_id "9"]'
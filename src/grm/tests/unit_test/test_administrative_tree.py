@@ -0,0 +1,160 @@
+import threading
+
+import pytest
+
+import grm.administrative_tree
+from grm.administrative_tree import AdministrativeTree, get_administrative_tree, reset_administrative_trees
+
+
+def region(administrative_id, parent_id, level, name=None):
+    return {
+        "_id": f'doc-{administrative_id}',
+        "type": 'administrative_level',
+        "administrative_id": administrative_id,
+        "administrative_level": level,
+        "name": name or administrative_id,
+        "parent_id": parent_id,
+    }
+
+
+def create_tree():
+    return AdministrativeTree([
+        region('country', None, 'country'),
+        region('region-1', 'country', 'region'),
+        region('region-2', 'country', 'region'),
+        region('commune-1', 'region-1', 'commune'),
+        region('commune-2', 'region-1', 'commune'),
+        region('village-1', 'commune-1', 'village'),
+        region('commune-3', 'region-2', 'commune'),
+    ])
+
+
+class TestAdministrativeTree:
+
+    def test_parent_and_ancestors(self):
+        tree = create_tree()
+
+        assert tree.get_parent('village-1')['administrative_id'] == 'commune-1'
+        assert tree.get_parent('country') is None
+        assert tree.get_parent('missing') is None
+        assert [d['administrative_id'] for d in tree.get_ancestors('village-1')] == ['commune-1', 'region-1', 'country']
+        assert tree.get_depth('country') == 0
+        assert tree.get_depth('village-1') == 3
+
+    def test_descendants(self):
+        tree = create_tree()
+
+        assert set(tree.get_descendant_ids('region-1')) == {'commune-1', 'commune-2', 'village-1'}
+        assert tree.get_descendant_ids('village-1') == []
+        assert tree.get_descendant_ids('missing') == []
+        assert len(tree.get_descendant_ids(None)) == len(tree) == 7
+
+    def test_is_descendant(self):
+        tree = create_tree()
+
+        assert tree.is_descendant('village-1', 'country')
+        assert tree.is_descendant('village-1', 'region-1')
+        assert not tree.is_descendant('village-1', 'region-2')
+        assert not tree.is_descendant('region-1', 'region-1')
+        assert not tree.is_descendant('region-1', 'village-1')
+        assert not tree.is_descendant('missing', 'country')
+
+    def test_apply_changes(self):
+        tree = create_tree()
+        moved = region('commune-2', 'region-2', 'commune')
+        tree.apply_changes([
+            {"id": moved['_id'], "doc": moved},
+            {"id": 'doc-village-2', "doc": region('village-2', 'commune-3', 'village')},
+            {"id": 'doc-village-1', "deleted": True},
+        ])
+
+        assert set(tree.get_descendant_ids('region-1')) == {'commune-1'}
+        assert set(tree.get_descendant_ids('region-2')) == {'commune-2', 'commune-3', 'village-2'}
+        assert 'village-1' not in tree
+        assert [d['administrative_id'] for d in tree.get_children('region-2')] == ['commune-3', 'commune-2']
+
+    def test_add_node_keeps_intervals_consistent(self):
+        tree = create_tree()
+        relabel_count = tree.relabel_count
+        tree.add_node(region('village-2', 'commune-2', 'village'))
+
+        assert tree.relabel_count == relabel_count
+        assert tree.is_descendant('village-2', 'commune-2')
+        assert tree.is_descendant('village-2', 'country')
+        assert not tree.is_descendant('village-2', 'commune-1')
+        assert tree.get_depth('village-2') == 3
+
+        for i in range(100):
+            tree.add_node(region(f'village-3-{i}', 'commune-3', 'village'))
+
+        assert tree.relabel_count == relabel_count
+        for i in range(100):
+            assert tree.is_descendant(f'village-3-{i}', 'region-2')
+            assert not tree.is_descendant(f'village-3-{i}', 'region-1')
+        assert len(tree.get_descendant_ids('commune-3')) == 100
+
+    def test_add_node_relabels_when_the_gap_is_exhausted(self):
+        tree = create_tree()
+        relabel_count = tree.relabel_count
+        parent_id = 'village-1'
+        for i in range(30):
+            tree.add_node(region(f'area-{i}', parent_id, 'area'))
+            parent_id = f'area-{i}'
+
+        assert tree.relabel_count > relabel_count
+        assert tree.is_descendant('area-29', 'village-1')
+        assert tree.is_descendant('area-29', 'area-0')
+        assert not tree.is_descendant('area-0', 'area-29')
+        assert tree.get_depth('area-29') == 33
+
+
+class Database:
+    database_name = 'eadl'
+
+    def __init__(self):
+        self.changes_requests = 0
+        self.during_changes_request = None
+
+
+class TestGetAdministrativeTree:
+
+    @pytest.fixture
+    def tree(self, monkeypatch):
+        tree = create_tree()
+        tree.refreshed_at -= 3600
+        db = Database()
+
+        def get_changes(eadl_db, since, selector):
+            eadl_db.changes_requests += 1
+            if eadl_db.during_changes_request:
+                eadl_db.during_changes_request()
+            return [], since
+
+        monkeypatch.setattr(grm.administrative_tree, 'get_changes', get_changes)
+        reset_administrative_trees()
+        grm.administrative_tree._trees[db.database_name] = tree
+        yield tree, db
+        reset_administrative_trees()
+
+    def test_stale_tree_is_refreshed(self, tree):
+        tree, db = tree
+
+        assert get_administrative_tree(db) is tree
+        assert db.changes_requests == 1 and not tree.is_stale()
+        get_administrative_tree(db)
+        assert db.changes_requests == 1
+
+    def test_other_callers_do_not_wait_for_a_refresh(self, tree):
+        tree, db = tree
+        trees = []
+
+        def get_tree_in_another_thread():
+            thread = threading.Thread(target=lambda: trees.append(get_administrative_tree(db)))
+            thread.start()
+            thread.join(timeout=5)
+
+        db.during_changes_request = get_tree_in_another_thread
+        get_administrative_tree(db)
+
+        # The other thread used the tree being refreshed without refreshing it too
+        assert trees == [tree] and db.changes_requests == 1
@@ -0,0 +1,76 @@
+import pytest
+
+from grm.benchmarks import SCENARIOS, Scenario, SequenceAllocations, ViewScenario, compare_results, run_benchmarks
+
+TINY = {'tiny': {'levels': 'region:1,commune:2,village:2', 'issues': 40, 'unchecked-ratio': 0.1,
+                 'escalated-ratio': 0.1}}
+
+
+class TinySequenceAllocations(SequenceAllocations):
+    processes = 2
+    threads_per_process = 2
+    allocations = 5
+
+
+TINY_SCENARIOS = [
+    TinySequenceAllocations if scenario is SequenceAllocations else scenario for scenario in SCENARIOS
+]
+
+
+def results(wall_time, requests, peak_memory):
+    return {
+        'sizes': {
+            'small': {
+                'scenarios': {
+                    'get_assignee': {
+                        'wall_time': {'min': wall_time, 'median': wall_time},
+                        'couchdb_requests': requests,
+                        'peak_memory': peak_memory,
+                    }
+                }
+            }
+        }
+    }
+
+
+class TestCompareResults:
+
+    def test_regressions(self):
+        baseline = results(1.0, 10, 1000)
+
+        assert compare_results(baseline, results(1.2, 10, 1200)) == []
+        assert compare_results(baseline, results(0.5, 9, 10)) == []
+        assert compare_results(baseline, results(1.3, 11, 1300)) == [
+            ('small', 'get_assignee', 'wall_time', 1.0, 1.3),
+            ('small', 'get_assignee', 'couchdb_requests', 10, 11),
+            ('small', 'get_assignee', 'peak_memory', 1000, 1300),
+        ]
+
+    def test_scenarios_missing_from_the_baseline_are_not_compared(self):
+        assert compare_results({'sizes': {}}, results(1.0, 10, 1000)) == []
+
+
+class TestScenario:
+
+    def test_scenarios_without_run_cannot_be_created(self):
+        with pytest.raises(TypeError):
+            Scenario()
+        with pytest.raises(TypeError):
+            ViewScenario()
+        assert all(scenario() for scenario in SCENARIOS)
+
+
+@pytest.mark.django_db
+class TestRunBenchmarks:
+
+    def test_every_scenario_is_measured(self):
+        measured = run_benchmarks(['tiny'], TINY_SCENARIOS, repeat=1, available_sizes=TINY)
+
+        scenarios = measured['sizes']['tiny']['scenarios']
+        assert list(scenarios) == [scenario.name for scenario in SCENARIOS]
+        assert scenarios['check_issues']['couchdb_requests'] > 0
+        # The requests of the threads are counted
+        assert scenarios['sequence_allocations']['couchdb_requests'] >= 2 * 2 * 5
+        assert scenarios['hierarchy_walks']['couchdb_requests'] == 0
+        assert all(measurement['wall_time']['min'] > 0 and measurement['peak_memory'] > 0
+                   for measurement in scenarios.values())
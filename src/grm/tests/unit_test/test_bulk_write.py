@@ -0,0 +1,113 @@
+from json import loads
+
+from client import bulk_write
+
+
+class FakeResponse:
+
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeBulkSession:
+    """
+    Implements _bulk_docs and _bulk_get over documents kept in memory.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.requests = []
+        self.next_id = 0
+
+    def save(self, doc):
+        if doc.get('_id') is None:
+            self.next_id += 1
+            doc['_id'] = f'doc-{self.next_id}'
+        current = self.docs.get(doc['_id'])
+        if (current['_rev'] if current else None) != doc.get('_rev'):
+            return {'id': doc['_id'], 'error': 'conflict', 'reason': 'Document update conflict.'}
+        generation = int(current['_rev'].split('-')[0]) + 1 if current else 1
+        doc = dict(doc, _rev=f'{generation}-abc')
+        self.docs[doc['_id']] = doc
+        return {'ok': True, 'id': doc['_id'], 'rev': doc['_rev']}
+
+    def post(self, url, data=None, json=None, headers=None):
+        if url.endswith('/_bulk_docs'):
+            self.requests.append(len(data))
+            body = loads(data)
+            return FakeResponse([self.save(doc) for doc in body['docs']])
+        results = []
+        for doc in json['docs']:
+            current = self.docs.get(doc['id'])
+            results.append({'id': doc['id'], 'docs': [{'ok': dict(current)} if current else {'error': {}}]})
+        return FakeResponse({'results': results})
+
+
+class FakeDatabase:
+    database_url = 'http://couchdb/grm'
+
+    def __init__(self):
+        self.r_session = FakeBulkSession()
+
+
+class TestBulkWrite:
+
+    def test_documents_are_saved_by_batches(self):
+        db = FakeDatabase()
+        docs = [{'type': 'issue', 'index': i} for i in range(25)]
+
+        outcomes = bulk_write(db, docs, batch_size=10)
+
+        assert len(db.r_session.requests) == 3
+        assert [outcome['id'] for outcome in outcomes] == [doc['_id'] for doc in docs]
+        assert all(doc['_rev'] == '1-abc' for doc in docs)
+
+    def test_batches_are_limited_in_bytes(self):
+        db = FakeDatabase()
+        docs = [{'text': 'x' * 1000} for _ in range(10)] + [{'text': 'x' * 5000}]
+
+        bulk_write(db, docs, max_bytes=3000)
+
+        # Two documents per request, and the larger document alone
+        assert len(db.r_session.requests) == 6
+        assert all(size <= 3000 for size in db.r_session.requests[:5])
+
+    def test_conflicts_are_merged(self):
+        db = FakeDatabase()
+        doc = {'_id': 'issue-1', 'counter': 0, 'name': 'Issue'}
+        bulk_write(db, [doc])
+        # Updated by another process in the meantime
+        db.r_session.save(dict(db.r_session.docs['issue-1'], counter=5))
+
+        def merge(latest_doc, doc):
+            latest_doc['name'] = doc['name']
+            return latest_doc
+
+        doc['name'] = 'Renamed'
+        outcomes = bulk_write(db, [doc, {'_id': 'issue-2'}], merge)
+
+        assert 'error' not in outcomes[0] and outcomes[0]['rev'] == '3-abc'
+        assert db.r_session.docs['issue-1']['counter'] == 5 and db.r_session.docs['issue-1']['name'] == 'Renamed'
+        assert outcomes[1]['rev'] == '1-abc'
+
+    def test_conflicts_without_merge_are_reported(self):
+        db = FakeDatabase()
+        bulk_write(db, [{'_id': 'issue-1'}])
+
+        outcomes = bulk_write(db, [{'_id': 'issue-1', 'name': 'Stale'}])
+
+        assert outcomes == [{'id': 'issue-1', 'error': 'conflict', 'reason': 'Document update conflict.'}]
+
+    def test_merge_keeping_the_latest_revision(self):
+        db = FakeDatabase()
+        bulk_write(db, [{'_id': 'issue-1'}])
+
+        outcomes = bulk_write(db, [{'_id': 'issue-1'}], merge=lambda latest_doc, doc: None)
+
+        assert outcomes == [{'id': 'issue-1', 'rev': '1-abc', 'skipped': True}]
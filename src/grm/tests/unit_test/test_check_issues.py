@@ -0,0 +1,121 @@
+import copy
+import io
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+
+import dashboard.tasks
+from client import bulk_get, bulk_write, get_db
+from dashboard.tasks import check_issues, update_issues
+from grm.couchdb_trace import end_couchdb_trace, get_couchdb_trace, start_couchdb_trace
+
+
+@pytest.fixture
+def grm_db():
+    return get_db(settings.COUCHDB_GRM_DATABASE)
+
+
+def load_unchecked_issues(grm_db):
+    """
+    Generates a dataset whose issues are all left for check_issues, without auto_increment_id and internal_code.
+    """
+    call_command('generate_dataset', '--levels=region:1,commune:2,village:2', issues=12, unchecked_ratio=1,
+                 stdout=io.StringIO())
+    issues = list(grm_db.get_query_result({"type": 'issue', "confirmed": True}, page_size=100))
+    for issue in issues:
+        del issue['auto_increment_id']
+        issue['internal_code'] = ''
+    bulk_write(grm_db, issues)
+    return issues
+
+
+def modify_while_checked(monkeypatch, grm_db, modify):
+    """
+    Saves modify(doc) of each issue right after check_issue updated it the first time, as another process would
+    before the update is written. Returns the issues as updated by check_issue by id.
+    """
+    check_issue = dashboard.tasks.check_issue
+    checked = {}
+
+    def concurrent_check_issue(grm_db_, eadl_db, issue_doc, *args):
+        updates = check_issue(grm_db_, eadl_db, issue_doc, *args)
+        if updates and issue_doc['_id'] not in checked:
+            checked[issue_doc['_id']] = copy.deepcopy(issue_doc)
+            doc = bulk_get(grm_db, [issue_doc['_id']])[0]
+            modify(doc)
+            bulk_write(grm_db, [doc])
+        return updates
+
+    monkeypatch.setattr(dashboard.tasks, 'check_issue', concurrent_check_issue)
+    return checked
+
+
+@pytest.mark.django_db
+class TestCheckIssues:
+
+    def test_issues_are_updated_by_batches(self, grm_db):
+        bulk_write(grm_db, [{"_id": f'issue-{number}', "type": 'issue', "number": number} for number in range(7)])
+        result = {'errors': [], 'updated': []}
+
+        def update_issue(issue_doc):
+            if issue_doc['number'] % 2:
+                return []
+            issue_doc['updated'] = True
+            return ['updated']
+
+        token = start_couchdb_trace()
+        try:
+            updated = update_issues(grm_db, [f'issue-{number}' for number in range(7)], update_issue, result,
+                                    batch_size=3)
+            shapes = [call['shape'] for call in get_couchdb_trace().calls]
+        finally:
+            end_couchdb_trace(token)
+
+        assert updated == 4
+        assert result == {'errors': [], 'updated': ['issue-0', 'issue-2', 'issue-4', 'issue-6']}
+        assert shapes.count('POST /{db}/_bulk_get') == 3
+        assert shapes.count('POST /{db}/_bulk_docs') == 3
+        docs = bulk_get(grm_db, [f'issue-{number}' for number in range(7)])
+        assert [doc.get('updated', False) for doc in docs] == [True, False, True, False, True, False, True]
+
+    def test_conflicts_reuse_the_checked_values(self, monkeypatch, grm_db):
+        issues = load_unchecked_issues(grm_db)
+        checked = modify_while_checked(monkeypatch, grm_db, lambda doc: doc.update(description='Edited'))
+
+        result = check_issues([issue['_id'] for issue in issues])
+
+        assert result['errors'] == []
+        assert set(checked) == {issue['_id'] for issue in issues}
+        docs = bulk_get(grm_db, [issue['_id'] for issue in issues])
+        assert all(doc['description'] == 'Edited' for doc in docs)
+        # The values set by the first check are saved, no other auto_increment_id is allocated
+        for doc in docs:
+            for field in ('auto_increment_id', 'internal_code', 'assignee', 'citizen'):
+                assert doc[field] == checked[doc['_id']][field]
+        ids = sorted(doc['auto_increment_id'] for doc in docs)
+        assert ids == list(range(ids[0], ids[0] + len(issues)))
+        for update in ('auto_increment_id_updated', 'internal_code_updated', 'anonymized_data'):
+            assert sorted(result[update]) == sorted(issue['_id'] for issue in issues)
+        assert result['updated_issues'] == len(issues)
+
+    def test_values_set_in_the_meantime_are_kept(self, monkeypatch, grm_db):
+        issues = load_unchecked_issues(grm_db)
+        assignee = {"id": 999, "name": 'Other worker'}
+        modify_while_checked(monkeypatch, grm_db, lambda doc: doc.update(assignee=assignee))
+        pending = {}
+        get_assignee = dashboard.tasks.get_assignee
+
+        def recording_get_assignee(grm_db_, eadl_db, issue_doc, errors, pending_assignments):
+            pending['assignments'] = pending_assignments
+            return get_assignee(grm_db_, eadl_db, issue_doc, errors, pending_assignments)
+
+        monkeypatch.setattr(dashboard.tasks, 'get_assignee', recording_get_assignee)
+
+        result = check_issues([issue['_id'] for issue in issues])
+
+        assert result['errors'] == []
+        assert result['assignee_updated'] == []
+        assert all(doc['assignee'] == assignee for doc in bulk_get(grm_db, [issue['_id'] for issue in issues]))
+        # The assignments that were not saved are not counted in the workload of the next issues
+        assert pending['assignments'] and not any(pending['assignments'].values())
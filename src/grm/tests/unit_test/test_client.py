@@ -0,0 +1,39 @@
+import pytest
+
+import client
+from client import get_client, get_connection_stats, get_db, reset_clients
+
+
+@pytest.fixture
+def clients():
+    reset_clients()
+    yield
+    reset_clients()
+
+
+class TestClients:
+
+    def test_the_client_is_reused_in_the_process(self, clients):
+        first = get_db()
+        second = get_db()
+
+        assert first.client is second.client is get_client()
+        assert get_connection_stats() == {'opened': 1, 'reused': 2, 'databases_checked': 1}
+
+    def test_a_forked_process_opens_its_own_client(self, clients, monkeypatch):
+        parent = get_client()
+        monkeypatch.setattr(client.os, 'getpid', lambda: -1)
+        child = get_db()
+
+        assert child.client is not parent and child.client is get_client()
+        assert get_connection_stats() == {'opened': 2, 'reused': 1, 'databases_checked': 1}
+
+    def test_reset_clients(self, clients):
+        previous = get_client()
+        get_db()
+        reset_clients()
+
+        assert get_connection_stats() == {'opened': 0, 'reused': 0, 'databases_checked': 0}
+        assert get_client() is not previous
+        get_db()
+        assert get_connection_stats()['databases_checked'] == 1
@@ -0,0 +1,27 @@
+from grm.couchdb_indexes import EADL, GRM, INDEX_DESIGN_DOCUMENT, INDEXES, QUERIES, get_index_name
+
+
+class TestGetIndexName:
+
+    def test_most_specific_index_is_used(self):
+        selector = {"auto_increment_id": 1, "confirmed": True, "type": 'issue'}
+
+        assert get_index_name(GRM, selector) == f'{INDEX_DESIGN_DOCUMENT}/issue-auto-increment-id'
+
+    def test_and_conditions_are_considered(self):
+        selector = {"$and": [{"representative.email": 'user@example.com'}, {"type": {"$in": ['adl', 'major']}}]}
+
+        assert get_index_name(EADL, selector) == f'{INDEX_DESIGN_DOCUMENT}/representative-email'
+
+    def test_no_usable_index(self):
+        assert get_index_name(GRM, {"name": 'Closed'}) is None
+
+    def test_every_declared_query_has_an_index(self):
+        for database in INDEXES:
+            for selector in QUERIES[database].values():
+                assert get_index_name(database, selector) is not None
+
+    def test_issue_list_uses_the_sort_index(self):
+        selector = QUERIES[GRM]['issue list next page']
+
+        assert get_index_name(GRM, selector) == f'{INDEX_DESIGN_DOCUMENT}/issue-list'
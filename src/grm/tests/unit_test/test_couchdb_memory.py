@@ -0,0 +1,127 @@
+import io
+
+import pytest
+from cloudant.error import CloudantDatabaseException
+
+from client import bulk_get, bulk_write, get_attachment, get_changes, get_db, get_document, upload_stream
+from grm.couchdb_memory import match_selector
+from grm.couchdb_views import DESIGN_DOCUMENTS, MAP_FUNCTIONS, load_design_document
+
+
+@pytest.fixture
+def db():
+    return get_db()
+
+
+def issue(doc_id, auto_increment_id, **fields):
+    return {
+        "_id": doc_id,
+        "type": 'issue',
+        "confirmed": True,
+        "auto_increment_id": auto_increment_id,
+        "intake_date": f'2024-01-{auto_increment_id:02}T10:00:00.000Z',
+        "status": {"id": 1, "name": 'Open'},
+        **fields,
+    }
+
+
+class TestMemoryBackend:
+
+    def test_revisions_and_conflicts(self, db):
+        doc = db.create_document({"_id": 'doc-1', "type": 'issue'})
+        first_rev = doc['_rev']
+        doc['name'] = 'Issue'
+        doc.save()
+
+        assert first_rev.startswith('1-') and doc['_rev'].startswith('2-')
+        outcomes = bulk_write(db, [{"_id": 'doc-1', "_rev": first_rev}, {"_id": 'doc-2'}])
+        assert outcomes[0]['error'] == 'conflict' and outcomes[1]['ok']
+        doc.delete()
+        assert 'doc-1' not in [d['_id'] for d in bulk_get(db, ['doc-1', 'doc-2'])]
+        with pytest.raises(CloudantDatabaseException):
+            db.create_document({"_id": 'doc-2'}, throw_on_exists=True)
+        # A deleted document can be created again
+        assert db.create_document({"_id": 'doc-1'})['_rev'].startswith('4-')
+
+    def test_mango_queries(self, db):
+        bulk_write(db, [
+            issue('a', 3, code='AB-3'), issue('b', 1, assignee={"id": 2}), issue('c', 2, confirmed=False),
+            {"_id": 'd', "type": 'category'},
+        ])
+
+        def find(selector, **options):
+            return [doc['_id'] for doc in db.get_query_result(selector, raw_result=True, **options)['docs']]
+
+        assert find({"type": 'issue', "confirmed": True}) == ['a', 'b']
+        assert find({"type": 'issue', "auto_increment_id": {"$gte": 2, "$lt": 4}}) == ['a', 'c']
+        assert find({"type": {"$in": ['issue', 'category']}, "assignee": {"$exists": False}}) == ['a', 'c', 'd']
+        assert find({"$or": [{"code": {"$regex": '^AB'}}, {"assignee.id": 2}]}) == ['a', 'b']
+        assert find({"type": 'issue', "intake_date": {"$gt": None}}, sort=[{"intake_date": 'desc'}]) == ['a', 'c', 'b']
+        assert find({"type": 'issue'}, fields=['_id'], limit=2) == ['a', 'b']
+        page = db.get_query_result({"type": 'issue'}, raw_result=True, limit=2)
+        assert [doc['_id'] for doc in db.get_query_result(
+            {"type": 'issue'}, raw_result=True, limit=2, bookmark=page['bookmark'])['docs']] == ['c']
+        assert len(list(db.get_query_result({"type": 'issue'}, page_size=1))) == 3
+
+    def test_selector_semantics(self):
+        doc = {"a": 1, "b": None, "c": [1, 2], "d": {"e": 'x'}}
+
+        assert match_selector(doc, {"b": {"$gt": None}}) is False
+        assert match_selector(doc, {"a": {"$gt": None}})
+        assert match_selector(doc, {"missing": {"$ne": 1}}) is False
+        assert match_selector(doc, {"a": {"$ne": True}})
+        assert match_selector(doc, {"c": {"$in": [2]}, "d": {"e": 'x'}})
+        assert match_selector(doc, {"c": {"$elemMatch": {"$gt": 1}}, "d.e": {"$nin": ['y']}})
+
+    def test_views(self, db):
+        region = {"administrative_id": '2', "path_ids": ['1', '2']}
+        bulk_write(db, [issue('a', 3, administrative_region=region), issue('b', 1, administrative_region=region),
+                        issue('c', 2, confirmed=False)])
+
+        stats = db.get_view_result('issues', 'auto_increment_id_stats')[0]
+        assert stats[0]['value'] == {'sum': 6, 'count': 3, 'min': 1, 'max': 3, 'sumsqr': 14}
+        rows = db.get_view_result('issues', 'statistics', group_level=3, startkey=['1', 'day'],
+                                  endkey=['1', 'day', {}])[:]
+        assert rows == [{'key': ['1', 'day', '2024-01-01'], 'value': 1},
+                        {'key': ['1', 'day', '2024-01-03'], 'value': 1}]
+        rows = db.get_view_result('issues', 'statistics', group_level=4, startkey=['2', 'month'],
+                                  endkey=['2', 'month', {}])[:]
+        assert rows == [{'key': ['2', 'month', '2024-01', '2'], 'value': 2}]
+        rows = db.get_view_result('issues', 'auto_increment_id_stats', reduce=False, descending=True,
+                                  startkey='b', include_docs=True)[:]
+        assert [(row['id'], row['doc']['auto_increment_id']) for row in rows] == [('b', 1), ('a', 3)]
+
+        # The index is updated with the changed documents
+        bulk_write(db, [{**db['b'], "auto_increment_id": 10}])
+        rows = db.get_view_result('issues', 'auto_increment_id_stats', reduce=False, keys=['b', 'c'])[:]
+        assert [row['value'] for row in rows] == [10, 2]
+        assert len(list(db.get_view_result('issues', 'auto_increment_id_stats', reduce=False, page_size=1))) == 3
+
+    def test_every_view_has_a_python_map_function(self):
+        for names in DESIGN_DOCUMENTS.values():
+            for name in names:
+                design_document = load_design_document(name)
+                for view in design_document.get('views', {}):
+                    assert (design_document['_id'], view) in MAP_FUNCTIONS
+
+    def test_changes(self, db):
+        _, since = get_changes(db, 'now')
+        bulk_write(db, [issue('a', 1), {"_id": 'b', "type": 'category'}])
+        db['a'].delete()
+
+        changes, last_seq = get_changes(db, since, {"$or": [{"type": 'category'}, {"_deleted": True}]})
+        assert [(change['id'], change.get('deleted', False)) for change in changes] == [('b', False), ('a', True)]
+        assert get_changes(db, last_seq) == ([], last_seq)
+
+    def test_attachments(self, db):
+        created = upload_stream(db, 'photo.jpg', 'image/jpeg', io.BytesIO(b'0123456789'), 10)
+
+        doc = get_document(db, created['id'])
+        assert doc['_attachments']['photo.jpg']['length'] == 10
+        response = get_attachment(db, created['id'], 'photo.jpg', {'Range': 'bytes=2-4'})
+        assert response.status_code == 206 and response.content == b'234'
+        etag = response.headers['ETag']
+        assert get_attachment(db, created['id'], 'photo.jpg', {'If-None-Match': etag}).status_code == 304
+        # Saving the document keeps the attachments of its stubs
+        db[created['id']].save()
+        assert get_attachment(db, created['id'], 'photo.jpg').content == b'0123456789'
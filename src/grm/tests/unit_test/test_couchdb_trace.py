@@ -0,0 +1,101 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+import grm.couchdb_trace
+from client import bulk_write, get_db
+from grm.couchdb_trace import (
+    end_couchdb_trace, get_call, get_couchdb_trace, get_selector_shape, start_couchdb_trace
+)
+from grm.middleware import CouchDBTraceMiddleware
+
+
+class Logger:
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, message, *args):
+        self.warnings.append(message % args)
+
+
+@pytest.fixture
+def db():
+    return get_db()
+
+
+@pytest.fixture
+def logger(monkeypatch):
+    logger = Logger()
+    monkeypatch.setattr(grm.couchdb_trace, 'logger', logger)
+    return logger
+
+
+def find_issues(db, number):
+    return db.get_query_result({"type": 'issue', "auto_increment_id": {"$in": [number, number + 1]}})[:]
+
+
+class TestCouchDBTrace:
+
+    def test_shapes(self):
+        selector = {"type": 'issue', "$or": [{"assignee.id": 1}, {"code": {"$regex": '^A'}}], "tags": ['a', 'b']}
+
+        assert get_selector_shape(selector) == {"type": '?', "$or": [{"assignee.id": '?'}, {"code": {"$regex": '?'}}],
+                                                "tags": '?'}
+        assert get_call('GET', '/grm/issue%201/a.jpg', None, 200, 0.1, 10)['shape'] == 'GET /{db}/{doc}/{attachment}'
+        assert get_call('GET', '/grm/_design/issues/_view/statistics', None, 200, 0.1, 10)['shape'] == \
+            'GET /{db}/_design/issues/_view/statistics'
+        assert get_call('PUT', '/grm/_local/checkpoint', '{}', 201, 0.1, 10)['shape'] == 'PUT /{db}/_local/{doc}'
+        assert get_call('POST', '/_session', None, 200, 0.1, 10)['database'] is None
+
+    def test_requests_are_recorded_while_a_trace_is_started(self, db):
+        bulk_write(db, [{"_id": 'a', "type": 'issue', "auto_increment_id": 1}])
+        find_issues(db, 1)
+
+        token = start_couchdb_trace()
+        try:
+            find_issues(db, 1)
+            inner_token = start_couchdb_trace()
+            find_issues(db, 5)
+            inner = get_couchdb_trace()
+            end_couchdb_trace(inner_token)
+            trace = get_couchdb_trace()
+        finally:
+            end_couchdb_trace(token)
+
+        assert get_couchdb_trace() is None
+        assert len(inner) == 1 and len(trace) == 2
+        call = trace.calls[0]
+        assert call['method'] == 'POST' and call['database'] == db.database_name and call['status'] == 200
+        assert call['request_bytes'] > 0 and call['response_bytes'] > 0 and call['duration'] >= 0
+        assert list(trace.shape_counts.values()) == [2]
+
+    def test_warnings(self, db, logger):
+        token = start_couchdb_trace()
+        try:
+            for number in range(3):
+                find_issues(db, number)
+            db.get_view_result('issues', 'statistics')[:]
+            trace = get_couchdb_trace()
+        finally:
+            end_couchdb_trace(token)
+
+        trace.log_warnings('GET /issues', budget=10, threshold=3)
+        assert len(logger.warnings) == 1 and 'sent the same CouchDB request 3 times' in logger.warnings[0]
+        trace.log_warnings('GET /issues', budget=3, threshold=0)
+        assert 'sent 4 CouchDB requests' in logger.warnings[1]
+
+
+class TestCouchDBTraceMiddleware:
+
+    def test_server_timing(self, db, logger):
+        def view(request):
+            find_issues(get_db(), 1)
+            response = HttpResponse()
+            response['Server-Timing'] = 'view;dur=1'
+            return response
+
+        response = CouchDBTraceMiddleware(view)(RequestFactory().get('/issues'))
+
+        assert response['Server-Timing'].startswith('view;dur=1, couchdb;dur=')
+        assert response['Server-Timing'].endswith(';desc="1 requests"')
+        assert get_couchdb_trace() is None and logger.warnings == []
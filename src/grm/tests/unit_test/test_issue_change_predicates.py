@@ -0,0 +1,49 @@
+from dashboard.tasks import issue_needs_check, issue_needs_escalation, issue_needs_sms_message
+
+
+def issue(**fields):
+    doc = {
+        "_id": 'issue-1',
+        "type": 'issue',
+        "confirmed": True,
+        "auto_increment_id": 1,
+        "internal_code": 'AB-1-1',
+        "citizen": '*',
+        "contact_information": {"type": 'phone_number', "contact": '*'},
+        "contact_medium": 'contact',
+        "tracking_code": 'Tree12',
+        "assignee": {"id": 1, "name": 'Worker'},
+        "escalate_flag": False,
+        "accepted_alert_message": True,
+        "rejected_alert_message": True,
+        "closed_alert_message": True,
+    }
+    doc.update(fields)
+    return doc
+
+
+class TestIssueChangePredicates:
+
+    def test_issue_needs_check(self):
+        assert not issue_needs_check(issue())
+        assert not issue_needs_check(issue(confirmed=False, assignee=''))
+        assert issue_needs_check(issue(auto_increment_id=''))
+        assert issue_needs_check(issue(internal_code=None))
+        assert issue_needs_check(issue(citizen='John Doe'))
+        assert issue_needs_check(issue(contact_information={"type": 'phone_number', "contact": '+22890000000'}))
+        assert issue_needs_check(issue(assignee=''))
+        assert issue_needs_check(issue(administrative_region={"administrative_id": '2'}))
+        assert not issue_needs_check(issue(administrative_region={"administrative_id": '2', "path_ids": ['1', '2']}))
+
+    def test_issue_needs_escalation(self):
+        assert not issue_needs_escalation(issue())
+        assert issue_needs_escalation(issue(escalate_flag=True))
+        assert not issue_needs_escalation(issue(escalate_flag=True, assignee=''))
+
+    def test_issue_needs_sms_message(self):
+        assert not issue_needs_sms_message(issue())
+        assert issue_needs_sms_message(issue(closed_alert_message=False))
+        assert not issue_needs_sms_message(issue(closed_alert_message=False, contact_medium='anonymous'))
+        doc = issue()
+        del doc['accepted_alert_message']
+        assert issue_needs_sms_message(doc)
@@ -0,0 +1,121 @@
+import pytest
+
+from client import bulk_write, get_db
+from grm.administrative_tree import AdministrativeTree
+from grm.issue_statistics import aggregate_issue_statistics, get_issue_statistics_rows, get_period_ranges
+
+
+def region(administrative_id, parent_id, level):
+    return {
+        "_id": f'doc-{administrative_id}',
+        "type": 'administrative_level',
+        "administrative_id": administrative_id,
+        "administrative_level": level,
+        "name": administrative_id,
+        "parent_id": parent_id,
+    }
+
+
+def create_tree():
+    return AdministrativeTree([
+        region('country', None, 'country'),
+        region('region-1', 'country', 'region'),
+        region('region-2', 'country', 'region'),
+        region('commune-1', 'region-1', 'commune'),
+        region('commune-2', 'region-1', 'commune'),
+        region('village-1', 'commune-1', 'village'),
+        region('commune-3', 'region-2', 'commune'),
+    ])
+
+
+def row(parent_id, day, administrative_id, status_id, type_id, category_id, count):
+    return {"key": [parent_id, 'day', day, administrative_id, status_id, type_id, category_id], "value": count}
+
+
+ROWS = [
+    row('country', '2022-01-01', 'region-1', 1, 1, 1, 3),
+    row('country', '2022-01-01', 'region-1', 2, 1, 2, 1),
+    row('country', '2022-01-02', 'region-2', 1, 2, 1, 4),
+]
+
+
+def issue(doc_id, day, path_ids, category_id=1):
+    return {
+        "_id": doc_id,
+        "type": 'issue',
+        "confirmed": True,
+        "auto_increment_id": 1,
+        "intake_date": f'{day}T10:00:00.000Z',
+        "status": {"id": 1},
+        "issue_type": {"id": 1},
+        "category": {"id": category_id},
+        "administrative_region": {"administrative_id": path_ids[-1], "path_ids": path_ids},
+    }
+
+
+@pytest.fixture
+def grm_db():
+    return get_db()
+
+
+class TestAggregateIssueStatistics:
+
+    def test_issues_are_counted_in_the_children_of_the_country(self):
+        stats = aggregate_issue_statistics(ROWS, create_tree(), names={'status': {1: 'Open', 2: 'Closed'}})
+
+        assert {k: v['count'] for k, v in stats['region_stats'].items()} == {'region-1': 4, 'region-2': 4}
+        assert stats['region_stats']['region-1']['percentage'] == 50
+        assert stats['region_stats']['region-1']['name'] == 'region-1'
+        assert stats['status_stats'][1] == {'count': 7, 'issues': 7, 'percentage': 88, 'name': 'Open'}
+        assert stats['type_stats'][2]['count'] == 4
+        assert 'name' not in stats['type_stats'][2]
+
+    def test_taxonomy_filters(self):
+        stats = aggregate_issue_statistics(ROWS, create_tree(), category=1)
+
+        assert {k: v['count'] for k, v in stats['region_stats'].items()} == {'region-1': 3, 'region-2': 4}
+        assert {k: v['count'] for k, v in stats['category_stats'].items()} == {1: 7}
+
+    def test_base_id(self):
+        tree = create_tree()
+
+        assert tree.get_base_id('village-1') == 'region-1'
+        assert tree.get_base_id('village-1', 'region-1') == 'commune-1'
+        assert tree.get_base_id('region-2') == 'region-2'
+        assert tree.get_base_id('country') == 'country'
+
+
+class TestIssueStatisticsRows:
+
+    def test_period_ranges(self):
+        assert get_period_ranges() == [('month', None, None)]
+        assert get_period_ranges('2022-01-01', '2022-03-31') == [('month', '2022-01', '2022-03')]
+        assert get_period_ranges('2022-01-15', '2022-03-10') == [
+            ('day', '2022-01-15', '2022-01-31'), ('month', '2022-02', '2022-02'), ('day', '2022-03-01', '2022-03-10')]
+        assert get_period_ranges('2022-01-15', '2022-02-10') == [('day', '2022-01-15', '2022-02-10')]
+        assert get_period_ranges('2022-02-15') == [('day', '2022-02-15', '2022-02-28'), ('month', '2022-03', None)]
+        assert get_period_ranges(None, '2022-02-10') == [
+            ('month', None, '2022-01'), ('day', '2022-02-01', '2022-02-10')]
+        assert get_period_ranges('2022-02-10', '2022-02-01') == []
+
+    def test_rows_of_a_region(self, grm_db):
+        bulk_write(grm_db, [
+            issue('a', '2022-01-15', ['country', 'region-1', 'commune-1', 'village-1']),
+            issue('b', '2022-02-03', ['country', 'region-1', 'commune-2'], category_id=2),
+            issue('c', '2022-02-20', ['country', 'region-1']),
+            issue('d', '2022-02-20', ['country', 'region-2', 'commune-3']),
+            issue('e', '2022-03-01', ['country', 'region-1', 'commune-2']),
+        ])
+        tree = create_tree()
+
+        rows = get_issue_statistics_rows(grm_db, ['region-1'], '2022-01-10', '2022-02-28')
+        stats = aggregate_issue_statistics(rows, tree)
+        assert {k: v['count'] for k, v in stats['region_stats'].items()} == {
+            'commune-1': 1, 'commune-2': 1, 'region-1': 1}
+        assert {k: v['count'] for k, v in stats['category_stats'].items()} == {1: 2, 2: 1}
+
+        rows = get_issue_statistics_rows(grm_db, ['country'])
+        stats = aggregate_issue_statistics(rows, tree)
+        assert {k: v['count'] for k, v in stats['region_stats'].items()} == {'region-1': 4, 'region-2': 1}
+        # The rows are grouped by child region and taxonomies, not by issue
+        assert len(get_issue_statistics_rows(grm_db, ['country'], '2022-02-01', '2022-02-28')) == 3
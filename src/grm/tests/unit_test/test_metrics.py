@@ -0,0 +1,119 @@
+import pytest
+
+from client import get_db, get_local_documents, save_local_document
+from dashboard.tasks import ISSUE_CHANGES_CHECKPOINT, process_issue_changes
+from grm.couchdb_trace import CouchDBTrace, get_call
+from grm.metrics import (
+    OTHER_KEY, LatencyHistogram, MetricsStore, RollingHistograms, get_change_feed_lag, get_metrics_snapshots,
+    get_metrics_store, get_performance_report, record_task_metrics
+)
+
+NOW = 1700000000
+
+
+@pytest.fixture
+def db():
+    return get_db()
+
+
+def trace(*durations):
+    couchdb_trace = CouchDBTrace()
+    for duration in durations:
+        couchdb_trace.add(get_call('GET', '/grm/issue', None, 200, duration, 10))
+    return couchdb_trace
+
+
+class TestLatencyHistogram:
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for millisecond in range(1, 1001):
+            histogram.record(millisecond / 1000)
+
+        assert histogram.count == 1000 and histogram.max == 1
+        assert histogram.get_percentile(50) == pytest.approx(0.5, rel=0.05)
+        assert histogram.get_percentile(99) == pytest.approx(0.99, rel=0.05)
+        assert histogram.get_percentile(100) == 1
+        assert len(histogram.counts) < 80
+
+    def test_merge(self):
+        first, second = LatencyHistogram(), LatencyHistogram()
+        first.record(0.01)
+        second.record(2)
+        first.merge(LatencyHistogram.from_dict(second.to_dict()))
+
+        assert first.count == 2 and first.max == 2 and first.mean == pytest.approx(1.005)
+        assert first.get_percentile(50) == pytest.approx(0.01, rel=0.05)
+
+
+class TestRollingHistograms:
+
+    def test_window(self):
+        histograms = RollingHistograms(window=120, slot_seconds=60, max_keys=2)
+        histograms.record('a', 1, NOW - 200)
+        histograms.record('a', 2, NOW - 10)
+        histograms.record('b', 3, NOW)
+        histograms.record('c', 4, NOW)
+
+        merged = histograms.get_histograms(NOW)
+        assert len(histograms.slots) == 2
+        assert {key: histogram.total for key, histogram in merged.items()} == {'a': 2, 'b': 3, OTHER_KEY: 4}
+
+
+class TestMetricsStore:
+
+    def test_publication(self, db):
+        other = MetricsStore()
+        other.process = 'worker-1'
+        other.record_task('check_issues', 0.5, {'updated_issues': 3}, trace(0.01, 0.02), now=NOW - 30)
+        other.publish(db, NOW - 30)
+        stale = MetricsStore()
+        stale.process = 'worker-2'
+        stale.publish(db, NOW - 7200)
+        get_metrics_store().record_request('GET dashboard:grm:issue_list', 0.2, trace(0.05), now=NOW - 5)
+
+        report = get_performance_report(get_metrics_snapshots(db, NOW))
+
+        assert len(report['processes']) == 2 and 'worker-1' in report['processes']
+        assert [(row['name'], row['count']) for row in report['endpoints']] == [('GET dashboard:grm:issue_list', 1)]
+        assert report['couchdb'][0]['count'] == 3 and report['couchdb'][0]['total'] == pytest.approx(80)
+        assert report['tasks'][0]['name'] == 'check_issues' and report['tasks'][0]['item_counts'] == {
+            'updated_issues': 3}
+        assert report['task_runs'][0]['duration'] == 500 and report['task_runs'][0]['couchdb_requests'] == 2
+        assert [doc['_id'] for doc in get_local_documents(db, 'metrics-')] == ['_local/metrics-worker-1']
+        assert [row['process'] for row in report['connections']] == sorted(report['processes'])
+        assert all(row['opened'] >= 0 and row['reused'] >= 0 for row in report['connections'])
+
+    def test_task_runs(self, db):
+        @record_task_metrics
+        def task(fail=False):
+            get_db().get_query_result({"type": 'issue'})[:]
+            if fail:
+                raise ValueError
+            return {'errors': [], 'updated_issues': ['a', 'b'], 'changes': 4}
+
+        task()
+        with pytest.raises(ValueError):
+            task(fail=True)
+
+        runs = list(get_metrics_store().task_runs)
+        assert runs[0]['item_counts'] == {'errors': 0, 'updated_issues': 2, 'changes': 4}
+        assert runs[0]['couchdb_requests'] == 1 and not runs[0]['failed']
+        assert runs[1]['failed'] and runs[1]['item_counts'] == {}
+
+
+class TestChangeFeedLag:
+
+    def test_lag(self, db):
+        assert get_change_feed_lag(db, ISSUE_CHANGES_CHECKPOINT) == {'pending_changes': None, 'checkpoint_age': None}
+
+        process_issue_changes()
+        db.create_document({"type": 'issue'})
+        db.create_document({"type": 'issue'})
+        lag = get_change_feed_lag(db, ISSUE_CHANGES_CHECKPOINT)
+        assert lag['pending_changes'] == 2 and 0 <= lag['checkpoint_age'] < 60
+
+        process_issue_changes()
+        assert get_change_feed_lag(db, ISSUE_CHANGES_CHECKPOINT)['pending_changes'] == 0
+        save_local_document(db, {"_id": ISSUE_CHANGES_CHECKPOINT, "last_seq": '1-g1AAAA'})
+        assert get_change_feed_lag(db, ISSUE_CHANGES_CHECKPOINT)['checkpoint_age'] is None
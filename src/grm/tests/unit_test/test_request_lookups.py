@@ -0,0 +1,70 @@
+from django.template import Context, Template
+
+import grm.request_lookups
+import grm.utils
+from grm.administrative_tree import AdministrativeTree
+from grm.middleware import RequestLookupsMiddleware
+from grm.request_lookups import get_request_lookups
+
+
+def region(administrative_id, name, parent_id):
+    return {
+        "_id": f'doc-{administrative_id}',
+        "type": 'administrative_level',
+        "administrative_id": administrative_id,
+        "administrative_level": 'Level',
+        "name": name,
+        "parent_id": parent_id,
+    }
+
+
+class FakeDatabase:
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def get_query_result(self, selector, **kwargs):
+        self.queries.append(selector)
+        return [doc for doc in self.docs if doc['administrative_id'] == selector['administrative_id']]
+
+
+def render_issues(monkeypatch, tree, db, issues):
+    monkeypatch.setattr(grm.request_lookups, 'get_db', lambda: db)
+    for module in (grm.request_lookups, grm.utils):
+        monkeypatch.setattr(module, 'get_administrative_tree', lambda eadl_db: tree)
+    template = Template(
+        '{% load custom_tags %}'
+        '{% for issue in issues %}{% get_administrative_region_name issue.administrative_region.administrative_id %};'
+        '{% endfor %}'
+    )
+
+    def view(request):
+        return template.render(Context({'issues': issues}))
+
+    return RequestLookupsMiddleware(view)(None)
+
+
+class TestRequestLookups:
+
+    def test_region_names_are_resolved_once_per_request(self, monkeypatch):
+        tree = AdministrativeTree([region('1', 'Togo', None), region('2', 'Savanes', '1')])
+        # Regions created since the tree was refreshed
+        db = FakeDatabase([region('3', 'Kpendjal', '2'), region('4', 'Tone', '2')])
+        issues = [{"administrative_region": {"administrative_id": i}} for i in ('2', '3', '4', '3', '2')]
+
+        rendered = render_issues(monkeypatch, tree, db, issues)
+
+        assert rendered.split(';')[:3] == ['Savanes, Togo', 'Kpendjal, Savanes, Togo', 'Tone, Savanes, Togo']
+        assert [selector['administrative_id'] for selector in db.queries] == ['3', '4']
+        assert get_request_lookups() is None
+
+    def test_lookups_are_not_shared_between_requests(self, monkeypatch):
+        tree = AdministrativeTree([region('1', 'Togo', None)])
+        db = FakeDatabase([])
+        issues = [{"administrative_region": {"administrative_id": '5'}}]
+
+        render_issues(monkeypatch, tree, db, issues)
+        render_issues(monkeypatch, tree, db, issues)
+
+        assert len(db.queries) == 2
@@ -0,0 +1,92 @@
+import threading
+
+from grm.sequences import SequenceAllocator
+
+
+class Response:
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return dict(self.body)
+
+    def raise_for_status(self):
+        assert self.status_code < 400
+
+
+class CounterSession:
+    """
+    Answers the GET and PUT requests of the allocators like CouchDB would, rejecting the updates of outdated
+    revisions with 409.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        with self.lock:
+            doc = self.docs.get(url)
+        return Response(200, doc) if doc else Response(404)
+
+    def put(self, url, json):
+        with self.lock:
+            current = self.docs.get(url)
+            if (current and current['_rev'] != json.get('_rev')) or (not current and '_rev' in json):
+                return Response(409)
+            revision = int(current['_rev']) + 1 if current else 1
+            self.docs[url] = dict(json, _rev=str(revision))
+            return Response(201)
+
+
+class CounterDatabase:
+
+    def __init__(self):
+        self.database_url = 'http://couchdb/grm'
+        self.r_session = CounterSession()
+
+
+class TestSequenceAllocator:
+
+    def test_ids_start_after_the_initial_value(self):
+        db = CounterDatabase()
+        allocator = SequenceAllocator(db, 'issue', get_initial_value=lambda: 41)
+
+        assert [allocator.next() for _ in range(3)] == [42, 43, 44]
+        assert SequenceAllocator(db, 'issue', get_initial_value=lambda: 0).next() == 45
+
+    def test_blocks_are_leased(self):
+        db = CounterDatabase()
+        first = SequenceAllocator(db, 'issue', block_size=10)
+        second = SequenceAllocator(db, 'issue', block_size=10)
+
+        assert [first.next(), second.next(), first.next(), second.next()] == [1, 11, 2, 12]
+        assert first.leases == second.leases == 1
+
+    def test_concurrent_allocators_hand_out_unique_ids(self):
+        db = CounterDatabase()
+        processes, threads_per_process, allocations = 8, 4, 100
+        allocators = [SequenceAllocator(db, 'issue', block_size=5) for _ in range(processes)]
+        ids = []
+        ids_lock = threading.Lock()
+
+        def allocate(allocator):
+            allocated = [allocator.next() for _ in range(allocations)]
+            with ids_lock:
+                ids.extend(allocated)
+
+        threads = [
+            threading.Thread(target=allocate, args=(allocator,))
+            for allocator in allocators for _ in range(threads_per_process)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        total = processes * threads_per_process * allocations
+        assert len(ids) == len(set(ids)) == total
+        # Every allocator leaves at most one partially used block
+        assert max(ids) <= total + processes * 5
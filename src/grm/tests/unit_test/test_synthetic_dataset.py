@@ -0,0 +1,77 @@
+import io
+
+import pytest
+from django.conf import settings
+from django.core.management import CommandError, call_command
+
+from authentication.models import GovernmentWorker
+from client import get_db
+from dashboard.tasks import check_issues, escalate_issues
+from grm.administrative_tree import AdministrativeTree
+from grm.synthetic_dataset import SyntheticDataset, parse_levels
+
+LEVELS = [('region', 2), ('commune', 2), ('village', 3)]
+
+
+@pytest.fixture
+def databases():
+    return get_db(), get_db(settings.COUCHDB_GRM_DATABASE)
+
+
+def saved_workers(dataset):
+    return [
+        {"id": number, "name": f'{worker["first_name"]} {worker["last_name"]}', "department": worker['department'],
+         "administrative_id": worker['administrative_id']}
+        for number, worker in enumerate(dataset.government_workers(), 1)
+    ]
+
+
+class TestSyntheticDataset:
+
+    def test_hierarchy(self):
+        docs = SyntheticDataset(levels=LEVELS).administrative_levels()
+
+        assert len(docs) == 1 + 2 + 4 + 12
+        tree = AdministrativeTree(docs)
+        village = docs[-1]
+        assert [doc['administrative_id'] for doc in tree.get_path(village['administrative_id'])] == village['path_ids']
+        assert village['path_names'] == ['Country', 'Region 2', 'Commune 2-2', 'Village 2-2-3']
+
+    def test_same_seed_same_documents(self):
+        first, second, other = (SyntheticDataset(seed=seed, levels=LEVELS, issues=50) for seed in (1, 1, 2))
+
+        assert list(first.adls()) == list(second.adls())
+        assert list(first.issues(saved_workers(first))) == list(second.issues(saved_workers(second)))
+        assert list(first.issues(saved_workers(first))) != list(other.issues(saved_workers(other)))
+        # The number of issues does not change the other documents
+        assert SyntheticDataset(seed=1, levels=LEVELS, issues=10).government_workers() == first.government_workers()
+
+    def test_parse_levels(self):
+        assert parse_levels('region:5, village:25') == [('region', 5), ('village', 25)]
+        with pytest.raises(ValueError):
+            parse_levels('region:0')
+
+
+@pytest.mark.django_db
+class TestGenerateDatasetCommand:
+
+    def test_generated_issues_are_processed_by_the_tasks(self, databases):
+        eadl_db, grm_db = databases
+        out = io.StringIO()
+        call_command('generate_dataset', '--levels=region:2,commune:2,village:3', issues=200, unchecked_ratio=0.1,
+                     escalated_ratio=0.1, batch_size=50, stdout=out)
+
+        assert 'created 19 administrative levels, 24 ADL documents, 24 government workers' in out.getvalue()
+        assert GovernmentWorker.objects.count() == 24
+        issues = list(grm_db.get_query_result({"type": 'issue'}, page_size=100))
+        assert len(issues) == 200
+        assert sorted(issue['auto_increment_id'] for issue in issues) == list(range(1, 201))
+
+        result = check_issues()
+        assert result['errors'] == []
+        assert result['assignee_updated'] and result['internal_code_updated']
+        result = escalate_issues()
+        assert result['errors'] == [] and result['updated_issues']
+
+        with pytest.raises(CommandError):
+            call_command('generate_dataset', '--levels=region:1,village:1', issues=1, stdout=out)
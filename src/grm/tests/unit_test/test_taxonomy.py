@@ -0,0 +1,108 @@
+import pytest
+from django.core.cache import cache
+
+import grm.taxonomy
+from grm.taxonomy import Taxonomy, get_taxonomy, reset_taxonomy_caches
+
+STATUSES = [
+    {"_id": 'status-1', "type": 'issue_status', "id": 1, "name": 'Open', "open_status": True,
+     "rejected_status": False, "final_status": False},
+    {"_id": 'status-2', "type": 'issue_status', "id": 2, "name": 'Rejected', "open_status": False,
+     "rejected_status": True, "final_status": False},
+    {"_id": 'status-3', "type": 'issue_status', "id": 3, "name": 'Closed', "open_status": False,
+     "rejected_status": False, "final_status": True},
+]
+
+
+class Logger:
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, message, *args):
+        self.warnings.append(message % args)
+
+
+class FakeDatabase:
+
+    def __init__(self, docs):
+        self.database_name = 'grm'
+        self.docs = docs
+        self.queries = 0
+        self.changes = []
+
+    def get_query_result(self, selector, **kwargs):
+        self.queries += 1
+        return [doc for doc in self.docs if doc['type'] == selector['type']]
+
+
+@pytest.fixture
+def grm_db(monkeypatch):
+    cache.clear()
+    reset_taxonomy_caches()
+    db = FakeDatabase([dict(doc) for doc in STATUSES])
+
+    def get_changes(database, since, selector=None, include_docs=True, **kwargs):
+        changes, db.changes = db.changes, []
+        return changes, 'seq'
+
+    monkeypatch.setattr(grm.taxonomy, 'get_changes', get_changes)
+    monkeypatch.setattr(grm.taxonomy, 'TAXONOMY_CACHE_REFRESH_INTERVAL', 0)
+    yield db
+    reset_taxonomy_caches()
+
+
+class TestTaxonomy:
+
+    def test_documents_are_indexed(self):
+        taxonomy = Taxonomy('issue_status', STATUSES)
+
+        assert taxonomy[2]['name'] == 'Rejected'
+        assert 4 not in taxonomy and taxonomy.get(4) is None
+        with pytest.raises(KeyError):
+            taxonomy[4]
+        assert taxonomy.filter(final_status=True) == [STATUSES[2]]
+        assert taxonomy.filter(open_status=False, name='Rejected') == [STATUSES[1]]
+        assert taxonomy.choices() == [('', ''), (1, 'Open'), (2, 'Rejected'), (3, 'Closed')]
+        assert taxonomy.choices(empty_choice=False)[0] == (1, 'Open')
+
+    def test_documents_without_id_are_skipped(self, monkeypatch):
+        logger = Logger()
+        monkeypatch.setattr(grm.taxonomy, 'logger', logger)
+        invalid = {"_id": 'status-4', "type": 'issue_status', "name": 'Invalid', "open_status": True}
+
+        taxonomy = Taxonomy('issue_status', STATUSES + [invalid])
+
+        assert len(taxonomy) == 3 and taxonomy[1]['name'] == 'Open'
+        assert taxonomy.filter(open_status=True) == [STATUSES[0]]
+        assert logger.warnings == ['Skipped the issue_status document status-4 without id']
+
+
+class TestTaxonomyCache:
+
+    def test_taxonomy_is_loaded_once(self, grm_db):
+        for _ in range(5):
+            assert get_taxonomy(grm_db, 'issue_status')[1]['name'] == 'Open'
+
+        assert grm_db.queries == 1
+
+    def test_taxonomy_is_shared_through_the_django_cache(self, grm_db):
+        get_taxonomy(grm_db, 'issue_status')
+        reset_taxonomy_caches()
+
+        assert get_taxonomy(grm_db, 'issue_status')[3]['name'] == 'Closed'
+        assert grm_db.queries == 1
+
+    def test_changed_taxonomy_is_loaded_again(self, grm_db):
+        get_taxonomy(grm_db, 'issue_status')
+        grm_db.docs[0]['name'] = 'New'
+        grm_db.changes = [{"id": 'status-1', "doc": grm_db.docs[0]}]
+
+        assert get_taxonomy(grm_db, 'issue_status')[1]['name'] == 'New'
+        assert grm_db.queries == 2
+
+    def test_deleted_document_invalidates_the_taxonomies(self, grm_db):
+        get_taxonomy(grm_db, 'issue_status')
+        del grm_db.docs[1]
+        grm_db.changes = [{"id": 'status-2', "deleted": True, "doc": {"_id": 'status-2', "_deleted": True}}]
+
+        assert 2 not in get_taxonomy(grm_db, 'issue_status')
@@ -1,8 +1,17 @@
+import base64
+import json
 from datetime import datetime
 from operator import itemgetter
 
+from django.conf import settings
 from django.template.defaultfilters import date as _date
 
+from grm.administrative_tree import get_administrative_tree
+from grm.sequences import get_sequence_allocator
+from grm.taxonomy import get_taxonomy
+
+ISSUE_AUTO_INCREMENT_ID_SEQUENCE = 'issue_auto_increment_id'
+
 
 def sort_dictionary_list_by_field(list_to_be_sorted, field, reverse=False):
     return sorted(list_to_be_sorted, key=itemgetter(field), reverse=reverse)
@@ -23,21 +32,29 @@ def unix_time_millis(dt):
     return int((dt - epoch).total_seconds() * 1000)
 
 
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor, length):
+    """
+    Returns the list of values of a pagination cursor created with encode_cursor, raising ValueError if the cursor
+    is not valid.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid cursor {cursor}')
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError(f'Invalid cursor {cursor}')
+    return values
+
+
 def get_administrative_region_choices(eadl_db, empty_choice=True):
-    country_id = eadl_db.get_query_result(
-        {
-            "type": 'administrative_level',
-            "parent_id": None,
-        }
-    )[:][0]['administrative_id']
-    query_result = eadl_db.get_query_result(
-        {
-            "type": 'administrative_level',
-            "parent_id": country_id,
-        }
-    )
+    tree = get_administrative_tree(eadl_db)
+    country_id = tree.get_children(None)[0]['administrative_id']
     choices = list()
-    for i in query_result:
+    for i in tree.get_children(country_id):
         choices.append((i['administrative_id'], f"{i['name']}"))
     if empty_choice:
         choices = [('', '')] + choices
@@ -52,33 +69,27 @@ def get_choices(query_result, empty_choice=True):
 
 
 def get_issue_age_group_choices(grm_db, empty_choice=True):
-    query_result = grm_db.get_query_result({"type": 'issue_age_group'})
-    return get_choices(query_result, empty_choice)
+    return get_taxonomy(grm_db, 'issue_age_group').choices(empty_choice)
 
 
 def get_issue_citizen_group_1_choices(grm_db, empty_choice=True):
-    query_result = grm_db.get_query_result({"type": 'issue_citizen_group_1'})
-    return get_choices(query_result, empty_choice)
+    return get_taxonomy(grm_db, 'issue_citizen_group_1').choices(empty_choice)
 
 
 def get_issue_citizen_group_2_choices(grm_db, empty_choice=True):
-    query_result = grm_db.get_query_result({"type": 'issue_citizen_group_2'})
-    return get_choices(query_result, empty_choice)
+    return get_taxonomy(grm_db, 'issue_citizen_group_2').choices(empty_choice)
 
 
 def get_issue_type_choices(grm_db, empty_choice=True):
-    query_result = grm_db.get_query_result({"type": 'issue_type'})
-    return get_choices(query_result, empty_choice)
+    return get_taxonomy(grm_db, 'issue_type').choices(empty_choice)
 
 
 def get_issue_category_choices(grm_db, empty_choice=True):
-    query_result = grm_db.get_query_result({"type": 'issue_category'})
-    return get_choices(query_result, empty_choice)
+    return get_taxonomy(grm_db, 'issue_category').choices(empty_choice)
 
 
 def get_issue_status_choices(grm_db, empty_choice=True):
-    query_result = grm_db.get_query_result({"type": 'issue_status'})
-    return get_choices(query_result, empty_choice)
+    return get_taxonomy(grm_db, 'issue_status').choices(empty_choice)
 
 
 def get_administrative_region_name(eadl_db, administrative_id):
@@ -86,21 +97,19 @@ def get_administrative_region_name(eadl_db, administrative_id):
     if not administrative_id:
         return not_found_message
 
+    # The name is read from the tree rather than from path_names, which are only updated by the periodic
+    # update_administrative_paths task once a region is renamed or moved
+    tree = get_administrative_tree(eadl_db)
     region_names = []
     has_parent = True
 
     while has_parent:
-        docs = eadl_db.get_query_result({
-            "administrative_id": administrative_id,
-            "type": 'administrative_level'
-        })
-
-        try:
-            doc = eadl_db[docs[0][0]['_id']]
+        doc = tree.get(administrative_id)
+        if doc:
             region_names.append(doc['name'])
-            administrative_id = doc['parent_id']
+            administrative_id = doc.get('parent_id')
             has_parent = administrative_id is not None
-        except Exception:
+        else:
             region_names.append(not_found_message)
             has_parent = False
 
@@ -108,82 +117,29 @@ def get_administrative_region_name(eadl_db, administrative_id):
 
 
 def get_base_administrative_id(eadl_db, administrative_id, base_parent_id=None):
-    base_administrative_id = administrative_id
-    while True:
-        parent = get_parent_administrative_level(eadl_db, administrative_id)
-        if parent:
-            base_administrative_id = administrative_id
-            administrative_id = parent['administrative_id']
-            if base_parent_id and parent['administrative_id'] == base_parent_id:
-                break
-        else:
-            break
-    return base_administrative_id
+    return get_administrative_tree(eadl_db).get_base_id(administrative_id, base_parent_id)
 
 
 def get_child_administrative_regions(eadl_db, parent_id):
-    data = eadl_db.get_query_result(
-        {
-            "type": 'administrative_level',
-            "parent_id": parent_id,
-        }
-    )
-    data = [doc for doc in data]
-    return data
+    return get_administrative_tree(eadl_db).get_children(parent_id)
 
 
 def get_administrative_regions_by_level(eadl_db, level=None):
-    filters = {"type": 'administrative_level'}
+    tree = get_administrative_tree(eadl_db)
     if level:
-        filters['administrative_level'] = level
+        parent = next(doc for doc in tree.nodes.values() if doc.get('administrative_level') == level)
     else:
-        filters['parent_id'] = None
-    parent_id = eadl_db.get_query_result(filters)[:][0]['administrative_id']
-    data = eadl_db.get_query_result(
-        {
-            "type": 'administrative_level',
-            "parent_id": parent_id,
-        }
-    )
-    data = [doc for doc in data]
-    return data
+        parent = tree.get_children(None)[0]
+    return tree.get_children(parent['administrative_id'])
 
 
 def get_administrative_level_descendants(eadl_db, parent_id, ids):
-    data = eadl_db.get_query_result(
-        {
-            "type": 'administrative_level',
-            "parent_id": parent_id,
-        }
-    )
-    data = [doc for doc in data]
-    descendants_ids = [region["administrative_id"] for region in data]
-    for descendant_id in descendants_ids:
-        get_administrative_level_descendants(eadl_db, descendant_id, ids)
-        ids.append(descendant_id)
-
+    ids.extend(get_administrative_tree(eadl_db).get_descendant_ids(parent_id))
     return ids
 
 
 def get_parent_administrative_level(eadl_db, administrative_id):
-    parent = None
-    docs = eadl_db.get_query_result({
-        "administrative_id": administrative_id,
-        "type": 'administrative_level'
-    })
-
-    try:
-        doc = eadl_db[docs[0][0]['_id']]
-        if 'parent_id' in doc and doc['parent_id']:
-            administrative_id = doc['parent_id']
-            docs = eadl_db.get_query_result({
-                "administrative_id": administrative_id,
-                "type": 'administrative_level'
-            })
-            parent = eadl_db[docs[0][0]['_id']]
-    except Exception:
-        pass
-    return parent
+    return get_administrative_tree(eadl_db).get_parent(administrative_id)
 
 
 def get_related_region_with_specific_level(eadl_db, region_doc, level):
@@ -207,14 +163,28 @@ def get_related_region_with_specific_level(eadl_db, region_doc, level):
 def belongs_to_region(eadl_db, child_administrative_id, parent_administrative_id):
     if parent_administrative_id == child_administrative_id:
         belongs = True
+    elif parent_administrative_id is None:
+        belongs = child_administrative_id in get_administrative_tree(eadl_db)
     else:
-        belongs = child_administrative_id in get_administrative_level_descendants(eadl_db, parent_administrative_id, [])
+        belongs = get_administrative_tree(eadl_db).is_descendant(child_administrative_id, parent_administrative_id)
     return belongs
 
 
-def get_auto_increment_id(grm_db):
+def get_max_auto_increment_id(grm_db):
     try:
         max_auto_increment_id = grm_db.get_view_result('issues', 'auto_increment_id_stats')[0][0]['value']['max']
     except Exception:
         max_auto_increment_id = 0
-    return max_auto_increment_id + 1
+    return max_auto_increment_id
+
+
+def get_auto_increment_id(grm_db):
+    """
+    Returns a new auto_increment_id from the issue sequence, which starts after the greatest auto_increment_id of
+    the existing issues.
+    """
+    allocator = get_sequence_allocator(
+        grm_db, ISSUE_AUTO_INCREMENT_ID_SEQUENCE, settings.AUTO_INCREMENT_ID_BLOCK_SIZE,
+        lambda: get_max_auto_increment_id(grm_db)
+    )
+    return allocator.next()
@@ -1,9 +1,27 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.module_loading import import_string
 from twilio.rest import Client
 
+from authentication.models import SmsMessage
+
 TWILIO_ACCOUNT_SID = settings.TWILIO_ACCOUNT_SID
 TWILIO_AUTH_TOKEN = settings.TWILIO_AUTH_TOKEN
 TWILIO_FROM_NUMBER = settings.TWILIO_FROM_NUMBER
+SMS_TRANSPORT = getattr(settings, 'SMS_TRANSPORT', 'sms_client.TwilioTransport')
+SMS_MAX_CONCURRENCY = getattr(settings, 'SMS_MAX_CONCURRENCY', 4)
+SMS_RATE_LIMIT = getattr(settings, 'SMS_RATE_LIMIT', 1.0)
+SMS_MAX_ATTEMPTS = getattr(settings, 'SMS_MAX_ATTEMPTS', 5)
+SMS_RETRY_BACKOFF = getattr(settings, 'SMS_RETRY_BACKOFF', 30)
+# Messages claimed by a sender that did not report back after this delay (e.g. killed worker) are sent again
+SMS_SENDING_TIMEOUT = 600
 
 client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
@@ -16,3 +34,182 @@ def send_sms(to, from_=TWILIO_FROM_NUMBER, body=None):
     )
 
     # print(message.sid)
+
+
+class TwilioTransport:
+
+    def send(self, to, body):
+        send_sms(to, body=body)
+
+
+class FakeTransport:
+    """
+    Transport keeping the messages in memory instead of sending them, optionally waiting latency seconds per message
+    and raising an exception for the recipients of fail_numbers, to test the sender offline. max_in_flight is the
+    highest number of messages that were being sent at the same time.
+    """
+
+    def __init__(self, latency=0, fail_numbers=()):
+        self.latency = latency
+        self.fail_numbers = set(fail_numbers)
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def send(self, to, body):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            self.wait()
+            if to in self.fail_numbers:
+                raise RuntimeError(f'Failed to send the message to {to}')
+            with self.lock:
+                self.sent.append((to, body))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def get_transport():
+    return import_string(SMS_TRANSPORT)()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing rate acquisitions per second on average, and bursts of capacity acquisitions.
+    clock and sleep are the functions measuring and waiting the time, replaced in the tests.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # The token is taken at once, the balance going negative while it is owed, so that the concurrent callers
+        # wait for the following tokens in turn
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate) - 1
+            self.updated_at = now
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            self.sleep(wait)
+
+
+def queue_sms(dedupe_key, to, body):
+    """
+    Adds a message to the outbox unless a message with the same dedupe_key was already queued.
+    Returns True if the message was added.
+    """
+    try:
+        _, created = SmsMessage.objects.get_or_create(dedupe_key=dedupe_key, defaults={'to': to, 'body': body})
+    except IntegrityError:
+        # Queued concurrently with the same dedupe_key
+        created = False
+    return created
+
+
+class SmsSender:
+    """
+    Sends the due messages of the outbox with max_concurrency threads, at most rate messages per second overall.
+    The messages of a recipient are sent in the order they were queued by the same thread, and a message that
+    fails is retried max_attempts times with an exponential backoff starting at retry_backoff seconds.
+    """
+
+    def __init__(self, transport=None, max_concurrency=SMS_MAX_CONCURRENCY, rate=SMS_RATE_LIMIT,
+                 max_attempts=SMS_MAX_ATTEMPTS, retry_backoff=SMS_RETRY_BACKOFF):
+        self.transport = transport or get_transport()
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, capacity=max_concurrency)
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+    def claim(self, limit):
+        """
+        Marks the due messages as being sent by this sender and returns them. Messages already claimed by another
+        sender are skipped.
+        """
+        now = timezone.now()
+        unsent = SmsMessage.objects.filter(status__in=(SmsMessage.STATUS_PENDING, SmsMessage.STATUS_SENDING))
+        due = list(unsent.filter(next_attempt_at__lte=now).order_by('id')[:limit])
+        # The messages queued after a message waiting for a retry must wait for it
+        waiting = unsent.filter(next_attempt_at__gt=now, to__in={message.to for message in due})
+        first_waiting = {}
+        for to, pk in waiting.order_by('-id').values_list('to', 'id'):
+            first_waiting[to] = pk
+        claimed = []
+        for message in due:
+            if message.to in first_waiting and message.pk > first_waiting[message.to]:
+                continue
+            updated = SmsMessage.objects.filter(
+                pk=message.pk, status=message.status, next_attempt_at=message.next_attempt_at
+            ).update(status=SmsMessage.STATUS_SENDING, next_attempt_at=now + timedelta(seconds=SMS_SENDING_TIMEOUT))
+            if updated:
+                claimed.append(message)
+        return claimed
+
+    def send_messages(self, messages):
+        # Runs in the threads of the pool, without database access. The messages after a failure are not sent to
+        # keep the order of the messages of the recipient.
+        outcomes = []
+        for message in messages:
+            self.bucket.acquire()
+            try:
+                self.transport.send(message.to, message.body)
+            except Exception as e:
+                outcomes.append((message, str(e) or e.__class__.__name__))
+                break
+            outcomes.append((message, None))
+        return outcomes
+
+    def drain(self, limit=500):
+        """
+        Sends the due messages of the outbox, limit at most. Returns the number of messages sent, failed for good
+        and scheduled for a retry.
+        """
+        by_recipient = {}
+        for message in self.claim(limit):
+            by_recipient.setdefault(message.to, []).append(message)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = list(executor.map(self.send_messages, by_recipient.values()))
+
+        stats = {'sent': 0, 'failed': 0, 'retried': 0}
+        now = timezone.now()
+        for messages, outcomes in zip(by_recipient.values(), results):
+            released_at = now
+            for message, error in outcomes:
+                if error is None:
+                    message.status = SmsMessage.STATUS_SENT
+                    message.sent_at = now
+                    stats['sent'] += 1
+                else:
+                    message.attempts += 1
+                    message.last_error = error
+                    if message.attempts >= self.max_attempts:
+                        message.status = SmsMessage.STATUS_FAILED
+                        stats['failed'] += 1
+                    else:
+                        message.status = SmsMessage.STATUS_PENDING
+                        backoff = self.retry_backoff * 2 ** (message.attempts - 1)
+                        message.next_attempt_at = now + timedelta(seconds=backoff * random.uniform(1, 1.5))
+                        released_at = message.next_attempt_at
+                        stats['retried'] += 1
+                message.save()
+            # The messages not tried after a failure are sent after the retry of the failed message
+            for message in messages[len(outcomes):]:
+                message.status = SmsMessage.STATUS_PENDING
+                message.next_attempt_at = released_at
+                message.save()
+        return stats